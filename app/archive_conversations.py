@@ -0,0 +1,48 @@
+"""
+Archive finished conversations now, and the one-time switch to incremental auto-vacuum.
+The switch runs a full VACUUM, which locks the whole database: stop the API first.
+
+    python -m app.archive_conversations --enable-incremental-vacuum
+    python -m app.archive_conversations --older-than-days 60
+"""
+import argparse
+import logging
+
+from app.config import settings
+from app.models.database import SessionLocal, init_db
+from app.services.archival_service import (
+    archive_finished_conversations,
+    enable_incremental_vacuum,
+    incremental_vacuum,
+    incremental_vacuum_enabled,
+)
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+
+def main():
+    parser = argparse.ArgumentParser(description="Move the messages of finished conversations to the archive.")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Switch SQLite to incremental auto-vacuum (one full VACUUM; run while the API is stopped)")
+    parser.add_argument("--older-than-days", type=float, default=None, help="Default: ARCHIVE_AFTER_DAYS")
+    args = parser.parse_args()
+
+    init_db()
+    if args.enable_incremental_vacuum:
+        if enable_incremental_vacuum():
+            print("The database is in incremental auto-vacuum mode.")
+        else:
+            print("Not an SQLite database; nothing to do.")
+
+    total = 0
+    with SessionLocal() as db:
+        while True:
+            archived = archive_finished_conversations(db, older_than_days=args.older_than_days)
+            total += len(archived)
+            if len(archived) < settings.ARCHIVE_BATCH_SIZE:
+                break
+    print(f"Archived {total} finished conversations.")
+    if incremental_vacuum_enabled():
+        print(f"{incremental_vacuum()} free pages left.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Offline bulk loader: crawl directory or crawl archive -> vector store.
+
+    python -m app.bulk_load web_scraper/recursive_scraped_data
+    python -m app.bulk_load web_scraper/recursive_scraped_data --batch-size 512 --workers 8
+    python -m app.bulk_load web_scraper/recursive_scraped_data --restart   # ignore the checkpoint
+    python -m app.bulk_load web_scraper/recursive_scraped_data --pdfs      # also index linked PDFs
+    python -m app.bulk_load web_scraper/recursive_scraped_data --no-dedup  # keep boilerplate and duplicates
+    python -m app.bulk_load web_scraper/recursive_scraped_data --convert-to crawl.jsonl.zst   # directory -> archive
+    python -m app.bulk_load crawl.jsonl.zst                                # load an archive
+    python -m app.bulk_load --delete-legacy-records                        # only remove records from old uploads
+
+Knowledge bases filled by versions before per-page record IDs hold records with
+shared IDs (content_summary, phone_number_N, url_N, pdf_link_N) that each upload
+overwrote; --delete-legacy-records removes them once after upgrading.
+"""
+import argparse
+import logging
+
+from app.config import settings
+from app.services.bulk_ingestion_service import bulk_load_crawl, bulk_load_pdfs, convert_crawl_directory
+from app.services.doc_ingestion_service import delete_legacy_records
+from app.utils.chromadb_client import get_chroma_collection
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a crawl output directory or crawl archive into the vector store.")
+    parser.add_argument("crawl_dir", nargs="?", help="Directory containing level_*/ folders from the scraper, or a crawl archive")
+    parser.add_argument("--collection", default="knowledge_base")
+    parser.add_argument("--batch-size", type=int, default=256, help="Records embedded and written per batch")
+    parser.add_argument("--workers", type=int, default=4, help="Processes used to parse and chunk pages")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <crawl_dir>/.bulk_load_checkpoint.json)")
+    parser.add_argument("--convert-to", default=None, metavar="ARCHIVE", help="Only convert the crawl directory into a crawl archive")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and load everything")
+    parser.add_argument("--pdfs", action="store_true", help="Also download, extract and index the PDFs the pages link to")
+    parser.add_argument("--refresh-pdfs", action="store_true", help="With --pdfs, download cached PDFs again and replace changed ones")
+    parser.add_argument("--no-dedup", action="store_true", help="Keep boilerplate text and near-duplicate pages and chunks")
+    parser.add_argument("--no-progress", action="store_true")
+    parser.add_argument("--delete-legacy-records", action="store_true", help="Delete records with the shared IDs of old uploads first")
+    args = parser.parse_args()
+    if not args.crawl_dir and not args.delete_legacy_records:
+        parser.error("crawl_dir is required")
+
+    if args.delete_legacy_records:
+        deleted = delete_legacy_records(get_chroma_collection(args.collection))
+        print(f"Deleted {deleted} legacy records from '{args.collection}'.")
+        if not args.crawl_dir:
+            return
+
+    if args.convert_to:
+        pages = convert_crawl_directory(args.crawl_dir, args.convert_to)
+        print(f"Wrote {pages} pages to {args.convert_to}.")
+        return
+
+    stats = bulk_load_crawl(
+        args.crawl_dir,
+        collection_name=args.collection,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        resume=not args.restart,
+        show_progress=not args.no_progress,
+        dedup=False if args.no_dedup else None,
+    )
+    print(f"Loaded {stats['records']} records from {stats['files']} files ({stats['skipped_files']} already loaded).")
+    if "text_chars" in stats:
+        share = stats["boilerplate_chars"] / stats["text_chars"] if stats["text_chars"] else 0.0
+        print(
+            f"Saved: {stats['boilerplate_chars']} boilerplate characters ({share:.1%} of page text), "
+            f"{stats['duplicate_pages']} near-duplicate pages, {stats['duplicate_chunks']} near-duplicate chunks, "
+            f"{stats['duplicate_phone_numbers']} repeated phone numbers."
+        )
+
+    if args.pdfs:
+        pdf_stats = bulk_load_pdfs(
+            args.crawl_dir, collection_name=args.collection, batch_size=args.batch_size, refresh=args.refresh_pdfs,
+        )
+        print(
+            f"Indexed {pdf_stats['records']} chunks from {pdf_stats['documents']} of {pdf_stats['pdfs']} linked PDFs "
+            f"({pdf_stats['unchanged']} unchanged, {pdf_stats['failed']} failed, {pdf_stats['removed']} replaced files removed)."
+        )
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Dict, List
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -15,16 +15,211 @@ class Settings(BaseSettings):
     ALLOWED_METHODS: List[str] = Field(default=["*"])
     ALLOWED_HEADERS: List[str] = Field(default=["*"])
 
+    # Metrics: per-stage timings and counters exposed on /metrics (Prometheus text format)
+    METRICS_ENABLED: bool = True
+
+    # Single-flight: concurrent identical embedding, retrieval and LLM calls share one computation
+    SINGLE_FLIGHT_ENABLED: bool = True
+
     # Database
     DATABASE_URL: str = "sqlite:///./app.db"
 
+    # Retention: finished conversations older than ARCHIVE_AFTER_DAYS are moved to compressed
+    # archive rows by a background task, which also vacuums the freed pages incrementally once the
+    # database is in incremental auto-vacuum mode (switched offline: python -m app.archive_conversations
+    # --enable-incremental-vacuum, with the API stopped). Off by default: set ARCHIVE_ENABLED=True
+    # to start the task with the API, or run python -m app.archive_conversations from cron.
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_AFTER_DAYS: float = 30.0
+    ARCHIVE_INTERVAL_S: float = 3600.0
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_VACUUM_PAGES: int = 2000  # SQLite pages returned to the OS per run
+
+    # Hot conversation cache: LRU of active conversation state with write-behind persistence.
+    # With several workers, route each conversation to one worker (sticky sessions) for best hit rates;
+    # version checks keep the database consistent either way.
+    CONVERSATION_CACHE_SIZE: int = 10000
+    CONVERSATION_RECENT_WINDOW: int = 5  # recent messages kept per conversation for question rewording
+    CONVERSATION_WRITE_BEHIND: bool = True
+    CONVERSATION_WRITE_BATCH_MS: float = 20.0
+
+    # Conversation flows: YAML/JSON definitions compiled at startup and recompiled when a file
+    # changes (checked at most every FLOW_RELOAD_INTERVAL_S seconds). Flow detection only offers
+    # the LLM the FLOW_DETECTION_MAX_CANDIDATES flows whose keywords best match the message.
+    FLOWS_DIR: str = ""  # defaults to app/prompts/flows
+    FLOW_RELOAD_INTERVAL_S: float = 2.0
+    FLOW_DETECTION_MAX_CANDIDATES: int = 8
+
+    # Speculative next steps: while the user answers, the likely next question (or the final
+    # request) is generated at background priority and used if the answer leads there.
+    # Speculative calls are capped at SPECULATION_TOKENS_PER_MINUTE estimated tokens (0 = no cap).
+    SPECULATION_ENABLED: bool = False
+    SPECULATION_TOKENS_PER_MINUTE: int = 20000
+    SPECULATION_MAX_WORKERS: int = 4
+    SPECULATION_TTL_S: float = 900.0
+    SPECULATION_MAX_WAIT_S: float = 1.0  # a turn waits this long for an unfinished speculation, then calls the LLM itself
+
+    # Slot filling: answers to later flow questions are picked out of every user message by local
+    # extractors; one structured LLM call handles what is left of long messages (at least
+    # SLOT_FILLING_LLM_MIN_WORDS unexplained words) while questions remain open
+    SLOT_FILLING_LLM_ENABLED: bool = True
+    SLOT_FILLING_LLM_MIN_WORDS: int = 12
+
+    # Precomputed answers: /assistant/generate-checklist and /assistant/ask-human queries are logged
+    # with their embeddings. A background job clusters the last PRECOMPUTE_WINDOW_DAYS of queries and
+    # computes answers (in parallel, at background priority) for the PRECOMPUTE_TOP_CLUSTERS largest
+    # clusters of at least PRECOMPUTE_MIN_QUERIES queries, spending at most PRECOMPUTE_LLM_TOKEN_BUDGET
+    # estimated tokens per run (0 = no cap). Queries within PRECOMPUTE_MATCH_SIMILARITY of a cluster
+    # are answered from the table. The job runs every PRECOMPUTE_INTERVAL_S and after re-ingestion,
+    # once the knowledge base was unchanged for PRECOMPUTE_KB_SETTLE_S. Until it has run, the previous
+    # answers are still served; it only calls the LLM again for clusters whose retrieved context
+    # changed. API worker processes share one schedule through a lock file; where file locks are not
+    # available (Windows), only the process with PRECOMPUTE_DESIGNATED_PROCESS set runs the job.
+    # Also: python -m app.precompute_answers
+    # Both are off by default, since they store user queries and spend LLM tokens in the background:
+    # set QUERY_LOG_ENABLED=True to start collecting queries, then PRECOMPUTE_ENABLED=True to run
+    # the job and serve its answers (it has nothing to cluster without the query log).
+    QUERY_LOG_ENABLED: bool = False
+    QUERY_LOG_RETENTION_DAYS: float = 30.0
+    PRECOMPUTE_ENABLED: bool = False
+    PRECOMPUTE_WINDOW_DAYS: float = 7.0
+    PRECOMPUTE_MAX_LOG_ROWS: int = 200000
+    PRECOMPUTE_CLUSTER_SIMILARITY: float = 0.88
+    PRECOMPUTE_MATCH_SIMILARITY: float = 0.9
+    PRECOMPUTE_MIN_QUERIES: int = 3
+    PRECOMPUTE_TOP_CLUSTERS: int = 50
+    PRECOMPUTE_LLM_TOKEN_BUDGET: int = 200000
+    PRECOMPUTE_WORKERS: int = 4
+    PRECOMPUTE_INTERVAL_S: float = 3600.0
+    PRECOMPUTE_CHECK_INTERVAL_S: float = 60.0
+    PRECOMPUTE_KB_SETTLE_S: float = 120.0
+    PRECOMPUTE_RELOAD_INTERVAL_S: float = 5.0
+    PRECOMPUTE_DESIGNATED_PROCESS: bool = False
+
     # Groq/OpenAI API keys
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
+    GROQ_BASE_URL: str = ""  # Override the Groq endpoint, e.g. the local mock LLM server in benchmarks/
     CLIENT_NAME: str = os.getenv("CLIENT_NAME", "groq")  # or "openai"
 
     # Models
     MODEL_NAME_CONVERSATIONAL_GROQ: str = os.getenv("MODEL_NAME_CONVERSATIONAL_GROQ", "")
 
+    # LLM gateway: provider rate limits (0 = unlimited), retries, deadlines and hedging
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY_S: float = 0.5
+    LLM_RETRY_MAX_DELAY_S: float = 8.0
+    LLM_DEADLINE_S: float = 30.0  # default per-call deadline for interactive calls
+    LLM_HEDGE_AFTER_MS: float = 0.0  # send a hedged request if no token arrived after this long (0 = off)
+    # Share the rate limits and priorities with other processes (e.g. the scrapers) through this
+    # state file; empty = each process schedules on its own
+    LLM_SHARED_STATE_FILE: str = ""
+    LLM_JSON_MODE: bool = True  # request response_format=json_object for JSON outputs (disable for providers without it)
+
+    # Prompt assembly: local tokenizer for counting and the prompt token budget per LLM call type.
+    # PROMPT_TOKENIZER is a tokenizer.json path or a Hugging Face name, read from the local cache and
+    # only downloaded with PROMPT_TOKENIZER_DOWNLOAD; empty = the embedding model's tokenizer. Without
+    # a tokenizer, counting falls back to ~4 chars/token.
+    PROMPT_TOKENIZER: str = ""
+    PROMPT_TOKENIZER_DOWNLOAD: bool = False
+    PROMPT_TOKEN_BUDGETS: Dict[str, int] = {
+        "checklist": 3000,
+        "user_request": 3000,
+        "next_question": 1500,
+        "document_labelling": 4000,
+        "website_summary": 6000,
+    }
+    PROMPT_DEFAULT_TOKEN_BUDGET: int = 4000
+
+    # Scraper page summaries: pages longer than SUMMARY_CHUNK_TOKENS are summarized per chunk
+    # (in parallel) and merged; chunk summaries are cached on disk by content hash
+    SUMMARY_CHUNK_TOKENS: int = 3000
+    SUMMARY_MAX_WORKERS: int = 4
+    SUMMARY_MAX_REDUCE_DEPTH: int = 2  # rounds of summarizing summaries before they are truncated to fit
+    SUMMARY_CACHE_DIR: str = ""  # defaults to web_scraper/.summary_cache
+
+    # Bulk-load deduplication: text found on at least DEDUP_BOILERPLATE_MIN_PAGE_RATIO of a site's
+    # pages (navigation, cookie banners, footers) is stripped before chunking; pages with an estimated
+    # word-shingle similarity of DEDUP_PAGE_SIMILARITY to an earlier page, and chunks whose SimHash
+    # differs from an earlier chunk's in at most DEDUP_CHUNK_MAX_DISTANCE bits (0-3), are left out
+    DEDUP_ENABLED: bool = True
+    DEDUP_BOILERPLATE_MIN_PAGE_RATIO: float = 0.3
+    DEDUP_BOILERPLATE_MIN_PAGES: int = 3
+    DEDUP_PAGE_SIMILARITY: float = 0.9
+    DEDUP_CHUNK_MAX_DISTANCE: int = 3
+
+    # Link graph: page -> link edges with integer node IDs and CSR adjacency arrays, kept outside
+    # the vector store. Updates go to an append-only log that is folded into the arrays every
+    # LINK_GRAPH_COMPACT_EVERY updates (and at the end of a crawl or bulk load).
+    LINK_GRAPH_DIR: str = "./link_graph"
+    LINK_GRAPH_COMPACT_EVERY: int = 1000
+
+    # Linked PDFs: downloaded concurrently, stored once per content hash in PDF_CACHE_DIR together
+    # with their extracted text, chunked and embedded with a link to the pages that reference them.
+    # Only pages without a text layer are OCR'd. PDF_INGEST_ON_UPLOAD also indexes the PDFs of
+    # pages uploaded through /ingest-data, on a background thread after the upload has returned
+    # (otherwise only `python -m app.bulk_load --pdfs` does).
+    PDF_CACHE_DIR: str = "./pdf_cache"
+    PDF_DOWNLOAD_WORKERS: int = 8
+    PDF_DOWNLOAD_TIMEOUT_S: float = 30.0
+    PDF_MAX_BYTES: int = 25_000_000
+    PDF_OCR_ENABLED: bool = True
+    PDF_OCR_DPI: int = 200
+    PDF_INGEST_ON_UPLOAD: bool = False
+
+    # Focused crawler (web_scraper/frontier.py): best-scored links first, up to CRAWL_MAX_PAGES fetches.
+    # Pages below CRAWL_MIN_PAGE_RELEVANCE (similarity to the conversation flows) are neither
+    # summarized nor saved. Allowed domains default to the seed URLs' domains.
+    CRAWL_MAX_PAGES: int = 200
+    CRAWL_MAX_DEPTH: int = 3
+    CRAWL_MAX_PAGES_PER_HOST: int = 0  # 0 = no per-host limit
+    CRAWL_ALLOWED_DOMAINS: List[str] = Field(default=[])
+    CRAWL_MIN_PAGE_RELEVANCE: float = 0.35
+
+    # Crawl archives (app/utils/crawl_archive.py): page records as JSON lines in zstd-compressed
+    # blocks of about CRAWL_ARCHIVE_BLOCK_BYTES, with an offset index for lookups by URL. Smaller
+    # blocks make lookups cheaper (only one block is decompressed) at a small cost in size.
+    CRAWL_ARCHIVE_ZSTD_LEVEL: int = 3
+    CRAWL_ARCHIVE_BLOCK_BYTES: int = 65536
+
+    # Embeddings. Changing the model changes the vector size, so re-ingest afterwards (the API and
+    # the embedding server refuse to start while the collection holds vectors of another size).
+    EMBEDDING_MODEL_NAME: str = "all-MPNet-base-v2"  # or e.g. "all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"  # "torch" (sentence-transformers) or "onnx" (ONNX Runtime)
+    EMBEDDING_QUANTIZE: bool = False  # int8 dynamic quantization of the selected backend
+    EMBEDDING_ONNX_DIR: str = "./models/onnx"  # exported ONNX models are cached here
+    EMBEDDING_NUM_THREADS: int = 0  # 0 = library default
+
+    # Embedding service: when set, embed_text is delegated to the shared embedding
+    # server (app/embedding_server.py) instead of loading the model in every worker.
+    # Accepts "http://127.0.0.1:8001" or "unix:///tmp/bureasy-embeddings.sock".
+    EMBEDDING_SERVICE_URL: str = ""
+    EMBEDDING_SERVICE_TIMEOUT: float = 10.0
+    EMBEDDING_SERVER_HOST: str = "127.0.0.1"
+    EMBEDDING_SERVER_PORT: int = 8001
+    EMBEDDING_SERVER_SOCKET: str = ""  # Unix socket path; overrides host/port when set
+
+    # ChromaDB persistence directory
+    CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
+
+    # Knowledge base version, changed once by every ingest job (upload, bulk load, PDF ingestion) from any process
+    KB_VERSION_FILE: str = "./kb_version.json"
+
+    # Vector store: "chroma", or "compact" to keep vectors as contiguous NumPy arrays
+    # in float16 or int8 with exact rescoring of the top candidates.
+    VECTOR_STORE_BACKEND: str = "chroma"
+    VECTOR_STORE_DIR: str = "./vector_store"
+    VECTOR_STORE_DTYPE: str = "float16"  # "float16" or "int8"
+    VECTOR_STORE_RESCORE_FACTOR: int = 4  # candidates rescored exactly = factor * n_results
+    # Writes append to the record log; codes and norms are saved every N written records and on shutdown
+    VECTOR_STORE_PERSIST_EVERY: int = 1000
+
+    # Micro-batching of concurrent embed_text calls (used in-process and by the embedding server)
+    EMBEDDING_BATCHING_ENABLED: bool = True
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+
     class Config:
         env_file = ".env"
 
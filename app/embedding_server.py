@@ -0,0 +1,70 @@
+"""
+Shared embedding server.
+
+One process owns the embedding model and micro-batches concurrent requests
+coming from all API workers. Point the workers at it with EMBEDDING_SERVICE_URL.
+
+    python -m app.embedding_server                                    # localhost HTTP
+    EMBEDDING_SERVER_SOCKET=/tmp/bureasy-embeddings.sock python -m app.embedding_server
+"""
+import logging
+from typing import List
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from app.config import settings
+from app.utils.chromadb_client import check_embedding_dimension, encode_texts, get_embedding_backend
+from app.utils.embedding_batcher import EmbeddingBatcher
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+app = FastAPI(
+    title="Bureasy Embedding Service",
+    description="Shared embedding model for all Bureasy API workers",
+    version="1.0.0",
+)
+
+batcher = EmbeddingBatcher(
+    encode_texts,
+    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+)
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+class EmbedResponse(BaseModel):
+    embeddings: List[List[float]]
+
+@app.post("/embed", response_model=EmbedResponse)
+def embed(request: EmbedRequest):
+    """Embed the given texts. Concurrent calls are encoded together in one batch."""
+    try:
+        vectors = batcher.embed(request.texts)
+        return {"embeddings": [vector.tolist() for vector in vectors]}
+    except Exception as e:
+        logger.exception(f"Error embedding {len(request.texts)} texts: {e}")
+        raise HTTPException(status_code=500, detail="Failed to embed texts.")
+
+@app.get("/stats")
+def stats():
+    """Batch-size histogram of the shared batcher."""
+    return batcher.stats()
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "backend": get_embedding_backend().describe()}
+
+@app.on_event("startup")
+async def startup_event():
+    # Load the model before accepting traffic so the first request isn't slow
+    check_embedding_dimension(get_embedding_backend().dimension)
+
+if __name__ == "__main__":
+    if settings.EMBEDDING_SERVER_SOCKET:
+        uvicorn.run(app, uds=settings.EMBEDDING_SERVER_SOCKET)
+    else:
+        uvicorn.run(app, host=settings.EMBEDDING_SERVER_HOST, port=settings.EMBEDDING_SERVER_PORT)
@@ -1,6 +1,7 @@
+import time
 import uvicorn
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
@@ -9,8 +10,19 @@ from app.routers import doc_labelling
 from app.routers import doc_ingestion
 from app.routers import ask_human
 from app.routers import generate_checklist
+from app.routers import embeddings
+from app.routers import metrics
+from app.routers import links
 
 from app.models.database import init_db
+from app.services.archival_service import archival_worker
+from app.services.conversation_store import conversation_store
+from app.services.flow_engine import flow_registry
+from app.services.pdf_ingestion_service import pdf_ingestion_queue
+from app.services.precomputed_answers_service import precompute_worker, query_logger
+from app.utils.chromadb_client import check_embedding_dimension, get_embedding_backend
+from app.utils.compact_vector_store import persist_compact_stores
+from app.utils.metrics import HTTP_REQUEST_SECONDS, registry
 
 # Initialize logger
 logging.basicConfig(level=settings.LOG_LEVEL)
@@ -31,12 +43,34 @@ app.add_middleware(
     allow_headers=settings.ALLOWED_HEADERS,
 )
 
+# Request latency by route template, only when metrics are enabled
+if registry.enabled:
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
+
 # Include routers
 app.include_router(assistant.router)
 app.include_router(doc_labelling.router)
 app.include_router(doc_ingestion.router)
 app.include_router(ask_human.router)
 app.include_router(generate_checklist.router)
+app.include_router(embeddings.router)
+app.include_router(metrics.router)
+app.include_router(links.router)
 
 @app.get("/")
 def read_root():
@@ -45,6 +79,29 @@ def read_root():
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    if not settings.EMBEDDING_SERVICE_URL:
+        # The embedding server checks its model itself
+        check_embedding_dimension(get_embedding_backend().dimension)
+    # Compile the conversation flows now rather than on the first message
+    flow_registry.reload(force=True)
+    if settings.ARCHIVE_ENABLED:
+        archival_worker.start()
+    if settings.PRECOMPUTE_ENABLED:
+        precompute_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    archival_worker.stop()
+    precompute_worker.stop()
+    # Persist turns and logged queries still queued for write-behind
+    conversation_store.flush(timeout=10)
+    query_logger.flush(timeout=5)
+    if not pdf_ingestion_queue.flush(timeout=30):
+        logger.warning(
+            f"Shutting down during background PDF ingestion ({pdf_ingestion_queue.pending()} more PDFs queued); "
+            "`python -m app.bulk_load --pdfs` indexes what is left"
+        )
+    persist_compact_stores()
     
 if __name__ == "__main__":
     uvicorn.run(app, host=settings.FASTAPI_HOST, port=settings.FASTAPI_PORT, debug=settings.FASTAPI_DEBUG)
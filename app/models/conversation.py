@@ -1,19 +1,37 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from datetime import datetime, timezone
+from sqlalchemy import JSON, Column, DateTime, Integer, LargeBinary, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from .database import Base
 
+def utcnow() -> datetime:
+    """Naive UTC timestamp, as stored in DateTime columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
     id = Column(Integer, primary_key=True, index=True)
     flow_type = Column(String, index=True)  # e.g., "visa_extension"
     state_index = Column(Integer, default=0)  # Tracks which question index we are on in the flow
+    current_question = Column(String, nullable=True)  # Id of the question last asked; survives flow edits, unlike state_index
+    finished_at = Column(DateTime, nullable=True, index=True)  # Set when the final user request was produced
+    archived_at = Column(DateTime, nullable=True)  # Set while the messages live in conversation_archives
+    answers = Column(JSON, nullable=True)  # Flow answers by slot name, filled from any user message
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # Optimistic concurrency check
 
     messages = relationship("Message", back_populates="conversation")
 
+    # Every UPDATE checks and increments the version, so a stale copy (e.g. in another
+    # worker's conversation cache) cannot silently overwrite newer state
+    __mapper_args__ = {"version_id_col": version}
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Every turn reads a conversation's messages ordered by id
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
@@ -21,3 +39,15 @@ class Message(Base):
     content = Column(String)
 
     conversation = relationship("Conversation", back_populates="messages")
+
+class ConversationArchive(Base):
+    """
+    Messages of an archived conversation, stored as one compressed JSON blob. The
+    conversation row itself stays online as the summary, so its id is never reused.
+    """
+    __tablename__ = "conversation_archives"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), primary_key=True)
+    message_count = Column(Integer)
+    final_request = Column(String)  # Last assistant message, i.e. the generated user request
+    payload = Column(LargeBinary)  # zlib-compressed JSON list of {"role", "content"}
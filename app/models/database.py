@@ -1,11 +1,52 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from app.config import settings
+from app.utils.metrics import STAGE_SECONDS, registry
 
 engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+
+if registry.enabled:
+    # Time every statement into the "db" stage. The start time lives on the statement's
+    # execution context, so a statement that fails leaves nothing behind.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        STAGE_SECONDS.observe(time.perf_counter() - context._query_started, stage="db")
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def run_migrations(bind=engine):
+    """
+    Lightweight migrations for databases created by older versions: create_all()
+    only creates missing tables, so nullable or server-defaulted columns and indexes
+    added to existing tables are created here.
+    """
+    existing_tables = inspect(bind).get_table_names()
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspect(bind).get_columns(table.name)}
+        with bind.begin() as conn:
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NOT NULL DEFAULT {default}"
+                    ))
+                elif column.nullable:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    run_migrations()
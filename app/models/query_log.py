@@ -0,0 +1,43 @@
+from sqlalchemy import JSON, Column, DateTime, Float, Index, Integer, LargeBinary, String
+
+from .conversation import utcnow
+from .database import Base
+
+class QueryLog(Base):
+    """One /assistant query, with its embedding, for clustering frequent queries."""
+    __tablename__ = "query_logs"
+    __table_args__ = (
+        # The precompute job reads one kind's recent queries
+        Index("ix_query_logs_kind_created_at", "kind", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # "checklist" or "ask_human"
+    query = Column(String, nullable=False)
+    normalized = Column(String, nullable=False)  # case- and whitespace-insensitive form
+    embedding = Column(LargeBinary, nullable=True)  # float16 vector
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+class PrecomputedAnswer(Base):
+    """
+    Answer computed ahead of time for a cluster of frequent queries. The precompute job
+    replaces all rows of a kind at once; until then, rows computed for an older
+    knowledge base version are still served. An answer is only computed again when
+    the context retrieved for its query (context_hash) changed.
+    """
+    __tablename__ = "precomputed_answers"
+    __table_args__ = (
+        Index("ix_precomputed_answers_kind_kb_version", "kind", "kb_version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    kb_version = Column(String, nullable=False)  # knowledge base version the answer was computed for
+    context_hash = Column(String, nullable=True)  # digest of the context retrieved for query
+    query = Column(String, nullable=False)  # the cluster's most frequent query, which the answer was computed for
+    normalized_queries = Column(JSON, nullable=False)  # normalized forms of the cluster's most frequent queries
+    embedding = Column(LargeBinary, nullable=False)  # unit-length float32 embedding of query
+    query_count = Column(Integer, nullable=False)  # logged queries in the cluster
+    answer = Column(JSON, nullable=False)  # what the endpoint returns: checklist JSON or phone number
+    compute_seconds = Column(Float, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
@@ -0,0 +1,36 @@
+"""
+Refresh the precomputed answers for frequent queries now, e.g. from cron instead of
+(or in addition to) the API's background worker.
+
+    python -m app.precompute_answers
+    python -m app.precompute_answers --kind checklist --budget 50000 --workers 8
+"""
+import argparse
+import logging
+
+from app.config import settings
+from app.models.database import init_db
+from app.services.precomputed_answers_service import KINDS, refresh_precomputed_answers
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster logged queries and precompute answers for the most frequent ones.")
+    parser.add_argument("--kind", action="append", choices=KINDS, default=None, help="Only this kind (repeatable; default: all)")
+    parser.add_argument("--budget", type=int, default=None, help="Estimated LLM tokens to spend at most (0 = no cap)")
+    parser.add_argument("--workers", type=int, default=None, help="Answers computed in parallel")
+    args = parser.parse_args()
+
+    init_db()
+    results = refresh_precomputed_answers(kinds=args.kind or KINDS, budget_tokens=args.budget, workers=args.workers)
+    llm_tokens = results.pop("llm_tokens")
+    for kind, stats in results.items():
+        print(
+            f"{kind}: {stats['answers']} answers for {stats['selected']} of {stats['clusters']} query clusters "
+            f"({stats['computed']} computed, {stats['reused']} reused, {stats['over_budget']} over budget, {stats['failed']} failed); "
+            f"they cover {stats['covered_queries']} of {stats['logged_queries']} recent queries."
+        )
+    print(f"Spent about {llm_tokens['spent']} LLM tokens" + (f" of {llm_tokens['budget']}." if llm_tokens["budget"] else "."))
+
+if __name__ == "__main__":
+    main()
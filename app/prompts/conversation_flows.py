@@ -1,16 +0,0 @@
-# app/prompts/conversation_flows.py
-
-CONVERSATION_FLOWS = {
-    "visa_extension": [
-        "What is your current visa or residence permit type?",
-        "What is your nationality?",
-        "What is your full name (as on your passport)?",
-        "What is your date of birth? (DD/MM/YYYY)",
-        "What is your current address in Munich? (street, house number, postal code)?",
-        "What is the reason for your visa extension? (e.g., continued studies, employment, family reasons, etc.)",
-        "Do you have proof of financial resources for the extended period? (Yes/No)",
-        "Do you have valid health insurance covering the extended stay? (Yes/No)",
-        "Are you currently employed or studying? Please specify employer/university.",
-        "Which local Foreigners Office (KVR / Ausländerbehörde) do you usually go to?",
-    ],
-}
@@ -0,0 +1,195 @@
+# app/prompts/prompt_assembly.py
+
+import os
+import re
+import logging
+import threading
+from typing import Any, List, Sequence
+
+from app.config import settings
+from app.utils.embedding_backends import hf_model_id
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKENS = registry.histogram(
+    "bureasy_prompt_tokens",
+    "Assembled prompt size in tokens, by call type.",
+    ["call_type"],
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384),
+)
+
+TRUNCATION_MARKER = " [...]"
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+def _cached_tokenizer_file(repo_id: str) -> str | None:
+    """tokenizer.json of a Hugging Face model if it is already in the local cache (no download)."""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return None
+    path = try_to_load_from_cache(repo_id, "tokenizer.json")
+    return path if isinstance(path, str) else None
+
+def _local_tokenizer_file(name: str) -> str | None:
+    if name:
+        return name if os.path.isfile(name) else _cached_tokenizer_file(name)
+    # Default: the embedding model's tokenizer, from the ONNX export or the model cache
+    model_name = settings.EMBEDDING_MODEL_NAME
+    exported = os.path.join(settings.EMBEDDING_ONNX_DIR, model_name.replace("/", "__"), "tokenizer.json")
+    return exported if os.path.isfile(exported) else _cached_tokenizer_file(hf_model_id(model_name))
+
+def _get_tokenizer():
+    """Load the configured tokenizer once; None means counting falls back to the chars/4 estimate."""
+    global _tokenizer, _tokenizer_loaded
+    if _tokenizer_loaded:
+        return _tokenizer
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            name = settings.PROMPT_TOKENIZER
+            try:
+                from tokenizers import Tokenizer
+                path = _local_tokenizer_file(name)
+                if path:
+                    _tokenizer = Tokenizer.from_file(path)
+                    logger.info(f"Counting prompt tokens with tokenizer {path}")
+                elif name and settings.PROMPT_TOKENIZER_DOWNLOAD:
+                    _tokenizer = Tokenizer.from_pretrained(name)
+                    logger.info(f"Counting prompt tokens with tokenizer '{name}' from the Hugging Face Hub")
+                else:
+                    logger.info(f"No local tokenizer for '{name or settings.EMBEDDING_MODEL_NAME}'; estimating ~4 characters per token.")
+                if _tokenizer is not None:
+                    # Embedding models' tokenizer files truncate and pad to the model's input length,
+                    # which would make every count the padded length or the cap
+                    _tokenizer.no_truncation()
+                    _tokenizer.no_padding()
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer '{name or settings.EMBEDDING_MODEL_NAME}' ({e}); estimating ~4 characters per token.")
+            _tokenizer_loaded = True
+    return _tokenizer
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return max(1, len(text) // 4)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens (at a word boundary where possible), marking the cut."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    max_tokens = max(1, max_tokens - count_tokens(TRUNCATION_MARKER))
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        cut = text[:max_tokens * 4]
+    else:
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        cut = text[:encoding.offsets[min(max_tokens, len(encoding.offsets)) - 1][1]]
+
+    space = cut.rfind(" ")
+    if space > len(cut) * 0.8:
+        cut = cut[:space]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+def normalize_passage(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def dedupe_passages(passages: Sequence[str]) -> List[str]:
+    """Drop empty and repeated passages (ignoring case and whitespace), keeping the first occurrence."""
+    seen, unique = set(), []
+    for passage in passages:
+        key = normalize_passage(passage)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(passage)
+    return unique
+
+def token_budget(call_type: str) -> int:
+    return settings.PROMPT_TOKEN_BUDGETS.get(call_type, settings.PROMPT_DEFAULT_TOKEN_BUDGET)
+
+class PromptPacker:
+    """
+    Fits variable prompt content (retrieved steps, conversation history, document
+    text) into the token budget of a call type, after reserving room for the
+    fixed instructions. Usage is logged and recorded per call type by log_usage().
+    """
+    def __init__(self, call_type: str, fixed_text: str = "", budget: int | None = None):
+        self.call_type = call_type
+        self.budget = token_budget(call_type) if budget is None else budget
+        self.used = count_tokens(fixed_text)
+        self.duplicates = 0
+        self.dropped = 0
+        self.truncated = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.budget - self.used)
+
+    def pack(
+        self,
+        passages: Sequence[str],
+        priorities: Sequence[Any] | None = None,
+        separator: str = "\n\n",
+        truncate: bool = False,
+    ) -> List[str]:
+        """
+        Select passages in priority order (lowest first; list order by default) while
+        they fit, and return the kept ones in their original order. Repeated passages
+        are removed first. With truncate=True, the first passage that does not fit is
+        cut to the remaining space instead of being dropped.
+        """
+        if priorities is None:
+            priorities = range(len(passages))
+        candidates, seen = [], set()
+        for idx, (passage, priority) in enumerate(zip(passages, priorities)):
+            key = normalize_passage(passage)
+            if not key:
+                continue
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            candidates.append((priority, idx, passage))
+
+        separator_tokens = count_tokens(separator)
+        kept = {}
+        for _, idx, passage in sorted(candidates, key=lambda c: (c[0], c[1])):
+            cost = count_tokens(passage) + separator_tokens
+            if cost <= self.remaining:
+                kept[idx] = passage
+                self.used += cost
+            elif truncate and not self.truncated and self.remaining > separator_tokens + 32:
+                passage = truncate_to_tokens(passage, self.remaining - separator_tokens)
+                kept[idx] = passage
+                self.used += count_tokens(passage) + separator_tokens
+                self.truncated += 1
+            else:
+                self.dropped += 1
+        return [kept[idx] for idx in sorted(kept)]
+
+    def fit(self, text: str) -> str:
+        """Truncate a single block of text to the remaining budget."""
+        fitted = truncate_to_tokens(text, self.remaining)
+        if fitted != text:
+            self.truncated += 1
+        self.used += count_tokens(fitted)
+        return fitted
+
+    def log_usage(self, messages: List[dict]) -> int:
+        """Count the final prompt, record it, and log it against the budget."""
+        prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+        PROMPT_TOKENS.observe(prompt_tokens, call_type=self.call_type)
+        log = logger.warning if prompt_tokens > self.budget else logger.info
+        log(
+            f"Prompt for {self.call_type}: {prompt_tokens}/{self.budget} tokens "
+            f"({self.duplicates} duplicate, {self.dropped} dropped, {self.truncated} truncated passages)"
+        )
+        return prompt_tokens
@@ -58,9 +58,9 @@ You will be provided with:
     "...additional steps as required"
   ],
   "pdf_links": [
-    "...only PDF links provided in {formatted_steps}`..."
+    "...only PDF links provided in the steps above..."
   ],
-  "source": "...only source URL explicitly provided in `{formatted_steps}`...",
+  "source": "...only source URL explicitly provided in the steps above...",
   "closing": "Short concluding sentence summarizing the process or providing next steps."
 }}
 
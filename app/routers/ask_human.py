@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.services.ask_human_service import ask_human_phone
+from app.services.precomputed_answers_service import lookup_answer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,11 +22,13 @@ class AskHumanResponse(BaseModel):
 def ask_human_route(request: AskHumanRequest):
     """
     Returns a phone number as a JSON object or 'NoPhoneAvailable'
-    if no number is available.
+    if no number is available. Frequent queries are answered from precomputed results.
     """
     try:
-        # Get the result from the `ask_human_phone` function
-        result = ask_human_phone(request.query)
+        result, query_embedding, retrieved_phone = lookup_answer("ask_human", request.query)
+        if result is None:
+            # Get the result from the `ask_human_phone` function, unless the lookup already did
+            result = retrieved_phone if retrieved_phone is not None else ask_human_phone(request.query, query_embedding=query_embedding)
 
         # Ensure the response is wrapped in the expected format
         if result == "NoPhoneAvailable":
@@ -1,17 +1,32 @@
 # app/routers/assistant.py
 
+import json
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.services.assistant_service import (
+    ChatSession,
     process_incoming_message,
     generate_user_request
 )
+from app.services.archival_service import restore_conversation
+from app.services.conversation_store import conversation_store
+from app.services.speculation_service import speculator
+from app.models.conversation import Conversation
 from app.models.database import SessionLocal
+from app.utils.metrics import registry, timed
 
 logger = logging.getLogger(__name__)
+
+WEBSOCKET_EVENTS = registry.counter(
+    "bureasy_assistant_websocket_events_total",
+    "Assistant WebSocket connections and turns by event (connected, disconnected, turn, error).",
+    ["event"],
+)
 router = APIRouter(
     prefix="/assistant",
     tags=["Assistant Responses"],
@@ -62,6 +77,124 @@ def handle_message(request_data: ChatRequest, db: Session = Depends(get_db)):
         logger.exception(f"Unexpected error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error.")
 
+def _parse_conversation_id(value) -> int | None:
+    """A positive integer id (also as a string of digits), else None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    return value if isinstance(value, int) and value > 0 else None
+
+@router.websocket("/ws")
+async def assistant_websocket(websocket: WebSocket, conversation_id: int | None = None):
+    """
+    Chat over one WebSocket. The conversation state stays with the connection, the
+    reply is streamed token by token and each turn is persisted in the background.
+    Reconnect with ?conversation_id=<id> or a {"type": "resume", "conversation_id": <id>} message.
+
+    Client messages: {"type": "message", "user_input": "..."}, {"type": "resume", "conversation_id": 1}
+    Server messages: {"type": "session", "conversation_id", "last_response"},
+                     {"type": "token", "text"}, {"type": "done", "conversation_id", "response", "finished"},
+                     {"type": "error", "detail"}
+    """
+    await websocket.accept()
+    WEBSOCKET_EVENTS.inc(event="connected")
+    session = ChatSession()
+    loop = asyncio.get_running_loop()
+
+    async def resume(resume_id: int):
+        state = await run_in_threadpool(session.resume, resume_id)
+        if state is None:
+            await websocket.send_json({"type": "error", "detail": "Conversation not found."})
+            return
+        await websocket.send_json({
+            "type": "session", "conversation_id": state.id, "last_response": session.last_reply(),
+        })
+
+    async def turn(user_input: str):
+        tokens: asyncio.Queue = asyncio.Queue()
+
+        def on_token(text: str):
+            loop.call_soon_threadsafe(tokens.put_nowait, text)
+
+        def send():
+            try:
+                return session.send(user_input, on_token)
+            finally:
+                loop.call_soon_threadsafe(tokens.put_nowait, None)
+
+        with timed("websocket_turn"):
+            pending = asyncio.ensure_future(run_in_threadpool(send))
+            done = False
+            while not done:
+                # Tokens that arrived while the previous frame was sent go out as one frame
+                parts = [await tokens.get()]
+                while not tokens.empty():
+                    parts.append(tokens.get_nowait())
+                done = parts[-1] is None
+                text = "".join(part for part in parts if part is not None)
+                if text:
+                    await websocket.send_json({"type": "token", "text": text})
+            reply, finished = await pending
+        WEBSOCKET_EVENTS.inc(event="turn")
+        await websocket.send_json({
+            "type": "done",
+            "conversation_id": session.state.id if session.state else None,
+            "response": reply,
+            "finished": finished,
+        })
+
+    try:
+        if conversation_id:
+            await resume(conversation_id)
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                data = json.loads(raw)
+                if not isinstance(data, dict):
+                    await websocket.send_json({"type": "error", "detail": "Expected a JSON object."})
+                elif data.get("type") == "resume":
+                    resume_id = _parse_conversation_id(data.get("conversation_id"))
+                    if resume_id is None:
+                        await websocket.send_json({"type": "error", "detail": "conversation_id must be a positive integer."})
+                    else:
+                        await resume(resume_id)
+                elif data.get("type", "message") == "message" and data.get("user_input"):
+                    await turn(str(data["user_input"]))
+                else:
+                    await websocket.send_json({"type": "error", "detail": "Expected a message with user_input or a resume."})
+            except json.JSONDecodeError:
+                await websocket.send_json({"type": "error", "detail": "Invalid JSON."})
+            except HTTPException as http_exc:
+                logger.error(f"Error processing message: {http_exc.detail}")
+                WEBSOCKET_EVENTS.inc(event="error")
+                await websocket.send_json({"type": "error", "detail": http_exc.detail})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.exception(f"Unexpected error: {e}")
+                WEBSOCKET_EVENTS.inc(event="error")
+                await websocket.send_json({"type": "error", "detail": "Internal server error."})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        WEBSOCKET_EVENTS.inc(event="disconnected")
+        session.close()
+
+@router.get("/conversation-cache/stats")
+def conversation_cache_stats():
+    """
+    Hit rate, size and pending write-behind writes of this worker's conversation cache.
+    """
+    return conversation_store.stats()
+
+@router.get("/speculation/stats")
+def speculation_stats():
+    """
+    Hit rate, saved LLM time and spent tokens of this worker's speculative next steps.
+    """
+    return speculator.stats()
+
 @router.get("/{conversation_id}/generate-request")
 def skip_and_generate_request(conversation_id: int, db: Session = Depends(get_db)):
     """
@@ -80,3 +213,22 @@ def skip_and_generate_request(conversation_id: int, db: Session = Depends(get_db
     except Exception as e:
         logger.exception(f"Unexpected error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error.")
+
+@router.post("/{conversation_id}/restore")
+def restore_archived_conversation(conversation_id: int, db: Session = Depends(get_db)):
+    """
+    Endpoint to bring an archived conversation's messages back into the live tables.
+    Conversations are also restored automatically when they receive a new message.
+    """
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found.")
+    try:
+        restored = restore_conversation(db, conversation)
+        return {
+            "conversation_id": conversation_id,
+            "restored": restored
+        }
+    except Exception as e:
+        logger.exception(f"Unexpected error restoring conversation: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error.")
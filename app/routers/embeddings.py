@@ -0,0 +1,20 @@
+import logging
+from fastapi import APIRouter
+
+from app.utils.chromadb_client import embedding_batcher
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/embeddings",
+    tags=["Embeddings"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/batch-stats")
+def batch_stats():
+    """
+    Batch-size histogram of the in-process embedding micro-batcher.
+    Empty when embeddings are delegated to the shared embedding server.
+    """
+    return embedding_batcher.stats()
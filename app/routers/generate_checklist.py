@@ -1,7 +1,13 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import logging
-from app.services.checklist_generation_service import generate_checklist, send_checklist_to_ai_model
+from app.services.checklist_generation_service import (
+    generate_checklist,
+    send_checklist_to_ai_model,
+    stream_checklist_from_ai_model,
+)
+from app.services.precomputed_answers_service import lookup_answer
 import json
 
 # Initialize logger
@@ -20,9 +26,14 @@ class ChecklistResponse(BaseModel):
     ai_response: dict
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import logging
-from app.services.checklist_generation_service import generate_checklist, send_checklist_to_ai_model
+from app.services.checklist_generation_service import (
+    generate_checklist,
+    send_checklist_to_ai_model,
+    stream_checklist_from_ai_model,
+)
 import json
 
 # Initialize logger
@@ -44,40 +55,22 @@ class ChecklistResponse(BaseModel):
 def generate_checklist_route(request: ChecklistRequest):
     """
     Query the vector store + LLM to produce a JSON-based checklist, then send it to an AI model for processing.
+    Frequent queries are answered from precomputed checklists.
     """
     try:
-        # Generate the checklist
-        checklist_json = generate_checklist(request.query)
-        logger.info(f"Generated checklist: {checklist_json}")
+        ai_response, query_embedding, checklist_json = lookup_answer("checklist", request.query)
+        if ai_response is not None:
+            return ChecklistResponse(ai_response=ai_response)
 
-        # Send the checklist to the AI model for further formatting
+        # Generate the checklist, unless the lookup already retrieved it
+        if checklist_json is None:
+            checklist_json = generate_checklist(request.query, query_embedding=query_embedding)
+        logger.debug(f"Generated checklist: {checklist_json}")
+
+        # Send the checklist to the AI model; its JSON answer is parsed and validated while it streams
         ai_response = send_checklist_to_ai_model(request.query, checklist_json)
-        logger.info(f"AI response (raw): {ai_response}")
-
-        # Process and clean up the AI response
-        if isinstance(ai_response, str):
-            # Remove potential formatting markers (like ```json and ``` around the response)
-            ai_response = ai_response.strip()
-            if ai_response.startswith("```json"):
-                ai_response = ai_response[7:]
-            if ai_response.endswith("```"):
-                ai_response = ai_response[:-3]
-
-            logger.info(f"AI response (cleaned): {ai_response}")
-
-            # Attempt to parse the cleaned response as JSON
-            try:
-                ai_response = json.loads(ai_response)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing AI response as JSON: {e}")
-                raise HTTPException(status_code=500, detail="Failed to parse AI response as valid JSON.")
-
-        # Ensure the parsed response is a dictionary
-        if not isinstance(ai_response, dict):
-            logger.error(f"AI response is not a valid dictionary: {ai_response}")
-            raise HTTPException(status_code=500, detail="AI response format is invalid.")
-
-        # Return the successfully parsed and validated AI response
+        logger.debug(f"AI response: {ai_response}")
+
         return ChecklistResponse(ai_response=ai_response)
 
     except HTTPException as exc:
@@ -86,3 +79,35 @@ def generate_checklist_route(request: ChecklistRequest):
     except Exception as e:
         logger.exception(f"Unexpected error generating checklist: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate the checklist or query the AI model.")
+
+@router.post("/generate-checklist/stream")
+def generate_checklist_stream_route(request: ChecklistRequest):
+    """
+    Same as /generate-checklist, but streams newline-delimited JSON events:
+    {"event": "step"} for each checklist step as soon as the AI model completes it,
+    {"event": "retry"} if a malformed answer was discarded and regenerated,
+    then {"event": "checklist"} with the validated response, or {"event": "error"}.
+    A precomputed checklist is sent as the same events, all at once.
+    """
+    ai_response, query_embedding, checklist_json = lookup_answer("checklist", request.query)
+    if ai_response is not None:
+        precomputed_events = [{"event": "step", "index": idx, "step": step} for idx, step in enumerate(ai_response["steps"], start=1)]
+        precomputed_events.append({"event": "checklist", "ai_response": ai_response})
+        return StreamingResponse((json.dumps(event) + "\n" for event in precomputed_events), media_type="application/x-ndjson")
+
+    # Retrieval errors are returned as regular HTTP errors before streaming starts
+    if checklist_json is None:
+        checklist_json = generate_checklist(request.query, query_embedding=query_embedding)
+
+    def events():
+        try:
+            for event in stream_checklist_from_ai_model(request.query, checklist_json):
+                yield json.dumps(event) + "\n"
+        except HTTPException as exc:
+            logger.error(f"HTTPException occurred while streaming checklist: {exc.detail}")
+            yield json.dumps({"event": "error", "status_code": exc.status_code, "detail": exc.detail}) + "\n"
+        except Exception as e:
+            logger.exception(f"Unexpected error streaming checklist: {e}")
+            yield json.dumps({"event": "error", "status_code": 500, "detail": "Failed to generate the checklist."}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -0,0 +1,32 @@
+import logging
+from typing import Literal
+from fastapi import APIRouter, Query
+
+from app.utils.link_graph import link_graph
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/links",
+    tags=["Link Graph"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/inbound")
+def inbound_links(url: str, limit: int = Query(50, ge=1, le=1000)):
+    """Pages that link to the given page or PDF form."""
+    return {"url": url, "pages": link_graph.inbound(url, limit=limit)}
+
+@router.get("/outbound")
+def outbound_links(url: str, kind: Literal["page", "pdf", "link"] | None = None, limit: int = Query(200, ge=1, le=5000)):
+    """Links found on the given page, optionally only of one kind."""
+    return {"url": url, "links": link_graph.outbound(url, limit=limit, kind=kind)}
+
+@router.get("/related")
+def related_pages(url: str, limit: int = Query(10, ge=1, le=100)):
+    """Pages related to the given page through shared links."""
+    return {"url": url, "pages": link_graph.related(url, limit=limit)}
+
+@router.get("/stats")
+def link_graph_stats():
+    return link_graph.stats()
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.utils.metrics import registry
+
+router = APIRouter(
+    tags=["Metrics"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of stage timings, LLM token counts, cache and error counters."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
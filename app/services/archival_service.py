@@ -0,0 +1,219 @@
+# app/services/archival_service.py
+
+import json
+import zlib
+import logging
+import threading
+from datetime import timedelta
+from typing import List
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.conversation import Conversation, ConversationArchive, Message, utcnow
+from app.models.database import SessionLocal, engine
+from app.utils.metrics import registry, timed
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_CONVERSATIONS = registry.counter(
+    "bureasy_archived_conversations_total",
+    "Conversations whose messages were moved to or restored from the archive.",
+    ["action"],
+)
+
+def archive_finished_conversations(db: Session, older_than_days: float | None = None, batch_size: int | None = None) -> List[int]:
+    """
+    Move the messages of up to batch_size conversations that finished more than
+    older_than_days ago into compressed archive rows, in one transaction.
+    Returns the ids of the conversations archived.
+    """
+    older_than_days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = utcnow() - timedelta(days=older_than_days)
+
+    conversations = db.query(Conversation).filter(
+        Conversation.finished_at.isnot(None),
+        Conversation.finished_at < cutoff,
+        Conversation.archived_at.is_(None),
+    ).order_by(Conversation.finished_at.asc()).limit(batch_size).all()
+    if not conversations:
+        return []
+
+    ids = [conversation.id for conversation in conversations]
+    messages_by_conversation = {conversation_id: [] for conversation_id in ids}
+    for message in db.query(Message).filter(Message.conversation_id.in_(ids)).order_by(Message.id.asc()):
+        messages_by_conversation[message.conversation_id].append({"role": message.role, "content": message.content})
+
+    archived_at = utcnow()
+    for conversation in conversations:
+        messages = messages_by_conversation[conversation.id]
+        final_request = next((m["content"] for m in reversed(messages) if m["role"] == "assistant"), None)
+        db.add(ConversationArchive(
+            conversation_id=conversation.id,
+            message_count=len(messages),
+            final_request=final_request,
+            payload=zlib.compress(json.dumps(messages, ensure_ascii=False).encode("utf-8"), 6),
+        ))
+        conversation.archived_at = archived_at
+
+    db.query(Message).filter(Message.conversation_id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+
+    ARCHIVED_CONVERSATIONS.inc(len(ids), action="archived")
+    return ids
+
+def restore_conversation(db: Session, conversation: Conversation) -> bool:
+    """
+    Move an archived conversation's messages back into the messages table.
+    Returns False if the conversation was not archived.
+    """
+    if conversation.archived_at is None:
+        return False
+
+    archive = db.query(ConversationArchive).filter(ConversationArchive.conversation_id == conversation.id).first()
+    if archive is not None:
+        messages = json.loads(zlib.decompress(archive.payload).decode("utf-8"))
+        # New ids keep the original order; the old ids may have been reused since
+        db.add_all([
+            Message(conversation_id=conversation.id, role=m["role"], content=m["content"]) for m in messages
+        ])
+        db.delete(archive)
+
+    conversation.archived_at = None
+    # Restarts the retention clock, so a conversation in use is not archived again right away
+    conversation.finished_at = utcnow()
+    db.commit()
+
+    ARCHIVED_CONVERSATIONS.inc(action="restored")
+    logger.info(f"Restored conversation {conversation.id} from the archive")
+    return True
+
+def restore_archived_messages(conn, conversation_id: int) -> bool:
+    """
+    restore_conversation for the conversation writer, inside its transaction on conn. The
+    conversation's version is left alone. Returns False if the conversation was not archived.
+    """
+    conversations = Conversation.__table__
+    archives = ConversationArchive.__table__
+    archived_at = conn.execute(select(conversations.c.archived_at).where(conversations.c.id == conversation_id)).scalar()
+    if archived_at is None:
+        return False
+
+    payload = conn.execute(select(archives.c.payload).where(archives.c.conversation_id == conversation_id)).scalar()
+    if payload is not None:
+        messages = json.loads(zlib.decompress(payload).decode("utf-8"))
+        if messages:
+            conn.execute(insert(Message.__table__), [
+                {"conversation_id": conversation_id, "role": m["role"], "content": m["content"]} for m in messages
+            ])
+        conn.execute(delete(archives).where(archives.c.conversation_id == conversation_id))
+    conn.execute(update(conversations).where(conversations.c.id == conversation_id).values(archived_at=None, finished_at=utcnow()))
+
+    ARCHIVED_CONVERSATIONS.inc(action="restored")
+    logger.info(f"Restored conversation {conversation_id} from the archive for a new turn")
+    return True
+
+def ensure_restored(db: Session, conversation: Conversation | None) -> Conversation | None:
+    """Restore on demand: make an archived conversation's messages available again before it is used."""
+    if conversation is not None and conversation.archived_at is not None:
+        restore_conversation(db, conversation)
+    return conversation
+
+def incremental_vacuum_enabled(bind=engine) -> bool:
+    """Whether the SQLite database is in incremental auto-vacuum mode."""
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+
+def enable_incremental_vacuum(bind=engine) -> bool:
+    """
+    Switch SQLite to incremental auto-vacuum so freed pages can be returned in small
+    steps. Changing the mode needs one full VACUUM, which locks the whole database: run
+    it offline (`python -m app.archive_conversations --enable-incremental-vacuum`).
+    """
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            logger.info("Enabling incremental auto-vacuum (one-time VACUUM)")
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+    return True
+
+def incremental_vacuum(pages: int | None = None, bind=engine) -> int:
+    """Return up to `pages` free pages to the OS. Returns the number of free pages left."""
+    if bind.dialect.name != "sqlite":
+        return 0
+    pages = pages or settings.ARCHIVE_VACUUM_PAGES
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # sqlite3's execute() steps the pragma once, freeing a single page; executescript() runs it to completion
+        conn.connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        return conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+class ArchivalWorker:
+    """
+    Background thread that archives finished conversations in batches every
+    ARCHIVE_INTERVAL_S seconds and then vacuums part of the freed space, if the database
+    is already in incremental auto-vacuum mode (the switch is an offline step).
+    """
+    def __init__(self, interval_s: float | None = None):
+        self.interval_s = settings.ARCHIVE_INTERVAL_S if interval_s is None else interval_s
+        self._stop = threading.Event()
+        self._thread = None
+        self._vacuum_enabled = None
+
+    def run_once(self) -> int:
+        if self._vacuum_enabled is None:
+            self._vacuum_enabled = incremental_vacuum_enabled()
+            if not self._vacuum_enabled and engine.dialect.name == "sqlite":
+                logger.warning(
+                    "The database is not in incremental auto-vacuum mode, so archived space is not returned to the OS; "
+                    "run `python -m app.archive_conversations --enable-incremental-vacuum` once while the API is stopped"
+                )
+
+        # Imported here: the conversation store imports this module
+        from app.services.conversation_store import conversation_store
+
+        total = 0
+        with timed("archive"), SessionLocal() as db:
+            while not self._stop.is_set():
+                archived = archive_finished_conversations(db)
+                # Cached copies would skip the restore on the next turn (and their version is stale)
+                for conversation_id in archived:
+                    conversation_store.invalidate(conversation_id)
+                total += len(archived)
+                if len(archived) < settings.ARCHIVE_BATCH_SIZE:
+                    break
+        if self._vacuum_enabled:
+            free_pages = incremental_vacuum()
+            if total:
+                logger.info(f"Archived {total} finished conversations ({free_pages} free pages left)")
+        elif total:
+            logger.info(f"Archived {total} finished conversations")
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception(f"Conversation archival failed: {e}")
+            self._stop.wait(self.interval_s)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="conversation-archival", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+# Singleton worker, started by the API on startup when ARCHIVE_ENABLED is set
+archival_worker = ArchivalWorker()
@@ -1,24 +1,35 @@
 import logging
 from itertools import chain
+from typing import List
 from app.utils.chromadb_client import get_chroma_collection, embed_text
+from app.utils.metrics import timed
+from app.utils.single_flight import normalize_key, retrieval_flight
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-def ask_human_phone(query: str) -> str:
-    """Query ChromaDB for the most relevant phone number based on its context."""
+def ask_human_phone(query: str, query_embedding: List[float] | None = None) -> str:
+    """
+    Query ChromaDB for the most relevant phone number based on its context. Pass
+    query_embedding if the query was already embedded.
+    """
     try:
         # Get the shared ChromaDB collection
         collection = get_chroma_collection()
 
         # Generate the query embedding
-        query_embedding = embed_text(query)
+        if query_embedding is None:
+            query_embedding = embed_text(query)
 
         # Perform semantic search on the collection
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=5  # Number of results to retrieve
-        )
+        with timed("vector_query"):
+            # Identical concurrent queries share one vector search
+            results = retrieval_flight.do(
+                ("ask_human", normalize_key(query)),
+                collection.query,
+                query_embeddings=[query_embedding],
+                n_results=5  # Number of results to retrieve
+            )
 
         # Flatten the metadatas list (handles potential list of lists)
         all_metadatas = list(chain.from_iterable(results.get("metadatas", [])))
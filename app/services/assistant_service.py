@@ -1,33 +1,63 @@
 # app/services/assistant_service.py
 
 import logging
+from typing import Callable, List, Sequence, Tuple
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.models.conversation import Conversation, Message
-from app.prompts.conversation_flows import CONVERSATION_FLOWS
+from app.models.database import SessionLocal
+from app.prompts.prompt_assembly import PromptPacker, token_budget
+from app.services.archival_service import ensure_restored
+from app.services.conversation_store import ConversationState, conversation_store
+from app.services.flow_engine import flow_registry
+from app.services.flow_engine import Flow, Question
+from app.services.slot_filling_service import fill_slots, format_answers
+from app.services.speculation_service import speculator
 from app.prompts.system_prompt_templates import (
     detect_flow_prompt,
     next_question_prompt,
     user_request_generation_prompt,
     classification_instructions_template,
 )
-from app.utils.client_manager import client_manager
-from app.config import settings
+from app.utils.llm_client import complete_chat, stream_chat_completion
+from app.utils.llm_gateway import Priority, estimate_prompt_tokens
 
 logger = logging.getLogger(__name__)
 
+# Stands in for the answer to the last question while the final request is speculated
+ANSWER_PLACEHOLDER = "[[ANSWER]]"
+
 def process_incoming_message(db: Session, user_input: str, conversation_id: int | None):
     """
     1) If conversation_id is None or invalid => detect flow from user_input via LLM.
     2) If recognized => create/resume conversation.
     3) Store user msg => ask next question or produce final summary.
+
+    Active conversations are served from the conversation store's cache, so a turn
+    normally reads nothing from the database and is persisted with a single write.
+    One message can answer several questions: the flow's state machine moves on to
+    the first question on its path that is still unanswered.
+    With speculation enabled, the reply may have been generated while the user was
+    typing (see _speculate_next_step); it is only used if this answer leads to it.
     """
-    conversation = None
+    state = None
     if conversation_id:
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        # Archived conversations are restored on demand when loaded
+        state = conversation_store.get(db, conversation_id)
 
-    if not conversation:
+    state, reply, finished = run_turn(db, state, user_input)
+    return (state.id if state else None), reply, finished
+
+def run_turn(db: Session, state: ConversationState | None, user_input: str,
+             on_token: Callable[[str], None] | None = None) -> Tuple[ConversationState | None, str, bool]:
+    """
+    One turn of a conversation whose state is already at hand (None => new conversation).
+    If on_token is given, the reply is passed to it as it is generated.
+    Returns the (possibly new) state, the reply and whether the flow is finished.
+    """
+    if not state:
         detected_flow = detect_flow_from_text(user_input)
         if not detected_flow:
             # If LLM can't match a known flow
@@ -35,66 +65,213 @@ def process_incoming_message(db: Session, user_input: str, conversation_id: int
                 "Thanks for your request. Unfortunately, we do not yet support this process. "
                 "We may add it in a future release."
             )
+            _emit(on_token, response_text)
             return None, response_text, True
-        else:
-            # Create new conversation
-            conversation = Conversation(flow_type=detected_flow, state_index=0)
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-
-    flow_type = conversation.flow_type
-    flow = CONVERSATION_FLOWS.get(flow_type)
+        flow_type, current_index, history = detected_flow, 0, []
+    else:
+        flow_type, current_index, history = state.flow_type, state.state_index, list(state.recent)
+
+    flow = flow_registry.get(flow_type)
     if not flow:
         raise HTTPException(status_code=400, detail="Flow type not recognized.")
 
-    # Store the user's message
-    user_msg = Message(conversation_id=conversation.id, role="user", content=user_input)
-    db.add(user_msg)
-    db.commit()
+    user_msg = ("user", user_input)
+    answers = dict(state.answers) if state else {}
+    # The opening message only fills what it states; later ones also answer the question just asked
+    current = _current_question(flow, state)
+    filled, error = fill_slots(flow, user_input, answers, current)
+    answers.update(filled)
+    question = flow.next_question(answers)
+    finished = question is None
+
+    speculated = None
+    if state is not None:
+        # Valid if the answer led to the predicted question, or (final request) answered just the last one
+        if not finished:
+            key = (flow.name, question.id) if not (error and not filled) else None
+            speculated = speculator.take(state.id, "next_question", key)
+        else:
+            key = (flow.name, current.id) if current is not None and set(filled) == {current.id} else None
+            speculated = speculator.take(state.id, "user_request", key)
+            if speculated is not None:
+                speculated = speculated.replace(ANSWER_PLACEHOLDER, filled[current.id])
+
+    if not finished:
+        if error and not filled:
+            # Invalid answer to the question just asked => ask it again, no rewording needed
+            reply = _emit(on_token, f"{error} {question.text}")
+        elif speculated:
+            reply = _emit(on_token, speculated)
+        else:
+            # We still have questions => reword next question
+            reply = ai_generate_question(question.text, history + [user_msg], on_token=on_token)
+        next_index, next_question_id = question.index, question.id
+    else:
+        # All questions answered => generate user request
+        if speculated:
+            reply = _emit(on_token, speculated)
+        else:
+            all_msgs = _conversation_messages(db, state.id) if state else []
+            reply = _compose_user_request(all_msgs + [user_msg], format_answers(flow, answers), on_token=on_token)
+        next_index, next_question_id = current_index, current.id if current is not None else None
+
+    # The user's message, the reply and the new state are written together. A new
+    # conversation is only inserted now, so nothing is locked while the LLM runs.
+    turn_messages = [user_msg, ("assistant", reply)]
+    if state is None:
+        state = conversation_store.create(
+            db, flow_type, next_index, turn_messages, finished=finished, answers=answers, current_question=next_question_id,
+        )
+    else:
+        conversation_store.save_turn(
+            db, state, turn_messages, state_index=next_index, finished=finished, answers=answers, current_question=next_question_id,
+        )
 
-    current_index = conversation.state_index
-    next_index = current_index + 1
+    if not finished and speculator.enabled:
+        _speculate_next_step(state.id, flow, answers, question, history + turn_messages)
 
-    if next_index < len(flow):
-        # We still have questions => reword next question
-        raw_question = flow[next_index]
-        next_q = ai_generate_question(conversation, raw_question, db)
+    return state, reply, finished
 
-        assistant_msg = Message(
-            conversation_id=conversation.id, 
-            role="assistant", 
-            content=next_q
+class ChatSession:
+    """
+    Conversation state resident in a long-lived connection (the assistant WebSocket).
+    Turns use the state held here instead of looking it up per message; writes go
+    through the conversation store, so they are persisted in the background.
+    """
+    def __init__(self):
+        self.db = SessionLocal()
+        self.state: ConversationState | None = None
+
+    def resume(self, conversation_id: int) -> ConversationState | None:
+        """Attach to an existing conversation (e.g. after a reconnect); None if it does not exist."""
+        try:
+            self.state = conversation_store.get(self.db, conversation_id)
+        finally:
+            self.db.close()
+        return self.state
+
+    def last_reply(self) -> str | None:
+        if self.state is None:
+            return None
+        return next((content for role, content in reversed(self.state.recent) if role == "assistant"), None)
+
+    def send(self, user_input: str, on_token: Callable[[str], None] | None = None) -> Tuple[str, bool]:
+        try:
+            if self.state is not None and not conversation_store.is_current(self.state):
+                # Evicted from the cache, or changed by another writer: reload it
+                self.state = conversation_store.get(self.db, self.state.id)
+            state, reply, finished = run_turn(self.db, self.state, user_input, on_token=on_token)
+        finally:
+            # Hand the connection back to the pool between turns
+            self.db.close()
+        if state is not None:
+            self.state = state
+        return reply, finished
+
+    def close(self):
+        self.db.close()
+
+def _emit(on_token: Callable[[str], None] | None, text: str) -> str:
+    """Pass a reply that was not generated token by token to a streaming caller in one piece."""
+    if on_token is not None:
+        on_token(text)
+    return text
+
+def _llm_reply(system_prompt: str, max_tokens: int, temperature: float, call_type: str,
+               priority: Priority, on_token: Callable[[str], None] | None) -> str:
+    messages = [{"role": "system", "content": system_prompt}]
+    if on_token is None:
+        return complete_chat(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            call_type=call_type,
+            priority=priority,
         )
-        db.add(assistant_msg)
+    tokens = []
+    for token in stream_chat_completion(messages, max_tokens, temperature, call_type, priority=priority):
+        tokens.append(token)
+        on_token(token)
+    return "".join(tokens).strip()
+
+def _speculate_next_step(conversation_id: int, flow: Flow, answers: dict, question: Question,
+                         recent_msgs: List[Tuple[str, str]]):
+    """
+    Start generating the step that follows `question` while the user answers it,
+    assuming the answer takes the flow's default path. The next question is reworded
+    without the answer; the final request is written with a placeholder for it.
+    """
+    predicted = dict(answers)
+    predicted[question.id] = ANSWER_PLACEHOLDER
+    next_question = flow.next_question(predicted)
+
+    if next_question is not None:
+        estimated = estimate_prompt_tokens([{"content": c} for _, c in recent_msgs]) + 120 + 200
+        speculator.schedule(
+            conversation_id, "next_question", (flow.name, next_question.id), estimated,
+            lambda: ai_generate_question(
+                next_question.text, recent_msgs,
+                priority=Priority.BACKGROUND, call_type="next_question_speculative",
+            ),
+        )
+        return
+
+    def compose() -> str:
+        with SessionLocal() as db:
+            all_msgs = _conversation_messages(db, conversation_id)
+        request = _compose_user_request(
+            all_msgs + [("user", ANSWER_PLACEHOLDER)], format_answers(flow, predicted),
+            placeholder=ANSWER_PLACEHOLDER, priority=Priority.BACKGROUND, call_type="user_request_speculative",
+        )
+        if ANSWER_PLACEHOLDER not in request:
+            # The answer could not be slotted in later
+            raise ValueError("speculative request does not contain the answer placeholder")
+        return request
 
-        conversation.state_index = next_index
-        db.commit()
+    speculator.schedule(
+        conversation_id, "user_request", (flow.name, question.id), token_budget("user_request") + 400, compose,
+    )
+
+def _current_question(flow: Flow, state: ConversationState | None) -> Question | None:
+    """The question last asked, looked up by id so flow edits (hot reloads) don't shift it."""
+    if state is None:
+        return None
+    if state.current_question is not None:
+        return flow.by_id.get(state.current_question)
+    # Conversations saved before the question id was stored
+    return flow.questions[state.state_index] if state.state_index < len(flow) else None
+
+def _conversation_messages(db: Session, conversation_id: int) -> List[Tuple[str, str]]:
+    """All (role, content) messages of a conversation in chronological order."""
+    # Turns still queued for write-behind must be in the database first
+    conversation_store.flush(conversation_id)
+    return [
+        (m.role, m.content)
+        for m in db.query(Message.role, Message.content).filter(
+            Message.conversation_id == conversation_id
+        ).order_by(Message.id.asc())
+    ]
 
-        return conversation.id, next_q, False
-    else:
-        # All questions answered => generate user request
-        user_request = generate_user_request(db, conversation.id)
-        
-        assistant_msg = Message(
-            conversation_id=conversation.id, 
-            role="assistant", 
-            content=user_request
-        )
-        
-        db.add(assistant_msg)
-        db.commit()
-        
-        return conversation.id, user_request, True
-    
 def detect_flow_from_text(user_input: str) -> str | None:
     """
     LLM-based flow detection using classification_instructions_template.
-    Dynamically list known flows from CONVERSATION_FLOWS. If not matched => None.
+    The flows whose keywords match the message best are offered to the LLM; with many
+    flows, a message matching no keywords is not sent to the LLM at all. If not matched => None.
     """
-    known_flows = list(CONVERSATION_FLOWS.keys())  # e.g. ["visa_extension", ...]
-
-    flow_list_text = "\n".join(f"- {f}" for f in known_flows)
+    max_candidates = settings.FLOW_DETECTION_MAX_CANDIDATES
+    known_flows = flow_registry.candidates(user_input, max_candidates)  # e.g. ["visa_extension", ...]
+    keyword_match = bool(known_flows)
+    if not known_flows:
+        all_flows = flow_registry.names()
+        if len(all_flows) > max_candidates:
+            logger.info("[Flow Detection] No flow keywords in the message")
+            return None
+        known_flows = all_flows
+
+    flow_list_text = "\n".join(
+        f"- {name}: {flow.description}" if (flow := flow_registry.get(name)) and flow.description else f"- {name}"
+        for name in known_flows
+    )
 
     classification_text = classification_instructions_template.format(
         detect_flow_prompt=detect_flow_prompt,
@@ -103,24 +280,13 @@ def detect_flow_from_text(user_input: str) -> str | None:
     )
 
     try:
-        client_manager.setup_clients()
-        groq_client = client_manager.get_groq_client()
-
-        response_stream = groq_client.chat.completions.create(
-            model=settings.MODEL_NAME_CONVERSATIONAL_GROQ,
+        llm_response = complete_chat(
             messages=[{"role": "system", "content": classification_text}],
-            stream=True,
             max_tokens=30,
             temperature=0.0,
+            call_type="flow_detection",
         )
 
-        llm_response = ""
-        for chunk in response_stream:
-            if hasattr(chunk.choices[0].delta, "content"):
-                token = chunk.choices[0].delta.content
-                if token:
-                    llm_response += token
-
         llm_response = llm_response.strip().lower()
         logger.info(f"[Flow Detection] LLM responded: {llm_response}")
 
@@ -132,58 +298,42 @@ def detect_flow_from_text(user_input: str) -> str | None:
 
     except Exception as e:
         logger.error(f"Error detecting flow: {e}")
-        # fallback if LLM fails
-        fallback_input = user_input.lower()
-        if "visa" in fallback_input or "extend" in fallback_input:
-            return "visa_extension"
-        return None
+        # fallback if LLM fails: best keyword match
+        return known_flows[0] if keyword_match else None
 
-def ai_generate_question(conversation: Conversation, new_question: str, db: Session) -> str:
+def ai_generate_question(new_question: str, recent_msgs: Sequence[Tuple[str, str]],
+                         priority: Priority = Priority.INTERACTIVE, call_type: str = "next_question",
+                         on_token: Callable[[str], None] | None = None) -> str:
     """
-    Reword new_question in a friendlier style, using recent conversation context.
+    Reword new_question in a friendlier style, using the recent (role, content) messages as context.
     """
-    recent_msgs = db.query(Message).filter(
-        Message.conversation_id == conversation.id
-    ).order_by(Message.id.desc()).limit(5).all()
-
-    user_context = "\n".join(
-        f"{m.role.capitalize()}: {m.content}" for m in reversed(recent_msgs)
-    )
+    recent_msgs = list(recent_msgs)[-settings.CONVERSATION_RECENT_WINDOW:]
 
-    system_prompt = (
-        f"{detect_flow_prompt}\n\n"
-        f"{next_question_prompt}\n\n"
-        "Conversation so far:\n"
-        f"{user_context}\n\n"
-        "Raw next question:\n"
-        f"{new_question}\n"
-        "Please reply ONLY with the reworded question, nothing else."
-    )
-
-    try:
-        client_manager.setup_clients()
-        groq_client = client_manager.get_groq_client()
-
-        response_stream = groq_client.chat.completions.create(
-            model=settings.MODEL_NAME_CONVERSATIONAL_GROQ,
-            messages=[{"role": "system", "content": system_prompt}],
-            stream=True,
-            max_tokens=120,
-            temperature=0.3,
+    def build_prompt(user_context: str) -> str:
+        return (
+            f"{detect_flow_prompt}\n\n"
+            f"{next_question_prompt}\n\n"
+            "Conversation so far:\n"
+            f"{user_context}\n\n"
+            "Raw next question:\n"
+            f"{new_question}\n"
+            "Please reply ONLY with the reworded question, nothing else."
         )
 
-        final_question = ""
-        for chunk in response_stream:
-            if hasattr(chunk.choices[0].delta, "content"):
-                token = chunk.choices[0].delta.content
-                if token:
-                    final_question += token
+    # Newest messages are kept first if the history does not fit
+    packer = PromptPacker("next_question", build_prompt(""))
+    history = [f"{role.capitalize()}: {content}" for role, content in recent_msgs]
+    user_context = "\n".join(packer.pack(history, priorities=range(len(history), 0, -1), separator="\n"))
+
+    system_prompt = build_prompt(user_context)
+    packer.log_usage([{"role": "system", "content": system_prompt}])
 
-        return final_question.strip()
+    try:
+        return _llm_reply(system_prompt, 120, 0.3, call_type, priority, on_token)
 
     except Exception as e:
         logger.error(f"Error generating next question: {e}")
-        return new_question
+        return _emit(on_token, new_question)
 
 def generate_user_request(db: Session, conversation_id: int) -> str:
     """
@@ -193,50 +343,63 @@ def generate_user_request(db: Session, conversation_id: int) -> str:
     conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found.")
+    ensure_restored(db, conversation)
 
     # Fetch entire conversation so LLM sees Q&A
-    all_msgs = db.query(Message).filter(
-        Message.conversation_id == conversation.id
-    ).order_by(Message.id.asc()).all()
+    all_msgs = _conversation_messages(db, conversation.id)
 
     if not all_msgs:
         return "No messages to generate a request."
 
-    conv_context = "\n".join(f"{m.role.capitalize()}: {m.content}" for m in all_msgs)
+    flow = flow_registry.get(conversation.flow_type)
+    details = format_answers(flow, conversation.answers or {}) if flow else ""
+    return _compose_user_request(all_msgs, details)
 
-    system_prompt = (
-        f"{user_request_generation_prompt}\n\n"
-        "Below is the conversation so far, including both questions and user responses:\n"
-        f"{conv_context}\n\n"
-        "Please generate a concise, polite user request to the relevant authority using first-person language. "
-        "If some details are missing, politely mention them. End with a polite question like 'What do I need to do next?'."
-    )
+def _compose_user_request(all_msgs: List[Tuple[str, str]], details: str = "", placeholder: str | None = None,
+                          priority: Priority = Priority.INTERACTIVE, call_type: str = "user_request",
+                          on_token: Callable[[str], None] | None = None) -> str:
+    """
+    Ask the LLM for the user request, given the conversation's (role, content) messages in order
+    and the answers collected so far as "question answer" lines. A placeholder marks an
+    answer that is not known yet and must be copied into the request verbatim.
+    """
+    details_block = f"Details collected so far:\n{details}\n\n" if details else ""
+    if placeholder:
+        details_block += (
+            f"{placeholder} stands for the user's answer to the last question, which is filled in later. "
+            f"Write {placeholder} exactly as it is where that answer belongs in the request.\n\n"
+        )
 
-    try:
-        client_manager.setup_clients()
-        groq_client = client_manager.get_groq_client()
-
-        response_stream = groq_client.chat.completions.create(
-            model=settings.MODEL_NAME_CONVERSATIONAL_GROQ,
-            messages=[{"role": "system", "content": system_prompt}],
-            stream=True,
-            max_tokens=400,
-            temperature=0.4,
+    def build_prompt(conv_context: str) -> str:
+        return (
+            f"{user_request_generation_prompt}\n\n"
+            f"{details_block}"
+            "Below is the conversation so far, including both questions and user responses:\n"
+            f"{conv_context}\n\n"
+            "Please generate a concise, polite user request to the relevant authority using first-person language. "
+            "If some details are missing, politely mention them. End with a polite question like 'What do I need to do next?'."
         )
 
-        request_text = ""
-        for chunk in response_stream:
-            if hasattr(chunk.choices[0].delta, "content"):
-                token = chunk.choices[0].delta.content
-                if token:
-                    request_text += token
+    # If the conversation does not fit the budget, the user's answers are kept before
+    # the assistant's questions, newest first; the rest stays in chronological order.
+    packer = PromptPacker("user_request", build_prompt(""))
+    history = [f"{role.capitalize()}: {content}" for role, content in all_msgs]
+    priorities = [(0 if role == "user" else 1, -idx) for idx, (role, _) in enumerate(all_msgs)]
+    kept = packer.pack(history, priorities=priorities, separator="\n")
+    if packer.dropped:
+        kept.insert(0, "(Some earlier messages were omitted.)")
+    conv_context = "\n".join(kept)
+
+    system_prompt = build_prompt(conv_context)
+    packer.log_usage([{"role": "system", "content": system_prompt}])
 
-        return request_text.strip()
+    try:
+        return _llm_reply(system_prompt, 400, 0.4, call_type, priority, on_token)
 
     except Exception as e:
         logger.error(f"Error generating user request: {e}")
-        fallback = "\n".join([f"- {m.role.capitalize()}: {m.content}" for m in all_msgs])
-        return (
+        fallback = "\n".join([f"- {role.capitalize()}: {content}" for role, content in all_msgs])
+        return _emit(on_token, (
             "LLM request generation failed. Fallback request based on partial conversation:\n"
             + fallback
-        )
+        ))
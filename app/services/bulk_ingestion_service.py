@@ -0,0 +1,364 @@
+import os
+import re
+import glob
+import json
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from tqdm import tqdm
+
+from app.config import settings
+from app.services.doc_ingestion_service import build_records, write_records
+from app.services.pdf_ingestion_service import collect_pdf_links, ingest_pdfs
+from app.utils.chromadb_client import get_chroma_collection, embed_texts_array
+from app.utils.crawl_archive import CrawlArchiveReader, CrawlArchiveWriter, is_crawl_archive
+from app.utils.knowledge_base import mark_knowledge_base_changed
+from app.utils.link_graph import link_graph
+from app.utils.near_duplicates import BoilerplateModel, MinHashLSH, SimHashIndex, minhash, simhash, site_of
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE_NAME = ".bulk_load_checkpoint.json"
+
+# Boilerplate model of the current load, installed in each parse worker by _init_worker
+_boilerplate = None
+
+def discover_crawl_files(crawl_dir: str) -> List[Tuple[str, str]]:
+    """
+    List (path, url) for every page file in a crawl directory. Each level_* directory's
+    mapping.json (file name -> URL) is used when present; otherwise the URL is read
+    from the record itself.
+    """
+    files = []
+    for level_dir in sorted(glob.glob(os.path.join(crawl_dir, "level_*"))):
+        mapping = {}
+        mapping_path = os.path.join(level_dir, "mapping.json")
+        if os.path.exists(mapping_path):
+            with open(mapping_path, "r", encoding="utf-8") as f:
+                mapping = json.load(f)
+
+        for path in sorted(glob.glob(os.path.join(level_dir, "*.json"))):
+            file_name = os.path.basename(path)
+            if file_name == "mapping.json":
+                continue
+            files.append((path, mapping.get(file_name, "")))
+    return files
+
+def crawl_keys(source: str) -> List[str]:
+    """
+    Checkpoint keys of every page in a crawl directory (file paths relative to it) or a
+    crawl archive (URLs). Archive keys come from its index, without decompressing pages.
+    """
+    if is_crawl_archive(source):
+        return CrawlArchiveReader(source).urls()
+    return [os.path.relpath(path, source) for path, _ in discover_crawl_files(source)]
+
+def iter_crawl_items(source: str, skip: set = frozenset()) -> Iterator[Tuple[str, object]]:
+    """
+    Stream (key, item) for every page of a crawl directory or archive whose key is not in
+    skip. Items are what the parse workers take: (path, url) for page files, and
+    (url, record) for archive records, which are read here block by block.
+    """
+    if is_crawl_archive(source):
+        for record in CrawlArchiveReader(source).latest():
+            if record.get("url", "") not in skip:
+                yield record.get("url", ""), (record.get("url", ""), record)
+        return
+    for path, url in discover_crawl_files(source):
+        key = os.path.relpath(path, source)
+        if key not in skip:
+            yield key, (path, url)
+
+def convert_crawl_directory(crawl_dir: str, archive_path: str) -> int:
+    """Write every page of a crawl directory into a crawl archive, with its level as "depth"."""
+    pages = 0
+    with CrawlArchiveWriter(archive_path) as writer:
+        for path, url in discover_crawl_files(crawl_dir):
+            try:
+                record = _read_page(path, url)
+            except Exception as e:
+                logger.error(f"Skipping {path}: {e}")
+                continue
+            level = re.search(r"level_(\d+)", os.path.basename(os.path.dirname(path)))
+            record.setdefault("depth", int(level.group(1)) if level else 0)
+            writer.write(record)
+            pages += 1
+    return pages
+
+def load_checkpoint(checkpoint_path: str) -> set:
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return set(json.load(f).get("completed", []))
+
+def save_checkpoint(checkpoint_path: str, completed: set):
+    """Write the checkpoint atomically so an interruption never leaves it half-written."""
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"completed": sorted(completed)}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def _read_page(path: str, url: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        json_data = json.load(f)
+    if url and not json_data.get("url"):
+        json_data["url"] = url
+    return json_data
+
+def _load_item(item: Tuple[str, object]) -> dict:
+    """The page record of an item from iter_crawl_items."""
+    key, source = item
+    if isinstance(source, dict):
+        return source
+    return _read_page(key, source)
+
+def _bounded_map(pool, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """Like pool.map, in order, but with at most `window` items submitted at a time."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _init_worker(boilerplate_state):
+    global _boilerplate
+    _boilerplate = BoilerplateModel.from_state(boilerplate_state) if boilerplate_state is not None else None
+
+def page_shingles(item: Tuple[str, object]):
+    """Boilerplate shingles of one page. Runs in a worker process; returns (site, shingles)."""
+    try:
+        json_data = _load_item(item)
+    except Exception:
+        return "", None
+    return site_of(json_data.get("url", "")), BoilerplateModel(0.0, 0).page_shingles(json_data.get("text", ""))
+
+def parse_crawl_file(item: Tuple[str, object]) -> Tuple[str, List[Tuple[str, str, str, dict]], str, dict | None]:
+    """
+    Parse and chunk one page (file or archive record). Runs in a worker process; returns
+    (path or URL, records, error, fingerprints). With a boilerplate model installed,
+    boilerplate is stripped from the page text first and the page and its chunks are
+    fingerprinted.
+    """
+    path = item[0]
+    try:
+        json_data = _load_item(item)
+        if _boilerplate is None:
+            return path, build_records(json_data), "", None
+
+        text = json_data.get("text", "")
+        json_data["text"] = _boilerplate.strip(site_of(json_data.get("url", "")), text)
+        records = build_records(json_data)
+        fingerprints = {
+            "text_chars": len(text),
+            "kept_chars": len(json_data["text"]),
+            "page": minhash(json_data["text"]),
+            "chunks": [simhash(record[1]) if record[3]["type"] == "content" else None for record in records],
+        }
+        return path, records, "", fingerprints
+    except Exception as e:
+        return path, [], str(e), None
+
+class Deduplicator:
+    """
+    Drops near-duplicate pages (MinHash over word shingles), near-duplicate content chunks
+    (SimHash) and repeated phone number entries, counting what was left out. State covers
+    one load, so duplicates of pages loaded by an earlier (resumed) run are not detected.
+    """
+    def __init__(self, page_similarity: float, chunk_max_distance: int):
+        self.pages = MinHashLSH(page_similarity)
+        self.chunks = SimHashIndex(chunk_max_distance)
+        self.phone_numbers = set()
+        self.stats = {
+            "text_chars": 0, "boilerplate_chars": 0, "duplicate_pages": 0,
+            "duplicate_chunks": 0, "duplicate_phone_numbers": 0, "dropped_records": 0,
+        }
+
+    def filter(self, path: str, records: List[Tuple[str, str, str, dict]], fingerprints: dict) -> List[Tuple[str, str, str, dict]]:
+        self.stats["text_chars"] += fingerprints["text_chars"]
+        self.stats["boilerplate_chars"] += fingerprints["text_chars"] - fingerprints["kept_chars"]
+
+        signature = fingerprints["page"]
+        if signature is not None:
+            match = self.pages.query(signature)
+            if match:
+                logger.debug(f"{path} is a near-duplicate of {match[0]} (similarity {match[1]:.2f})")
+                self.stats["duplicate_pages"] += 1
+                self.stats["dropped_records"] += len(records)
+                return []
+            self.pages.add(path, signature)
+
+        kept = []
+        for record, fingerprint in zip(records, fingerprints["chunks"]):
+            metadata = record[3]
+            if fingerprint is not None:
+                if self.chunks.contains(fingerprint):
+                    self.stats["duplicate_chunks"] += 1
+                    continue
+                self.chunks.add(fingerprint)
+            elif metadata["type"] == "phone_number":
+                key = record[1].strip().lower()
+                if key in self.phone_numbers:
+                    self.stats["duplicate_phone_numbers"] += 1
+                    continue
+                self.phone_numbers.add(key)
+            kept.append(record)
+        self.stats["dropped_records"] += len(records) - len(kept)
+        return kept
+
+def _iter_crawl_pages(source: str):
+    for key, item in iter_crawl_items(source):
+        try:
+            yield _load_item(item)
+        except Exception as e:
+            logger.error(f"Skipping {key}: {e}")
+
+def record_crawl_links(crawl_dir: str) -> int:
+    """Record every page's links in the link graph (replacing earlier ones) and compact it."""
+    pages = 0
+    for json_data in _iter_crawl_pages(crawl_dir):
+        if json_data.get("url"):
+            link_graph.add_page(json_data["url"], json_data.get("all_links", []), json_data.get("pdf_links", []))
+            pages += 1
+    link_graph.compact()
+    return pages
+
+def bulk_load_pdfs(crawl_dir: str, collection_name: str = "knowledge_base", batch_size: int = 256,
+                   refresh: bool = False) -> Dict[str, int]:
+    """
+    Index the PDFs linked from every page of a crawl. Downloads and extracted text are
+    cached, and PDFs already indexed with the same content and linking pages are
+    skipped, so this is cheap to re-run after an interrupted or incremental load.
+    With refresh, every PDF is downloaded again to pick up changed files.
+    """
+    pdf_parents = collect_pdf_links(_iter_crawl_pages(crawl_dir))
+    logger.info(f"Found {len(pdf_parents)} linked PDFs in {crawl_dir}.")
+    if not pdf_parents:
+        return {"pdfs": 0, "documents": 0, "records": 0, "unchanged": 0, "failed": 0, "removed": 0}
+    return ingest_pdfs(pdf_parents, collection_name=collection_name, batch_size=batch_size, refresh=refresh)
+
+def _iter_batches(parsed: Iterable, batch_size: int, deduplicator: Deduplicator | None = None):
+    """Group parsed files into batches of at least batch_size records, never splitting a file."""
+    batch_records, batch_paths = [], []
+    for path, records, error, fingerprints in parsed:
+        if error:
+            logger.error(f"Skipping {path}: {error}")
+            continue
+        if deduplicator is not None and fingerprints is not None:
+            records = deduplicator.filter(path, records, fingerprints)
+        batch_records.extend(records)
+        batch_paths.append(path)
+        if len(batch_records) >= batch_size:
+            yield batch_paths, batch_records
+            batch_records, batch_paths = [], []
+    if batch_paths:
+        yield batch_paths, batch_records
+
+def bulk_load_crawl(
+    crawl_dir: str,
+    collection_name: str = "knowledge_base",
+    batch_size: int = 256,
+    workers: int = 4,
+    checkpoint_path: str | None = None,
+    resume: bool = True,
+    show_progress: bool = True,
+    dedup: bool | None = None,
+) -> Dict[str, int]:
+    """
+    Load a crawl directory or crawl archive into the link graph and the vector store, the
+    latter through a parse -> strip boilerplate -> chunk -> deduplicate -> batched-embed ->
+    bulk-write pipeline. Pages are streamed to worker processes for parsing, embedding
+    runs in this process, and writes on a background thread so the next batch is
+    embedded while the previous one is written. Completed pages are checkpointed after
+    every write so an interrupted load can resume.
+
+    With dedup (DEDUP_ENABLED by default), a first pass over every page of the crawl
+    finds the text each site repeats on most of its pages, which is stripped before
+    chunking; near-duplicate pages and chunks are then left out.
+    """
+    dedup = settings.DEDUP_ENABLED if dedup is None else dedup
+    archive = is_crawl_archive(crawl_dir)
+    checkpoint_path = checkpoint_path or (
+        f"{crawl_dir}{CHECKPOINT_FILE_NAME}" if archive else os.path.join(crawl_dir, CHECKPOINT_FILE_NAME)
+    )
+    completed = load_checkpoint(checkpoint_path) if resume else set()
+    # Pages are checkpointed by URL in archives and by relative path in directories
+    checkpoint_key = (lambda key: key) if archive else (lambda key: os.path.relpath(key, crawl_dir))
+    window = workers * 16
+
+    # Links go to the link graph rather than the vector store; recording them is cheap and idempotent
+    linked_pages = record_crawl_links(crawl_dir)
+    logger.info(f"Recorded the links of {linked_pages} pages in the link graph.")
+
+    pending = sum(1 for key in crawl_keys(crawl_dir) if key not in completed)
+    stats = {"files": 0, "records": 0, "skipped_files": len(completed)}
+    if not pending:
+        logger.info(f"Nothing to load from {crawl_dir} ({len(completed)} pages already loaded).")
+        return stats
+
+    boilerplate_state, deduplicator = None, None
+    if dedup:
+        # Boilerplate is learned from the whole crawl, so resumed loads strip the same text
+        model = BoilerplateModel(settings.DEDUP_BOILERPLATE_MIN_PAGE_RATIO, settings.DEDUP_BOILERPLATE_MIN_PAGES)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            all_items = (item for _, item in iter_crawl_items(crawl_dir))
+            for site, shingles in _bounded_map(pool, page_shingles, all_items, window):
+                if shingles is not None:
+                    model.add(site, shingles)
+        boilerplate_state = model.fit().state()
+        deduplicator = Deduplicator(settings.DEDUP_PAGE_SIMILARITY, settings.DEDUP_CHUNK_MAX_DISTANCE)
+
+    collection = get_chroma_collection(collection_name)
+    # The compact store logs every record before write_records returns, so a checkpointed
+    # batch survives a crash; its codes are saved periodically and once at the end.
+    persist = getattr(collection, "persist", None)
+
+    def write_batch(paths, records, embeddings):
+        write_records(collection, records, embeddings=embeddings)
+        completed.update(checkpoint_key(p) for p in paths)
+        save_checkpoint(checkpoint_path, completed)
+
+    progress = tqdm(total=pending, unit="page", disable=not show_progress)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(boilerplate_state,)) as parse_pool, \
+                ThreadPoolExecutor(max_workers=1) as write_pool:
+            items = (item for _, item in iter_crawl_items(crawl_dir, skip=frozenset(completed)))
+            parsed = _bounded_map(parse_pool, parse_crawl_file, items, window)
+            pending_write = None
+
+            for paths, records in _iter_batches(parsed, batch_size, deduplicator):
+                embeddings = embed_texts_array([record[2] for record in records]) if records else None
+
+                # Keep at most one write in flight: wait for the previous batch before queueing this one
+                if pending_write is not None:
+                    pending_write.result()
+                pending_write = write_pool.submit(write_batch, paths, records, embeddings)
+
+                stats["files"] += len(paths)
+                stats["records"] += len(records)
+                progress.update(len(paths))
+                progress.set_postfix(records=stats["records"])
+
+            if pending_write is not None:
+                pending_write.result()
+    finally:
+        progress.close()
+        if persist:
+            persist()
+        # Once per load rather than per batch, so precomputed answers are refreshed once
+        if stats["records"]:
+            mark_knowledge_base_changed()
+
+    if deduplicator is not None:
+        stats.update(deduplicator.stats)
+        share = stats["boilerplate_chars"] / stats["text_chars"] if stats["text_chars"] else 0.0
+        logger.info(
+            f"Deduplication: stripped {share:.1%} of page text as boilerplate, left out "
+            f"{stats['duplicate_pages']} near-duplicate pages, {stats['duplicate_chunks']} near-duplicate chunks "
+            f"and {stats['duplicate_phone_numbers']} repeated phone numbers ({stats['dropped_records']} records)."
+        )
+    logger.info(f"Loaded {stats['records']} records from {stats['files']} files in {crawl_dir}.")
+    return stats
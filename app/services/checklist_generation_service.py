@@ -5,18 +5,27 @@ from fastapi import HTTPException
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 import logging
+from contextlib import closing
 from itertools import chain
-from app.utils.chromadb_client import get_chroma_collection, embed_text
-from app.utils.client_manager import client_manager
+from typing import Iterator, List
+from pydantic import BaseModel, Field, ValidationError
 from app.config import settings
+from app.utils.chromadb_client import get_chroma_collection, embed_text
+from app.utils.llm_client import stream_chat_completion
+from app.utils.llm_gateway import LLMDeadlineExceeded, Priority
+from app.utils.metrics import LLM_CALLS, timed
+from app.utils.streaming_json import MalformedJSONError, StreamingJSONObjectParser
+from app.utils.single_flight import hash_key, llm_flight, normalize_key, retrieval_flight
 from app.prompts.system_prompt_templates import checklist_generation_template
+from app.prompts.prompt_assembly import PromptPacker, dedupe_passages
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-def generate_checklist(query: str) -> dict:
+def generate_checklist(query: str, query_embedding: List[float] | None = None) -> dict:
     """
-    Query ChromaDB and generate a checklist based on user input.
+    Query ChromaDB and generate a checklist based on user input. Pass query_embedding
+    if the query was already embedded.
     """
     try:
         if not query.strip():
@@ -26,20 +35,26 @@ def generate_checklist(query: str) -> dict:
         collection = get_chroma_collection()
 
         # Generate the query embedding
-        query_embedding = embed_text(query)
+        if query_embedding is None:
+            query_embedding = embed_text(query)
 
         # Perform semantic search on the collection
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=10  # Retrieve more results for a broader checklist
-        )
+        with timed("vector_query"):
+            # Identical concurrent queries share one vector search
+            results = retrieval_flight.do(
+                ("checklist", normalize_key(query)),
+                collection.query,
+                query_embeddings=[query_embedding],
+                n_results=10  # Retrieve more results for a broader checklist
+            )
 
         # Ensure results contain metadata
         if not results.get("metadatas"):
             raise ValueError("No results found for the given query. Please refine your input.")
 
-        # Flatten the metadata list
+        # Flatten the metadata and document lists
         all_metadatas = list(chain.from_iterable(results.get("metadatas", [])))
+        all_documents = list(chain.from_iterable(results.get("documents") or [])) or [""] * len(all_metadatas)
 
         # Prepare the checklist
         checklist = {
@@ -47,13 +62,21 @@ def generate_checklist(query: str) -> dict:
             "steps": []
         }
 
-        # Extract steps, PDFs, and sources
-        for metadata in all_metadatas:
-            step = metadata.get("summary", "").strip() or metadata.get("text", "").strip()
-            pdf_links = metadata.get("pdf_links", [])
+        # Extract steps, PDFs, and sources. Chunks of the same page share a summary,
+        # so each (step, source) pair is only added once.
+        seen_steps = set()
+        for metadata, document in zip(all_metadatas, all_documents):
+            if metadata.get("type") == "pdf_content":
+                # Text from a linked form or info sheet is cited as-is, with the PDF it came from
+                step = (document or "").strip()
+                pdf_links = [f"{metadata.get('pdf_link', '')} (page {metadata.get('page', '?')})"]
+            else:
+                step = metadata.get("summary", "").strip() or metadata.get("text", "").strip()
+                pdf_links = metadata.get("pdf_links", [])
             source_url = metadata.get("source_url", "Unknown Source")
 
-            if step:
+            if step and (step, source_url) not in seen_steps:
+                seen_steps.add((step, source_url))
                 checklist["steps"].append({
                     "step": step,
                     "details": [step],
@@ -77,40 +100,65 @@ def generate_checklist(query: str) -> dict:
         logger.exception(f"Unexpected error generating checklist: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while generating the checklist.")
 
-def send_checklist_to_ai_model(query: str, checklist: dict) -> str:
+class ChecklistAIResponse(BaseModel):
+    """Schema the AI model's checklist JSON must satisfy."""
+    steps: List[str] = Field(min_length=1)
+    pdf_links: List[str] = []
+    source: str = ""
+    closing: str = ""
+
+# A malformed generation is aborted as soon as it is detected and retried once
+MAX_CHECKLIST_ATTEMPTS = 2
+CHECKLIST_MAX_TOKENS = 600
+
+def build_checklist_prompt(query: str, checklist: dict) -> str:
     """
-    Format the checklist and send it to the AI model for further processing.
+    Format the checklist steps into the system prompt for the AI model.
     """
     try:
         if not checklist or not checklist.get("steps"):
             raise ValueError("The checklist is empty or malformed. Ensure valid steps are provided.")
 
-        # Build formatted steps
-        formatted_steps = ""
-        for idx, step in enumerate(checklist.get("steps", []), start=1):
-            step_details = "\n".join(f"- {detail}" for detail in step.get("details", []))
-            pdf_links = step.get("pdf_links", [])
-            formatted_pdf_links = (
-                f"PDF Links:\n{chr(10).join(pdf_links)}\n" if pdf_links else ""
-            )
-            source = step.get("source", "Unknown Source")
-
-            formatted_steps += (
-                f"Step {idx}:\n"
-                f"{step.get('step', 'No step description provided')}\n"
-                f"{step_details}\n"
-                f"{formatted_pdf_links}"
-                f"Source: {source}\n\n"
+        with timed("prompt_build"):
+            # Room left for the steps once the instructions and query are in
+            packer = PromptPacker("checklist", checklist_generation_template.format(query=query, formatted_steps=""))
+
+            # Build one block per step, in retrieval (relevance) order
+            step_blocks = []
+            for step in checklist.get("steps", []):
+                step_text = step.get("step", "No step description provided")
+                # Details often just repeat the step itself
+                details = dedupe_passages([step_text] + list(step.get("details", [])))[1:]
+                step_details = "".join(f"- {detail}\n" for detail in details)
+                pdf_links = step.get("pdf_links", [])
+                formatted_pdf_links = (
+                    f"PDF Links:\n{chr(10).join(pdf_links)}\n" if pdf_links else ""
+                )
+                source = step.get("source", "Unknown Source")
+
+                step_blocks.append(
+                    f"{step_text}\n"
+                    f"{step_details}"
+                    f"{formatted_pdf_links}"
+                    f"Source: {source}"
+                )
+
+            # Most relevant steps first; whatever does not fit the budget is left out
+            formatted_steps = "".join(
+                f"Step {idx}:\n{block}\n\n"
+                for idx, block in enumerate(packer.pack(step_blocks, truncate=True), start=1)
             )
 
-        if not formatted_steps.strip():
-            raise ValueError("Formatted steps are empty. Ensure valid checklist data is provided.")
+            if not formatted_steps.strip():
+                raise ValueError("Formatted steps are empty. Ensure valid checklist data is provided.")
 
-        # Format the system prompt
-        system_prompt = checklist_generation_template.format(
-            query=query,
-            formatted_steps=formatted_steps
-        ).strip()
+            # Format the system prompt
+            system_prompt = checklist_generation_template.format(
+                query=query,
+                formatted_steps=formatted_steps
+            ).strip()
+            packer.log_usage([{"role": "system", "content": system_prompt}])
+            return system_prompt
 
     except KeyError as e:
         logger.error(f"Missing key in checklist data: {e}")
@@ -122,30 +170,71 @@ def send_checklist_to_ai_model(query: str, checklist: dict) -> str:
         logger.error(f"Unexpected error formatting checklist prompt: {e}")
         raise HTTPException(status_code=500, detail="Failed to format the system prompt.")
 
-    try:
-        # Set up the client
-        client_manager.setup_clients()
-        groq_client = client_manager.get_groq_client()
+def _checklist_call_key(system_prompt: str, priority: Priority) -> str:
+    return hash_key("checklist", settings.MODEL_NAME_CONVERSATIONAL_GROQ, system_prompt, CHECKLIST_MAX_TOKENS, settings.LLM_JSON_MODE, int(priority))
 
-        # Send the system prompt to the AI model
-        response_stream = groq_client.chat.completions.create(
-            model=settings.MODEL_NAME_CONVERSATIONAL_GROQ,
+def stream_checklist_from_ai_model(query: str, checklist: dict, priority: Priority = Priority.INTERACTIVE) -> Iterator[dict]:
+    """
+    Send the checklist to the AI model and parse its JSON answer while it streams.
+
+    Yields {"event": "step", ...} for every checklist step as soon as it is complete,
+    then {"event": "checklist", "ai_response": {...}} with the validated response.
+    Malformed output stops the generation immediately and is retried once; in that
+    case {"event": "retry"} is yielded first so clients discard the steps they got.
+    Concurrent requests with the same prompt share one generation and its events.
+    """
+    system_prompt = build_checklist_prompt(query, checklist)
+    yield from llm_flight.stream(_checklist_call_key(system_prompt, priority), _checklist_events, system_prompt, priority)
+
+def _checklist_events(system_prompt: str, priority: Priority) -> Iterator[dict]:
+    response_format = {"type": "json_object"} if settings.LLM_JSON_MODE else None
+
+    for attempt in range(1, MAX_CHECKLIST_ATTEMPTS + 1):
+        parser = StreamingJSONObjectParser(array_fields=("steps",))
+        emitted_steps = 0
+        tokens = stream_chat_completion(
             messages=[{"role": "system", "content": system_prompt}],
-            stream=True,
-            max_tokens=600,
+            max_tokens=CHECKLIST_MAX_TOKENS,
             temperature=0.4,
+            call_type="checklist",
+            priority=priority,
+            response_format=response_format,
         )
+        try:
+            with closing(tokens):
+                for token in tokens:
+                    for _, step in parser.feed(token):
+                        emitted_steps += 1
+                        yield {"event": "step", "index": emitted_steps, "step": step}
+            ai_response = ChecklistAIResponse.model_validate(parser.close())
+            yield {"event": "checklist", "ai_response": ai_response.model_dump()}
+            return
+
+        except (MalformedJSONError, ValidationError) as e:
+            # Closing the token stream above cancels the upstream generation
+            LLM_CALLS.inc(call_type="checklist", outcome="malformed")
+            logger.warning(f"Malformed checklist JSON from AI model (attempt {attempt}/{MAX_CHECKLIST_ATTEMPTS}): {e}")
+            if attempt == MAX_CHECKLIST_ATTEMPTS:
+                raise HTTPException(status_code=502, detail="The AI model did not return a valid checklist.")
+            yield {"event": "retry", "reason": "malformed_output"}
+        except LLMDeadlineExceeded as e:
+            logger.error(f"AI model did not respond in time: {e}")
+            raise HTTPException(status_code=504, detail="The AI model did not respond in time.")
+        except Exception as e:
+            logger.error(f"Error querying AI model: {e}")
+            raise HTTPException(status_code=500, detail="Failed to retrieve response from the AI model.")
+
+def send_checklist_to_ai_model(query: str, checklist: dict, priority: Priority = Priority.INTERACTIVE) -> dict:
+    """
+    Send the checklist to the AI model and return its validated JSON response.
+    Concurrent requests with the same prompt share one call; the result must not be mutated.
+    """
+    system_prompt = build_checklist_prompt(query, checklist)
 
-        # Collect the streamed response
-        raw_output = []
-        for chunk in response_stream:
-            if hasattr(chunk.choices[0].delta, "content"):
-                token = chunk.choices[0].delta.content
-                if token:
-                    raw_output.append(token)
-
-        return "".join(raw_output).strip()
+    def first_checklist() -> dict:
+        for event in llm_flight.stream(_checklist_call_key(system_prompt, priority), _checklist_events, system_prompt, priority):
+            if event["event"] == "checklist":
+                return event["ai_response"]
+        raise HTTPException(status_code=500, detail="Failed to retrieve response from the AI model.")
 
-    except Exception as e:
-        logger.error(f"Error querying AI model: {e}")
-        raise HTTPException(status_code=500, detail="Failed to retrieve response from the AI model.")
\ No newline at end of file
+    return llm_flight.do(_checklist_call_key(system_prompt, priority), first_checklist)
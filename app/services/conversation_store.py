@@ -0,0 +1,338 @@
+# app/services/conversation_store.py
+
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.conversation import Conversation, Message, utcnow
+from app.models.database import engine
+from app.services.archival_service import ensure_restored, restore_archived_messages
+from app.utils.metrics import record_cache, registry
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_WRITES = registry.counter(
+    "bureasy_conversation_writes_total",
+    "Conversation turn writes by outcome (ok, conflict, error).",
+    ["outcome"],
+)
+
+class ConversationState:
+    """What a turn needs to know about a conversation, without touching the database."""
+    __slots__ = ("id", "flow_type", "state_index", "current_question", "answers", "version", "finished_at", "recent")
+
+    def __init__(self, id: int, flow_type: str, state_index: int, current_question: str | None, answers: Dict[str, str] | None,
+                 version: int, finished_at: datetime | None, recent: Sequence[Tuple[str, str]], recent_window: int):
+        self.id = id
+        self.flow_type = flow_type
+        self.state_index = state_index
+        self.current_question = current_question  # None for conversations saved before it was stored
+        self.answers = dict(answers or {})  # flow answers by slot name
+        self.version = version
+        self.finished_at = finished_at
+        self.recent = deque(recent, maxlen=recent_window)  # (role, content), oldest first
+
+class _TurnWrite:
+    __slots__ = ("conversation_id", "expected_version", "state_index", "current_question", "answers", "finished_at", "messages")
+
+    def __init__(self, conversation_id, expected_version, state_index, current_question, answers, finished_at, messages):
+        self.conversation_id = conversation_id
+        self.expected_version = expected_version
+        self.state_index = state_index
+        self.current_question = current_question
+        self.answers = answers
+        self.finished_at = finished_at
+        self.messages = messages
+
+class ConversationStore:
+    """
+    Size-bounded LRU of active conversation state with write-behind persistence.
+
+    A turn on a cached conversation reads nothing from the database; its state
+    update and messages are queued and written by a background thread, which
+    commits everything queued within CONVERSATION_WRITE_BATCH_MS in one transaction,
+    each turn in its own savepoint so one failing turn does not lose the others.
+    Each update carries the version it was based on: if another worker changed
+    the conversation in the meantime, the turn (state and messages) is not stored,
+    so the transcript never disagrees with the stored state, and the entry is dropped
+    from the cache so the next turn reloads it. Routing a conversation to the same
+    worker (sticky sessions) avoids such conflicts.
+    """
+    def __init__(self, max_entries: int, recent_window: int, write_behind: bool = True, batch_ms: float = 20.0):
+        self.max_entries = max_entries
+        self.recent_window = recent_window
+        self.write_behind = write_behind
+        self.batch_s = batch_ms / 1000.0
+
+        self._entries: "OrderedDict[int, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[_TurnWrite]" = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        # Queued, not yet committed turn writes per conversation
+        self._pending: Dict[int, int] = {}
+        self._pending_cond = threading.Condition()
+
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+
+    # -- Cache --
+
+    def _cache_get(self, conversation_id: int) -> ConversationState | None:
+        with self._lock:
+            state = self._entries.get(conversation_id)
+            if state is not None:
+                self._entries.move_to_end(conversation_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache("conversation", state is not None)
+        return state
+
+    def _cache_put(self, state: ConversationState):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[state.id] = state
+            self._entries.move_to_end(state.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_current(self, state: ConversationState) -> bool:
+        """Whether state is still the cached copy, i.e. it was neither evicted nor invalidated."""
+        with self._lock:
+            return self._entries.get(state.id) is state
+
+    def invalidate(self, conversation_id: int):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "write_conflicts": self.conflicts,
+                "pending_writes": self._queue.unfinished_tasks,
+                "write_behind": self.write_behind,
+            }
+
+    # -- Loading and creating --
+
+    def get(self, db: Session, conversation_id: int) -> ConversationState | None:
+        """Cached state, or load it (restoring archived conversations) on a miss."""
+        state = self._cache_get(conversation_id)
+        if state is not None:
+            return state
+
+        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        if conversation is None:
+            return None
+        ensure_restored(db, conversation)
+        # Pending writes for this conversation must land before its messages are read
+        self.flush(conversation_id)
+        recent = db.query(Message.role, Message.content).filter(
+            Message.conversation_id == conversation_id
+        ).order_by(Message.id.desc()).limit(self.recent_window).all()
+
+        state = ConversationState(
+            conversation.id, conversation.flow_type, conversation.state_index or 0, conversation.current_question,
+            conversation.answers, conversation.version, conversation.finished_at, [(m.role, m.content) for m in reversed(recent)], self.recent_window,
+        )
+        self._cache_put(state)
+        return state
+
+    def create(self, db: Session, flow_type: str, state_index: int, messages: List[Tuple[str, str]],
+               finished: bool = False, answers: Dict[str, str] | None = None, current_question: str | None = None) -> ConversationState:
+        """Insert a new conversation with its first messages in one transaction (needed for its id)."""
+        conversation = Conversation(
+            flow_type=flow_type, state_index=state_index, current_question=current_question, answers=dict(answers or {}),
+            finished_at=utcnow() if finished else None,
+        )
+        db.add(conversation)
+        db.add_all([Message(conversation=conversation, role=role, content=content) for role, content in messages])
+        db.flush()
+        state = ConversationState(
+            conversation.id, flow_type, state_index, current_question, conversation.answers, conversation.version,
+            conversation.finished_at, messages, self.recent_window,
+        )
+        db.commit()
+
+        self._cache_put(state)
+        return state
+
+    # -- Turn writes --
+
+    def save_turn(self, db: Session, state: ConversationState, messages: List[Tuple[str, str]],
+                  state_index: int | None = None, finished: bool = False, answers: Dict[str, str] | None = None,
+                  current_question: str | None = None):
+        """
+        Apply a turn to the cached state and persist it with a single write:
+        queued for the background writer, or committed right away without write-behind.
+        """
+        write = _TurnWrite(
+            state.id,
+            state.version,
+            state.state_index if state_index is None else state_index,
+            state.current_question if current_question is None else current_question,
+            # A copy, so later turns cannot change what is queued for writing
+            dict(state.answers if answers is None else answers),
+            utcnow() if finished else state.finished_at,
+            list(messages),
+        )
+        state.state_index = write.state_index
+        state.current_question = write.current_question
+        state.answers = dict(write.answers)
+        state.finished_at = write.finished_at
+        state.version += 1
+        state.recent.extend(messages)
+
+        if self.write_behind:
+            self._ensure_writer()
+            with self._pending_cond:
+                self._pending[state.id] = self._pending.get(state.id, 0) + 1
+            self._queue.put(write)
+        else:
+            applied = self._apply_one(db.connection(), write)
+            db.commit()
+            self._record_outcome(write, applied)
+
+    def flush(self, conversation_id: int | None = None, timeout: float | None = None) -> bool:
+        """
+        Block until the queued turn writes of one conversation (or of all, without
+        conversation_id) have been committed. Returns False if the timeout passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._pending_cond:
+            while self._pending.get(conversation_id) if conversation_id is not None else self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def _apply(self, conn, writes: List[_TurnWrite]) -> List[Tuple[_TurnWrite, bool]]:
+        """
+        Apply each write in its own savepoint: a failing write is rolled back and logged
+        alone. Returns (write, applied) for the others, to be recorded once committed.
+        """
+        outcomes = []
+        for write in writes:
+            savepoint = conn.begin_nested()
+            try:
+                applied = self._apply_one(conn, write)
+                savepoint.commit()
+            except Exception as e:
+                savepoint.rollback()
+                CONVERSATION_WRITES.inc(outcome="error")
+                logger.exception(f"Failed to persist a turn of conversation {write.conversation_id}: {e}")
+                self.invalidate(write.conversation_id)
+                continue
+            outcomes.append((write, applied))
+        return outcomes
+
+    def _apply_one(self, conn, write: _TurnWrite) -> bool:
+        """Store the turn's state and messages; False (nothing stored) if the state changed elsewhere."""
+        conversations = Conversation.__table__
+        result = conn.execute(
+            update(conversations)
+            .where(conversations.c.id == write.conversation_id, conversations.c.version == write.expected_version)
+            .values(
+                state_index=write.state_index, current_question=write.current_question, answers=write.answers,
+                finished_at=write.finished_at, version=write.expected_version + 1,
+            )
+        )
+        if result.rowcount == 0 and restore_archived_messages(conn, write.conversation_id):
+            # Archived since it was cached (which bumped the version): its older messages are
+            # back in front of this turn's, and the state applies if nothing else changed it.
+            # The restore restarted the retention clock, which a finished turn keeps.
+            self.invalidate(write.conversation_id)
+            result = conn.execute(
+                update(conversations)
+                .where(conversations.c.id == write.conversation_id, conversations.c.version == write.expected_version + 1)
+                .values(
+                    state_index=write.state_index, current_question=write.current_question, answers=write.answers,
+                    finished_at=None if write.finished_at is None else utcnow(), version=write.expected_version + 2,
+                )
+            )
+        if result.rowcount == 0:
+            return False
+        conn.execute(insert(Message.__table__), [
+            {"conversation_id": write.conversation_id, "role": role, "content": content}
+            for role, content in write.messages
+        ])
+        return True
+
+    def _record_outcome(self, write: _TurnWrite, applied: bool):
+        if applied:
+            CONVERSATION_WRITES.inc(outcome="ok")
+            return
+        # Changed elsewhere since this state was cached: the turn's reply was based on stale
+        # state, so neither it nor the state is stored; the next turn reloads the conversation
+        self.conflicts += 1
+        CONVERSATION_WRITES.inc(outcome="conflict")
+        logger.warning(f"Conversation {write.conversation_id} changed concurrently; dropped a turn based on stale state")
+        self.invalidate(write.conversation_id)
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="conversation-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                # Group commit: everything queued within the batch window goes into one transaction
+                deadline = time.monotonic() + self.batch_s
+                while (remaining := deadline - time.monotonic()) > 0:
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                with engine.begin() as conn:
+                    if conn.dialect.name == "sqlite":
+                        # pysqlite defers BEGIN until the first write, which would turn the first
+                        # savepoint into a transaction of its own, committed on release
+                        conn.exec_driver_sql("BEGIN")
+                    outcomes = self._apply(conn, batch)
+                for write, applied in outcomes:
+                    self._record_outcome(write, applied)
+            except Exception as e:
+                CONVERSATION_WRITES.inc(len(batch), outcome="error")
+                logger.exception(f"Failed to persist {len(batch)} conversation turns: {e}")
+                for write in batch:
+                    self.invalidate(write.conversation_id)
+            finally:
+                with self._pending_cond:
+                    for write in batch:
+                        remaining = self._pending.get(write.conversation_id, 1) - 1
+                        if remaining > 0:
+                            self._pending[write.conversation_id] = remaining
+                        else:
+                            self._pending.pop(write.conversation_id, None)
+                    self._pending_cond.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+# Singleton store shared by the API
+conversation_store = ConversationStore(
+    max_entries=settings.CONVERSATION_CACHE_SIZE,
+    recent_window=settings.CONVERSATION_RECENT_WINDOW,
+    write_behind=settings.CONVERSATION_WRITE_BEHIND,
+    batch_ms=settings.CONVERSATION_WRITE_BATCH_MS,
+)
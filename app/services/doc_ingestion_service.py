@@ -1,17 +1,61 @@
 from fastapi import UploadFile, HTTPException
-from typing import List
+from typing import List, Tuple
 import logging
+import re
 import json
-from app.utils.chromadb_client import get_chroma_collection, embed_text
+import hashlib
+from app.config import settings
+from app.utils.chromadb_client import get_chroma_collection, embed_texts_array
+from app.utils.knowledge_base import mark_knowledge_base_changed
+from app.utils.link_graph import link_graph
 
 # Initialize logging
 logger = logging.getLogger(__name__)
 
-def ingest_json_to_chromadb(json_data):
-    """Ingest JSON data into ChromaDB."""
-    # Get the shared ChromaDB collection
-    collection = get_chroma_collection()
+# Page text is split into chunks of this size before embedding
+CHUNK_MAX_CHARS = 2000
+CHUNK_OVERLAP_CHARS = 200
+
+# Record types build_records() writes for a page. PDF content records also carry the
+# page's source_url but are replaced by the PDF pipeline, by content hash.
+PAGE_RECORD_TYPES = ["phone_number", "content", "pdf"]
+
+# IDs written by versions before record_id(): they were reused by every page, so each
+# upload overwrote the previous page's records (see delete_legacy_records)
+LEGACY_ID_RE = re.compile(r"^(content_summary|(phone_number|url|pdf_link)_\d+)$")
+LEGACY_DELETE_BATCH = 1000
+
+def record_id(source_url: str, kind: str, idx: int) -> str:
+    """Stable, per-page record ID so pages don't overwrite each other and re-ingestion is idempotent."""
+    url_hash = hashlib.sha1(source_url.encode("utf-8")).hexdigest()[:16]
+    return f"{kind}_{url_hash}_{idx}"
+
+def chunk_text(text: str, max_chars: int = CHUNK_MAX_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
+    """Split text into overlapping chunks, preferring to break at sentence ends or spaces."""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
 
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            cut = max(text.rfind(". ", start, end), text.rfind(" ", start, end))
+            if cut > start + max_chars // 2:
+                end = cut + 1
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return [c for c in chunks if c]
+
+def build_records(json_data) -> List[Tuple[str, str, str, dict]]:
+    """
+    Turn one scraped page into (id, document, text_to_embed, metadata) records:
+    phone numbers, content chunks and PDF links. Other links are not embedded; they
+    are recorded in the link graph (see record_links).
+    """
     # Extract source URL
     source_url = json_data.get("url", "")
 
@@ -19,96 +63,119 @@ def ingest_json_to_chromadb(json_data):
     text = json_data.get("text", "")
     summary = json_data.get("summary", "")
     pdf_links = json_data.get("pdf_links", [])
-    all_links = json_data.get("all_links", [])
     phone_numbers = json_data.get("phone_numbers", [])
 
     # Convert list metadata to JSON strings
     pdf_links_str = json.dumps(pdf_links) if pdf_links else ""
-    all_links_str = json.dumps(all_links) if all_links else ""
 
-    # Ingest phone numbers
+    records = []
+
+    # Phone numbers
     for idx, phone in enumerate(phone_numbers):
         number = phone.get("number", "")
         left_context = phone.get("left_context", "")
         right_context = phone.get("right_context", "")
         phone_text = f"{left_context} {number} {right_context}"
 
-        phone_metadata = {
+        records.append((record_id(source_url, "phone_number", idx), phone_text, phone_text, {
             "type": "phone_number",
             "number": number,
             "left_context": left_context,
             "right_context": right_context,
             "source_url": source_url,
-        }
-
-        # Add phone number data to the collection
-        collection.add(
-            documents=[phone_text],
-            embeddings=[embed_text(phone_text)],
-            metadatas=[phone_metadata],
-            ids=[f"phone_number_{idx}"]
-        )
-
-    # Ingest main text and summary
-    combined_text = f"{text} {summary}"
-    main_metadata = {
-        "type": "content",
-        "summary": summary,
-        "pdf_links": pdf_links_str,  # JSON string
-        "all_links": all_links_str,  # JSON string
-        "source_url": source_url,
-    }
-
-    # Add main text and summary to the collection
-    collection.add(
-        documents=[combined_text],
-        embeddings=[embed_text(combined_text)],
-        metadatas=[main_metadata],
-        ids=["content_summary"]
-    )
+        }))
 
-    # Ingest PDF links
+    # Main text and summary, chunked so long pages aren't truncated by the embedding model
+    for idx, chunk in enumerate(chunk_text(f"{text} {summary}")):
+        records.append((record_id(source_url, "content", idx), chunk, chunk, {
+            "type": "content",
+            "summary": summary,
+            "pdf_links": pdf_links_str,  # JSON string
+            "source_url": source_url,
+            "chunk_index": idx,
+        }))
+
+    # PDF links
     for idx, pdf_link in enumerate(pdf_links):
-        pdf_metadata = {
+        records.append((record_id(source_url, "pdf_link", idx), f"PDF Link: {pdf_link}", pdf_link, {
             "type": "pdf",
             "pdf_link": pdf_link,
             "source_url": source_url,
-        }
-        collection.add(
-            documents=[f"PDF Link: {pdf_link}"],
-            embeddings=[embed_text(pdf_link)],
-            metadatas=[pdf_metadata],
-            ids=[f"pdf_link_{idx}"]
-        )
-
-    # Ingest all other links
-    for idx, url in enumerate(all_links):
-        url_metadata = {
-            "type": "url",
-            "url": url,
-            "source_url": source_url,
-        }
-        collection.add(
-            documents=[f"URL: {url}"],
-            embeddings=[embed_text(url)],
-            metadatas=[url_metadata],
-            ids=[f"url_{idx}"]
-        )
+        }))
+
+    return records
+
+def record_links(json_data):
+    """Record a scraped page's links in the link graph."""
+    if json_data.get("url"):
+        link_graph.add_page(json_data["url"], json_data.get("all_links", []), json_data.get("pdf_links", []))
+
+def write_records(collection, records: List[Tuple[str, str, str, dict]], embeddings=None):
+    """Embed (unless embeddings are given) and upsert records with a single batched call."""
+    if not records:
+        return
+    ids, documents, embed_inputs, metadatas = (list(column) for column in zip(*records))
+    if embeddings is None:
+        embeddings = embed_texts_array(embed_inputs)
+    collection.upsert(
+        documents=documents,
+        embeddings=embeddings,
+        metadatas=metadatas,
+        ids=ids
+    )
+
+def delete_page_records(collection, source_url: str):
+    """Delete a page's records, so chunks, phone numbers and PDF links it no longer has do not linger."""
+    if source_url:
+        collection.delete(where={"$and": [{"source_url": source_url}, {"type": {"$in": PAGE_RECORD_TYPES}}]})
+
+def delete_legacy_records(collection) -> int:
+    """Delete records with the shared IDs of older versions (content_summary, phone_number_N, url_N, pdf_link_N)."""
+    legacy_ids = [id_ for id_ in collection.get(include=[])["ids"] if LEGACY_ID_RE.match(id_)]
+    for start in range(0, len(legacy_ids), LEGACY_DELETE_BATCH):
+        collection.delete(ids=legacy_ids[start:start + LEGACY_DELETE_BATCH])
+    return len(legacy_ids)
+
+def ingest_json_to_chromadb(json_data):
+    """Ingest JSON data into ChromaDB."""
+    # Get the shared ChromaDB collection
+    collection = get_chroma_collection()
+
+    # A re-uploaded page replaces its records; upserting alone would keep the extra
+    # chunks of a page that got shorter
+    delete_page_records(collection, json_data.get("url", ""))
+
+    # Add everything to the collection with a single batched embedding call
+    write_records(collection, build_records(json_data))
+    record_links(json_data)
+
+    if settings.PDF_INGEST_ON_UPLOAD and json_data.get("pdf_links"):
+        # Imported here: the PDF pipeline reuses this module's chunking and writes
+        from app.services.pdf_ingestion_service import collect_pdf_links, pdf_ingestion_queue
+        pdf_ingestion_queue.submit(collect_pdf_links([json_data]))
 
 def ingest_json_data_from_files(files: List[UploadFile]):
     """Process uploaded files and ingest their data."""
-    for file in files:
-        try:
-            # Read and parse the JSON file
-            content = file.file.read()
-            json_data = json.loads(content)
-
-            # Ingest the JSON data into ChromaDB
-            ingest_json_to_chromadb(json_data)
-        except json.JSONDecodeError:
-            logger.error(f"File {file.filename} is not a valid JSON file.")
-            raise HTTPException(status_code=400, detail=f"File {file.filename} is not a valid JSON file.")
-        except Exception as e:
-            logger.exception(f"Error processing file {file.filename}: {e}")
-            raise HTTPException(status_code=500, detail=f"Error processing file {file.filename}: {str(e)}")
+    written = False
+    try:
+        for file in files:
+            try:
+                # Read and parse the JSON file
+                content = file.file.read()
+                json_data = json.loads(content)
+
+                # Ingest the JSON data into ChromaDB
+                written = True
+                ingest_json_to_chromadb(json_data)
+            except json.JSONDecodeError:
+                logger.error(f"File {file.filename} is not a valid JSON file.")
+                raise HTTPException(status_code=400, detail=f"File {file.filename} is not a valid JSON file.")
+            except Exception as e:
+                logger.exception(f"Error processing file {file.filename}: {e}")
+                raise HTTPException(status_code=500, detail=f"Error processing file {file.filename}: {str(e)}")
+    finally:
+        # Once per upload, also when a later file failed: precomputed answers built from the
+        # previous content are refreshed
+        if written:
+            mark_knowledge_base_changed()
     return "Files successfully ingested."
@@ -3,8 +3,9 @@ import logging
 from pdf2image import convert_from_path
 import pytesseract
 from langchain_community.document_loaders import PyPDFLoader
-from app.utils.client_manager import client_manager
-from app.config import settings
+from app.prompts.prompt_assembly import PromptPacker
+from app.utils.llm_client import complete_chat
+from app.utils.metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -44,13 +45,14 @@ def _ocr_pdf(pdf_path: str) -> str:
     Converts each page to an image and extracts text using pytesseract.
     """
     try:
-        # Convert PDF to a list of images (one per page)
-        pages = convert_from_path(pdf_path)
+        with timed("ocr"):
+            # Convert PDF to a list of images (one per page)
+            pages = convert_from_path(pdf_path)
 
-        # Extract text from each page using OCR
-        ocr_text = ""
-        for page in pages:
-            ocr_text += pytesseract.image_to_string(page)
+            # Extract text from each page using OCR
+            ocr_text = ""
+            for page in pages:
+                ocr_text += pytesseract.image_to_string(page)
 
         return ocr_text
     except Exception as e:
@@ -66,9 +68,10 @@ def process_pdf_document(pdf_path: str) -> dict:
 
     # -- 1) Try parsing the PDF normally --
     try:
-        loader = PyPDFLoader(pdf_path)
-        docs = loader.load()
-        all_content = "\n".join([d.page_content for d in docs if d.page_content])
+        with timed("pdf_parse"):
+            loader = PyPDFLoader(pdf_path)
+            docs = loader.load()
+            all_content = "\n".join([d.page_content for d in docs if d.page_content])
     except Exception as e:
         logger.warning(f"Normal PDF parsing failed for {pdf_path}. Attempting OCR. Error: {e}")
         all_content = ""
@@ -158,34 +161,30 @@ def process_pdf_document(pdf_path: str) -> dict:
         "(No additional commentary.)"
     )
 
-    user_prompt = (
-        f"PDF Content:\n{all_content}\n\n"
-        "Identify the single best document type from the list, and provide the main topics as comma-separated tags.\n"
-        "Use the exact format requested."
-    )
+    def build_user_prompt(content: str) -> str:
+        return (
+            f"PDF Content:\n{content}\n\n"
+            "Identify the single best document type from the list, and provide the main topics as comma-separated tags.\n"
+            "Use the exact format requested."
+        )
+
+    # The beginning of a document identifies it best, so long PDFs are cut at the budget
+    packer = PromptPacker("document_labelling", system_prompt + build_user_prompt(""))
+    user_prompt = build_user_prompt(packer.fit(all_content))
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    packer.log_usage(messages)
 
     try:
-        client_manager.setup_clients()
-        groq_client = client_manager.get_groq_client()
-
-        response_stream = groq_client.chat.completions.create(
-            model=settings.MODEL_NAME_CONVERSATIONAL_GROQ,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            stream=True,
+        response_text = complete_chat(
+            messages=messages,
             max_tokens=300,
             temperature=0.2,
+            call_type="document_labelling",
         )
 
-        response_text = ""
-        for chunk in response_stream:
-            if hasattr(chunk.choices[0].delta, "content"):
-                token = chunk.choices[0].delta.content
-                if token:
-                    response_text += token
-
         # -- 4) Parse LLM response into { document_type, tags } --
         result = _parse_llm_response(response_text)
         return result
@@ -0,0 +1,416 @@
+# app/services/flow_engine.py
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import yaml
+
+from app.config import settings
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+FLOW_RELOADS = registry.counter(
+    "bureasy_flow_reloads_total",
+    "Flow definition files compiled, by outcome (ok, error, removed).",
+    ["outcome"],
+)
+
+DEFAULT_FLOWS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts", "flows")
+FLOW_FILE_EXTENSIONS = (".yaml", ".yml", ".json")
+QUESTION_TYPES = {
+    "text", "date", "number", "choice", "yes_no", "name", "nationality",
+    "address", "permit_type", "reason", "occupation", "office",
+}
+QUESTION_KEYS = {"id", "text", "type", "keywords", "choices", "validate", "error", "when", "unless", "next"}
+VALIDATION_KEYS = {"pattern", "min_length", "max_length", "min", "max", "past"}
+DATE_FORMAT = "%d/%m/%Y"
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+class FlowDefinitionError(ValueError):
+    """A flow file that cannot be compiled."""
+
+def normalize_answer(value) -> str:
+    if isinstance(value, bool):
+        # Unquoted yes/no in YAML files
+        return "yes" if value else "no"
+    return str(value).strip().casefold()
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[\wäöüß]+", text.casefold())
+
+class Question:
+    """One compiled question: type, validation, skip condition and outgoing transitions."""
+    __slots__ = (
+        "index", "id", "text", "type", "keywords", "choices", "error",
+        "condition", "transitions", "default_next", "_checks",
+    )
+
+    def __init__(self, index: int, id: str, text: str, type: str, keywords: List[str], choices: List[str], error: str):
+        self.index = index
+        self.id = id
+        self.text = text
+        self.type = type
+        self.keywords = keywords
+        self.choices = choices
+        self.error = error
+        self.condition: Callable[[Dict[str, str]], bool] = lambda answers: True
+        self.transitions: Dict[str, int] = {}  # normalized answer -> index of the next question
+        self.default_next = index + 1
+        self._checks: List[Callable[[str], bool]] = []
+
+    def check(self, value: str) -> Tuple[str | None, str | None]:
+        """Normalize and validate an answer. Returns (value, None) or (None, error message)."""
+        value = str(value).strip()
+        if self.type == "date":
+            value = _normalize_date(value)
+        elif self.type == "yes_no":
+            value = {"yes": "Yes", "no": "No"}.get(normalize_answer(value), value)
+        elif self.type == "choice":
+            value = next((choice for choice in self.choices if normalize_answer(choice) == normalize_answer(value)), value)
+        elif self.type == "number":
+            value = value.replace(",", ".")
+
+        if not value:
+            return None, self.error
+        for check in self._checks:
+            if not check(value):
+                return None, self.error
+        return value, None
+
+    def next_index(self, answer: str) -> int:
+        return self.transitions.get(normalize_answer(answer), self.default_next)
+
+class Flow:
+    """
+    A compiled flow. Transitions only point forward, so finding the next question
+    walks each question at most once, whatever the branching.
+    """
+    __slots__ = ("name", "description", "keywords", "questions", "by_id", "path", "mtime_ns")
+
+    def __init__(self, name: str, description: str, keywords: List[str], questions: List[Question], path: str, mtime_ns: int):
+        self.name = name
+        self.description = description
+        self.keywords = keywords
+        self.questions = questions
+        self.by_id = {question.id: question for question in questions}
+        self.path = path
+        self.mtime_ns = mtime_ns
+
+    def __len__(self):
+        return len(self.questions)
+
+    def walk(self, answers: Dict[str, str]):
+        """Yield the questions on the conversation's path, stopping at the first unanswered one."""
+        idx = 0
+        while idx < len(self.questions):
+            question = self.questions[idx]
+            if not question.condition(answers):
+                idx = question.default_next
+                continue
+            yield question
+            if question.id not in answers:
+                return
+            idx = question.next_index(answers[question.id])
+
+    def next_question(self, answers: Dict[str, str]) -> Question | None:
+        """First question on the path without an answer, or None once the flow is complete."""
+        for question in self.walk(answers):
+            if question.id not in answers:
+                return question
+        return None
+
+    def open_questions(self, answers: Dict[str, str]) -> List[Question]:
+        """Unanswered questions that may still be asked given the answers so far."""
+        return [q for q in self.questions if q.id not in answers and q.condition(answers)]
+
+    def answered_path(self, answers: Dict[str, str]) -> List[Tuple[Question, str]]:
+        """(question, answer) pairs along the path, in the order they are asked."""
+        return [(q, answers[q.id]) for q in self.walk(answers) if q.id in answers]
+
+def _normalize_date(value: str) -> str:
+    for fmt in (DATE_FORMAT, "%d.%m.%Y", "%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).strftime(DATE_FORMAT)
+        except ValueError:
+            continue
+    return value
+
+def _parse_date(value: str) -> datetime | None:
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        return None
+
+def _parse_number(value: str) -> float | None:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _compile_checks(question: Question, rules: dict, where: str) -> List[Callable[[str], bool]]:
+    unknown = set(rules) - VALIDATION_KEYS
+    if unknown:
+        raise FlowDefinitionError(f"{where}: unknown validation rules {sorted(unknown)}")
+
+    checks = []
+    if question.type == "date":
+        checks.append(lambda v: _parse_date(v) is not None)
+        if rules.get("past"):
+            checks.append(lambda v: _parse_date(v) < datetime.now())
+    elif question.type == "number":
+        checks.append(lambda v: _parse_number(v) is not None)
+    elif question.type == "yes_no":
+        checks.append(lambda v: v in ("Yes", "No"))
+    elif question.type == "choice":
+        allowed = set(question.choices)
+        checks.append(lambda v: v in allowed)
+
+    if "pattern" in rules:
+        try:
+            pattern = re.compile(rules["pattern"])
+        except re.error as e:
+            raise FlowDefinitionError(f"{where}: invalid pattern: {e}")
+        checks.append(lambda v: pattern.search(v) is not None)
+    if "min_length" in rules:
+        min_length = int(rules["min_length"])
+        checks.append(lambda v: len(v) >= min_length)
+    if "max_length" in rules:
+        max_length = int(rules["max_length"])
+        checks.append(lambda v: len(v) <= max_length)
+    if "min" in rules:
+        minimum = float(rules["min"])
+        checks.append(lambda v: (_parse_number(v) or 0.0) >= minimum)
+    if "max" in rules:
+        maximum = float(rules["max"])
+        checks.append(lambda v: (_parse_number(v) or 0.0) <= maximum)
+    return checks
+
+def _compile_condition(spec: dict, earlier: Dict[str, Question], where: str, negate: bool):
+    if not isinstance(spec, dict) or not spec:
+        raise FlowDefinitionError(f"{where}: expected a mapping of earlier question ids to values")
+    expected = {}
+    for question_id, values in spec.items():
+        if question_id not in earlier:
+            raise FlowDefinitionError(f"{where}: '{question_id}' is not an earlier question")
+        values = values if isinstance(values, list) else [values]
+        expected[question_id] = frozenset(normalize_answer(v) for v in values)
+    items = tuple(expected.items())
+
+    def matches(answers: Dict[str, str]) -> bool:
+        return all(normalize_answer(answers.get(qid, "")) in values for qid, values in items)
+
+    return (lambda answers: not matches(answers)) if negate else matches
+
+def compile_flow(spec: dict, path: str = "", mtime_ns: int = 0) -> Flow:
+    """Validate a flow definition and compile it into a Flow."""
+    where = os.path.basename(path) or "flow"
+    if not isinstance(spec, dict):
+        raise FlowDefinitionError(f"{where}: expected a mapping at the top level")
+    name = spec.get("name")
+    if not name or not isinstance(name, str):
+        raise FlowDefinitionError(f"{where}: missing flow name")
+    raw_questions = spec.get("questions")
+    if not raw_questions or not isinstance(raw_questions, list):
+        raise FlowDefinitionError(f"{where}: flow '{name}' has no questions")
+
+    questions: List[Question] = []
+    by_id: Dict[str, Question] = {}
+    for idx, raw in enumerate(raw_questions):
+        if isinstance(raw, str):
+            raw = {"text": raw}
+        qwhere = f"{where} question {idx + 1}"
+        unknown = set(raw) - QUESTION_KEYS
+        if unknown:
+            raise FlowDefinitionError(f"{qwhere}: unknown keys {sorted(unknown)}")
+        if not raw.get("text"):
+            raise FlowDefinitionError(f"{qwhere}: missing text")
+        qtype = raw.get("type", "text")
+        if qtype not in QUESTION_TYPES:
+            raise FlowDefinitionError(f"{qwhere}: unknown type '{qtype}'")
+        question_id = str(raw.get("id") or f"q{idx + 1}")
+        if question_id in by_id:
+            raise FlowDefinitionError(f"{qwhere}: duplicate id '{question_id}'")
+        choices = [str(c) for c in raw.get("choices", [])]
+        if qtype == "choice" and not choices:
+            raise FlowDefinitionError(f"{qwhere}: choice questions need choices")
+
+        default_error = (
+            "Please answer with one of: " + ", ".join(choices) + "." if qtype == "choice"
+            else "Please answer with Yes or No." if qtype == "yes_no"
+            else "Please enter a date as DD/MM/YYYY." if qtype == "date"
+            else "Please enter a number." if qtype == "number"
+            else "Sorry, I could not use that answer."
+        )
+        question = Question(
+            idx, question_id, str(raw["text"]), qtype,
+            [k.casefold() for k in raw.get("keywords", [])], choices, raw.get("error") or default_error,
+        )
+        question._checks = _compile_checks(question, raw.get("validate") or {}, qwhere)
+
+        conditions = []
+        if "when" in raw:
+            conditions.append(_compile_condition(raw["when"], by_id, f"{qwhere} when", negate=False))
+        if "unless" in raw:
+            conditions.append(_compile_condition(raw["unless"], by_id, f"{qwhere} unless", negate=True))
+        if len(conditions) == 1:
+            question.condition = conditions[0]
+        elif conditions:
+            question.condition = lambda answers, a=conditions[0], b=conditions[1]: a(answers) and b(answers)
+
+        questions.append(question)
+        by_id[question_id] = question
+
+    # Transitions are resolved once every id is known; they may only jump forward
+    for raw, question in zip(raw_questions, questions):
+        branches = raw.get("next") if isinstance(raw, dict) else None
+        if not branches:
+            continue
+        if not isinstance(branches, dict):
+            raise FlowDefinitionError(f"{where} question '{question.id}': next must map answers to question ids")
+        for answer, target_id in branches.items():
+            target = by_id.get(target_id) if target_id != "end" else None
+            if target_id != "end" and target is None:
+                raise FlowDefinitionError(f"{where} question '{question.id}': unknown next question '{target_id}'")
+            target_index = len(questions) if target is None else target.index
+            if target_index <= question.index:
+                raise FlowDefinitionError(f"{where} question '{question.id}': next may only jump forward")
+            if answer == "default":
+                question.default_next = target_index
+            else:
+                question.transitions[normalize_answer(answer)] = target_index
+
+    keywords = [k.casefold() for k in spec.get("keywords", [])]
+    return Flow(name, str(spec.get("description", "")), keywords, questions, path, mtime_ns)
+
+def load_flow_file(path: str) -> Flow:
+    with open(path, "r", encoding="utf-8") as f:
+        # The libyaml loader is several times faster when PyYAML was built with it
+        spec = json.load(f) if path.endswith(".json") else yaml.load(f, Loader=YAML_LOADER)
+    return compile_flow(spec, path, os.stat(path).st_mtime_ns)
+
+class KeywordIndex:
+    """
+    Inverted index from keyword phrases to flows. Scoring a message only looks at
+    its own tokens, so detection cost does not grow with the number of flows.
+    """
+    def __init__(self, flows: List[Flow]):
+        # first token -> [(phrase tokens, flow name, weight)]
+        self._entries: Dict[str, List[Tuple[Tuple[str, ...], str, float]]] = {}
+        phrases_by_flow = {}
+        document_frequency: Dict[Tuple[str, ...], int] = {}
+        for flow in flows:
+            phrases = {tuple(tokenize(k)) for k in flow.keywords} | {(t,) for t in tokenize(flow.name.replace("_", " "))}
+            phrases.discard(())
+            phrases_by_flow[flow.name] = phrases
+            for phrase in phrases:
+                document_frequency[phrase] = document_frequency.get(phrase, 0) + 1
+        for name, phrases in phrases_by_flow.items():
+            for phrase in phrases:
+                # Phrases shared by many flows say little; longer phrases say more
+                weight = len(phrase) / document_frequency[phrase]
+                self._entries.setdefault(phrase[0], []).append((phrase, name, weight))
+
+    def candidates(self, text: str, limit: int) -> List[str]:
+        tokens = tokenize(text)
+        scores: Dict[str, float] = {}
+        for i, token in enumerate(tokens):
+            for phrase, name, weight in self._entries.get(token, ()):
+                if len(phrase) == 1 or tuple(tokens[i:i + len(phrase)]) == phrase:
+                    scores[name] = scores.get(name, 0.0) + weight
+        return sorted(scores, key=lambda name: (-scores[name], name))[:limit]
+
+class FlowRegistry:
+    """
+    Flows compiled from the files in a directory. Files are checked for changes at
+    most every reload_interval_s seconds when flows are looked up; changed files are
+    recompiled and swapped in, and a file that fails to compile keeps its last good version.
+    """
+    def __init__(self, directory: str, reload_interval_s: float = 2.0):
+        self.directory = directory
+        self.reload_interval_s = reload_interval_s
+        self._flows: Dict[str, Flow] = {}
+        self._by_path: Dict[str, Flow] = {}
+        self._mtimes: Dict[str, int] = {}
+        self._index = KeywordIndex([])
+        self._lock = threading.Lock()
+        self._checked_at = None
+
+    def _scan(self) -> Dict[str, int]:
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            logger.warning(f"Flow directory {self.directory} does not exist")
+            return {}
+        return {
+            entry.path: entry.stat().st_mtime_ns
+            for entry in entries
+            if entry.is_file() and entry.name.endswith(FLOW_FILE_EXTENSIONS)
+        }
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile changed flow files. Returns True if the set of flows changed."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.reload_interval_s:
+                return False
+            self._checked_at = now
+
+            mtimes = self._scan()
+            if mtimes == self._mtimes:
+                return False
+
+            by_path = {path: flow for path, flow in self._by_path.items() if path in mtimes}
+            for path in set(self._by_path) - set(mtimes):
+                FLOW_RELOADS.inc(outcome="removed")
+                logger.info(f"Flow file {path} removed")
+            for path, mtime_ns in mtimes.items():
+                if self._mtimes.get(path) == mtime_ns:
+                    continue
+                try:
+                    by_path[path] = load_flow_file(path)
+                    FLOW_RELOADS.inc(outcome="ok")
+                except Exception as e:
+                    FLOW_RELOADS.inc(outcome="error")
+                    logger.error(f"Could not compile flow file {path}: {e}")
+
+            flows = {}
+            for path in sorted(by_path):
+                flow = by_path[path]
+                if flow.name in flows:
+                    logger.error(f"Flow '{flow.name}' in {path} is already defined in {flows[flow.name].path}; ignoring it")
+                    continue
+                flows[flow.name] = flow
+
+            # Readers use the previous dicts until these are swapped in
+            self._index = KeywordIndex(list(flows.values()))
+            self._flows = flows
+            self._by_path = by_path
+            self._mtimes = mtimes
+            logger.info(f"Loaded {len(flows)} conversation flows from {self.directory}")
+            return True
+
+    def get(self, name: str) -> Flow | None:
+        self.reload()
+        return self._flows.get(name)
+
+    def names(self) -> List[str]:
+        self.reload()
+        return list(self._flows)
+
+    def candidates(self, text: str, limit: int) -> List[str]:
+        """Flow names whose keywords occur in text, best match first."""
+        self.reload()
+        return self._index.candidates(text, limit)
+
+# Singleton registry used by the assistant
+flow_registry = FlowRegistry(
+    settings.FLOWS_DIR or DEFAULT_FLOWS_DIR,
+    reload_interval_s=settings.FLOW_RELOAD_INTERVAL_S,
+)
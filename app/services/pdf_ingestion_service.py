@@ -0,0 +1,402 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Tuple
+
+import httpx
+import pytesseract
+from pdf2image import convert_from_path
+from PyPDF2 import PdfReader
+
+from app.config import settings
+from app.services.doc_ingestion_service import chunk_text, record_id, write_records
+from app.utils.chromadb_client import get_chroma_collection, embed_texts_array
+from app.utils.knowledge_base import mark_knowledge_base_changed
+from app.utils.metrics import registry, timed
+
+logger = logging.getLogger(__name__)
+
+# Bump when extraction changes, so cached page text is regenerated
+PDF_TEXT_VERSION = "1"
+# Pages with fewer characters than this in their text layer are treated as scanned
+MIN_TEXT_LAYER_CHARS = 20
+INDEX_FILE_NAME = "index.json"
+
+PDF_DOCUMENTS = registry.counter(
+    "bureasy_pdf_documents_total",
+    "Linked PDFs by outcome (downloaded, cached, duplicate, failed, too_large, indexed, unchanged).",
+    ["outcome"],
+)
+PDF_PAGES = registry.counter(
+    "bureasy_pdf_pages_total",
+    "PDF pages by text source (text_layer, ocr, empty).",
+    ["source"],
+)
+
+def normalize_pdf_url(url: str) -> str:
+    """Fragments never change the document, so they are dropped before deduplication."""
+    return url.split("#")[0].strip()
+
+def collect_pdf_links(pages: Iterable[dict]) -> Dict[str, List[str]]:
+    """Map every PDF URL found on the given scraped pages to the pages that link to it."""
+    parents: Dict[str, List[str]] = {}
+    for page in pages:
+        source_url = page.get("url", "")
+        for pdf_link in page.get("pdf_links", []) or []:
+            pdf_url = normalize_pdf_url(pdf_link)
+            if not pdf_url:
+                continue
+            linked_from = parents.setdefault(pdf_url, [])
+            if source_url and source_url not in linked_from:
+                linked_from.append(source_url)
+    return parents
+
+class PDFCache:
+    """
+    On-disk PDF cache. Files are stored once per content hash (blobs/<sha256>.pdf) with
+    their extracted page text next to them (text/<sha256>.json); index.json maps each
+    URL to its content hash and records what was last written to the vector store.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "text"), exist_ok=True)
+        self.index = {"urls": {}, "indexed": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index.update(json.load(f))
+
+    def blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", f"{content_hash}.pdf")
+
+    def text_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, "text", f"{content_hash}.json")
+
+    def hash_for(self, url: str) -> str | None:
+        with self._lock:
+            content_hash = self.index["urls"].get(url)
+        if content_hash and os.path.exists(self.blob_path(content_hash)):
+            return content_hash
+        return None
+
+    def store(self, url: str, content: bytes) -> Tuple[str, bool]:
+        """Store a downloaded file; returns (content hash, whether the content was new)."""
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(content_hash)
+        is_new = not os.path.exists(path)
+        if is_new:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self.index["urls"][url] = content_hash
+        return content_hash, is_new
+
+    def indexed_signature(self, content_hash: str) -> str | None:
+        with self._lock:
+            return self.index["indexed"].get(content_hash)
+
+    def mark_indexed(self, content_hash: str, signature: str):
+        with self._lock:
+            self.index["indexed"][content_hash] = signature
+
+    def unreferenced_indexed(self) -> List[str]:
+        """Indexed content hashes that no URL maps to any more (their file changed or went away)."""
+        with self._lock:
+            referenced = set(self.index["urls"].values())
+            return [content_hash for content_hash in self.index["indexed"] if content_hash not in referenced]
+
+    def forget_indexed(self, content_hash: str):
+        with self._lock:
+            self.index["indexed"].pop(content_hash, None)
+
+    def save(self):
+        """Write the index atomically so an interruption never leaves it half-written."""
+        with self._lock:
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+
+def download_pdfs(urls: Iterable[str], cache: PDFCache, workers: int | None = None, refresh: bool = False) -> Dict[str, str]:
+    """
+    Download PDFs concurrently into the cache and return {url: content hash} for every
+    URL that is available. URLs already in the cache are not fetched again unless
+    refresh is set; a URL that fails to download then keeps its cached file.
+    """
+    workers = workers or settings.PDF_DOWNLOAD_WORKERS
+    resolved, to_fetch = {}, []
+    for url in dict.fromkeys(normalize_pdf_url(u) for u in urls):
+        content_hash = None if refresh else cache.hash_for(url)
+        if content_hash:
+            resolved[url] = content_hash
+            PDF_DOCUMENTS.inc(outcome="cached")
+        elif url:
+            to_fetch.append(url)
+    if not to_fetch:
+        return resolved
+
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    with httpx.Client(timeout=settings.PDF_DOWNLOAD_TIMEOUT_S, follow_redirects=True, limits=limits) as client:
+        def fetch(url: str) -> bytes | None:
+            try:
+                with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    content = bytearray()
+                    for block in response.iter_bytes():
+                        content += block
+                        if len(content) > settings.PDF_MAX_BYTES:
+                            logger.warning(f"Skipping {url}: larger than {settings.PDF_MAX_BYTES} bytes")
+                            PDF_DOCUMENTS.inc(outcome="too_large")
+                            return None
+            except httpx.HTTPError as e:
+                logger.warning(f"Failed to download {url}: {e}")
+                PDF_DOCUMENTS.inc(outcome="failed")
+                return None
+            if not content.startswith(b"%PDF"):
+                logger.warning(f"Skipping {url}: not a PDF")
+                PDF_DOCUMENTS.inc(outcome="failed")
+                return None
+            return bytes(content)
+
+        with timed("pdf_download"), ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-download") as pool:
+            futures = {pool.submit(fetch, url): url for url in to_fetch}
+            for future in as_completed(futures):
+                content = future.result()
+                if content is None:
+                    cached_hash = cache.hash_for(futures[future])
+                    if cached_hash:
+                        resolved[futures[future]] = cached_hash
+                    continue
+                content_hash, is_new = cache.store(futures[future], content)
+                resolved[futures[future]] = content_hash
+                # The same file is often linked under several URLs; it is stored and indexed once
+                PDF_DOCUMENTS.inc(outcome="downloaded" if is_new else "duplicate")
+    cache.save()
+    return resolved
+
+def _ocr_page(pdf_path: str, page_number: int) -> str:
+    """OCR a single page (1-based); only used for pages without a text layer."""
+    try:
+        with timed("ocr"):
+            images = convert_from_path(pdf_path, dpi=settings.PDF_OCR_DPI, first_page=page_number, last_page=page_number)
+            return "\n".join(pytesseract.image_to_string(image) for image in images)
+    except Exception as e:
+        logger.error(f"OCR failed for page {page_number} of {pdf_path}: {e}")
+        return ""
+
+def extract_pdf_pages(pdf_path: str, cache_path: str | None = None) -> List[dict]:
+    """
+    Extract text per page as [{"page": n, "text": ..., "ocr": bool}]. The text layer is
+    used where it exists; only pages without one are rendered and OCR'd. The result is
+    cached next to the file, keyed by PDF_TEXT_VERSION.
+    """
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("version") == PDF_TEXT_VERSION:
+            return cached["pages"]
+
+    pages = []
+    with timed("pdf_parse"):
+        reader = PdfReader(pdf_path)
+        for page_number, page in enumerate(reader.pages, start=1):
+            try:
+                text = page.extract_text() or ""
+            except Exception as e:
+                logger.warning(f"Text extraction failed for page {page_number} of {pdf_path}: {e}")
+                text = ""
+            pages.append({"page": page_number, "text": text.strip(), "ocr": False})
+
+    for page in pages:
+        if len(page["text"]) >= MIN_TEXT_LAYER_CHARS:
+            PDF_PAGES.inc(source="text_layer")
+        elif settings.PDF_OCR_ENABLED:
+            page["text"] = _ocr_page(pdf_path, page["page"]).strip()
+            page["ocr"] = True
+            PDF_PAGES.inc(source="ocr" if page["text"] else "empty")
+        else:
+            PDF_PAGES.inc(source="empty")
+
+    if cache_path:
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": PDF_TEXT_VERSION, "pages": pages}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    return pages
+
+def build_pdf_records(content_hash: str, pdf_urls: List[str], parent_urls: List[str], pages: List[dict]) -> List[Tuple[str, str, str, dict]]:
+    """
+    Turn one PDF's pages into (id, document, text_to_embed, metadata) records. IDs
+    depend on the content hash, so a file linked under several URLs is stored once.
+    """
+    records = []
+    idx = 0
+    for page in pages:
+        for chunk in chunk_text(page["text"]):
+            records.append((record_id(content_hash, "pdf_content", idx), chunk, chunk, {
+                "type": "pdf_content",
+                "pdf_link": pdf_urls[0],
+                "pdf_links": json.dumps(pdf_urls),  # JSON string
+                "source_url": parent_urls[0] if parent_urls else pdf_urls[0],
+                "parent_urls": json.dumps(parent_urls),  # JSON string
+                "content_hash": content_hash,
+                "page": page["page"],
+                "ocr": page["ocr"],
+                "chunk_index": idx,
+            }))
+            idx += 1
+    return records
+
+def remove_unreferenced_pdfs(cache: PDFCache, collection) -> int:
+    """
+    Delete the records of indexed files that no URL maps to any more, e.g. the old
+    version of a PDF whose content changed. Returns the number of files removed.
+    """
+    removed = cache.unreferenced_indexed()
+    for content_hash in removed:
+        collection.delete(where={"content_hash": content_hash})
+        cache.forget_indexed(content_hash)
+    if removed:
+        cache.save()
+        logger.info(f"Removed the records of {len(removed)} PDFs no longer linked under any URL.")
+    return len(removed)
+
+def ingest_pdfs(
+    pdf_parents: Dict[str, List[str]],
+    collection_name: str = "knowledge_base",
+    batch_size: int = 256,
+    workers: int | None = None,
+    cache_dir: str | None = None,
+    refresh: bool = False,
+) -> Dict[str, int]:
+    """
+    Download, extract, chunk and embed linked PDFs ({pdf url: [parent page urls]}).
+    Text extraction (and OCR) runs on a thread pool; chunks are embedded and written in
+    batches. A file whose content and linking pages are unchanged since it was last
+    indexed is skipped. With refresh, cached URLs are downloaded again; when a URL's
+    content changed, the records of the old content are removed once no URL links to it.
+    """
+    cache = PDFCache(cache_dir or settings.PDF_CACHE_DIR)
+    workers = workers or settings.PDF_DOWNLOAD_WORKERS
+    stats = {"pdfs": len(pdf_parents), "documents": 0, "records": 0, "unchanged": 0, "failed": 0, "removed": 0}
+    hashes = download_pdfs(pdf_parents, cache, workers=workers, refresh=refresh)
+    stats["failed"] = len(pdf_parents) - len(hashes)
+
+    # Group URLs by content so each file is extracted and embedded once
+    documents: Dict[str, Tuple[List[str], List[str]]] = {}
+    for url, content_hash in sorted(hashes.items()):
+        urls, parents = documents.setdefault(content_hash, ([], []))
+        urls.append(url)
+        parents.extend(p for p in pdf_parents.get(url, []) if p not in parents)
+
+    pending = {}
+    for content_hash, (urls, parents) in documents.items():
+        signature = hashlib.sha1(json.dumps([PDF_TEXT_VERSION, sorted(urls), sorted(parents)]).encode("utf-8")).hexdigest()
+        if cache.indexed_signature(content_hash) == signature:
+            stats["unchanged"] += 1
+            PDF_DOCUMENTS.inc(outcome="unchanged")
+            continue
+        pending[content_hash] = signature
+    collection = get_chroma_collection(collection_name)
+    if not pending:
+        stats["removed"] = remove_unreferenced_pdfs(cache, collection)
+        if stats["removed"]:
+            mark_knowledge_base_changed()
+        return stats
+
+    def extract(content_hash: str):
+        try:
+            return content_hash, extract_pdf_pages(cache.blob_path(content_hash), cache.text_path(content_hash))
+        except Exception as e:
+            logger.error(f"Failed to extract {documents[content_hash][0][0]}: {e}")
+            return content_hash, None
+
+    batch_records, batch_hashes = [], []
+
+    def flush():
+        if batch_records:
+            embeddings = embed_texts_array([record[2] for record in batch_records])
+            write_records(collection, batch_records, embeddings=embeddings)
+        for content_hash in batch_hashes:
+            cache.mark_indexed(content_hash, pending[content_hash])
+        cache.save()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-extract") as pool:
+        for content_hash, pages in pool.map(extract, pending):
+            if pages is None:
+                stats["failed"] += 1
+                continue
+            urls, parents = documents[content_hash]
+            records = build_pdf_records(content_hash, urls, parents, pages)
+            batch_records.extend(records)
+            batch_hashes.append(content_hash)
+            stats["documents"] += 1
+            stats["records"] += len(records)
+            PDF_DOCUMENTS.inc(outcome="indexed")
+            if len(batch_records) >= batch_size:
+                flush()
+                batch_records, batch_hashes = [], []
+    flush()
+    # After the new content is written, so the documents are never missing in between
+    stats["removed"] = remove_unreferenced_pdfs(cache, collection)
+    if stats["records"] or stats["removed"]:
+        mark_knowledge_base_changed()
+
+    logger.info(f"Indexed {stats['records']} chunks from {stats['documents']} PDFs ({stats['unchanged']} unchanged, {stats['failed']} failed).")
+    return stats
+
+class PDFIngestionQueue:
+    """
+    Indexes the PDFs of uploaded pages on a background thread, so an upload does not
+    wait for their downloads, extraction and OCR. PDFs submitted while a run is in
+    progress are merged and indexed by the next run.
+    """
+    def __init__(self):
+        self._pending: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._worker = None
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def submit(self, pdf_parents: Dict[str, List[str]]):
+        if not pdf_parents:
+            return
+        with self._lock:
+            for url, parents in pdf_parents.items():
+                known = self._pending.setdefault(url, [])
+                known.extend(p for p in parents if p not in known)
+            self._idle.clear()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="pdf-ingestion", daemon=True)
+                self._worker.start()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until every submitted PDF has been processed. Returns False if the timeout passed first."""
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    self._idle.set()
+                    return
+                pdf_parents, self._pending = self._pending, {}
+            try:
+                ingest_pdfs(pdf_parents)
+            except Exception as e:
+                logger.exception(f"Background ingestion of {len(pdf_parents)} linked PDFs failed: {e}")
+
+# Singleton queue for the PDFs of pages uploaded through /ingest-data
+pdf_ingestion_queue = PDFIngestionQueue()
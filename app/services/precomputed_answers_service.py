@@ -0,0 +1,564 @@
+# app/services/precomputed_answers_service.py
+
+import json
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert
+
+from app.config import settings
+from app.models.conversation import utcnow
+from app.models.database import SessionLocal, engine
+from app.models.query_log import PrecomputedAnswer, QueryLog
+from app.services.ask_human_service import ask_human_phone
+from app.services.checklist_generation_service import (
+    CHECKLIST_MAX_TOKENS,
+    build_checklist_prompt,
+    generate_checklist,
+    send_checklist_to_ai_model,
+)
+from app.utils.chromadb_client import embed_text
+from app.utils.knowledge_base import knowledge_base_version
+from app.utils.llm_gateway import Priority, estimate_prompt_tokens
+from app.utils.metrics import registry, timed
+from app.utils.single_flight import hash_key, normalize_key
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; runs are then not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("checklist", "ask_human")
+
+PRECOMPUTED_LOOKUPS = registry.counter(
+    "bureasy_precomputed_lookups_total",
+    "Queries answered from precomputed answers (exact or similar match) or computed live (miss, or "
+    "changed_context: a similar query's answer was not served because the retrieved context differs).",
+    ["kind", "outcome"],
+)
+PRECOMPUTED_CLUSTERS = registry.counter(
+    "bureasy_precomputed_clusters_total",
+    "Query clusters handled by the precompute job, by outcome (computed, reused, over_budget, failed).",
+    ["kind", "outcome"],
+)
+QUERY_LOG_WRITES = registry.counter(
+    "bureasy_query_log_writes_total",
+    "Logged queries by outcome (ok, dropped, error).",
+    ["outcome"],
+)
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class QueryLogger:
+    """
+    Records /assistant queries with their embeddings for the precompute job. Rows are
+    queued and inserted by a background thread, one transaction per batch_ms, so
+    logging adds no database time to requests. When the queue is full, queries are dropped.
+    """
+    def __init__(self, enabled: bool, batch_ms: float = 200.0, max_queued: int = 10000):
+        self.enabled = enabled
+        self.batch_s = batch_ms / 1000.0
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queued)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def record(self, kind: str, query: str, embedding) -> bool:
+        if not self.enabled or not query.strip():
+            return False
+        row = {
+            "kind": kind,
+            "query": query,
+            "normalized": normalize_key(query),
+            "embedding": np.asarray(embedding, dtype=np.float16).tobytes() if embedding is not None else None,
+            "created_at": utcnow(),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            QUERY_LOG_WRITES.inc(outcome="dropped")
+            return False
+        self._ensure_writer()
+        return True
+
+    def flush(self, timeout: float | None = None):
+        """Block until every queued query has been written."""
+        if self._writer is None:
+            return
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        done.wait(timeout)
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="query-log-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                deadline = time.monotonic() + self.batch_s
+                while (remaining := deadline - time.monotonic()) > 0:
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                with engine.begin() as conn:
+                    conn.execute(insert(QueryLog.__table__), batch)
+                QUERY_LOG_WRITES.inc(len(batch), outcome="ok")
+            except Exception as e:
+                QUERY_LOG_WRITES.inc(len(batch), outcome="error")
+                logger.exception(f"Failed to write {len(batch)} query log rows: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+def cluster_queries(rows: List[Tuple[str, str, np.ndarray]], similarity: float, max_members: int = 20) -> List[dict]:
+    """
+    Cluster logged (query, normalized, embedding) rows, oldest first. Identical normalized
+    queries are counted together, then, most frequent first, every query joins the
+    cluster whose leading query it is most similar to (cosine >= similarity) or leads a
+    new one. Clusters are anchored on their most frequent query rather than a running
+    mean, so one-off questions cannot drift into a broad cluster that matches anything.
+    Returns clusters, largest first, as dicts with the leading query (in its latest
+    spelling) and its unit-length embedding, the normalized forms of up to max_members
+    queries and the query count.
+    """
+    groups: Dict[str, list] = {}
+    for query, normalized, vector in rows:
+        group = groups.get(normalized)
+        if group is None:
+            groups[normalized] = [query, 1, vector]
+        else:
+            group[0] = query
+            group[1] += 1
+    if not groups:
+        return []
+
+    ordered = sorted(groups.items(), key=lambda item: (-item[1][1], item[0]))
+    vectors = _unit(np.stack([group[2] for _, group in ordered]).astype(np.float32))
+    leaders = np.zeros_like(vectors)
+    clusters = []
+    for idx, (normalized, (query, count, _)) in enumerate(ordered):
+        if clusters:
+            similarities = leaders[:len(clusters)] @ vectors[idx]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= similarity:
+                cluster = clusters[best]
+                cluster["count"] += count
+                if len(cluster["normalized_queries"]) < max_members:
+                    cluster["normalized_queries"].append(normalized)
+                continue
+        leaders[len(clusters)] = vectors[idx]
+        clusters.append({"query": query, "embedding": vectors[idx], "normalized_queries": [normalized], "count": count})
+    return sorted(clusters, key=lambda cluster: -cluster["count"])
+
+class OverBudget(Exception):
+    """The precompute run's LLM budget cannot cover another answer."""
+
+class LLMBudget:
+    """Estimated LLM tokens a precompute run may spend; <= 0 means no cap."""
+    def __init__(self, tokens: int):
+        self.remaining = tokens
+        self.unlimited = tokens <= 0
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def take(self, tokens: int):
+        with self._lock:
+            if not self.unlimited and tokens > self.remaining:
+                raise OverBudget(f"{tokens} tokens needed, {self.remaining} left")
+            self.remaining -= tokens
+            self.spent += tokens
+
+def compute_checklist_answer(query: str, checklist: dict, budget: LLMBudget) -> Any:
+    """What /assistant/generate-checklist returns as ai_response, generated at background priority."""
+    prompt = build_checklist_prompt(query, checklist)
+    budget.take(estimate_prompt_tokens([{"role": "system", "content": prompt}]) + CHECKLIST_MAX_TOKENS)
+    return send_checklist_to_ai_model(query, checklist, priority=Priority.BACKGROUND)
+
+def compute_phone_answer(query: str, phone: str, budget: LLMBudget) -> Any:
+    """What /assistant/ask-human returns as phone: the retrieved number itself (no LLM call)."""
+    return phone
+
+# Retrieval for a query: cheap, and run for every cluster to tell whether its answer is still current
+CONTEXT_FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "checklist": generate_checklist,
+    "ask_human": ask_human_phone,
+}
+
+def context_fingerprint(kind: str, context: Any) -> str:
+    """Digest of the context retrieved for a query, without the query itself (checklists repeat it)."""
+    if isinstance(context, dict):
+        context = {key: value for key, value in context.items() if key != "query"}
+    return hash_key(kind, context)
+ANSWER_FUNCTIONS: Dict[str, Callable[[str, Any, LLMBudget], Any]] = {
+    "checklist": compute_checklist_answer,
+    "ask_human": compute_phone_answer,
+}
+
+def _load_logged_queries(db, kind: str, since) -> List[Tuple[str, str, np.ndarray]]:
+    logged = db.query(QueryLog.query, QueryLog.normalized, QueryLog.embedding).filter(
+        QueryLog.kind == kind,
+        QueryLog.created_at >= since,
+        QueryLog.embedding.isnot(None),
+    ).order_by(QueryLog.id.desc()).limit(settings.PRECOMPUTE_MAX_LOG_ROWS).all()
+    rows = [(query, normalized, np.frombuffer(embedding, dtype=np.float16)) for query, normalized, embedding in reversed(logged)]
+    # After an embedding model change only the queries embedded with the current model are comparable
+    if rows:
+        dimension = len(rows[-1][2])
+        rows = [row for row in rows if len(row[2]) == dimension]
+    return rows
+
+def refresh_precomputed_answers(
+    kinds=KINDS,
+    budget_tokens: int | None = None,
+    workers: int | None = None,
+    answer_functions: Dict[str, Callable[[str, Any, LLMBudget], Any]] | None = None,
+    context_functions: Dict[str, Callable[[str], Any]] | None = None,
+) -> Dict[str, dict]:
+    """
+    Cluster each kind's recent queries and replace its precomputed answers with answers
+    for the largest clusters, computed in parallel within the run's LLM budget (largest
+    clusters are submitted first). The context of every cluster's query is retrieved
+    again; answers previously computed for the same query and context are reused
+    without an LLM call, whatever changed elsewhere in the knowledge base. Clusters that
+    could not be computed are simply answered live. Returns stats per kind.
+    """
+    budget = LLMBudget(settings.PRECOMPUTE_LLM_TOKEN_BUDGET if budget_tokens is None else budget_tokens)
+    workers = workers or settings.PRECOMPUTE_WORKERS
+    answer_functions = answer_functions or ANSWER_FUNCTIONS
+    context_functions = context_functions or CONTEXT_FUNCTIONS
+    kb_version, _ = knowledge_base_version()
+    since = utcnow() - timedelta(days=settings.PRECOMPUTE_WINDOW_DAYS)
+    results = {}
+
+    with SessionLocal() as db:
+        for kind in kinds:
+            with timed("precompute_cluster"):
+                clusters = cluster_queries(_load_logged_queries(db, kind, since), settings.PRECOMPUTE_CLUSTER_SIMILARITY)
+            selected = [cluster for cluster in clusters if cluster["count"] >= settings.PRECOMPUTE_MIN_QUERIES]
+            selected = selected[:settings.PRECOMPUTE_TOP_CLUSTERS]
+            previous = {
+                normalize_key(query): (answer, compute_seconds, context_hash)
+                for query, answer, compute_seconds, context_hash in db.query(
+                    PrecomputedAnswer.query, PrecomputedAnswer.answer, PrecomputedAnswer.compute_seconds,
+                    PrecomputedAnswer.context_hash,
+                ).filter(PrecomputedAnswer.kind == kind)
+            }
+            # End the read transaction: on SQLite it would block the query log writer while answers are computed
+            db.commit()
+            stats ={"clusters": len(clusters), "selected": len(selected), "computed": 0, "reused": 0, "over_budget": 0, "failed": 0}
+
+            def compute(cluster: dict):
+                """(answer, compute seconds, context hash, reused)"""
+                context = context_functions[kind](cluster["query"])
+                context_hash = context_fingerprint(kind, context)
+                reused = previous.get(normalize_key(cluster["query"]))
+                if reused is not None and reused[2] == context_hash:
+                    return (*reused, True)
+                started = time.perf_counter()
+                answer = answer_functions[kind](cluster["query"], context, budget)
+                return answer, time.perf_counter() - started, context_hash, False
+
+            answers = {}
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="precompute") as pool:
+                futures = {position: pool.submit(compute, cluster) for position, cluster in enumerate(selected)}
+                for position, future in futures.items():
+                    try:
+                        answer, compute_seconds, context_hash, reused = future.result()
+                        answers[position] = (answer, compute_seconds, context_hash)
+                        stats["reused" if reused else "computed"] += 1
+                    except OverBudget:
+                        stats["over_budget"] += 1
+                    except Exception as e:
+                        stats["failed"] += 1
+                        logger.warning(f"Could not precompute the {kind} answer for {selected[position]['query']!r}: {e}")
+
+            rows = []
+            for position, (answer, compute_seconds, context_hash) in sorted(answers.items()):
+                cluster = selected[position]
+                rows.append(PrecomputedAnswer(
+                    kind=kind,
+                    kb_version=kb_version,
+                    context_hash=context_hash,
+                    query=cluster["query"],
+                    normalized_queries=cluster["normalized_queries"],
+                    embedding=cluster["embedding"].astype(np.float32).tobytes(),
+                    query_count=cluster["count"],
+                    answer=answer,
+                    compute_seconds=compute_seconds,
+                ))
+            # All of a kind's answers are replaced in one transaction
+            db.query(PrecomputedAnswer).filter(PrecomputedAnswer.kind == kind).delete(synchronize_session=False)
+            db.add_all(rows)
+            db.commit()
+
+            for outcome in ("computed", "reused", "over_budget", "failed"):
+                if stats[outcome]:
+                    PRECOMPUTED_CLUSTERS.inc(stats[outcome], kind=kind, outcome=outcome)
+            stats["answers"] = len(rows)
+            stats["covered_queries"] = sum(row.query_count for row in rows)
+            stats["logged_queries"] = sum(cluster["count"] for cluster in clusters)
+            results[kind] = stats
+            logger.info(
+                f"Precomputed {kind} answers: {len(rows)} of {len(clusters)} clusters "
+                f"({stats['computed']} computed, {stats['reused']} reused, {stats['over_budget']} over budget, "
+                f"{stats['failed']} failed), covering {stats['covered_queries']} of {stats['logged_queries']} recent queries"
+            )
+
+        retention_cutoff = utcnow() - timedelta(days=settings.QUERY_LOG_RETENTION_DAYS)
+        db.query(QueryLog).filter(QueryLog.created_at < retention_cutoff).delete(synchronize_session=False)
+        db.commit()
+
+    results["llm_tokens"] = {"spent": budget.spent, "budget": 0 if budget.unlimited else budget.spent + budget.remaining}
+    return results
+
+class PrecomputedAnswerStore:
+    """
+    Serves precomputed answers from memory: a query is answered if its normalized form is
+    a cluster's leading query. A query that only resembles one (another of the cluster's
+    queries, or an embedding within match_similarity cosine of the leading query's) gets
+    the answer only if the context retrieved for it is the one the answer was computed
+    from: queries that differ in one word ("student" or "work" visa) can be close in
+    embedding space but need different answers. The table is re-read, at most every
+    reload_interval_s, when its rows changed. After re-ingestion the current answers keep
+    being served until the precompute job has replaced them (stale-while-revalidate).
+    """
+    def __init__(self, enabled: bool, match_similarity: float, reload_interval_s: float):
+        self.enabled = enabled
+        self.match_similarity = match_similarity
+        self.reload_interval_s = reload_interval_s
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._signature = None
+        self._kb_version = None
+        self._exact: Dict[str, Dict[str, int]] = {}
+        self._members: Dict[str, Dict[str, int]] = {}
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._answers: Dict[str, list] = {}
+        self._context_hashes: Dict[str, list] = {}
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.reload_interval_s:
+                return
+            self._checked_at = now
+        with SessionLocal() as db:
+            # SQLite reuses the ids of deleted rows, so a refresh is told apart by its rows' creation time
+            signature = tuple(db.query(
+                func.count(PrecomputedAnswer.id), func.max(PrecomputedAnswer.id), func.max(PrecomputedAnswer.created_at),
+            ).one())
+            if signature == self._signature:
+                return
+            rows = db.query(PrecomputedAnswer).order_by(PrecomputedAnswer.id.asc()).all()
+
+        exact, members, embeddings, answers, context_hashes = {}, {}, {}, {}, {}
+        for row in rows:
+            position = len(answers.setdefault(row.kind, []))
+            answers[row.kind].append(row.answer)
+            context_hashes.setdefault(row.kind, []).append(row.context_hash)
+            embeddings.setdefault(row.kind, []).append(np.frombuffer(row.embedding, dtype=np.float32))
+            exact.setdefault(row.kind, {}).setdefault(normalize_key(row.query), position)
+            for normalized in row.normalized_queries or []:
+                members.setdefault(row.kind, {}).setdefault(normalized, position)
+        with self._lock:
+            self._exact = exact
+            self._members = members
+            self._embeddings = {kind: np.stack(vectors) for kind, vectors in embeddings.items()}
+            self._answers = answers
+            self._context_hashes = context_hashes
+            self._signature = signature
+            self._kb_version = rows[-1].kb_version if rows else None
+        logger.info(f"Loaded {len(rows)} precomputed answers for knowledge base version {self._kb_version or '(initial)'}")
+
+    def lookup(self, kind: str, query: str, embedding, context: Callable[[], Any] | None = None) -> Any | None:
+        """
+        The precomputed answer for the query, or None. context() retrieves the query's
+        context; it is only called for a similar match, and without it similar matches
+        are not served.
+        """
+        if not self.enabled:
+            return None
+        try:
+            self._maybe_reload()
+        except Exception as e:
+            logger.warning(f"Could not load precomputed answers: {e}")
+        with self._lock:
+            exact, members = self._exact.get(kind, {}), self._members.get(kind, {})
+            embeddings, answers, context_hashes = self._embeddings.get(kind), self._answers.get(kind, []), self._context_hashes.get(kind, [])
+
+        normalized = normalize_key(query)
+        position = exact.get(normalized)
+        if position is not None:
+            PRECOMPUTED_LOOKUPS.inc(kind=kind, outcome="exact")
+            return answers[position]
+
+        position = members.get(normalized)
+        if position is None and embeddings is not None and embedding is not None:
+            vector = _unit(np.asarray(embedding, dtype=np.float32))
+            if vector.shape[0] == embeddings.shape[1]:
+                similarities = embeddings @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.match_similarity:
+                    position = best
+        if position is None or context is None or context_hashes[position] is None:
+            PRECOMPUTED_LOOKUPS.inc(kind=kind, outcome="miss")
+            return None
+        if context_fingerprint(kind, context()) != context_hashes[position]:
+            PRECOMPUTED_LOOKUPS.inc(kind=kind, outcome="changed_context")
+            return None
+        PRECOMPUTED_LOOKUPS.inc(kind=kind, outcome="similar")
+        return answers[position]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "kb_version": self._kb_version,
+                **{f"{kind}_answers": len(self._answers.get(kind, [])) for kind in KINDS},
+            }
+
+class PrecomputeWorker:
+    """
+    Background thread that refreshes the precomputed answers every interval_s, and after
+    re-ingestion: once the knowledge base version changed and then stayed the same for
+    settle_s (uploads often come in a series). The time and knowledge base version of the
+    last run are kept in the lock file, so every API worker process shares one schedule:
+    a process checks them again once it holds the lock and skips the run if another
+    process has just done it. Without fcntl (Windows) there is no lock, and the job only
+    runs in the process started with designated=True.
+    """
+    def __init__(self, interval_s: float, check_interval_s: float, settle_s: float, lock_path: str, designated: bool = False):
+        self.interval_s = interval_s
+        self.check_interval_s = check_interval_s
+        self.settle_s = settle_s
+        self.lock_path = lock_path
+        self.designated = designated
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _parse_state(text: str) -> dict:
+        try:
+            state = json.loads(text) if text else {}
+        except json.JSONDecodeError:
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def last_run(self) -> dict:
+        """{"last_run_at": epoch seconds, "kb_version": ...} of the last run by any process, or {}."""
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                return self._parse_state(f.read())
+        except FileNotFoundError:
+            return {}
+
+    def due(self, state: dict | None = None) -> bool:
+        state = self.last_run() if state is None else state
+        last_run_at = state.get("last_run_at")
+        if last_run_at is None:
+            return True
+        kb_version, changed_at = knowledge_base_version()
+        if kb_version != state.get("kb_version") and time.time() - changed_at >= self.settle_s:
+            return True
+        return time.time() - last_run_at >= self.interval_s
+
+    def run_once(self, force: bool = False) -> Dict[str, dict] | None:
+        """Refresh if due (or with force). Returns None if the run was skipped."""
+        with open(self.lock_path, "a+", encoding="utf-8") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info("Precomputed answers are being refreshed by another process")
+                    return None
+            lock_file.seek(0)
+            state = self._parse_state(lock_file.read())
+            if not force and not self.due(state):
+                return None
+
+            kb_version, _ = knowledge_base_version()
+            try:
+                with timed("precompute"):
+                    return refresh_precomputed_answers()
+            finally:
+                # A failed run is recorded too, so the processes do not retry it back to back
+                lock_file.seek(0)
+                lock_file.truncate()
+                lock_file.write(json.dumps({"last_run_at": time.time(), "kb_version": kb_version}))
+                lock_file.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.due():
+                    self.run_once()
+            except Exception as e:
+                logger.exception(f"Refreshing precomputed answers failed: {e}")
+            self._stop.wait(self.check_interval_s)
+
+    def start(self):
+        if fcntl is None and not self.designated:
+            logger.warning(
+                "Precomputed answers are not refreshed by this process: without file locks only the process "
+                "with PRECOMPUTE_DESIGNATED_PROCESS set runs the job (or run python -m app.precompute_answers)"
+            )
+            return
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="precompute-answers", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+# Singletons shared by the API
+query_logger = QueryLogger(settings.QUERY_LOG_ENABLED)
+precomputed_answers = PrecomputedAnswerStore(
+    enabled=settings.PRECOMPUTE_ENABLED,
+    match_similarity=settings.PRECOMPUTE_MATCH_SIMILARITY,
+    reload_interval_s=settings.PRECOMPUTE_RELOAD_INTERVAL_S,
+)
+precompute_worker = PrecomputeWorker(
+    interval_s=settings.PRECOMPUTE_INTERVAL_S,
+    check_interval_s=settings.PRECOMPUTE_CHECK_INTERVAL_S,
+    settle_s=settings.PRECOMPUTE_KB_SETTLE_S,
+    lock_path=f"{settings.KB_VERSION_FILE}.precompute.lock",
+    designated=settings.PRECOMPUTE_DESIGNATED_PROCESS,
+)
+
+def lookup_answer(kind: str, query: str) -> Tuple[Any | None, List[float] | None, Any | None]:
+    """
+    Log an /assistant query and return (precomputed answer or None, query embedding, retrieved
+    context or None), so a miss can be computed live without embedding the query or
+    retrieving its context (if a similar match needed it) again.
+    """
+    if not query.strip():
+        return None, None, None
+    embedding = embed_text(query)
+    query_logger.record(kind, query, embedding)
+    retrieved = []
+
+    def context():
+        if not retrieved:
+            retrieved.append(CONTEXT_FUNCTIONS[kind](query, query_embedding=embedding))
+        return retrieved[0]
+
+    answer = precomputed_answers.lookup(kind, query, embedding, context=context)
+    return answer, embedding, retrieved[0] if retrieved else None
@@ -0,0 +1,303 @@
+# app/services/slot_filling_service.py
+
+import re
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from app.config import settings
+from app.services.flow_engine import Flow, Question
+from app.utils.llm_client import complete_chat
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SLOTS_FILLED = registry.counter(
+    "bureasy_slots_filled_total",
+    "Flow answers filled, by source (extractor, llm, direct answer to the current question).",
+    ["source"],
+)
+
+# Matched span in the message, used to tell what part of a message is still unexplained
+Span = Tuple[int, int]
+
+NATIONALITIES = {
+    "afghan": "Afghan", "albanian": "Albanian", "algerian": "Algerian", "american": "American",
+    "argentinian": "Argentinian", "australian": "Australian", "austrian": "Austrian",
+    "bangladeshi": "Bangladeshi", "belgian": "Belgian", "bosnian": "Bosnian", "brazilian": "Brazilian",
+    "british": "British", "bulgarian": "Bulgarian", "canadian": "Canadian", "chilean": "Chilean",
+    "chinese": "Chinese", "colombian": "Colombian", "croatian": "Croatian", "czech": "Czech",
+    "danish": "Danish", "dutch": "Dutch", "egyptian": "Egyptian", "eritrean": "Eritrean",
+    "ethiopian": "Ethiopian", "filipino": "Filipino", "finnish": "Finnish", "french": "French",
+    "georgian": "Georgian", "german": "German", "ghanaian": "Ghanaian", "greek": "Greek",
+    "hungarian": "Hungarian", "indian": "Indian", "indonesian": "Indonesian", "iranian": "Iranian",
+    "iraqi": "Iraqi", "irish": "Irish", "israeli": "Israeli", "italian": "Italian",
+    "japanese": "Japanese", "jordanian": "Jordanian", "kenyan": "Kenyan", "korean": "Korean",
+    "kosovar": "Kosovar", "lebanese": "Lebanese", "mexican": "Mexican", "moroccan": "Moroccan",
+    "nepalese": "Nepalese", "nigerian": "Nigerian", "norwegian": "Norwegian", "pakistani": "Pakistani",
+    "peruvian": "Peruvian", "polish": "Polish", "portuguese": "Portuguese", "romanian": "Romanian",
+    "russian": "Russian", "serbian": "Serbian", "slovak": "Slovak", "slovenian": "Slovenian",
+    "spanish": "Spanish", "sri lankan": "Sri Lankan", "swedish": "Swedish", "swiss": "Swiss",
+    "syrian": "Syrian", "thai": "Thai", "tunisian": "Tunisian", "turkish": "Turkish",
+    "ukrainian": "Ukrainian", "venezuelan": "Venezuelan", "vietnamese": "Vietnamese",
+}
+COUNTRIES = {
+    "afghanistan": "Afghan", "albania": "Albanian", "algeria": "Algerian", "argentina": "Argentinian",
+    "australia": "Australian", "austria": "Austrian", "bangladesh": "Bangladeshi", "belgium": "Belgian",
+    "bosnia": "Bosnian", "brazil": "Brazilian", "bulgaria": "Bulgarian", "canada": "Canadian",
+    "chile": "Chilean", "china": "Chinese", "colombia": "Colombian", "croatia": "Croatian",
+    "czechia": "Czech", "denmark": "Danish", "egypt": "Egyptian", "eritrea": "Eritrean",
+    "ethiopia": "Ethiopian", "finland": "Finnish", "france": "French", "georgia": "Georgian",
+    "germany": "German", "ghana": "Ghanaian", "greece": "Greek", "hungary": "Hungarian",
+    "india": "Indian", "indonesia": "Indonesian", "iran": "Iranian", "iraq": "Iraqi",
+    "ireland": "Irish", "israel": "Israeli", "italy": "Italian", "japan": "Japanese",
+    "jordan": "Jordanian", "kenya": "Kenyan", "korea": "Korean", "kosovo": "Kosovar",
+    "lebanon": "Lebanese", "mexico": "Mexican", "morocco": "Moroccan", "nepal": "Nepalese",
+    "netherlands": "Dutch", "nigeria": "Nigerian", "norway": "Norwegian", "pakistan": "Pakistani",
+    "peru": "Peruvian", "philippines": "Filipino", "poland": "Polish", "portugal": "Portuguese",
+    "romania": "Romanian", "russia": "Russian", "serbia": "Serbian", "slovakia": "Slovak",
+    "slovenia": "Slovenian", "spain": "Spanish", "sri lanka": "Sri Lankan", "sweden": "Swedish",
+    "switzerland": "Swiss", "syria": "Syrian", "thailand": "Thai", "tunisia": "Tunisian",
+    "turkey": "Turkish", "türkiye": "Turkish", "uk": "British", "united kingdom": "British",
+    "ukraine": "Ukrainian", "usa": "American", "united states": "American", "venezuela": "Venezuelan",
+    "vietnam": "Vietnamese",
+}
+
+NATIONALITY_RE = re.compile(r"\b(" + "|".join(sorted(map(re.escape, NATIONALITIES), key=len, reverse=True)) + r")\b", re.I)
+COUNTRY_RE = re.compile(r"\b(?:from|citizen of|nationality:?)\s+(?:the\s+)?(" + "|".join(sorted(map(re.escape, COUNTRIES), key=len, reverse=True)) + r")\b", re.I)
+DATE_RE = re.compile(r"\b(\d{1,2})[./-](\d{1,2})[./-](\d{4})\b|\b(\d{4})-(\d{2})-(\d{2})\b")
+NAME_RE = re.compile(r"(?i:my name is|i am|i'm|name:?)\s+((?:[A-ZÄÖÜ][a-zäöüß'\-]+)(?:\s+[A-ZÄÖÜ][a-zäöüß'\-]+){1,3})")
+BARE_NAME_RE = re.compile(r"^\s*((?:[A-ZÄÖÜ][a-zäöüß'\-]+)(?:\s+[A-ZÄÖÜ][a-zäöüß'\-]+){1,3})\s*\.?\s*$")
+ADDRESS_RE = re.compile(
+    r"([A-ZÄÖÜ][\wäöüß.\-]*(?:\s+[A-ZÄÖÜ][\wäöüß.\-]*){0,3}?"
+    r"(?i:straße|strasse|str\.|weg|platz|allee|gasse|ring|damm|street|road)\s*\d+\s?[a-zA-Z]?\b)"
+    r"(?:\s*,?\s*(\d{5}))?(?:\s*,?\s*(München|Muenchen|Munich))?"
+)
+PERMIT_RE = re.compile(
+    r"\b(student visa|work visa|job seeker visa|(?:eu )?blue card|national visa|family reunion visa|"
+    r"settlement permit|residence permit(?: for (?:study|studies|employment|work|family reasons|research))?)\b",
+    re.I,
+)
+REASON_RE = re.compile(r"\b(?:because(?: of)?|due to|the reason is|in order to|so that)\s+([^.;!?]{4,})", re.I)
+OCCUPATION_RE = re.compile(
+    r"\b(?:(employed|working|work|job)\s+(at|for|with|in)|(stud(?:y|ying)|student|enrolled)\s+(at|in))\s+"
+    r"((?:the\s+)?[A-ZÄÖÜ0-9][\wäöüß&.\-]*(?:\s+[A-ZÄÖÜ0-9][\wäöüß&.\-]*){0,4})"
+)
+# After "in" or "with" the name must look like an organisation: "I work in Munich" is a place
+ORGANISATION_RE = re.compile(
+    r"\b(GmbH|AG|SE|KG|Inc|Ltd|LLC|Company|Group|Bank|Hospital|Klinikum|Clinic|University|Universität|"
+    r"Hochschule|College|School|Academy|Akademie|Institute|Institut|Agency|Ministry|TUM|LMU)\b"
+)
+OFFICE_RE = re.compile(r"\b(KVR|Kreisverwaltungsreferat|Ausländerbehörde|Auslaenderbehoerde|Foreigners Office)\b([^,.;!?]{0,40})", re.I)
+YES_RE = re.compile(r"^\s*(yes|yeah|yep|ja|sure|of course|i do|i have)\b", re.I)
+NO_RE = re.compile(r"^\s*(no|nope|nein|not yet|i don't|i do not|i haven't|i have not)\b", re.I)
+NEGATION_RE = re.compile(r"\b(no|not|don't|do not|haven't|have not|without|lack)\b[\w\s]{0,20}$", re.I)
+FILLER_WORDS = {
+    "i", "im", "am", "my", "me", "and", "the", "a", "an", "is", "at", "in", "on", "of", "to", "for", "from",
+    "born", "living", "live", "name", "hi", "hello", "yes", "no", "also", "with", "it", "its", "this",
+}
+
+def _extract_date(message: str, question: Question):
+    match = DATE_RE.search(message)
+    if not match:
+        return None
+    if match.group(1):
+        day, month, year = match.group(1), match.group(2), match.group(3)
+    else:
+        year, month, day = match.group(4), match.group(5), match.group(6)
+    try:
+        value = datetime(int(year), int(month), int(day)).strftime("%d/%m/%Y")
+    except ValueError:
+        return None
+    return value, [match.span()]
+
+def _extract_nationality(message: str, question: Question):
+    match = COUNTRY_RE.search(message)
+    if match:
+        return COUNTRIES[match.group(1).lower()], [match.span()]
+    match = NATIONALITY_RE.search(message)
+    if match:
+        return NATIONALITIES[match.group(1).lower()], [match.span()]
+    return None
+
+def _extract_name(message: str, question: Question):
+    match = NAME_RE.search(message) or BARE_NAME_RE.search(message)
+    if not match:
+        return None
+    name = match.group(1)
+    # "I'm Italian" or "I am Student" are not names
+    if NATIONALITY_RE.fullmatch(name.split()[0]) or PERMIT_RE.search(name):
+        return None
+    return name, [match.span()]
+
+def _extract_address(message: str, question: Question):
+    match = ADDRESS_RE.search(message)
+    if not match:
+        return None
+    street, postal_code, city = match.group(1).strip(), match.group(2), match.group(3)
+    return ", ".join(part for part in (street, " ".join(p for p in (postal_code, city) if p)) if part), [match.span()]
+
+def _extract_permit_type(message: str, question: Question):
+    match = PERMIT_RE.search(message)
+    if not match:
+        return None
+    return match.group(1), [match.span()]
+
+def _extract_reason(message: str, question: Question):
+    match = REASON_RE.search(message)
+    if not match:
+        return None
+    return match.group(1).strip(), [match.span()]
+
+def _extract_occupation(message: str, question: Question):
+    for match in OCCUPATION_RE.finditer(message):
+        preposition = (match.group(2) or match.group(4)).lower()
+        organisation = match.group(5).strip().rstrip(".")
+        if preposition not in ("at", "for") and not ORGANISATION_RE.search(organisation):
+            continue
+        kind = "Employed at" if match.group(1) else "Studying at"
+        return f"{kind} {organisation}", [match.span()]
+    return None
+
+def _extract_office(message: str, question: Question):
+    match = OFFICE_RE.search(message)
+    if not match:
+        return None
+    return (match.group(1) + match.group(2)).strip(), [match.span()]
+
+def _extract_yes_no(message: str, question: Question):
+    """Only answers that mention the question's topic; bare yes/no is handled as a direct answer."""
+    lowered = message.lower()
+    for keyword in question.keywords:
+        idx = lowered.find(keyword)
+        if idx >= 0:
+            negated = NEGATION_RE.search(lowered[max(0, idx - 30):idx])
+            return ("No" if negated else "Yes"), [(idx, idx + len(keyword))]
+    return None
+
+def _extract_choice(message: str, question: Question):
+    for choice in question.choices:
+        match = re.search(r"\b" + re.escape(choice) + r"\b", message, re.I)
+        if match:
+            return choice, [match.span()]
+    return None
+
+EXTRACTORS = {
+    "date": _extract_date,
+    "nationality": _extract_nationality,
+    "name": _extract_name,
+    "address": _extract_address,
+    "permit_type": _extract_permit_type,
+    "reason": _extract_reason,
+    "occupation": _extract_occupation,
+    "office": _extract_office,
+    "yes_no": _extract_yes_no,
+    "choice": _extract_choice,
+}
+
+def _direct_answer(message: str, question: Question) -> str | None:
+    """The message taken as the answer to the question that was just asked."""
+    if question.type == "yes_no":
+        if YES_RE.search(message):
+            return "Yes"
+        if NO_RE.search(message):
+            return "No"
+    text = message.strip()
+    return text or None
+
+def _residual_words(message: str, spans: List[Span]) -> List[str]:
+    """Words of the message not covered by any extracted answer (ignoring filler words)."""
+    covered = [False] * len(message)
+    for start, end in spans:
+        for i in range(start, end):
+            covered[i] = True
+    residual = "".join(" " if covered[i] else char for i, char in enumerate(message))
+    return [w for w in re.findall(r"[\wäöüß']+", residual.lower()) if w not in FILLER_WORDS]
+
+def _llm_fill(message: str, questions: List[Question]) -> Dict[str, str]:
+    """One structured LLM call extracting answers for the given questions from the message."""
+    wanted = "\n".join(f'- "{question.id}": {question.text}' for question in questions)
+    system_prompt = (
+        "You extract answers to form questions from a user's message.\n"
+        f"Questions, by slot name:\n{wanted}\n\n"
+        f"User message:\n{message}\n\n"
+        "Reply with a JSON object mapping each slot name to the answer stated in the message, "
+        "copied or briefly normalised. Use null for slots the message does not answer. Do not guess."
+    )
+    try:
+        response = complete_chat(
+            messages=[{"role": "system", "content": system_prompt}],
+            max_tokens=200,
+            temperature=0.0,
+            call_type="slot_filling",
+            response_format={"type": "json_object"} if settings.LLM_JSON_MODE else None,
+        )
+        parsed = json.loads(response.strip().removeprefix("```json").removesuffix("```"))
+    except Exception as e:
+        logger.warning(f"LLM slot filling failed: {e}")
+        return {}
+
+    ids = {question.id for question in questions}
+    return {
+        name: str(value).strip()
+        for name, value in (parsed.items() if isinstance(parsed, dict) else [])
+        if name in ids and value not in (None, "") and str(value).strip().lower() not in ("null", "none", "unknown")
+    }
+
+def fill_slots(flow: Flow, message: str, answers: Dict[str, str], current: Question | None) -> Tuple[Dict[str, str], str | None]:
+    """
+    Extract every answer present in the message for the flow's open questions.
+
+    Local extractors run first. If a long message still has unexplained content and
+    questions remain open, one structured LLM call fills what it can. Finally, the
+    question that was just asked (current; None for the opening message) takes
+    the whole message as its answer if nothing else claimed it.
+    Answers are validated against their question; extracted answers that fail are
+    dropped. Returns the newly filled slots and the validation error of a direct
+    answer to the current question, if it was rejected.
+    """
+    open_questions = flow.open_questions(answers)
+    filled, spans, error = {}, [], None
+
+    def accept(question: Question, value: str, source: str) -> bool:
+        value, _ = question.check(value)
+        if value is None:
+            return False
+        filled[question.id] = value
+        SLOTS_FILLED.inc(source=source)
+        return True
+
+    for question in open_questions:
+        extractor = EXTRACTORS.get(question.type)
+        result = extractor(message, question) if extractor else None
+        if result and accept(question, result[0], "extractor"):
+            spans.extend(result[1])
+
+    still_open = [question for question in open_questions if question.id not in filled]
+    residual = _residual_words(message, spans)
+    clauses = len(re.findall(r"[,;.!?]|\band\b", message)) + 1
+    if (
+        settings.SLOT_FILLING_LLM_ENABLED
+        and still_open
+        and len(residual) >= settings.SLOT_FILLING_LLM_MIN_WORDS
+        and clauses >= 2
+    ):
+        for name, value in _llm_fill(message, still_open).items():
+            accept(flow.by_id[name], value, "llm")
+
+    if current is not None and current.id in flow.by_id:
+        # A message that only answered other questions is not an answer to this one
+        answered_elsewhere = filled and len(residual) < 3
+        if current.id not in answers and current.id not in filled and not answered_elsewhere:
+            value = _direct_answer(message, current)
+            if value and not accept(current, value, "direct"):
+                error = current.error
+
+    if filled:
+        logger.info(f"[Slot filling] {flow.name}: filled {sorted(filled)}")
+    return filled, error
+
+def format_answers(flow: Flow, answers: Dict[str, str]) -> str:
+    """Collected answers as "question answer" lines, in the order they were asked."""
+    return "\n".join(f"- {question.text} {answer}" for question, answer in flow.answered_path(answers))
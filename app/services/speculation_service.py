@@ -0,0 +1,179 @@
+# app/services/speculation_service.py
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Hashable
+
+from app.config import settings
+from app.utils.llm_gateway import TokenBucket
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_EVENTS = registry.counter(
+    "bureasy_speculation_events_total",
+    "Speculative next steps by kind and outcome (scheduled, hit, late_hit, too_late, miss, expired, over_budget, busy, error).",
+    ["kind", "outcome"],
+)
+SPECULATION_SAVED_SECONDS = registry.histogram(
+    "bureasy_speculation_saved_seconds",
+    "LLM time taken off the response by using a speculative result.",
+    ["kind"],
+)
+
+class _Speculation:
+    __slots__ = ("kind", "key", "future", "started", "finished", "tokens")
+
+    def __init__(self, kind: str, key: Hashable, tokens: int):
+        self.kind = kind
+        self.key = key
+        self.future: Future = Future()
+        self.started = time.monotonic()
+        self.finished = None
+        self.tokens = tokens
+
+class Speculator:
+    """
+    Pre-generates a conversation's likely next assistant step while the user is
+    answering. A turn claims the result with take(): it is used only if the key it
+    was computed for (e.g. the id of the question predicted to come next) matches
+    the real next step, otherwise it is discarded.
+
+    Speculative calls run at background priority, at most max_workers at a time,
+    and their estimated tokens are capped per minute; above the cap nothing is
+    speculated and turns run as usual. Results are kept per conversation for ttl_s.
+    """
+    def __init__(self, enabled: bool, tokens_per_minute: int, max_workers: int, ttl_s: float, max_entries: int = 10000,
+                 max_wait_s: float = 1.0):
+        self.enabled = enabled
+        self.ttl_s = ttl_s
+        self.max_wait_s = max_wait_s
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self._budget = TokenBucket(tokens_per_minute)
+        self._entries: "OrderedDict[int, _Speculation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._running = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_s = 0.0
+        self.spent_tokens = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="speculation")
+        return self._executor
+
+    def schedule(self, conversation_id: int, kind: str, key: Hashable, estimated_tokens: int, fn: Callable[[], str]) -> bool:
+        """Start computing fn() for the conversation's next turn. Returns False if it was not scheduled."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._running >= self.max_workers:
+                SPECULATION_EVENTS.inc(kind=kind, outcome="busy")
+                return False
+            if self._budget.wait_time(estimated_tokens, time.monotonic()) > 0:
+                SPECULATION_EVENTS.inc(kind=kind, outcome="over_budget")
+                return False
+            self._budget.consume(estimated_tokens)
+            self.spent_tokens += estimated_tokens
+
+            speculation = _Speculation(kind, key, estimated_tokens)
+            self._entries[conversation_id] = speculation
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._running += 1
+
+        SPECULATION_EVENTS.inc(kind=kind, outcome="scheduled")
+        self._get_executor().submit(self._run, speculation, fn)
+        return True
+
+    def _run(self, speculation: _Speculation, fn: Callable[[], str]):
+        try:
+            speculation.future.set_result(fn())
+        except Exception as e:
+            SPECULATION_EVENTS.inc(kind=speculation.kind, outcome="error")
+            logger.warning(f"Speculative {speculation.kind} failed: {e}")
+            speculation.future.set_exception(e)
+        finally:
+            speculation.finished = time.monotonic()
+            with self._lock:
+                self._running -= 1
+
+    def take(self, conversation_id: int, kind: str, key: Hashable, wait_s: float | None = None) -> str | None:
+        """
+        Claim the speculative result for this turn if it was computed for `key`.
+        A result still being generated is waited for briefly (wait_s, default
+        max_wait_s): it runs at background priority and may still be queued behind
+        interactive calls, so past that the turn makes its own call instead.
+        """
+        with self._lock:
+            speculation = self._entries.pop(conversation_id, None)
+        if speculation is None:
+            return None
+
+        now = time.monotonic()
+        if speculation.kind != kind or speculation.key != key:
+            self._record_miss(speculation.kind, "miss")
+            return None
+        if now - speculation.started > self.ttl_s:
+            self._record_miss(kind, "expired")
+            return None
+
+        late = not speculation.future.done()
+        try:
+            result = speculation.future.result(timeout=self.max_wait_s if wait_s is None else wait_s)
+        except FutureTimeoutError:
+            self._record_miss(kind, "too_late")
+            return None
+        except Exception:
+            self._record_miss(kind, "miss")
+            return None
+
+        # Saved: how long the call took, less the time this turn still had to wait for it
+        waited = time.monotonic() - now
+        saved = max(0.0, (speculation.finished or time.monotonic()) - speculation.started - waited)
+        with self._lock:
+            self.hits += 1
+            self.saved_s += saved
+        SPECULATION_EVENTS.inc(kind=kind, outcome="late_hit" if late else "hit")
+        SPECULATION_SAVED_SECONDS.observe(saved, kind=kind)
+        return result
+
+    def _record_miss(self, kind: str, outcome: str):
+        with self._lock:
+            self.misses += 1
+        SPECULATION_EVENTS.inc(kind=kind, outcome=outcome)
+
+    def discard(self, conversation_id: int):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            claimed = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._entries),
+                "running": self._running,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / claimed if claimed else 0.0,
+                "saved_seconds": self.saved_s,
+                "spent_tokens": self.spent_tokens,
+            }
+
+# Singleton used by the assistant
+speculator = Speculator(
+    enabled=settings.SPECULATION_ENABLED,
+    tokens_per_minute=settings.SPECULATION_TOKENS_PER_MINUTE,
+    max_workers=settings.SPECULATION_MAX_WORKERS,
+    ttl_s=settings.SPECULATION_TTL_S,
+    max_wait_s=settings.SPECULATION_MAX_WAIT_S,
+)
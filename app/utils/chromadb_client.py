@@ -1,9 +1,21 @@
+import os
+import threading
+from typing import List
+
+import numpy as np
+
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+
+from app.config import settings as app_settings
+from app.utils.compact_vector_store import get_compact_store
+from app.utils.embedding_backends import create_embedding_backend
+from app.utils.embedding_batcher import EmbeddingBatcher
+from app.utils.metrics import timed
+from app.utils.single_flight import embedding_flight
 
 # Configure persistent storage for ChromaDB
-PERSIST_DIRECTORY = "./chroma_db"
+PERSIST_DIRECTORY = app_settings.CHROMA_PERSIST_DIRECTORY
 
 # Initialize ChromaDB client
 client = chromadb.Client(
@@ -15,12 +27,95 @@ client = chromadb.Client(
 
 # Get or create the shared collection
 def get_chroma_collection(collection_name: str = "knowledge_base"):
-    """Retrieve or create the shared ChromaDB collection."""
+    """
+    Retrieve or create the shared collection. With VECTOR_STORE_BACKEND=compact this
+    is a CompactVectorStore exposing the same add/query interface.
+    """
+    if app_settings.VECTOR_STORE_BACKEND == "compact":
+        return get_compact_store(
+            os.path.join(app_settings.VECTOR_STORE_DIR, collection_name),
+            dtype=app_settings.VECTOR_STORE_DTYPE,
+            rescore_factor=app_settings.VECTOR_STORE_RESCORE_FACTOR,
+            persist_every=app_settings.VECTOR_STORE_PERSIST_EVERY,
+        )
     return client.get_or_create_collection(collection_name)
 
-# Initialize embedding model
-embedding_model = SentenceTransformer("all-MPNet-base-v2")
+def collection_dimension(collection) -> int | None:
+    """Vector size of the records in a collection; None while it is empty."""
+    if hasattr(collection, "dimension"):
+        return collection.dimension
+    embeddings = collection.get(limit=1, include=["embeddings"])["embeddings"]
+    return len(embeddings[0]) if embeddings is not None and len(embeddings) else None
+
+def check_embedding_dimension(dimension: int, collection_name: str = "knowledge_base"):
+    """
+    Fail early when the embedding model's vectors do not fit the collection (the model
+    was changed without re-ingesting), instead of on the first query.
+    """
+    stored = collection_dimension(get_chroma_collection(collection_name))
+    if stored is not None and stored != dimension:
+        raise RuntimeError(
+            f"The embedding model {app_settings.EMBEDDING_MODEL_NAME} produces {dimension}-dimensional vectors, "
+            f"but the '{collection_name}' collection holds {stored}-dimensional ones. "
+            "Switch back to the model it was built with, or re-ingest the knowledge base into a fresh collection."
+        )
+
+# The embedding backend is loaded on first use, so workers that delegate to the
+# embedding service never hold their own copy of the model.
+_embedding_backend = None
+_embedding_backend_lock = threading.Lock()
+
+def get_embedding_backend():
+    """Return the process-local embedding backend selected in settings, loading it if necessary."""
+    global _embedding_backend
+    if _embedding_backend is None:
+        with _embedding_backend_lock:
+            if _embedding_backend is None:
+                _embedding_backend = create_embedding_backend(
+                    app_settings.EMBEDDING_BACKEND,
+                    app_settings.EMBEDDING_MODEL_NAME,
+                    quantize=app_settings.EMBEDDING_QUANTIZE,
+                    onnx_dir=app_settings.EMBEDDING_ONNX_DIR,
+                    num_threads=app_settings.EMBEDDING_NUM_THREADS,
+                )
+    return _embedding_backend
+
+def encode_texts(texts: List[str]):
+    """Encode texts with the local backend and return a NumPy array (one row per text)."""
+    return get_embedding_backend().encode(list(texts))
+
+# In-process micro-batcher: concurrent single-text calls from request threads are
+# collected for a few milliseconds and encoded together.
+embedding_batcher = EmbeddingBatcher(
+    encode_texts,
+    max_batch_size=app_settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait_ms=app_settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+)
 
 def embed_text(text: str):
-    """Generate embeddings for a given text."""
-    return embedding_model.encode(text).tolist()
+    """Generate embeddings for a given text. Concurrent calls for the same text share one embedding."""
+    return embedding_flight.do(text, _embed_text, text)
+
+def _embed_text(text: str):
+    with timed("embed"):
+        if app_settings.EMBEDDING_SERVICE_URL:
+            from app.utils.embedding_client import embed_text as remote_embed_text
+            return remote_embed_text(text)
+        if app_settings.EMBEDDING_BATCHING_ENABLED:
+            return embedding_batcher.embed([text])[0].tolist()
+        return encode_texts([text])[0].tolist()
+
+def embed_texts(texts: List[str]):
+    """Generate embeddings for several texts in a single batch."""
+    if app_settings.EMBEDDING_SERVICE_URL:
+        from app.utils.embedding_client import embed_texts as remote_embed_texts
+        return remote_embed_texts(texts)
+    return encode_texts(texts).tolist()
+
+def embed_texts_array(texts: List[str]) -> np.ndarray:
+    """Like embed_texts, but returns a float32 NumPy array without per-vector list conversion."""
+    with timed("embed"):
+        if app_settings.EMBEDDING_SERVICE_URL:
+            from app.utils.embedding_client import embed_texts as remote_embed_texts
+            return np.asarray(remote_embed_texts(texts), dtype=np.float32)
+        return np.asarray(encode_texts(texts), dtype=np.float32)
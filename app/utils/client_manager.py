@@ -14,7 +14,8 @@ class ClientManager:
         if not self.groq_client:
             if not settings.GROQ_API_KEY:
                 raise ValueError("GROQ_API_KEY is not set in the environment.")
-            self.groq_client = Groq(api_key=settings.GROQ_API_KEY)
+            # Retries are handled by the LLM gateway, not the SDK
+            self.groq_client = Groq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL or None, max_retries=0)
 
     def get_groq_client(self):
         if not self.groq_client:
@@ -0,0 +1,444 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ("float16", "int8")
+
+WHERE_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+class CompactVectorStore:
+    """
+    A collection with the same add/upsert/query/get/count/delete surface the services use
+    on a Chroma collection, but keeping vectors in contiguous NumPy arrays:
+
+    - float16: vectors stored at half precision (2x smaller than float32)
+    - int8: per-vector scalar quantization, code = round(v / max|v| * 127) (~4x smaller)
+
+    Queries score all compact codes, then rescore the best `rescore_factor * n_results`
+    candidates exactly against the float32 vectors, which live in an on-disk memmap
+    and are only paged in for those candidates. Distances are squared L2, like
+    Chroma's default space.
+    """
+    SCORE_BLOCK_ROWS = 65536  # codes are widened to float32 one block at a time while scoring
+
+    def __init__(self, directory: str, dtype: str = "float16", rescore_factor: int = 4, persist_every: int = 1000):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{dtype}'. Use one of {SUPPORTED_DTYPES}.")
+        self.directory = directory
+        self.dtype = dtype
+        self.rescore_factor = max(1, rescore_factor)
+        # Writes only append to records.jsonl and update the float32 file in place; the
+        # codes and norms are saved by persist(), every persist_every written records
+        # (0 = only when persist() is called) and on shutdown.
+        self.persist_every = persist_every
+        self._lock = threading.RLock()
+
+        self.dimension = None
+        self.size = 0
+        self._codes = None       # (capacity, dim) float16 or int8
+        self._scales = None      # (capacity,) float32, int8 only
+        self._sq_norms = None    # (capacity,) float32, exact squared norms for L2
+        self._exact = None       # (capacity, dim) float32 memmap on disk
+
+        self.ids: List[str] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Optional[dict]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._deleted_rows: Set[int] = set()  # rows of deleted records, skipped by queries
+
+        self._journal = None     # records.jsonl, opened for appending
+        self._journal_lines = 0  # lines in records.jsonl, including superseded versions of a record
+        self._unpersisted = 0    # records written since the last persist()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # -- Persistence --
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _write_info(self, journal_bytes: int):
+        tmp_path = self._path("store.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "dimension": self.dimension, "size": self.size, "journal_bytes": journal_bytes}, f)
+        os.replace(tmp_path, self._path("store.json"))
+
+    def _save_array(self, name: str, array: np.ndarray):
+        tmp_path = self._path(f"{name}.tmp.npy")
+        np.save(tmp_path, array)
+        os.replace(tmp_path, self._path(f"{name}.npy"))
+
+    def _load(self):
+        info = None
+        info_path = self._path("store.json")
+        if os.path.exists(info_path):
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            if info["dtype"] != self.dtype:
+                raise ValueError(
+                    f"Vector store at {self.directory} was built with dtype {info['dtype']}, not {self.dtype}. Re-ingest to convert."
+                )
+            self.dimension = info["dimension"]
+
+        # Replay the record log. A later line for an ID replaces the earlier one; rows
+        # written after the last persist() get their codes rebuilt from the float32 file.
+        journal_path = self._path("records.jsonl")
+        persisted_bytes = info.get("journal_bytes") if info else 0
+        stale_rows = set()
+        offset = 0
+        if os.path.exists(journal_path):
+            with open(journal_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn last line from an interrupted write
+                    record = json.loads(line)
+                    row = self._row_by_id.get(record["id"])
+                    if record.get("deleted"):
+                        if row is None:
+                            # Compacted log: a placeholder keeps the rows after it in place
+                            row = len(self.ids)
+                            self.ids.append(record["id"])
+                            self.documents.append(None)
+                            self.metadatas.append(None)
+                        else:
+                            del self._row_by_id[record["id"]]
+                            self.documents[row] = None
+                            self.metadatas[row] = None
+                        self._deleted_rows.add(row)
+                    elif row is None:
+                        row = len(self.ids)
+                        self.ids.append(record["id"])
+                        self.documents.append(record.get("document"))
+                        self.metadatas.append(record.get("metadata"))
+                        self._row_by_id[record["id"]] = row
+                    else:
+                        self.documents[row] = record.get("document")
+                        self.metadatas[row] = record.get("metadata")
+                    if persisted_bytes is not None and offset >= persisted_bytes:
+                        stale_rows.add(row)
+                    offset += len(line)
+                    self._journal_lines += 1
+            if offset != os.path.getsize(journal_path):
+                with open(journal_path, "r+b") as f:
+                    f.truncate(offset)
+        self._journal = open(journal_path, "ab")
+        self.size = len(self.ids)
+        if self.dimension is None:
+            return
+
+        capacity = max(os.path.getsize(self._path("vectors.f32")) // (self.dimension * 4), self.size)
+        self._exact = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self._codes = np.zeros((capacity, self.dimension), dtype=np.int8 if self.dtype == "int8" else np.float16)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        if self.dtype == "int8":
+            self._scales = np.zeros(capacity, dtype=np.float32)
+
+        persisted = min(info["size"], self.size) if os.path.exists(self._path("codes.npy")) else 0
+        if persisted:
+            self._codes[:persisted] = np.load(self._path("codes.npy"), mmap_mode="r")[:persisted]
+            self._sq_norms[:persisted] = np.load(self._path("sq_norms.npy"), mmap_mode="r")[:persisted]
+            if self.dtype == "int8":
+                self._scales[:persisted] = np.load(self._path("scales.npy"), mmap_mode="r")[:persisted]
+        stale_rows.update(range(persisted, self.size))
+        if stale_rows:
+            rows = np.asarray(sorted(stale_rows))
+            self._write_rows(rows, np.asarray(self._exact[rows]))
+            self._unpersisted = len(rows)
+
+    def _compact_journal(self):
+        """Rewrite records.jsonl with one line per row, dropping superseded versions."""
+        tmp_path = self._path("records.jsonl.tmp")
+        with open(tmp_path, "wb") as f:
+            for row, (id_, document, metadata) in enumerate(zip(self.ids, self.documents, self.metadatas)):
+                f.write(self._tombstone_line(id_) if row in self._deleted_rows else self._record_line(id_, document, metadata))
+        self._journal.close()
+        os.replace(tmp_path, self._path("records.jsonl"))
+        self._journal = open(self._path("records.jsonl"), "ab")
+        self._journal_lines = self.size
+
+    def persist(self):
+        """Save codes and norms, and compact the record log once most of it is superseded."""
+        with self._lock:
+            if self.dimension is None:
+                return
+            self._exact.flush()
+            self._save_array("codes", self._codes[:self.size])
+            self._save_array("sq_norms", self._sq_norms[:self.size])
+            if self.dtype == "int8":
+                self._save_array("scales", self._scales[:self.size])
+            if self._journal_lines > 2 * self.size:
+                self._compact_journal()
+            self._journal.flush()
+            self._write_info(self._journal.tell())
+            self._unpersisted = 0
+
+    @staticmethod
+    def _record_line(id_: str, document: Optional[str], metadata: Optional[dict]) -> bytes:
+        return (json.dumps({"id": id_, "document": document, "metadata": metadata}, ensure_ascii=False) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _tombstone_line(id_: str) -> bytes:
+        return (json.dumps({"id": id_, "deleted": True}, ensure_ascii=False) + "\n").encode("utf-8")
+
+    # -- Storage --
+
+    def _ensure_capacity(self, needed: int, dimension: int):
+        if self.dimension is None:
+            self.dimension = dimension
+            self._write_info(0)
+        elif dimension != self.dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match store dimension {self.dimension}.")
+
+        capacity = 0 if self._codes is None else len(self._codes)
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, 1024)
+        codes = np.zeros((new_capacity, self.dimension), dtype=np.int8 if self.dtype == "int8" else np.float16)
+        sq_norms = np.zeros(new_capacity, dtype=np.float32)
+        if self._codes is not None:
+            codes[:self.size] = self._codes[:self.size]
+            sq_norms[:self.size] = self._sq_norms[:self.size]
+        self._codes, self._sq_norms = codes, sq_norms
+
+        if self.dtype == "int8":
+            scales = np.zeros(new_capacity, dtype=np.float32)
+            if self._scales is not None:
+                scales[:self.size] = self._scales[:self.size]
+            self._scales = scales
+
+        # Grow the exact-vector file in place and remap it
+        if self._exact is not None:
+            self._exact.flush()
+            del self._exact
+        with open(self._path("vectors.f32"), "ab") as f:
+            f.truncate(new_capacity * self.dimension * 4)
+        self._exact = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(new_capacity, self.dimension))
+
+    def _write_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        self._exact[rows] = vectors
+        self._sq_norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._codes[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._codes[rows] = vectors.astype(np.float16)
+
+    def _write(self, ids, embeddings, metadatas, documents, overwrite: bool):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if len(ids) != len(vectors):
+            raise ValueError("ids and embeddings must have the same length.")
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        documents = documents if documents is not None else [None] * len(ids)
+
+        with self._lock:
+            rows, keep = [], []
+            pending: Dict[str, int] = {}  # new IDs in this batch -> row
+            new_rows = 0
+            for idx, id_ in enumerate(ids):
+                row = self._row_by_id.get(id_, pending.get(id_))
+                if row is not None:
+                    if not overwrite:
+                        logger.warning(f"Add of existing embedding ID: {id_}")
+                        continue
+                else:
+                    row = self.size + new_rows
+                    pending[id_] = row
+                    new_rows += 1
+                rows.append(row)
+                keep.append(idx)
+
+            if not rows:
+                return
+
+            self._ensure_capacity(self.size + new_rows, vectors.shape[1])
+            self._write_rows(np.asarray(rows), vectors[keep])
+
+            # The float32 vectors are already in place, so a logged record can always be rebuilt
+            self._journal.write(b"".join(self._record_line(ids[idx], documents[idx], metadatas[idx]) for idx in keep))
+            self._journal.flush()
+            self._journal_lines += len(keep)
+
+            for row, idx in zip(rows, keep):
+                if row >= len(self.ids):
+                    self.ids.append(ids[idx])
+                    self.documents.append(documents[idx])
+                    self.metadatas.append(metadatas[idx])
+                    self._row_by_id[ids[idx]] = row
+                else:
+                    self.documents[row] = documents[idx]
+                    self.metadatas[row] = metadatas[idx]
+            self.size += new_rows
+
+            self._unpersisted += len(keep)
+            if self.persist_every and self._unpersisted >= self.persist_every:
+                self.persist()
+
+    # -- Chroma-compatible API --
+
+    def add(self, ids, embeddings, metadatas=None, documents=None):
+        """Add records; existing IDs are skipped, as in Chroma."""
+        self._write(ids, embeddings, metadatas, documents, overwrite=False)
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        self._write(ids, embeddings, metadatas, documents, overwrite=True)
+
+    def delete(self, ids=None, where: Optional[dict] = None):
+        """
+        Delete records by ID and/or metadata filter, as in Chroma. Their rows are left
+        empty (queries skip them); a re-added ID gets a new row.
+        """
+        if ids is None and not where:
+            raise ValueError("Pass ids or where to delete records.")
+        with self._lock:
+            rows = self._row_by_id.values() if ids is None else [self._row_by_id[i] for i in ids if i in self._row_by_id]
+            rows = sorted(row for row in rows if not where or self._matches(self.metadatas[row], where))
+            if not rows:
+                return
+            self._journal.write(b"".join(self._tombstone_line(self.ids[row]) for row in rows))
+            self._journal.flush()
+            self._journal_lines += len(rows)
+            for row in rows:
+                del self._row_by_id[self.ids[row]]
+                self.documents[row] = None
+                self.metadatas[row] = None
+                self._deleted_rows.add(row)
+
+            self._unpersisted += len(rows)
+            if self.persist_every and self._unpersisted >= self.persist_every:
+                self.persist()
+
+    def count(self) -> int:
+        return self.size - len(self._deleted_rows)
+
+    def get(self, ids=None, include=None):
+        with self._lock:
+            if ids is None:
+                rows = [row for row in range(self.size) if row not in self._deleted_rows]
+            else:
+                rows = [self._row_by_id[i] for i in ids if i in self._row_by_id]
+            return {
+                "ids": [self.ids[r] for r in rows],
+                "documents": [self.documents[r] for r in rows],
+                "metadatas": [self.metadatas[r] for r in rows],
+            }
+
+    def _matches(self, metadata: Optional[dict], where: dict) -> bool:
+        """Chroma's metadata filter: field equality and $eq/$ne/$in/$nin, combined with $and/$or."""
+        metadata = metadata or {}
+        for key, condition in where.items():
+            if key == "$and":
+                if not all(self._matches(metadata, clause) for clause in condition):
+                    return False
+            elif key == "$or":
+                if not any(self._matches(metadata, clause) for clause in condition):
+                    return False
+            elif isinstance(condition, dict):
+                value = metadata.get(key)
+                for operator, operand in condition.items():
+                    if operator not in WHERE_OPERATORS:
+                        raise ValueError(f"Unsupported where operator '{operator}'.")
+                    if not WHERE_OPERATORS[operator](value, operand):
+                        return False
+            elif metadata.get(key) != condition:
+                return False
+        return True
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[dict] = None, include=None):
+        """Approximate search over the compact codes followed by exact rescoring of the top candidates."""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            if self.size == 0:
+                for _ in queries:
+                    for key in result:
+                        result[key].append([])
+                return result
+
+            codes = self._codes[:self.size]
+            sq_norms = self._sq_norms[:self.size]
+            allowed = None
+            if where:
+                allowed = np.fromiter((self._matches(m, where) for m in self.metadatas), dtype=bool, count=self.size)
+
+            # Approximate ranking: maximise q.v - |v|^2 / 2, which orders results like L2 distance
+            approx = np.empty((self.size, len(queries)), dtype=np.float32)
+            for start in range(0, self.size, self.SCORE_BLOCK_ROWS):
+                end = min(start + self.SCORE_BLOCK_ROWS, self.size)
+                approx[start:end] = codes[start:end].astype(np.float32) @ queries.T
+            if self.dtype == "int8":
+                approx *= self._scales[:self.size, None]
+            approx -= 0.5 * sq_norms[:, None]
+            if allowed is not None:
+                approx[~allowed] = -np.inf
+            if self._deleted_rows:
+                approx[np.fromiter(self._deleted_rows, dtype=np.int64)] = -np.inf
+
+            candidates_per_query = min(self.size, n_results * self.rescore_factor)
+            for qi, query in enumerate(queries):
+                column = approx[:, qi]
+                if candidates_per_query < self.size:
+                    candidates = np.argpartition(-column, candidates_per_query - 1)[:candidates_per_query]
+                else:
+                    candidates = np.arange(self.size)
+                candidates = np.sort(candidates[np.isfinite(column[candidates])])
+
+                # Exact rescoring against the float32 vectors (sorted rows keep memmap reads sequential)
+                exact = np.asarray(self._exact[candidates])
+                distances = sq_norms[candidates] + float(query @ query) - 2.0 * (exact @ query)
+                order = np.argsort(distances)[:n_results]
+                top_rows = candidates[order]
+
+                result["ids"].append([self.ids[r] for r in top_rows])
+                result["documents"].append([self.documents[r] for r in top_rows])
+                result["metadatas"].append([self.metadatas[r] for r in top_rows])
+                result["distances"].append(distances[order].tolist())
+        return result
+
+    def memory_bytes_per_vector(self) -> float:
+        """In-RAM bytes per stored vector (codes, scales and norms; the exact vectors stay on disk)."""
+        if self.dimension is None:
+            return 0.0
+        per_vector = self.dimension * (1 if self.dtype == "int8" else 2) + 4
+        if self.dtype == "int8":
+            per_vector += 4
+        return float(per_vector)
+
+_stores: Dict[str, CompactVectorStore] = {}
+_stores_lock = threading.Lock()
+
+def get_compact_store(directory: str, dtype: str = "float16", rescore_factor: int = 4, persist_every: int = 1000) -> CompactVectorStore:
+    """Return the process-wide store for a directory, opening it on first use."""
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = CompactVectorStore(directory, dtype=dtype, rescore_factor=rescore_factor, persist_every=persist_every)
+            _stores[directory] = store
+        return store
+
+def persist_compact_stores():
+    """Persist every open store (called on shutdown)."""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        if store._unpersisted:
+            store.persist()
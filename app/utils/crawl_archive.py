@@ -0,0 +1,184 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Tuple
+
+import zstandard
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".idx"
+FORMAT_VERSION = 1
+
+class CrawlArchiveWriter:
+    """
+    Append-only crawl archive: page records as JSON lines, grouped into blocks that are
+    each compressed as an independent zstd frame. After every block, one line is
+    appended to the index file (<path>.idx) with the frame's offset and length and the
+    URLs in it, so a reader can fetch any page by decompressing only its block.
+
+    Reopening an existing archive appends to it; a block that was written but never
+    made it into the index (an interrupted writer) is cut off first.
+    """
+    def __init__(self, path: str, block_records: int = 64, block_bytes: int | None = None, level: int | None = None):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.block_records = block_records
+        self.block_bytes = block_bytes or settings.CRAWL_ARCHIVE_BLOCK_BYTES
+        self._compressor = zstandard.ZstdCompressor(level=settings.CRAWL_ARCHIVE_ZSTD_LEVEL if level is None else level)
+        self._lines: List[bytes] = []
+        self._urls: List[str] = []
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self.records = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        end = 0
+        if os.path.exists(self.index_path):
+            for entry in _read_index(self.index_path):
+                end = entry["offset"] + entry["length"]
+        else:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"format": "crawl-archive", "version": FORMAT_VERSION}) + "\n")
+        self._data = open(path, "ab")
+        if self._data.tell() > end:
+            self._data.truncate(end)
+            self._data.seek(end)
+        self._index = open(self.index_path, "a", encoding="utf-8")
+
+    def write(self, record: dict):
+        """Add one page record (must have a "url"); flushed once the block is full."""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            self._lines.append(line)
+            self._urls.append(record.get("url", ""))
+            self._pending_bytes += len(line)
+            self.records += 1
+            if len(self._lines) >= self.block_records or self._pending_bytes >= self.block_bytes:
+                self._flush_block()
+
+    def _flush_block(self):
+        if not self._lines:
+            return
+        frame = self._compressor.compress(b"".join(self._lines))
+        offset = self._data.tell()
+        self._data.write(frame)
+        self._data.flush()
+        # The index line goes last: a block is only part of the archive once it is indexed
+        self._index.write(json.dumps({"offset": offset, "length": len(frame), "urls": self._urls}, ensure_ascii=False) + "\n")
+        self._index.flush()
+        self._lines, self._urls, self._pending_bytes = [], [], 0
+
+    def flush(self):
+        with self._lock:
+            self._flush_block()
+
+    def close(self):
+        with self._lock:
+            self._flush_block()
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _read_index(index_path: str) -> Iterator[dict]:
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # a torn last line from an interrupted writer
+            if "offset" in entry:
+                yield entry
+
+class CrawlArchiveReader:
+    """
+    Streaming and random access over a crawl archive. Iteration decompresses one block
+    at a time; get(url) decompresses only the block holding the latest record for the
+    URL (the most recently used blocks are kept).
+    """
+    def __init__(self, path: str, cached_blocks: int = 8):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self._blocks: List[Tuple[int, int]] = []
+        self._by_url: Dict[str, Tuple[int, int]] = {}
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._cache: "OrderedDict[int, List[bytes]]" = OrderedDict()
+        self._cached_blocks = cached_blocks
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.index_path):
+            raise FileNotFoundError(f"No index for crawl archive {path} (expected {self.index_path})")
+        for entry in _read_index(self.index_path):
+            block = len(self._blocks)
+            self._blocks.append((entry["offset"], entry["length"]))
+            for line, url in enumerate(entry["urls"]):
+                self._by_url[url] = (block, line)
+
+    def _read_block(self, block: int, data_file=None) -> List[bytes]:
+        offset, length = self._blocks[block]
+        if data_file is None:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                frame = f.read(length)
+        else:
+            data_file.seek(offset)
+            frame = data_file.read(length)
+        return self._decompressor.decompress(frame).splitlines()
+
+    def __iter__(self) -> Iterator[dict]:
+        """Every record in write order, including older versions of re-written URLs."""
+        with open(self.path, "rb") as f:
+            for block in range(len(self._blocks)):
+                for line in self._read_block(block, f):
+                    yield json.loads(line)
+
+    def latest(self) -> Iterator[dict]:
+        """Only the latest record for each URL, in write order."""
+        with open(self.path, "rb") as f:
+            for block in range(len(self._blocks)):
+                for line_no, line in enumerate(self._read_block(block, f)):
+                    record = json.loads(line)
+                    if self._by_url.get(record.get("url", "")) == (block, line_no):
+                        yield record
+
+    def _block(self, block: int) -> List[bytes]:
+        with self._lock:
+            lines = self._cache.get(block)
+            if lines is not None:
+                self._cache.move_to_end(block)
+                return lines
+        lines = self._read_block(block)
+        with self._lock:
+            self._cache[block] = lines
+            while len(self._cache) > self._cached_blocks:
+                self._cache.popitem(last=False)
+        return lines
+
+    def get(self, url: str) -> dict | None:
+        position = self._by_url.get(url)
+        if position is None:
+            return None
+        block, line = position
+        return json.loads(self._block(block)[line])
+
+    def urls(self) -> List[str]:
+        return list(self._by_url)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._by_url
+
+    def __len__(self) -> int:
+        return len(self._by_url)
+
+def is_crawl_archive(path: str) -> bool:
+    return os.path.isfile(path) and os.path.exists(path + INDEX_SUFFIX)
@@ -0,0 +1,222 @@
+import os
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def hf_model_id(model_name: str) -> str:
+    """Short sentence-transformers names (e.g. 'all-MiniLM-L6-v2') live under the sentence-transformers org."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+class EmbeddingBackend(ABC):
+    """Interface for embedding backends: encode(texts) returns one row per text."""
+    name = "base"
+
+    def __init__(self, model_name: str, quantize: bool = False):
+        self.model_name = model_name
+        self.quantize = quantize
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+    @property
+    def dimension(self) -> int:
+        """Size of the vectors this backend produces."""
+        if getattr(self, "_dimension", None) is None:
+            self._dimension = int(self.encode(["dimension check"]).shape[1])
+        return self._dimension
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.model_name}{':int8' if self.quantize else ''}"
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Full PyTorch model via sentence-transformers, optionally with int8 dynamic quantization."""
+    name = "torch"
+
+    def __init__(self, model_name: str, quantize: bool = False, num_threads: int = 0):
+        super().__init__(model_name, quantize)
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if quantize:
+            # Quantize the Linear layers' weights to int8; activations stay float.
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(list(texts), convert_to_numpy=True)
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = False) -> str:
+    """
+    Export the transformer behind `model_name` to ONNX (and optionally an int8
+    dynamically-quantized copy) in output_dir. Returns the path of the model to load.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    int8_path = os.path.join(output_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        logger.info(f"Exporting {model_name} to ONNX in {output_dir}")
+        tokenizer = AutoTokenizer.from_pretrained(hf_model_id(model_name))
+        model = AutoModel.from_pretrained(hf_model_id(model_name))
+        model.eval()
+        tokenizer.save_pretrained(output_dir)
+
+        dummy = tokenizer(["Export sample"], return_tensors="pt")
+        input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+        dynamic_axes = {n: {0: "batch", 1: "sequence"} for n in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy[n] for n in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        logger.info(f"Quantizing {fp32_path} to int8")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+# Pooling modes of a sentence-transformers Pooling module that OnnxBackend implements
+POOLING_MODES = {
+    "mean": "pooling_mode_mean_tokens",
+    "cls": "pooling_mode_cls_token",
+    "max": "pooling_mode_max_tokens",
+}
+SENTENCE_TRANSFORMERS_CONFIG_FILE = "sentence_transformers.json"
+
+def _model_json(model_name: str, filename: str) -> dict | list | None:
+    """A JSON file of a local model directory or a Hugging Face model; None if the model has no such file."""
+    if os.path.isdir(model_name):
+        path = os.path.join(model_name, filename)
+        if not os.path.exists(path):
+            return None
+    else:
+        from huggingface_hub import hf_hub_download
+        from huggingface_hub.utils import EntryNotFoundError
+        try:
+            path = hf_hub_download(hf_model_id(model_name), filename)
+        except EntryNotFoundError:
+            return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_sentence_transformers_config(model_name: str, model_dir: str) -> dict:
+    """
+    The maximum sequence length, pooling and normalization sentence-transformers applies
+    on top of the transformer, read from the model's modules.json, sentence_bert_config.json
+    and pooling config. Cached in model_dir next to the ONNX export.
+    """
+    cached_path = os.path.join(model_dir, SENTENCE_TRANSFORMERS_CONFIG_FILE)
+    if os.path.exists(cached_path):
+        with open(cached_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # Without modules.json, sentence-transformers uses mean pooling and no normalization
+    config = {"max_seq_length": None, "pooling": "mean", "normalize": False}
+    for module in _model_json(model_name, "modules.json") or []:
+        module_type, path = module.get("type", ""), module.get("path", "")
+        if module_type.endswith(".Transformer"):
+            transformer_config = _model_json(model_name, "/".join(filter(None, (path, "sentence_bert_config.json")))) or {}
+            config["max_seq_length"] = transformer_config.get("max_seq_length")
+        elif module_type.endswith(".Pooling"):
+            pooling_config = _model_json(model_name, f"{path}/config.json") or {}
+            enabled = [key for key, value in pooling_config.items() if key.startswith("pooling_mode_") and value]
+            modes = [mode for mode, key in POOLING_MODES.items() if key in enabled]
+            if len(modes) != 1 or len(enabled) != 1:
+                raise ValueError(f"{model_name} uses pooling {enabled}, which the ONNX backend does not support. Use EMBEDDING_BACKEND=torch.")
+            config["pooling"] = modes[0]
+        elif module_type.endswith(".Normalize"):
+            config["normalize"] = True
+        else:
+            raise ValueError(f"{model_name} has a {module_type} module, which the ONNX backend does not support. Use EMBEDDING_BACKEND=torch.")
+
+    with open(cached_path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    return config
+
+def pool_embeddings(token_embeddings: np.ndarray, attention_mask: np.ndarray, pooling: str = "mean", normalize: bool = True) -> np.ndarray:
+    """Sentence vectors from token embeddings, as sentence-transformers' Pooling and Normalize modules compute them."""
+    mask = attention_mask[..., None].astype(np.float32)
+    if pooling == "cls":
+        pooled = token_embeddings[:, 0]
+    elif pooling == "max":
+        pooled = np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+    else:
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        pooled = pooled / np.clip(norms, 1e-12, None)
+    return pooled.astype(np.float32)
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime backend. Truncation length, pooling and normalization follow the
+    model's sentence-transformers config, so the vectors match SentenceTransformerBackend's.
+    """
+    name = "onnx"
+
+    def __init__(self, model_name: str, onnx_dir: str, quantize: bool = False, num_threads: int = 0, max_length: int | None = None):
+        super().__init__(model_name, quantize)
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = os.path.join(onnx_dir, model_name.replace("/", "__"))
+        model_path = export_onnx_model(model_name, model_dir, quantize=quantize)
+        config = load_sentence_transformers_config(model_name, model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        # sentence-transformers falls back to the tokenizer's limit (capped at 512 here:
+        # some tokenizers report a huge placeholder) when the model does not set one
+        self.max_length = max_length or config["max_seq_length"] or min(self.tokenizer.model_max_length, 512)
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+        token_embeddings = self.session.run(None, inputs)[0]
+        return pool_embeddings(token_embeddings, encoded["attention_mask"], self.pooling, self.normalize)
+
+def create_embedding_backend(backend: str, model_name: str, quantize: bool = False, onnx_dir: str = "./models/onnx", num_threads: int = 0) -> EmbeddingBackend:
+    """Build the embedding backend selected in settings."""
+    backend = backend.lower()
+    if backend == "torch":
+        return SentenceTransformerBackend(model_name, quantize=quantize, num_threads=num_threads)
+    if backend == "onnx":
+        return OnnxBackend(model_name, onnx_dir, quantize=quantize, num_threads=num_threads)
+    raise ValueError(f"Unknown embedding backend '{backend}'. Use 'torch' or 'onnx'.")
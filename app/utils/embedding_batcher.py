@@ -0,0 +1,138 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = registry.histogram(
+    "bureasy_embedding_batch_size",
+    "Texts per batched encode call of the embedding micro-batcher.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+class _PendingRequest:
+    """A single caller's texts and the future its embeddings are delivered to."""
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future = Future()
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent embedding requests and encodes them with a single
+    batched call. A request waits at most `max_wait_ms` for company, and a
+    batch is closed early once it holds `max_batch_size` texts.
+    """
+    def __init__(self, encode_fn: Callable[[List[str]], Sequence], max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Batch-size histogram with power-of-two upper bounds, e.g. 1, 2, 4, ..., max_batch_size
+        self.histogram_buckets = []
+        bound = 1
+        while bound < self.max_batch_size:
+            self.histogram_buckets.append(bound)
+            bound *= 2
+        self.histogram_buckets.append(self.max_batch_size)
+        self._bucket_counts = [0] * (len(self.histogram_buckets) + 1)  # last bucket is +Inf
+        self._stats_lock = threading.Lock()
+        self.batch_count = 0
+        self.text_count = 0
+        self.request_count = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for embedding and return a future resolving to one vector per text."""
+        self._ensure_started()
+        request = _PendingRequest(list(texts))
+        self._queue.put(request)
+        return request.future
+
+    def embed(self, texts: List[str], timeout: float | None = None):
+        """Blocking helper around submit()."""
+        return self.submit(texts).result(timeout=timeout)
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        first = self._queue.get()
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+
+        return batch
+
+    def _record_batch(self, request_count: int, text_count: int):
+        bucket = len(self.histogram_buckets)
+        for idx, bound in enumerate(self.histogram_buckets):
+            if text_count <= bound:
+                bucket = idx
+                break
+        EMBEDDING_BATCH_SIZE.observe(text_count)
+        with self._stats_lock:
+            self._bucket_counts[bucket] += 1
+            self.batch_count += 1
+            self.text_count += text_count
+            self.request_count += request_count
+
+    def stats(self) -> dict:
+        """Return batch-size histogram and counters (cumulative since start)."""
+        with self._stats_lock:
+            histogram = {
+                str(bound): count
+                for bound, count in zip(self.histogram_buckets + ["+Inf"], self._bucket_counts)
+            }
+            return {
+                "batches": self.batch_count,
+                "requests": self.request_count,
+                "texts": self.text_count,
+                "mean_batch_size": (self.text_count / self.batch_count) if self.batch_count else 0.0,
+                "batch_size_histogram": histogram,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for request in batch for text in request.texts]
+            self._record_batch(len(batch), len(texts))
+
+            try:
+                vectors = self.encode_fn(texts) if texts else []
+            except Exception as e:
+                logger.exception(f"Batched embedding of {len(texts)} texts failed: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                count = len(request.texts)
+                request.future.set_result(vectors[offset:offset + count])
+                offset += count
@@ -0,0 +1,58 @@
+import logging
+import threading
+from typing import List
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+UNIX_SCHEME = "unix://"
+
+class EmbeddingServiceClient:
+    """Talks to the shared embedding server over localhost HTTP or a Unix socket."""
+    def __init__(self, service_url: str, timeout: float = 10.0):
+        self.service_url = service_url
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if self.service_url.startswith(UNIX_SCHEME):
+                        socket_path = self.service_url[len(UNIX_SCHEME):]
+                        self._client = httpx.Client(
+                            transport=httpx.HTTPTransport(uds=socket_path),
+                            base_url="http://embedding-service",
+                            timeout=self.timeout,
+                        )
+                    else:
+                        self._client = httpx.Client(base_url=self.service_url, timeout=self.timeout)
+        return self._client
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts with one round trip to the embedding server."""
+        if not texts:
+            return []
+        response = self._get_client().post("/embed", json={"texts": list(texts)})
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_texts([text])[0]
+
+# Singleton client, configured from settings
+embedding_service_client = EmbeddingServiceClient(
+    settings.EMBEDDING_SERVICE_URL,
+    timeout=settings.EMBEDDING_SERVICE_TIMEOUT,
+)
+
+def embed_text(text: str) -> List[float]:
+    """Drop-in replacement for chromadb_client.embed_text backed by the embedding server."""
+    return embedding_service_client.embed_text(text)
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    return embedding_service_client.embed_texts(texts)
@@ -0,0 +1,36 @@
+import os
+import json
+import time
+import uuid
+import logging
+from typing import Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def knowledge_base_version(path: str | None = None) -> Tuple[str, float]:
+    """
+    (version, changed_at) of the knowledge base. The version changes whenever records are
+    written to the vector store, by any process; "" if nothing was ingested since the
+    version file was introduced.
+    """
+    path = path or settings.KB_VERSION_FILE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("version", ""), float(data.get("changed_at", 0.0))
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return "", 0.0
+
+def mark_knowledge_base_changed(path: str | None = None) -> str:
+    """Give the knowledge base a new version, so answers computed from the old content are refreshed."""
+    path = path or settings.KB_VERSION_FILE
+    version = uuid.uuid4().hex
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "changed_at": time.time()}, f)
+    os.replace(tmp_path, path)
+    return version
@@ -0,0 +1,261 @@
+import os
+import json
+import math
+import logging
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+GRAPH_FILE_NAME = "link_graph.npz"
+LOG_FILE_NAME = "link_graph.log"
+
+# Node kinds; a node keeps the highest kind it was seen as
+LINK, PDF, PAGE = 0, 1, 2
+KIND_NAMES = {LINK: "link", PDF: "pdf", PAGE: "page"}
+
+def normalize_url(url: str) -> str:
+    return url.split("#")[0].strip()
+
+def _csr(sources: np.ndarray, targets: np.ndarray, num_nodes: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32)
+
+class LinkGraph:
+    """
+    Compact directed graph of page -> link edges, kept out of the vector store.
+
+    URLs get integer node IDs; edges are kept as CSR adjacency arrays (outbound, and the
+    transposed inbound) in link_graph.npz. Each page's links replace its previous ones,
+    and updates are appended to link_graph.log and folded into the arrays by compact()
+    (automatically every LINK_GRAPH_COMPACT_EVERY updates), so recording a page never
+    rewrites the whole graph. Other processes pick up new files on their next query.
+    Writers (the crawler and the ingesters) should run one at a time.
+    """
+    def __init__(self, directory: str, compact_every: int = 1000):
+        self.directory = directory
+        self.compact_every = compact_every
+        self.graph_path = os.path.join(directory, GRAPH_FILE_NAME)
+        self.log_path = os.path.join(directory, LOG_FILE_NAME)
+        self._lock = threading.RLock()
+        self._signature = None
+        self._reset()
+
+    def _reset(self):
+        self._ids: Dict[str, int] = {}
+        self._urls: List[str] = []
+        self._kinds = bytearray()
+        self._out_indptr = np.zeros(1, dtype=np.int64)
+        self._out_indices = np.empty(0, dtype=np.int32)
+        self._in_indptr = np.zeros(1, dtype=np.int64)
+        self._in_indices = np.empty(0, dtype=np.int32)
+        # Pages whose links changed since the arrays were built: node id -> target ids
+        self._overlay: Dict[int, np.ndarray] = {}
+        self._log_entries = 0
+
+    def _files_signature(self):
+        signature = []
+        for path in (self.graph_path, self.log_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _ensure_loaded(self):
+        """(Re)load from disk if the files changed since they were last read or written here."""
+        signature = self._files_signature()
+        if signature == self._signature:
+            return
+        self._reset()
+        if os.path.exists(self.graph_path):
+            with np.load(self.graph_path) as data:
+                offsets = data["url_offsets"]
+                blob = data["url_blob"].tobytes()
+                self._urls = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+                self._kinds = bytearray(data["kinds"].tobytes())
+                self._out_indptr, self._out_indices = data["out_indptr"], data["out_indices"]
+                self._in_indptr, self._in_indices = data["in_indptr"], data["in_indices"]
+            self._ids = {url: idx for idx, url in enumerate(self._urls)}
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn last line from an interrupted writer
+                    self._set_links(entry["url"], entry.get("links", []), entry.get("pdf_links", []))
+                    self._log_entries += 1
+        self._signature = signature
+
+    def _node(self, url: str, kind: int) -> int:
+        idx = self._ids.get(url)
+        if idx is None:
+            idx = len(self._urls)
+            self._ids[url] = idx
+            self._urls.append(url)
+            self._kinds.append(kind)
+        elif kind > self._kinds[idx]:
+            self._kinds[idx] = kind
+        return idx
+
+    def _set_links(self, page_url: str, links: Iterable[str], pdf_links: Iterable[str]) -> bool:
+        page_url = normalize_url(page_url)
+        if not page_url:
+            return False
+        # The crawler also follows links to PDFs; those stay PDF nodes
+        source = self._node(page_url, PDF if page_url.lower().endswith(".pdf") else PAGE)
+        targets = {self._node(url, PDF) for url in map(normalize_url, pdf_links) if url}
+        targets.update(self._node(url, LINK) for url in map(normalize_url, links) if url)
+        targets.discard(source)
+        self._overlay[source] = np.fromiter(sorted(targets), dtype=np.int32, count=len(targets))
+        return True
+
+    def add_page(self, page_url: str, links: Iterable[str], pdf_links: Iterable[str] = ()):
+        """Record (or replace) a page's outgoing links."""
+        links, pdf_links = list(links or []), list(pdf_links or [])
+        with self._lock:
+            self._ensure_loaded()
+            if not self._set_links(page_url, links, pdf_links):
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"url": page_url, "links": links, "pdf_links": pdf_links}, ensure_ascii=False) + "\n")
+            self._log_entries += 1
+            self._signature = self._files_signature()
+            if self.compact_every and self._log_entries >= self.compact_every:
+                self.compact()
+
+    def _rebuild(self):
+        """Fold the overlay into the CSR arrays (in memory only)."""
+        if not self._overlay and len(self._out_indptr) == len(self._urls) + 1:
+            return
+        num_nodes = len(self._urls)
+        base_nodes = len(self._out_indptr) - 1
+        sources = np.repeat(np.arange(base_nodes, dtype=np.int32), np.diff(self._out_indptr))
+        keep = ~np.isin(sources, np.fromiter(self._overlay, dtype=np.int32, count=len(self._overlay)))
+        sources, targets = [sources[keep]], [self._out_indices[keep]]
+        for source, page_targets in self._overlay.items():
+            sources.append(np.full(len(page_targets), source, dtype=np.int32))
+            targets.append(page_targets)
+        sources, targets = np.concatenate(sources), np.concatenate(targets)
+        self._out_indptr, self._out_indices = _csr(sources, targets, num_nodes)
+        self._in_indptr, self._in_indices = _csr(targets, sources, num_nodes)
+        self._overlay = {}
+
+    def compact(self):
+        """Write the graph as arrays and clear the update log."""
+        with self._lock:
+            self._ensure_loaded()
+            self._rebuild()
+            os.makedirs(self.directory, exist_ok=True)
+            encoded = [url.encode("utf-8") for url in self._urls]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(url) for url in encoded], out=offsets[1:])
+            tmp_path = f"{self.graph_path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                url_blob=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                url_offsets=offsets,
+                kinds=np.frombuffer(bytes(self._kinds), dtype=np.uint8),
+                out_indptr=self._out_indptr,
+                out_indices=self._out_indices,
+                in_indptr=self._in_indptr,
+                in_indices=self._in_indices,
+            )
+            os.replace(tmp_path, self.graph_path)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self._log_entries = 0
+            self._signature = self._files_signature()
+            logger.info(f"Link graph compacted: {len(self._urls)} nodes, {len(self._out_indices)} edges.")
+
+    def _query_ready(self, url: str) -> int | None:
+        self._ensure_loaded()
+        self._rebuild()
+        return self._ids.get(normalize_url(url))
+
+    def _neighbors(self, indptr: np.ndarray, indices: np.ndarray, idx: int) -> np.ndarray:
+        return indices[indptr[idx]:indptr[idx + 1]]
+
+    def _describe(self, ids: Iterable[int], scores: Iterable[float] | None = None) -> List[dict]:
+        results = []
+        for position, idx in enumerate(ids):
+            item = {"url": self._urls[idx], "kind": KIND_NAMES[self._kinds[idx]]}
+            if scores is not None:
+                item["score"] = round(float(scores[position]), 4)
+            results.append(item)
+        return results
+
+    def _filter_kind(self, ids: np.ndarray, kind: str | None) -> np.ndarray:
+        if kind is None:
+            return ids
+        wanted = next(k for k, name in KIND_NAMES.items() if name == kind)
+        kinds = np.frombuffer(bytes(self._kinds), dtype=np.uint8)
+        return ids[kinds[ids] == wanted]
+
+    def inbound(self, url: str, limit: int = 50) -> List[dict]:
+        """Pages linking to url (e.g. the pages that link to a form)."""
+        with self._lock:
+            idx = self._query_ready(url)
+            if idx is None:
+                return []
+            return self._describe(self._neighbors(self._in_indptr, self._in_indices, idx)[:limit])
+
+    def outbound(self, url: str, limit: int = 200, kind: str | None = None) -> List[dict]:
+        """Links on a page, optionally only of one kind (page, pdf or link)."""
+        with self._lock:
+            idx = self._query_ready(url)
+            if idx is None:
+                return []
+            targets = self._filter_kind(self._neighbors(self._out_indptr, self._out_indices, idx), kind)
+            return self._describe(targets[:limit])
+
+    def related(self, url: str, limit: int = 10, kind: str | None = "page") -> List[dict]:
+        """
+        Pages most related to url by shared links: pages linked from the same pages
+        (co-citation) and pages linking to the same targets (coupling). Every shared
+        neighbour counts 1 / log2(2 + degree), so navigation links that appear on every
+        page of a portal count for little.
+        """
+        with self._lock:
+            idx = self._query_ready(url)
+            if idx is None:
+                return []
+            num_nodes = len(self._urls)
+            scores = np.zeros(num_nodes, dtype=np.float64)
+            out_degree, in_degree = np.diff(self._out_indptr), np.diff(self._in_indptr)
+            for parent in self._neighbors(self._in_indptr, self._in_indices, idx):
+                siblings = self._neighbors(self._out_indptr, self._out_indices, parent)
+                scores[siblings] += 1.0 / math.log2(2 + out_degree[parent])
+            for target in self._neighbors(self._out_indptr, self._out_indices, idx):
+                cociting = self._neighbors(self._in_indptr, self._in_indices, target)
+                scores[cociting] += 1.0 / math.log2(2 + in_degree[target])
+            scores[idx] = 0.0
+
+            candidates = self._filter_kind(np.flatnonzero(scores), kind)
+            top = candidates[np.argsort(-scores[candidates], kind="stable")[:limit]]
+            return self._describe(top, scores[top])
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._ensure_loaded()
+            self._rebuild()
+            kinds = np.frombuffer(bytes(self._kinds), dtype=np.uint8)
+            return {
+                "nodes": len(self._urls),
+                "edges": int(len(self._out_indices)),
+                **{f"{name}_nodes": int(np.sum(kinds == kind)) for kind, name in KIND_NAMES.items()},
+                "pending_updates": self._log_entries,
+                "file_bytes": os.path.getsize(self.graph_path) if os.path.exists(self.graph_path) else 0,
+            }
+
+# Singleton shared by the ingesters, the crawler and the /links endpoints
+link_graph = LinkGraph(settings.LINK_GRAPH_DIR, compact_every=settings.LINK_GRAPH_COMPACT_EVERY)
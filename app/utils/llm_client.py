@@ -0,0 +1,98 @@
+import time
+import logging
+from typing import Dict, Iterator, List
+
+from app.config import settings
+from app.utils.llm_gateway import Priority, llm_gateway
+from app.utils.metrics import LLM_CALLS, LLM_TOKENS, STAGE_SECONDS, registry
+from app.utils.single_flight import hash_key, llm_flight
+
+logger = logging.getLogger(__name__)
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) when the provider reports no usage."""
+    return max(1, len(text) // 4) if text else 0
+
+def stream_chat_completion(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    call_type: str,
+    model: str | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    deadline_s: float | None = None,
+    response_format: dict | None = None,
+) -> Iterator[str]:
+    """
+    Stream a chat completion through the LLM gateway, yielding content tokens.
+    Records time-to-first-token, total time, token counts and outcome per call_type.
+    Pass response_format={"type": "json_object"} to request JSON mode.
+    """
+    started = time.perf_counter()
+    first_token_at = None
+    usage = None
+    completion_chunks = 0
+    request_options = {"response_format": response_format} if response_format else {}
+
+    try:
+        response_stream = llm_gateway.stream(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model=model,
+            priority=priority,
+            deadline_s=settings.LLM_DEADLINE_S if deadline_s is None else deadline_s,
+            **request_options,
+        )
+
+        for chunk in response_stream:
+            # Groq reports token usage on the last chunk
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                usage = x_groq.usage
+
+            if chunk.choices and hasattr(chunk.choices[0].delta, "content"):
+                token = chunk.choices[0].delta.content
+                if token:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        STAGE_SECONDS.observe(first_token_at - started, stage="llm_ttft")
+                    completion_chunks += 1
+                    yield token
+    except Exception:
+        LLM_CALLS.inc(call_type=call_type, outcome="error")
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_total")
+
+    if registry.enabled:
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+            completion_tokens = completion_chunks
+        LLM_TOKENS.inc(prompt_tokens, call_type=call_type, direction="in")
+        LLM_TOKENS.inc(completion_tokens, call_type=call_type, direction="out")
+    LLM_CALLS.inc(call_type=call_type, outcome="ok")
+
+def complete_chat(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    call_type: str,
+    model: str | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    deadline_s: float | None = None,
+) -> str:
+    """
+    Collect a streamed chat completion into a single stripped string. Concurrent
+    calls with identical messages and parameters share one upstream request.
+    """
+    key = hash_key(model or settings.MODEL_NAME_CONVERSATIONAL_GROQ, messages, max_tokens, temperature)
+    return llm_flight.do(
+        key,
+        lambda: "".join(stream_chat_completion(
+            messages, max_tokens, temperature, call_type,
+            model=model, priority=priority, deadline_s=deadline_s,
+        )).strip(),
+    )
@@ -0,0 +1,439 @@
+import os
+import json
+import time
+import queue
+import heapq
+import random
+import logging
+import itertools
+import threading
+from enum import IntEnum
+from typing import Dict, Iterator, List
+
+import groq
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; the shared limiter needs it
+    fcntl = None
+
+from app.config import settings
+from app.utils.client_manager import client_manager
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LLM_GATEWAY_EVENTS = registry.counter(
+    "bureasy_llm_gateway_events_total",
+    "LLM gateway events: retry, rate_limited, deadline_exceeded, hedge_started, hedge_won.",
+    ["event"],
+)
+LLM_QUEUE_SECONDS = registry.histogram(
+    "bureasy_llm_queue_seconds",
+    "Time LLM calls waited in the gateway scheduler, by priority.",
+    ["priority"],
+)
+
+class Priority(IntEnum):
+    """Lower values are scheduled first."""
+    INTERACTIVE = 0  # a user is waiting on the response (chat, checklists)
+    DEFAULT = 1
+    BACKGROUND = 2   # batch work such as scraper summaries
+
+class LLMGatewayError(Exception):
+    """Base class for errors raised by the gateway itself."""
+
+class LLMDeadlineExceeded(LLMGatewayError, TimeoutError):
+    """The call's deadline passed while queued, retrying or streaming."""
+
+class TokenBucket:
+    """Continuously refilling bucket sized to a per-minute limit. A limit <= 0 disables it."""
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)."""
+        if not self.enabled:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.enabled:
+            self.tokens -= min(amount, self.capacity)
+
+class SharedLimiter:
+    """
+    Rate buckets and priority shared by every process using the same state file (the API
+    and the scrapers), so their calls draw on one provider limit and background work in
+    one process yields to interactive calls waiting in another. The state is a small JSON
+    file updated under an exclusive lock; times are wall-clock seconds.
+    """
+    # An interactive call waiting for capacity keeps lower priorities out for this long;
+    # it refreshes the hold every time it re-checks.
+    INTERACTIVE_HOLD_S = 0.5
+
+    def __init__(self, path: str, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        if fcntl is None:
+            raise RuntimeError("The shared LLM limiter needs fcntl (POSIX).")
+        self.path = path
+        self.limits = {"requests": float(requests_per_minute), "tokens": float(tokens_per_minute)}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def _update(self, change):
+        """Run change(state, now) on the locked state and write it back. Returns its result."""
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                for name, limit in self.limits.items():
+                    # Refill like TokenBucket
+                    available = state.get(name, limit)
+                    elapsed = max(0.0, now - state.get("updated", now))
+                    state[name] = min(limit, available + elapsed * limit / 60.0)
+                state["updated"] = now
+                result = change(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self, priority: Priority, tokens: int, announce: bool = True) -> float:
+        """
+        Take capacity for one call if it is available now and no higher-priority call is
+        waiting anywhere. Returns 0 on success, otherwise the seconds to wait before
+        trying again.
+        """
+        amounts = {"requests": 1.0, "tokens": float(tokens)}
+
+        def change(state, now):
+            wait = state.get("blocked_until", 0.0) - now
+            if priority > Priority.INTERACTIVE:
+                wait = max(wait, state.get("interactive_until", 0.0) - now)
+            for name, limit in self.limits.items():
+                if limit > 0:
+                    amount = min(amounts[name], limit)
+                    if state[name] < amount:
+                        wait = max(wait, (amount - state[name]) * 60.0 / limit)
+            if wait <= 0:
+                for name, limit in self.limits.items():
+                    if limit > 0:
+                        state[name] -= min(amounts[name], limit)
+                return 0.0
+            if priority == Priority.INTERACTIVE and announce:
+                state["interactive_until"] = now + self.INTERACTIVE_HOLD_S
+                wait = min(wait, self.INTERACTIVE_HOLD_S / 2)
+            return wait
+
+        return self._update(change)
+
+    def pause(self, seconds: float):
+        """Hold every process's calls back for `seconds` (after a 429)."""
+        def change(state, now):
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), now + seconds)
+        self._update(change)
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, groq.InternalServerError)):
+        return True
+    return isinstance(exc, groq.APIStatusError) and exc.status_code >= 500
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """~4 characters per token; only used to charge the tokens-per-minute bucket."""
+    return sum(len(m.get("content", "")) for m in messages) // 4 + 4 * len(messages)
+
+class _Attempt:
+    """One upstream request, opened on a worker thread when hedging is enabled."""
+    def __init__(self, attempt_id: int):
+        self.attempt_id = attempt_id
+        self.cancelled = threading.Event()
+        self.stream = None
+
+    def close(self):
+        self.cancelled.set()
+        close = getattr(self.stream, "close", None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+class LLMGateway:
+    """
+    Central entry point for chat completions on top of ClientManager:
+
+    - a scheduler with requests-per-minute and tokens-per-minute token buckets,
+      serving waiting calls strictly by priority, then arrival order
+    - bounded retries with full jitter for 429s, timeouts, connection errors and 5xx,
+      honouring Retry-After (a 429 pauses the whole gateway for that long)
+    - optionally a SharedLimiter in place of the in-process buckets, so several
+      processes share the limits and the priorities
+    - a per-call deadline covering queueing, retries and streaming
+    - optional hedging: if no token has arrived after `hedge_after_s`, a second
+      identical request is sent and whichever produces content first is kept
+    """
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_retries: int = 2,
+        retry_base_delay_s: float = 0.5,
+        retry_max_delay_s: float = 8.0,
+        hedge_after_s: float = 0.0,
+        shared_state_path: str = "",
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.shared = SharedLimiter(shared_state_path, requests_per_minute, tokens_per_minute) if shared_state_path else None
+        self.max_retries = max_retries
+        self.retry_base_delay_s = retry_base_delay_s
+        self.retry_max_delay_s = retry_max_delay_s
+        self.hedge_after_s = hedge_after_s
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._blocked_until = 0.0
+
+    # -- Scheduling --
+
+    def _acquire(self, priority: Priority, tokens: int, deadline: float | None):
+        """Block until this call may be sent: it is first in line and both buckets have capacity."""
+        entry = (int(priority), next(self._seq))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiting[0] == entry and self.shared is not None:
+                        wait = self._blocked_until - now
+                        if wait <= 0:
+                            wait = self.shared.acquire(priority, tokens)
+                        if wait <= 0:
+                            LLM_QUEUE_SECONDS.observe(now - started, priority=priority.name.lower())
+                            return
+                    elif self._waiting[0] == entry:
+                        wait = max(
+                            self._blocked_until - now,
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(tokens, now),
+                        )
+                        if wait <= 0:
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            LLM_QUEUE_SECONDS.observe(now - started, priority=priority.name.lower())
+                            return
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            LLM_GATEWAY_EVENTS.inc(event="deadline_exceeded")
+                            raise LLMDeadlineExceeded("Deadline exceeded while waiting for LLM capacity.")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _try_acquire_now(self, tokens: int) -> bool:
+        """Take capacity only if nobody is queued and it is available right now (used for hedges)."""
+        with self._cond:
+            now = time.monotonic()
+            if self._waiting or self._blocked_until > now:
+                return False
+            if self.shared is not None:
+                return self.shared.acquire(Priority.DEFAULT, tokens, announce=False) <= 0
+            if self.requests.wait_time(1, now) > 0 or self.tokens.wait_time(tokens, now) > 0:
+                return False
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            return True
+
+    def _pause(self, seconds: float):
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+        if self.shared is not None:
+            self.shared.pause(seconds)
+
+    # -- Upstream calls --
+
+    def _open(self, request: dict, deadline: float | None, attempt: _Attempt):
+        """Open a stream and read up to the first content chunk. Returns (buffered_chunks, iterator)."""
+        client_manager.setup_clients()
+        groq_client = client_manager.get_groq_client()
+        timeout = groq.NOT_GIVEN if deadline is None else max(0.1, deadline - time.monotonic())
+
+        attempt.stream = groq_client.chat.completions.create(**request, stream=True, timeout=timeout)
+        iterator = iter(attempt.stream)
+        buffered = []
+        for chunk in iterator:
+            buffered.append(chunk)
+            if chunk.choices and getattr(chunk.choices[0].delta, "content", None):
+                break
+        return buffered, iterator
+
+    def _open_hedged(self, request: dict, deadline: float | None, estimated_tokens: int):
+        """Run _open on worker threads, adding a hedge if the primary is slow to produce content."""
+        results = queue.Queue()
+        attempts: List[_Attempt] = []
+
+        def run(attempt: _Attempt):
+            try:
+                buffered, iterator = self._open(request, deadline, attempt)
+                if attempt.cancelled.is_set():
+                    attempt.close()  # lost the race while connecting
+                    return
+                results.put((attempt, buffered, iterator, None))
+            except Exception as e:
+                results.put((attempt, None, None, e))
+
+        def launch():
+            attempt = _Attempt(len(attempts))
+            attempts.append(attempt)
+            threading.Thread(target=run, args=(attempt,), name=f"llm-attempt-{attempt.attempt_id}", daemon=True).start()
+
+        launch()
+        hedged = False
+        errors = []
+        while True:
+            timeout = None
+            if not hedged:
+                timeout = self.hedge_after_s
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            try:
+                attempt, buffered, iterator, error = results.get(timeout=timeout)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    for a in attempts:
+                        a.close()
+                    LLM_GATEWAY_EVENTS.inc(event="deadline_exceeded")
+                    raise LLMDeadlineExceeded("Deadline exceeded waiting for the first LLM token.")
+                if not hedged:
+                    hedged = True
+                    if self._try_acquire_now(estimated_tokens):
+                        LLM_GATEWAY_EVENTS.inc(event="hedge_started")
+                        launch()
+                continue
+
+            if error is not None:
+                errors.append(error)
+                # Give up once every launched attempt has failed (and no hedge can follow)
+                if not hedged or len(errors) == len(attempts):
+                    raise errors[0]
+                continue
+
+            # First attempt with content wins; the others are cancelled
+            for other in attempts:
+                if other is not attempt:
+                    other.close()
+            if attempt.attempt_id > 0:
+                LLM_GATEWAY_EVENTS.inc(event="hedge_won")
+            return attempt, buffered, iterator
+
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        model: str | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+        deadline_s: float | None = None,
+        hedge: bool = True,
+        **request_options,
+    ) -> Iterator:
+        """
+        Yield raw completion chunks. Failures before the first chunk is yielded are
+        retried; once content has been delivered to the caller, errors propagate.
+        """
+        deadline = None if not deadline_s else time.monotonic() + deadline_s
+        estimated_tokens = estimate_prompt_tokens(messages) + max_tokens
+        request = {
+            "model": model or settings.MODEL_NAME_CONVERSATIONAL_GROQ,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            **request_options,
+        }
+
+        for attempt_number in range(self.max_retries + 1):
+            self._acquire(priority, estimated_tokens, deadline)
+            try:
+                if hedge and self.hedge_after_s > 0:
+                    attempt, buffered, iterator = self._open_hedged(request, deadline, estimated_tokens)
+                else:
+                    attempt = _Attempt(0)
+                    buffered, iterator = self._open(request, deadline, attempt)
+                break
+            except LLMDeadlineExceeded:
+                raise
+            except Exception as e:
+                if isinstance(e, groq.RateLimitError):
+                    LLM_GATEWAY_EVENTS.inc(event="rate_limited")
+                    self._pause(_retry_after(e) or self.retry_base_delay_s)
+                if attempt_number >= self.max_retries or not _is_retryable(e):
+                    raise
+
+                delay = random.uniform(0, min(self.retry_max_delay_s, self.retry_base_delay_s * (2 ** attempt_number)))
+                delay = max(delay, _retry_after(e) or 0.0)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    LLM_GATEWAY_EVENTS.inc(event="deadline_exceeded")
+                    raise LLMDeadlineExceeded(f"Deadline exceeded before retrying LLM call: {e}") from e
+                LLM_GATEWAY_EVENTS.inc(event="retry")
+                logger.warning(f"LLM call failed ({e}); retry {attempt_number + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+        try:
+            yield from buffered
+            for chunk in iterator:
+                if deadline is not None and time.monotonic() > deadline:
+                    LLM_GATEWAY_EVENTS.inc(event="deadline_exceeded")
+                    raise LLMDeadlineExceeded("Deadline exceeded while streaming the LLM response.")
+                yield chunk
+        finally:
+            attempt.close()
+
+# Singleton gateway, configured from settings
+llm_gateway = LLMGateway(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    max_retries=settings.LLM_MAX_RETRIES,
+    retry_base_delay_s=settings.LLM_RETRY_BASE_DELAY_S,
+    retry_max_delay_s=settings.LLM_RETRY_MAX_DELAY_S,
+    hedge_after_s=settings.LLM_HEDGE_AFTER_MS / 1000.0,
+    shared_state_path=settings.LLM_SHARED_STATE_FILE,
+)
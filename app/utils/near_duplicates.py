@@ -0,0 +1,184 @@
+"""
+Near-duplicate and boilerplate detection for ingestion.
+
+- BoilerplateModel: word shingles that occur on a large share of a site's pages
+  (navigation, cookie banners, footers) are counted across the crawl and the words
+  they cover are stripped from page text before chunking.
+- MinHashLSH: near-duplicate pages (estimated Jaccard similarity of word shingles).
+- SimHashIndex: near-duplicate chunks (Hamming distance of 64-bit SimHash fingerprints).
+
+Shingles are hashed with blake2b rather than hash(), so fingerprints computed in
+worker processes agree with each other and across runs.
+"""
+import re
+import hashlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+WORD_RE = re.compile(r"\S+")
+# Words per shingle for boilerplate detection and for page/chunk fingerprints
+BOILERPLATE_SHINGLE_WORDS = 8
+FINGERPRINT_SHINGLE_WORDS = 5
+
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16  # 16 bands x 8 rows: pairs above ~0.7 Jaccard become candidates
+
+SIMHASH_BITS = 64
+SIMHASH_BLOCKS = 4  # any two fingerprints within 3 bits share at least one 16-bit block
+
+def site_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+def shingle_hashes(words: List[str], size: int) -> np.ndarray:
+    """64-bit hashes of every `size`-word window (one window for shorter texts)."""
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    count = max(1, len(words) - size + 1)
+    return np.fromiter(
+        (_hash64(" ".join(words[i:i + size]).lower()) for i in range(count)), dtype=np.uint64, count=count,
+    )
+
+class BoilerplateModel:
+    """
+    Per-site shingle document frequencies. A shingle found on at least min_page_ratio
+    of a site's pages (and at least min_pages of them) is boilerplate; stripping removes
+    every word covered by a boilerplate shingle.
+    """
+    def __init__(self, min_page_ratio: float, min_pages: int, shingle_words: int = BOILERPLATE_SHINGLE_WORDS):
+        self.min_page_ratio = min_page_ratio
+        self.min_pages = min_pages
+        self.shingle_words = shingle_words
+        self._hashes: Dict[str, List[np.ndarray]] = defaultdict(list)
+        self.boilerplate: Dict[str, np.ndarray] = {}
+
+    def page_shingles(self, text: str) -> np.ndarray:
+        return np.unique(shingle_hashes(WORD_RE.findall(text), self.shingle_words))
+
+    def add(self, site: str, shingles: np.ndarray):
+        """Count one page's unique shingles (from page_shingles, possibly computed in a worker)."""
+        self._hashes[site].append(shingles)
+
+    def fit(self) -> "BoilerplateModel":
+        for site, pages in self._hashes.items():
+            threshold = max(self.min_pages, int(np.ceil(self.min_page_ratio * len(pages))))
+            if len(pages) < threshold:
+                continue
+            values, counts = np.unique(np.concatenate(pages), return_counts=True)
+            frequent = values[counts >= threshold]
+            if len(frequent):
+                self.boilerplate[site] = frequent
+        self._hashes.clear()
+        return self
+
+    def strip(self, site: str, text: str) -> str:
+        frequent = self.boilerplate.get(site)
+        if frequent is None:
+            return text
+        words = WORD_RE.findall(text)
+        if len(words) < self.shingle_words:
+            return text
+        hits = np.flatnonzero(np.isin(shingle_hashes(words, self.shingle_words), frequent, assume_unique=False))
+        if not len(hits):
+            return text
+        # Mark the window of every hit: prefix sums of +1 at the start and -1 after the end
+        delta = np.zeros(len(words) + 1, dtype=np.int32)
+        np.add.at(delta, hits, 1)
+        np.add.at(delta, hits + self.shingle_words, -1)
+        keep = np.cumsum(delta[:-1]) == 0
+        return " ".join(word for word, kept in zip(words, keep) if kept)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Picklable state for worker processes (see from_state)."""
+        return self.boilerplate
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], shingle_words: int = BOILERPLATE_SHINGLE_WORDS) -> "BoilerplateModel":
+        model = cls(0.0, 0, shingle_words)
+        model.boilerplate = state
+        return model
+
+_rng = np.random.default_rng(0x5EED)
+_MINHASH_A = _rng.integers(1, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_MINHASH_B = _rng.integers(0, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+def minhash(text: str, shingle_words: int = FINGERPRINT_SHINGLE_WORDS) -> np.ndarray | None:
+    """MinHash signature of a text's word shingles; None for empty text."""
+    hashes = np.unique(shingle_hashes(WORD_RE.findall(text), shingle_words))
+    if not len(hashes):
+        return None
+    # Multiply-add permutations with 64-bit wrap-around, one row per permutation
+    with np.errstate(over="ignore"):
+        permuted = _MINHASH_A[:, None] * hashes[None, :] + _MINHASH_B[:, None]
+    return permuted.min(axis=1)
+
+class MinHashLSH:
+    """Banded LSH over MinHash signatures; query returns the closest earlier item above threshold."""
+    def __init__(self, threshold: float, bands: int = MINHASH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self._signatures: List[np.ndarray] = []
+        self._keys: List[str] = []
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature: np.ndarray) -> Tuple[str, float] | None:
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self._buckets.get(band_key, ()))
+        best = None
+        for idx in candidates:
+            similarity = float(np.mean(self._signatures[idx] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (self._keys[idx], similarity)
+        return best
+
+    def add(self, key: str, signature: np.ndarray):
+        idx = len(self._signatures)
+        self._signatures.append(signature)
+        self._keys.append(key)
+        for band_key in self._band_keys(signature):
+            self._buckets[band_key].append(idx)
+
+def simhash(text: str, shingle_words: int = 3) -> int | None:
+    """64-bit SimHash over word shingles; None for empty text."""
+    hashes = shingle_hashes(WORD_RE.findall(text), shingle_words)
+    if not len(hashes):
+        return None
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int(sum(1 << i for i in np.flatnonzero(votes > 0)))
+
+class SimHashIndex:
+    """Finds an earlier fingerprint within max_distance bits (max_distance < SIMHASH_BLOCKS)."""
+    def __init__(self, max_distance: int):
+        if max_distance >= SIMHASH_BLOCKS:
+            raise ValueError(f"max_distance must be below {SIMHASH_BLOCKS}")
+        self.max_distance = max_distance
+        self.block_bits = SIMHASH_BITS // SIMHASH_BLOCKS
+        self._tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(SIMHASH_BLOCKS)]
+
+    def _blocks(self, fingerprint: int) -> Iterable[Tuple[int, int]]:
+        mask = (1 << self.block_bits) - 1
+        for block in range(SIMHASH_BLOCKS):
+            yield block, (fingerprint >> (block * self.block_bits)) & mask
+
+    def contains(self, fingerprint: int) -> bool:
+        for block, value in self._blocks(fingerprint):
+            for other in self._tables[block].get(value, ()):
+                if bin(other ^ fingerprint).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def add(self, fingerprint: int):
+        for block, value in self._blocks(fingerprint):
+            self._tables[block][value].append(fingerprint)
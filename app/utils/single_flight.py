@@ -0,0 +1,158 @@
+import re
+import json
+import hashlib
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterator, List
+
+from app.config import settings
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_CALLS = registry.counter(
+    "bureasy_single_flight_calls_total",
+    "Calls through a single-flight group; role=follower means the call was coalesced into one already in progress.",
+    ["group", "role"],
+)
+
+def normalize_key(text: str) -> str:
+    """Case- and whitespace-insensitive key for user queries."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def hash_key(*parts: Any) -> str:
+    """Stable digest of JSON-serialisable parts, e.g. an LLM call's messages and parameters."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+class _SharedStream:
+    """Items produced so far by one shared generator run, and how it ended."""
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.cancelled = False
+        self.consumers = 0
+        self.cond = threading.Condition()
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-progress computation: the
+    first caller (leader) runs it and every caller that arrives before it
+    finishes (followers) receives the same result or exception. Nothing is
+    cached afterwards. Results are shared between callers and must not be mutated.
+    stream() does the same for generators.
+    """
+    def __init__(self, group: str, enabled: bool = True):
+        self.group = group
+        self.enabled = enabled
+        self._calls: Dict[Hashable, Future] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        if not self.enabled:
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            SINGLE_FLIGHT_CALLS.inc(group=self.group, role="follower")
+            return call.result()
+
+        SINGLE_FLIGHT_CALLS.inc(group=self.group, role="leader")
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stream(self, key: Hashable, fn: Callable[..., Iterator], *args, **kwargs) -> Iterator:
+        """
+        Iterate fn(*args, **kwargs), sharing one run between concurrent callers with the
+        same key: every caller gets all items from the first one on, then the same end
+        or exception. The run is produced in a background thread, so it does not depend
+        on the caller that started it; it is closed early once every caller has stopped.
+        """
+        if not self.enabled:
+            yield from fn(*args, **kwargs)
+            return
+
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = _SharedStream()
+            shared.consumers += 1
+
+        SINGLE_FLIGHT_CALLS.inc(group=self.group, role="leader" if leader else "follower")
+        if leader:
+            context = contextvars.copy_context()
+            threading.Thread(
+                target=context.run, args=(self._produce, key, shared, fn, args, kwargs),
+                name=f"single-flight-{self.group}", daemon=True,
+            ).start()
+
+        position = 0
+        try:
+            while True:
+                with shared.cond:
+                    while position >= len(shared.items) and not shared.done:
+                        shared.cond.wait()
+                    if position < len(shared.items):
+                        item = shared.items[position]
+                        position += 1
+                    elif shared.error is not None:
+                        raise shared.error
+                    else:
+                        return
+                yield item
+        finally:
+            with self._lock:
+                shared.consumers -= 1
+                if shared.consumers == 0 and not shared.done:
+                    # Nobody is listening any more: stop the run, and let new callers start afresh
+                    shared.cancelled = True
+                    if self._streams.get(key) is shared:
+                        del self._streams[key]
+
+    def _produce(self, key: Hashable, shared: _SharedStream, fn: Callable[..., Iterator], args, kwargs):
+        source = None
+        try:
+            source = fn(*args, **kwargs)
+            for item in source:
+                with shared.cond:
+                    shared.items.append(item)
+                    shared.cond.notify_all()
+                if shared.cancelled:
+                    break
+        except BaseException as e:
+            shared.error = e
+        finally:
+            if source is not None and hasattr(source, "close"):
+                try:
+                    source.close()
+                except Exception as e:
+                    logger.warning(f"Closing shared {self.group} stream failed: {e}")
+            with self._lock:
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+            with shared.cond:
+                shared.done = True
+                shared.cond.notify_all()
+
+# Shared groups
+embedding_flight = SingleFlight("embedding", enabled=settings.SINGLE_FLIGHT_ENABLED)
+retrieval_flight = SingleFlight("retrieval", enabled=settings.SINGLE_FLIGHT_ENABLED)
+llm_flight = SingleFlight("llm", enabled=settings.SINGLE_FLIGHT_ENABLED)
@@ -0,0 +1,136 @@
+import json
+from typing import Any, Iterable, List, Tuple
+
+# Models sometimes wrap JSON in a markdown fence despite being told not to
+FENCE_PREFIX = "```json"
+
+class MalformedJSONError(ValueError):
+    """The streamed text cannot become the expected JSON object."""
+
+class StreamingJSONObjectParser:
+    """
+    Incremental parser for a streamed top-level JSON object.
+
+    Text is fed chunk by chunk as tokens arrive. Every string element of the
+    watched top-level array fields (e.g. "steps") is returned from feed() as soon
+    as its closing quote arrives, so it can be forwarded before the object is
+    complete. Output that clearly cannot become a JSON object (prose before the
+    opening brace, a bare key, mismatched brackets, text after the object) raises
+    MalformedJSONError immediately, so the caller can stop the generation instead
+    of paying for the remaining tokens. close() parses and returns the full object.
+    """
+    def __init__(self, array_fields: Iterable[str] = ()):
+        self.array_fields = set(array_fields)
+        self._prefix = ""
+        self._document: List[str] = []
+        self._stack: List[str] = []
+        self._started = False
+        self._finished = False
+
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._expect_key = False
+        self._current_key = None
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk of text and return completed (field, item) pairs."""
+        items = []
+        for char in text:
+            if not self._started:
+                self._consume_prefix(char)
+            elif self._finished:
+                if not (char.isspace() or char == "`"):
+                    raise MalformedJSONError(f"Unexpected text after the JSON object: {char!r}")
+            else:
+                self._document.append(char)
+                item = self._consume(char)
+                if item is not None:
+                    items.append(item)
+        return items
+
+    def close(self) -> dict:
+        """Return the complete parsed object, or raise MalformedJSONError if it is incomplete or invalid."""
+        if not self._finished:
+            raise MalformedJSONError("The response ended before the JSON object was complete.")
+        try:
+            return json.loads("".join(self._document))
+        except json.JSONDecodeError as e:
+            raise MalformedJSONError(f"Invalid JSON: {e}") from e
+
+    def _consume_prefix(self, char: str):
+        if char == "{":
+            self._started = True
+            self._document.append(char)
+            self._stack.append("{")
+            self._expect_key = True
+            return
+        if char.isspace() and not self._prefix.strip():
+            return
+        self._prefix += char
+        if not FENCE_PREFIX.startswith(self._prefix.strip()):
+            raise MalformedJSONError(f"Expected a JSON object, got {self._prefix[:40]!r}")
+
+    def _consume(self, char: str):
+        if self._in_string:
+            return self._consume_string(char)
+
+        depth = len(self._stack)
+        if char.isspace():
+            return None
+        if char == '"':
+            self._in_string = True
+            self._string = []
+            return None
+
+        # Inside the top-level object only a key or the closing brace may follow '{' or ','
+        if depth == 1 and self._expect_key and char != "}":
+            raise MalformedJSONError(f"Expected a quoted key, got {char!r}")
+
+        if char in "{[":
+            self._stack.append(char)
+            self._expect_key = char == "{"
+        elif char in "}]":
+            opener = "{" if char == "}" else "["
+            if not self._stack or self._stack[-1] != opener:
+                raise MalformedJSONError(f"Mismatched {char!r}")
+            self._stack.pop()
+            self._expect_key = False
+            if not self._stack:
+                self._finished = True
+        elif char == ",":
+            self._expect_key = self._stack[-1] == "{"
+        elif char == ":":
+            self._expect_key = False
+        return None
+
+    def _consume_string(self, char: str):
+        if self._escape:
+            self._escape = False
+            self._string.append(char)
+            return None
+        if char == "\\":
+            self._escape = True
+            self._string.append(char)
+            return None
+        if char != '"':
+            self._string.append(char)
+            return None
+
+        self._in_string = False
+        raw = "".join(self._string)
+        depth = len(self._stack)
+        if depth == 1 and self._expect_key:
+            self._current_key = self._decode(raw)
+            self._expect_key = False
+            return None
+        if depth == 2 and self._stack == ["{", "["] and self._current_key in self.array_fields:
+            return self._current_key, self._decode(raw)
+        return None
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError as e:
+            raise MalformedJSONError(f"Invalid string literal: {e}") from e
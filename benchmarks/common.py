@@ -0,0 +1,65 @@
+# benchmarks/common.py
+
+import os
+import glob
+import math
+import json
+import time
+from typing import Dict, Iterator, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPED_DATA_DIR = os.path.join(REPO_ROOT, "web_scraper", "recursive_scraped_data")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Fixed query set used by all retrieval benchmarks, so runs stay comparable.
+BENCHMARK_QUERIES = [
+    "How do I extend my residence permit in Munich?",
+    "I need to renew my visa, what documents do I need?",
+    "Where is the Foreigners Office (Ausländerbehörde) in Munich?",
+    "How do I register my address after moving to Munich?",
+    "What are the opening hours of the KVR?",
+    "How can I apply for an EU Blue Card?",
+    "What do I need for a family reunification visa?",
+    "How do I book an appointment at the citizens office?",
+    "Which health insurance proof is required for a residence permit?",
+    "How do I get a certificate of good conduct?",
+    "What is the phone number of the immigration office?",
+    "How do I apply for a residence permit for studying?",
+    "Can I work while my visa extension is being processed?",
+    "Where do I download the application form for a residence title?",
+    "How do I deregister when leaving Germany?",
+]
+
+def iter_scraped_pages(data_dir: str = SCRAPED_DATA_DIR) -> Iterator[Dict]:
+    """Yield every scraped page record under data_dir (level_*/*.json, mapping files excluded)."""
+    for path in sorted(glob.glob(os.path.join(data_dir, "level_*", "*.json"))):
+        if os.path.basename(path) == "mapping.json":
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            yield json.load(f)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+def latency_summary(latencies_s: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean in milliseconds."""
+    return {
+        "count": len(latencies_s),
+        "mean_ms": (sum(latencies_s) / len(latencies_s) * 1000.0) if latencies_s else 0.0,
+        "p50_ms": percentile(latencies_s, 50) * 1000.0,
+        "p95_ms": percentile(latencies_s, 95) * 1000.0,
+        "p99_ms": percentile(latencies_s, 99) * 1000.0,
+    }
+
+def save_results(name: str, results: Dict, results_dir: str = RESULTS_DIR) -> str:
+    """Write results to benchmarks/results/<name>-<timestamp>.json and return the path."""
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
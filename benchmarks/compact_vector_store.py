@@ -0,0 +1,86 @@
+"""
+Memory and recall of the compact vector store against exact float32 search.
+
+    python -m benchmarks.compact_vector_store
+    python -m benchmarks.compact_vector_store --synthetic 200000   # add random distractor vectors
+
+Pages from web_scraper/recursive_scraped_data are split into passages and embedded
+with the configured backend; BENCHMARK_QUERIES are the query set.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.utils.chromadb_client import embed_texts_array
+from app.utils.compact_vector_store import CompactVectorStore
+from benchmarks.common import BENCHMARK_QUERIES, iter_scraped_pages, latency_summary, save_results
+
+def load_passages(passage_chars: int):
+    passages = []
+    for page in iter_scraped_pages():
+        text = page.get("text", "")
+        passages.extend(text[i:i + passage_chars] for i in range(0, len(text), passage_chars))
+    return [p for p in passages if p.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compact vector storage.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--passage-chars", type=int, default=800)
+    parser.add_argument("--synthetic", type=int, default=0, help="Extra random unit vectors added as distractors")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    passages = load_passages(args.passage_chars)
+    vectors = embed_texts_array(passages)
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        noise = rng.standard_normal((args.synthetic, vectors.shape[1])).astype(np.float32)
+        vectors = np.vstack([vectors, noise / np.linalg.norm(noise, axis=1, keepdims=True)])
+    ids = [str(i) for i in range(len(vectors))]
+    queries = embed_texts_array(BENCHMARK_QUERIES)
+
+    # Exact float32 baseline
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    exact_top = [
+        set(np.argsort(sq_norms - 2.0 * (vectors @ q))[:args.k].tolist()) for q in queries
+    ]
+
+    results = [{
+        "config": "float32 exact",
+        "bytes_per_vector": float(vectors.shape[1] * 4),
+        "recall": 1.0,
+    }]
+    for dtype in ("float16", "int8"):
+        for rescore_factor in (1, 4):
+            with tempfile.TemporaryDirectory() as directory:
+                store = CompactVectorStore(directory, dtype=dtype, rescore_factor=rescore_factor, persist_every=0)
+                store.add(ids=ids, embeddings=vectors)
+
+                latencies, hits = [], 0
+                for q, expected in zip(queries, exact_top):
+                    started = time.perf_counter()
+                    found = store.query(query_embeddings=[q], n_results=args.k)["ids"][0]
+                    latencies.append(time.perf_counter() - started)
+                    hits += len(expected & {int(i) for i in found})
+
+                results.append({
+                    "config": f"{dtype} rescore x{rescore_factor}",
+                    "bytes_per_vector": store.memory_bytes_per_vector(),
+                    "recall": hits / (args.k * len(queries)),
+                    "query_latency": latency_summary(latencies),
+                })
+
+    print(f"{len(vectors)} vectors of dim {vectors.shape[1]}, {len(queries)} queries, recall@{args.k} vs exact float32")
+    print(f"{'config':22} {'bytes/vec':>10} {'reduction':>10} {'recall':>8} {'p50 ms':>8}")
+    for result in results:
+        p50 = result.get("query_latency", {}).get("p50_ms", 0.0)
+        reduction = results[0]["bytes_per_vector"] / result["bytes_per_vector"]
+        print(f"{result['config']:22} {result['bytes_per_vector']:>10.0f} {reduction:>9.1f}x {result['recall']:>8.3f} {p50:>8.2f}")
+
+    if args.save:
+        print(f"Results written to {save_results('compact_vector_store', {'vectors': len(vectors), 'results': results})}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Crawl storage: one pretty-printed JSON file per page plus a rewritten mapping.json per
+level (what recursive_scraper.py writes) versus a crawl archive.
+
+    python -m benchmarks.crawl_archive
+    python -m benchmarks.crawl_archive --copies 40 --save
+
+The scraped pages in web_scraper/recursive_scraped_data are replicated --copies times
+(with distinct URLs) to stand in for a larger crawl. For both formats this measures the
+write time, the size on disk, a full re-read and random lookups of single pages by URL.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from app.utils.crawl_archive import CrawlArchiveReader, CrawlArchiveWriter
+from benchmarks.common import SCRAPED_DATA_DIR, iter_scraped_pages, latency_summary, save_results
+
+PAGES_PER_LEVEL = 200
+
+def replicate_pages(data_dir: str, copies: int):
+    pages = list(iter_scraped_pages(data_dir))
+    replicated = []
+    for copy in range(copies):
+        for page in pages:
+            replicated.append({**page, "url": f"{page['url']}?copy={copy}", "depth": len(replicated) // PAGES_PER_LEVEL})
+    return replicated
+
+def disk_bytes(paths) -> int:
+    return sum(os.path.getsize(path) for path in paths)
+
+def write_directory(pages, directory: str):
+    mappings = {}
+    for page in pages:
+        depth = page["depth"]
+        level_dir = os.path.join(directory, f"level_{depth}")
+        os.makedirs(level_dir, exist_ok=True)
+        file_name = f"level_{depth}_file{len(mappings.setdefault(depth, {})) + 1}.json"
+        with open(os.path.join(level_dir, file_name), "w", encoding="utf-8") as f:
+            json.dump(page, f, ensure_ascii=False, indent=4)
+        mappings[depth][file_name] = page["url"]
+        with open(os.path.join(level_dir, "mapping.json"), "w", encoding="utf-8") as f:
+            json.dump(mappings[depth], f, ensure_ascii=False, indent=4)
+
+def read_directory(directory: str) -> int:
+    return sum(1 for _ in iter_scraped_pages(directory))
+
+def directory_lookup(directory: str):
+    """URL lookups in the directory format go through the per-level mapping files."""
+    paths = {}
+    for mapping_path in glob.glob(os.path.join(directory, "level_*", "mapping.json")):
+        with open(mapping_path, "r", encoding="utf-8") as f:
+            for file_name, url in json.load(f).items():
+                paths[url] = os.path.join(os.path.dirname(mapping_path), file_name)
+
+    def lookup(url: str) -> dict:
+        with open(paths[url], "r", encoding="utf-8") as f:
+            return json.load(f)
+    return lookup
+
+def measure_lookups(lookup, urls) -> dict:
+    latencies = []
+    for url in urls:
+        started = time.perf_counter()
+        lookup(url)
+        latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawl archive against per-page JSON files.")
+    parser.add_argument("--data-dir", default=SCRAPED_DATA_DIR)
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    pages = replicate_pages(args.data_dir, args.copies)
+    lookup_urls = random.Random(0).choices([page["url"] for page in pages], k=args.lookups)
+    workdir = tempfile.mkdtemp(prefix="crawl_archive_bench_")
+    results = {"pages": len(pages), "runs": {}}
+    try:
+        directory = os.path.join(workdir, "pages")
+        started = time.perf_counter()
+        write_directory(pages, directory)
+        write_s = time.perf_counter() - started
+        started = time.perf_counter()
+        read_count = read_directory(directory)
+        read_s = time.perf_counter() - started
+        results["runs"]["directory"] = {
+            "write_s": write_s,
+            "bytes": disk_bytes(glob.glob(os.path.join(directory, "level_*", "*.json"))),
+            "files": len(glob.glob(os.path.join(directory, "level_*", "*.json"))),
+            "read_s": read_s,
+            "read_pages": read_count,
+            "lookup_ms": measure_lookups(directory_lookup(directory), lookup_urls),
+        }
+
+        archive_path = os.path.join(workdir, "crawl.jsonl.zst")
+        started = time.perf_counter()
+        with CrawlArchiveWriter(archive_path) as writer:
+            for page in pages:
+                writer.write(page)
+        write_s = time.perf_counter() - started
+        started = time.perf_counter()
+        read_count = sum(1 for _ in CrawlArchiveReader(archive_path))
+        read_s = time.perf_counter() - started
+        results["runs"]["archive"] = {
+            "write_s": write_s,
+            "bytes": disk_bytes([archive_path, archive_path + ".idx"]),
+            "files": 2,
+            "read_s": read_s,
+            "read_pages": read_count,
+            "lookup_ms": measure_lookups(CrawlArchiveReader(archive_path).get, lookup_urls),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{len(pages)} pages ({args.copies} copies of {os.path.relpath(args.data_dir)})")
+    print(f"{'format':10} {'files':>6} {'size MB':>8} {'write s':>8} {'read s':>7} {'get p50 ms':>11} {'get p95 ms':>11}")
+    for label, run in results["runs"].items():
+        print(
+            f"{label:10} {run['files']:>6} {run['bytes'] / 1e6:>8.2f} {run['write_s']:>8.2f} {run['read_s']:>7.2f} "
+            f"{run['lookup_ms']['p50_ms']:>11.3f} {run['lookup_ms']['p95_ms']:>11.3f}"
+        )
+    if args.save:
+        print(f"Results written to {save_results('crawl_archive', results)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Per-turn database time of the assistant with a large messages table.
+
+    python -m benchmarks.db_turns                            # 1M messages, reuses the database if present
+    python -m benchmarks.db_turns --messages 5000000 --turns 2000 --rebuild
+
+The database is filled with conversations whose messages are interleaved (as with
+concurrent users), then the database work of a conversation turn is timed:
+
+- "current":  composite (conversation_id, id) index, one transaction per turn
+- "previous": no index on conversation_id, one commit per write (conversation
+  state, user message, assistant message), as before the index was added
+
+Each turn reads the last five messages (question rewording); every tenth turn
+reads the whole conversation instead (final user request).
+"""
+import os
+import time
+import random
+import argparse
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.models.conversation import Conversation, Message
+from app.models.database import Base, run_migrations
+from benchmarks.common import latency_summary, save_results
+
+INDEX_NAME = "ix_messages_conversation_id_id"
+INSERT_BATCH = 50_000
+
+def build_database(engine, messages: int, per_conversation: int):
+    conversations = max(1, messages // per_conversation)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Load without the composite index and build it once at the end
+        conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+        conn.execute(Conversation.__table__.insert(), [
+            {"id": cid, "flow_type": "visa_extension", "state_index": 0} for cid in range(1, conversations + 1)
+        ])
+        batch = []
+        for position in range(per_conversation):
+            role = "user" if position % 2 == 0 else "assistant"
+            for cid in range(1, conversations + 1):
+                batch.append({"conversation_id": cid, "role": role, "content": f"Message {position} of conversation {cid}."})
+                if len(batch) >= INSERT_BATCH:
+                    conn.execute(Message.__table__.insert(), batch)
+                    batch = []
+        if batch:
+            conn.execute(Message.__table__.insert(), batch)
+    run_migrations(engine)
+    return conversations
+
+def turn_current(db, conversation_id: int, final: bool):
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    query = db.query(Message).filter(Message.conversation_id == conversation_id)
+    if final:
+        query.order_by(Message.id.asc()).all()
+    else:
+        query.order_by(Message.id.desc()).limit(4).all()
+    conversation.state_index += 1
+    db.add_all([
+        Message(conversation_id=conversation_id, role="user", content="Benchmark answer."),
+        Message(conversation_id=conversation_id, role="assistant", content="Benchmark question?"),
+    ])
+    db.commit()
+
+def turn_previous(db, conversation_id: int, final: bool):
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    db.add(Message(conversation_id=conversation_id, role="user", content="Benchmark answer."))
+    db.commit()
+    query = db.query(Message).filter(Message.conversation_id == conversation_id)
+    if final:
+        query.order_by(Message.id.asc()).all()
+    else:
+        query.order_by(Message.id.desc()).limit(5).all()
+    db.add(Message(conversation_id=conversation_id, role="assistant", content="Benchmark question?"))
+    conversation.state_index += 1
+    db.commit()
+
+def run_turns(Session, turn, conversations: int, turns: int, seed: int):
+    rng = random.Random(seed)
+    latencies = []
+    with Session() as db:
+        for i in range(turns):
+            conversation_id = rng.randint(1, conversations)
+            started = time.perf_counter()
+            turn(db, conversation_id, final=(i % 10 == 9))
+            latencies.append(time.perf_counter() - started)
+            db.expunge_all()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-turn database time.")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--messages-per-conversation", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--slow-turns", type=int, default=100, help="Turns timed without the index (full scans)")
+    parser.add_argument("--workdir", default=os.path.join("benchmarks", ".workdir"))
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    path = os.path.join(args.workdir, f"db_turns_{args.messages}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    if args.rebuild or not os.path.exists(path):
+        started = time.perf_counter()
+        conversations = build_database(engine, args.messages, args.messages_per_conversation)
+        print(f"Built {path} in {time.perf_counter() - started:.1f}s")
+    else:
+        run_migrations(engine)
+        with engine.connect() as conn:
+            conversations = conn.execute(text("SELECT COUNT(*) FROM conversations")).scalar()
+    with engine.connect() as conn:
+        message_count = conn.execute(text("SELECT COUNT(*) FROM messages")).scalar()
+    print(f"{message_count} messages in {conversations} conversations")
+
+    results = {"messages": message_count, "conversations": conversations, "runs": {}}
+    results["runs"]["current"] = latency_summary(run_turns(Session, turn_current, conversations, args.turns, args.seed))
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+    try:
+        results["runs"]["previous"] = latency_summary(
+            run_turns(Session, turn_previous, conversations, args.slow_turns, args.seed)
+        )
+    finally:
+        run_migrations(engine)
+
+    print(f"{'variant':10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in results["runs"].items():
+        print(f"{name:10} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f}")
+    if args.save:
+        print(f"\nResults written to {save_results('db_turns', results)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare embedding backends on encode throughput, latency and retrieval quality.
+
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --configs torch:all-MPNet-base-v2 onnx:all-MPNet-base-v2:int8 torch:all-MiniLM-L6-v2
+
+The first config is the reference: retrieval quality of every other config is
+reported as recall@k of the reference's top-k documents over BENCHMARK_QUERIES,
+with the scraped pages in web_scraper/recursive_scraped_data as corpus.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.utils.embedding_backends import create_embedding_backend
+from benchmarks.common import BENCHMARK_QUERIES, iter_scraped_pages, latency_summary, save_results
+
+DEFAULT_CONFIGS = [
+    "torch:all-MPNet-base-v2",
+    "torch:all-MPNet-base-v2:int8",
+    "onnx:all-MPNet-base-v2",
+    "onnx:all-MPNet-base-v2:int8",
+    "onnx:all-MiniLM-L6-v2:int8",
+]
+
+def parse_config(config: str):
+    """'backend:model[:int8]' -> (backend, model, quantize)"""
+    parts = config.split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Invalid config '{config}', expected backend:model[:int8]")
+    return parts[0], parts[1], len(parts) == 3 and parts[2] == "int8"
+
+def load_corpus(max_chars: int):
+    return [
+        f"{page.get('text', '')} {page.get('summary', '')}"[:max_chars]
+        for page in iter_scraped_pages()
+    ]
+
+def top_k(query_vectors: np.ndarray, doc_vectors: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def benchmark_config(config: str, corpus, queries, batch_size: int, k: int):
+    backend_name, model_name, quantize = parse_config(config)
+
+    started = time.perf_counter()
+    backend = create_embedding_backend(
+        backend_name, model_name, quantize=quantize,
+        onnx_dir=settings.EMBEDDING_ONNX_DIR, num_threads=settings.EMBEDDING_NUM_THREADS,
+    )
+    load_s = time.perf_counter() - started
+
+    backend.encode(queries[:2])  # warm-up
+
+    # Batch throughput over the corpus
+    started = time.perf_counter()
+    doc_vectors = np.vstack([
+        backend.encode(corpus[i:i + batch_size]) for i in range(0, len(corpus), batch_size)
+    ])
+    encode_s = time.perf_counter() - started
+
+    # Single-query latency (the shape of traffic from the API)
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        started = time.perf_counter()
+        query_vectors.append(backend.encode([query])[0])
+        latencies.append(time.perf_counter() - started)
+    query_vectors = np.vstack(query_vectors)
+
+    doc_vectors = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    query_vectors = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    return {
+        "config": config,
+        "backend": backend.describe(),
+        "dimension": int(doc_vectors.shape[1]),
+        "load_s": load_s,
+        "corpus_docs": len(corpus),
+        "docs_per_s": len(corpus) / encode_s if encode_s else 0.0,
+        "query_latency": latency_summary(latencies),
+        "top_k": top_k(query_vectors, doc_vectors, k),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends.")
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS, help="backend:model[:int8], first is the reference")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--k", type=int, default=5, help="Depth for retrieval recall")
+    parser.add_argument("--max-chars", type=int, default=2000, help="Truncate each page to this many characters")
+    parser.add_argument("--save", action="store_true", help="Store results under benchmarks/results/")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.max_chars)
+    if not corpus:
+        raise SystemExit("No scraped pages found to benchmark against.")
+
+    results = [benchmark_config(c, corpus, BENCHMARK_QUERIES, args.batch_size, args.k) for c in args.configs]
+    reference = results[0]["top_k"]
+
+    print(f"{'config':40} {'dim':>5} {'load s':>7} {'docs/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(args.k):>9}")
+    for result in results:
+        hits = sum(len(set(ref) & set(cand)) for ref, cand in zip(reference, result["top_k"]))
+        result["recall_vs_reference"] = hits / reference.size
+        result["top_k"] = result["top_k"].tolist()
+        print(
+            f"{result['config']:40} {result['dimension']:>5} {result['load_s']:>7.1f} "
+            f"{result['docs_per_s']:>8.1f} {result['query_latency']['p50_ms']:>8.1f} "
+            f"{result['query_latency']['p95_ms']:>8.1f} {result['recall_vs_reference']:>9.2f}"
+        )
+
+    if args.save:
+        print(f"Results written to {save_results('embedding_backends', {'k': args.k, 'results': results})}")
+
+if __name__ == "__main__":
+    main()
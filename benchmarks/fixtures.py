@@ -0,0 +1,69 @@
+# benchmarks/fixtures.py
+
+import os
+import sys
+import time
+import subprocess
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import REPO_ROOT, SCRAPED_DATA_DIR
+
+def benchmark_environment(workdir: str, mock_llm_url: str) -> Dict[str, str]:
+    """Environment for an API process that uses the benchmark database, knowledge base and mock LLM."""
+    workdir = os.path.abspath(workdir)
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "CHROMA_PERSIST_DIRECTORY": os.path.join(workdir, "chroma_db"),
+        "VECTOR_STORE_DIR": os.path.join(workdir, "vector_store"),
+        "GROQ_API_KEY": "mock-key",
+        "GROQ_BASE_URL": mock_llm_url,
+        "MODEL_NAME_CONVERSATIONAL_GROQ": "mock-model",
+        "LOG_LEVEL": "WARNING",
+        "PYTHONPATH": REPO_ROOT,
+    })
+    return env
+
+def seed_knowledge_base(workdir: str, env: Dict[str, str], data_dir: str = SCRAPED_DATA_DIR):
+    """
+    Build the fixture knowledge base from the scraped pages with the bulk loader.
+    The loader's checkpoint lives in the workdir, so reruns only load what is missing.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    subprocess.run(
+        [
+            sys.executable, "-m", "app.bulk_load", data_dir,
+            "--checkpoint", os.path.join(os.path.abspath(workdir), "bulk_load_checkpoint.json"),
+            "--no-progress",
+        ],
+        cwd=REPO_ROOT,
+        env=env,
+        check=True,
+    )
+
+def start_process(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log_file = open(log_path, "ab")
+    return subprocess.Popen(args, cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+def wait_until_healthy(url: str, timeout_s: float = 120.0):
+    """Poll url until it answers 200 or the timeout expires."""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not become healthy within {timeout_s:.0f}s")
+
+def stop_processes(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
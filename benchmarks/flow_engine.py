@@ -0,0 +1,160 @@
+"""
+Flow detection and per-turn dispatch cost with many conversation flows.
+
+    python -m benchmarks.flow_engine                   # app/prompts/flows plus 200 synthetic flows
+    python -m benchmarks.flow_engine --flows 1000 --save
+
+Synthetic flows (each with its own topic keywords, typed questions, skip logic and
+a branch) are written next to the real ones in a temporary directory, and timed
+against the real flows alone:
+
+- compile:   loading and compiling every flow file
+- reload:    recompiling after one file changed
+- detection: keyword shortlist for a message, plus the size of the detection prompt
+             compared with listing every flow (as before the shortlist)
+- turn:      flow lookup, slot filling (local extractors only) and next-question walk
+"""
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import yaml
+
+from app.config import settings
+from app.prompts.prompt_assembly import count_tokens
+from app.prompts.system_prompt_templates import classification_instructions_template, detect_flow_prompt
+from app.services.flow_engine import DEFAULT_FLOWS_DIR, FlowRegistry
+from app.services.slot_filling_service import fill_slots
+from benchmarks.common import BENCHMARK_QUERIES, latency_summary, save_results
+
+TOPICS = [
+    "dog", "tax", "marriage", "parking", "business", "pension", "child", "passport", "driving",
+    "housing", "waste", "school", "library", "festival", "noise", "tree", "boat", "market",
+]
+ANSWERS = ["Yes", "No", "02/03/1990", "Maria Rossi", "Italian", "Some longer free text answer."]
+
+def synthetic_flow(idx: int, rng: random.Random) -> dict:
+    topic = f"{rng.choice(TOPICS)}{idx}"
+    questions = [
+        {"id": "full_name", "text": "What is your full name?", "type": "name"},
+        {"id": "date_of_birth", "text": "What is your date of birth? (DD/MM/YYYY)", "type": "date"},
+        {"id": "has_permit", "text": f"Do you already have a {topic} permit? (Yes/No)", "type": "yes_no",
+         "keywords": [f"{topic} permit"], "next": {"No": "reason"}},
+        {"id": "permit_number", "text": "What is the permit number?", "type": "text", "validate": {"pattern": r"\d+"}},
+        {"id": "reason", "text": f"Why do you need the {topic} service?", "type": "reason"},
+        {"id": "category", "text": "Which category applies?", "type": "choice", "choices": ["private", "commercial"]},
+        {"id": "fee_waiver", "text": "Why should the fee be waived?", "type": "text", "when": {"category": "private"}},
+        {"id": "nationality", "text": "What is your nationality?", "type": "nationality"},
+    ]
+    return {
+        "name": f"synthetic_{topic}",
+        "description": f"Applying for {topic} services.",
+        "keywords": [topic, f"{topic} permit", f"{topic} application"],
+        "questions": questions,
+    }
+
+def write_flows(directory: str, count: int, seed: int):
+    for name in os.listdir(DEFAULT_FLOWS_DIR):
+        shutil.copy(os.path.join(DEFAULT_FLOWS_DIR, name), directory)
+    rng = random.Random(seed)
+    names = []
+    for idx in range(count):
+        spec = synthetic_flow(idx, rng)
+        names.append(spec["name"])
+        with open(os.path.join(directory, f"{spec['name']}.yaml"), "w", encoding="utf-8") as f:
+            yaml.safe_dump(spec, f, allow_unicode=True, sort_keys=False)
+    return names
+
+def detection_prompt(registry: FlowRegistry, names, message: str) -> str:
+    return classification_instructions_template.format(
+        detect_flow_prompt=detect_flow_prompt,
+        flow_list_text="\n".join(f"- {name}: {registry.get(name).description}" for name in names),
+        user_input=message,
+    )
+
+def measure(directory: str, messages, turns: int, seed: int) -> dict:
+    registry = FlowRegistry(directory, reload_interval_s=3600)
+    started = time.perf_counter()
+    registry.reload(force=True)
+    compile_s = time.perf_counter() - started
+    names = registry.names()
+
+    # Touch one file and recompile
+    path = os.path.join(directory, sorted(os.listdir(directory))[0])
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+    started = time.perf_counter()
+    registry.reload(force=True)
+    reload_s = time.perf_counter() - started
+
+    detection, shortlist_tokens, all_tokens = [], [], []
+    for message in messages:
+        started = time.perf_counter()
+        candidates = registry.candidates(message, settings.FLOW_DETECTION_MAX_CANDIDATES)
+        detection.append(time.perf_counter() - started)
+        shortlist_tokens.append(count_tokens(detection_prompt(registry, candidates or names[:1], message)))
+        all_tokens.append(count_tokens(detection_prompt(registry, names, message)))
+
+    rng = random.Random(seed)
+    turn = []
+    for _ in range(turns):
+        flow = registry.get(rng.choice(names))
+        answers = {}
+        for question in flow.questions[:rng.randint(0, len(flow) - 1)]:
+            answers[question.id] = rng.choice(question.choices or ANSWERS)
+        started = time.perf_counter()
+        flow = registry.get(flow.name)
+        current = flow.next_question(answers)
+        filled, _ = fill_slots(flow, rng.choice(ANSWERS), answers, current)
+        answers.update(filled)
+        flow.next_question(answers)
+        turn.append(time.perf_counter() - started)
+
+    return {
+        "flows": len(names),
+        "compile_ms": compile_s * 1000.0,
+        "reload_one_ms": reload_s * 1000.0,
+        "detection": latency_summary(detection),
+        "turn": latency_summary(turn),
+        "detection_prompt_tokens": {
+            "shortlist": sum(shortlist_tokens) / len(shortlist_tokens),
+            "all_flows": sum(all_tokens) / len(all_tokens),
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the conversation flow engine.")
+    parser.add_argument("--flows", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    # Local dispatch cost only
+    settings.SLOT_FILLING_LLM_ENABLED = False
+    messages = BENCHMARK_QUERIES * 20
+
+    results = {"runs": {}}
+    for label, count in (("real", 0), (f"real+{args.flows}", args.flows)):
+        directory = tempfile.mkdtemp(prefix="bureasy-flows-")
+        try:
+            write_flows(directory, count, args.seed)
+            results["runs"][label] = measure(directory, messages, args.turns, args.seed)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{'flows':>6} {'compile ms':>11} {'reload ms':>10} {'detect p95 ms':>14} {'turn p50 ms':>12} "
+          f"{'turn p95 ms':>12} {'prompt tok':>11} {'all-flows tok':>14}")
+    for run in results["runs"].values():
+        print(
+            f"{run['flows']:>6} {run['compile_ms']:>11.1f} {run['reload_one_ms']:>10.2f} "
+            f"{run['detection']['p95_ms']:>14.3f} {run['turn']['p50_ms']:>12.3f} {run['turn']['p95_ms']:>12.3f} "
+            f"{run['detection_prompt_tokens']['shortlist']:>11.0f} {run['detection_prompt_tokens']['all_flows']:>14.0f}"
+        )
+    if args.save:
+        print(f"\nResults written to {save_results('flow_engine', results)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Bulk-load records, embedding time, index size and retrieval noise with and without
+boilerplate stripping and near-duplicate elimination.
+
+    python -m benchmarks.ingest_dedup
+    python -m benchmarks.ingest_dedup --k 5 --save
+
+Pages from web_scraper/recursive_scraped_data go through the bulk loader's parse and
+dedup stages in this process, and the resulting records are embedded with the configured
+backend. For BENCHMARK_QUERIES, the top-k records are checked for:
+
+- boilerplate share: characters of the retrieved text that the boilerplate model strips
+- redundant hits:    results within 3 SimHash bits of a higher-ranked result
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.bulk_ingestion_service import Deduplicator, _init_worker, discover_crawl_files, page_shingles, parse_crawl_file
+from app.utils.chromadb_client import embed_texts_array
+from app.utils.near_duplicates import BoilerplateModel, simhash, site_of
+from benchmarks.common import BENCHMARK_QUERIES, SCRAPED_DATA_DIR, save_results
+
+def fit_boilerplate(files) -> BoilerplateModel:
+    model = BoilerplateModel(settings.DEDUP_BOILERPLATE_MIN_PAGE_RATIO, settings.DEDUP_BOILERPLATE_MIN_PAGES)
+    for site, shingles in map(page_shingles, files):
+        if shingles is not None:
+            model.add(site, shingles)
+    return model.fit()
+
+def load_records(files, model: BoilerplateModel | None):
+    """The records the bulk loader would write, and the dedup stats."""
+    _init_worker(model.state() if model else None)
+    deduplicator = Deduplicator(settings.DEDUP_PAGE_SIMILARITY, settings.DEDUP_CHUNK_MAX_DISTANCE) if model else None
+    records = []
+    for item in files:
+        path, page_records, error, fingerprints = parse_crawl_file(item)
+        if error:
+            continue
+        if deduplicator is not None:
+            page_records = deduplicator.filter(path, page_records, fingerprints)
+        records.extend(page_records)
+    _init_worker(None)
+    return records, deduplicator.stats if deduplicator else {}
+
+def retrieval_noise(records, vectors: np.ndarray, queries: np.ndarray, model: BoilerplateModel, k: int) -> dict:
+    boilerplate_chars = retrieved_chars = redundant = 0
+    for query in queries:
+        top = np.argsort(-(vectors @ query))[:k]
+        seen = []
+        for idx in top:
+            _, document, _, metadata = records[idx]
+            retrieved_chars += len(document)
+            boilerplate_chars += len(document) - len(model.strip(site_of(metadata.get("source_url", "")), document))
+            fingerprint = simhash(document)
+            if fingerprint is not None and any(bin(fingerprint ^ other).count("1") <= 3 for other in seen):
+                redundant += 1
+            elif fingerprint is not None:
+                seen.append(fingerprint)
+    return {
+        "boilerplate_share": boilerplate_chars / retrieved_chars if retrieved_chars else 0.0,
+        "redundant_hits_per_query": redundant / len(queries),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest-time deduplication.")
+    parser.add_argument("--data-dir", default=SCRAPED_DATA_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    files = discover_crawl_files(args.data_dir)
+    started = time.perf_counter()
+    model = fit_boilerplate(files)
+    fit_s = time.perf_counter() - started
+    queries = embed_texts_array(BENCHMARK_QUERIES)
+
+    results = {"pages": len(files), "boilerplate_fit_ms": fit_s * 1000.0, "runs": {}}
+    for label, run_model in (("baseline", None), ("dedup", model)):
+        started = time.perf_counter()
+        records, dedup_stats = load_records(files, run_model)
+        parse_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        vectors = embed_texts_array([record[2] for record in records])
+        embed_s = time.perf_counter() - started
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        document_bytes = sum(len(record[1].encode("utf-8")) for record in records)
+        results["runs"][label] = {
+            "records": len(records),
+            "embedded_chars": sum(len(record[2]) for record in records),
+            "parse_ms": parse_s * 1000.0,
+            "embed_s": embed_s,
+            "index_bytes": int(vectors.shape[0] * vectors.shape[1] * 4 + document_bytes),
+            **retrieval_noise(records, vectors, queries, model, args.k),
+            **dedup_stats,
+        }
+
+    print(f"{os.path.relpath(args.data_dir)}: {len(files)} pages, boilerplate model fitted in {fit_s * 1000.0:.0f} ms")
+    print(f"{'run':9} {'records':>8} {'chars':>9} {'parse ms':>9} {'embed s':>8} {'index KB':>9} "
+          f"{'boilerplate@k':>14} {'redundant@k':>12}")
+    for label, run in results["runs"].items():
+        print(
+            f"{label:9} {run['records']:>8} {run['embedded_chars']:>9} {run['parse_ms']:>9.0f} {run['embed_s']:>8.2f} "
+            f"{run['index_bytes'] / 1024:>9.0f} {run['boilerplate_share']:>14.1%} {run['redundant_hits_per_query']:>12.2f}"
+        )
+    dedup = results["runs"]["dedup"]
+    print(
+        f"\nStripped {dedup['boilerplate_chars']} of {dedup['text_chars']} page text characters, "
+        f"{dedup['duplicate_pages']} near-duplicate pages, {dedup['duplicate_chunks']} chunks, "
+        f"{dedup['duplicate_phone_numbers']} phone numbers"
+    )
+    if args.save:
+        print(f"Results written to {save_results('ingest_dedup', results)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Offline load test of the API against the mock LLM and a fixture knowledge base.
+
+    python -m benchmarks.load_test                                  # spawn mock LLM + API, run all scenarios
+    python -m benchmarks.load_test --concurrency 1 8 32 --iterations 50
+    python -m benchmarks.load_test --scenarios checklist_generation ask_human
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000  # use an already running API
+    python -m benchmarks.load_test --compare benchmarks/results/load_test-20261019-101500.json
+
+For every concurrency level and scenario it reports throughput (scenario runs
+per second) and p50/p95/p99 latency, and stores the results under
+benchmarks/results/ so later runs can be compared against them.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import httpx
+
+from benchmarks.common import latency_summary, save_results
+from benchmarks.fixtures import benchmark_environment, seed_knowledge_base, start_process, stop_processes, wait_until_healthy
+from benchmarks.scenarios import SCENARIOS
+
+REGRESSION_THRESHOLD = 0.10  # flag >10% worse p95 or throughput when comparing
+
+async def run_level(base_url: str, scenario_name: str, concurrency: int, iterations: int, seed: int) -> dict:
+    """Run `iterations` executions of one scenario with at most `concurrency` in flight."""
+    scenario = SCENARIOS[scenario_name]
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    scenario_latencies, request_latencies = [], {}
+    errors = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        async def one_execution():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await scenario(client, rng)
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                scenario_latencies.append(time.perf_counter() - started)
+                if not result.ok:
+                    errors += 1
+                for name, values in result.request_latencies.items():
+                    request_latencies.setdefault(name, []).extend(values)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_execution() for _ in range(iterations)))
+        wall_s = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "iterations": iterations,
+        "errors": errors,
+        "wall_s": wall_s,
+        "throughput_per_s": len(scenario_latencies) / wall_s if wall_s else 0.0,
+        "latency": latency_summary(scenario_latencies),
+        "requests": {name: latency_summary(values) for name, values in request_latencies.items()},
+    }
+
+def print_results(results: dict):
+    print(f"{'scenario':30} {'conc':>5} {'runs/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for scenario_name, levels in results["scenarios"].items():
+        for level in levels:
+            latency = level["latency"]
+            print(
+                f"{scenario_name:30} {level['concurrency']:>5} {level['throughput_per_s']:>8.2f} "
+                f"{latency['p50_ms']:>9.1f} {latency['p95_ms']:>9.1f} {latency['p99_ms']:>9.1f} {level['errors']:>7}"
+            )
+
+def compare_results(current: dict, baseline_path: str) -> bool:
+    """Print p95/throughput deltas against a stored run. Returns True if any regression was flagged."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressed = False
+    print(f"\nComparison against {baseline_path}")
+    print(f"{'scenario':30} {'conc':>5} {'runs/s Δ':>10} {'p95 Δ':>10}")
+    for scenario_name, levels in current["scenarios"].items():
+        baseline_levels = {l["concurrency"]: l for l in baseline.get("scenarios", {}).get(scenario_name, [])}
+        for level in levels:
+            previous = baseline_levels.get(level["concurrency"])
+            if not previous or not previous["throughput_per_s"] or not previous["latency"]["p95_ms"]:
+                continue
+            throughput_delta = level["throughput_per_s"] / previous["throughput_per_s"] - 1.0
+            p95_delta = level["latency"]["p95_ms"] / previous["latency"]["p95_ms"] - 1.0
+            flag = ""
+            if throughput_delta < -REGRESSION_THRESHOLD or p95_delta > REGRESSION_THRESHOLD:
+                flag = "  <-- regression"
+                regressed = True
+            print(f"{scenario_name:30} {level['concurrency']:>5} {throughput_delta:>+9.1%} {p95_delta:>+9.1%}{flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API with a mock LLM.")
+    parser.add_argument("--base-url", default=None, help="Use an already running API instead of spawning one")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--iterations", type=int, default=20, help="Scenario executions per concurrency level")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=os.path.join("benchmarks", ".workdir"))
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--mock-port", type=int, default=8090)
+    parser.add_argument("--mock-ttft-ms", type=float, default=150.0)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=250.0)
+    parser.add_argument("--compare", default=None, help="Stored results JSON to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    processes = []
+    base_url = args.base_url
+    try:
+        if base_url is None:
+            os.makedirs(args.workdir, exist_ok=True)
+            mock_url = f"http://127.0.0.1:{args.mock_port}"
+            env = benchmark_environment(args.workdir, mock_url)
+            log_path = os.path.join(args.workdir, "processes.log")
+
+            processes.append(start_process([
+                sys.executable, "-m", "benchmarks.mock_llm_server", "--port", str(args.mock_port),
+                "--ttft-ms", str(args.mock_ttft_ms), "--tokens-per-second", str(args.mock_tokens_per_second),
+                "--seed", str(args.seed),
+            ], env, log_path))
+            seed_knowledge_base(args.workdir, env)
+
+            processes.append(start_process([
+                sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                "--port", str(args.api_port), "--workers", str(args.api_workers), "--log-level", "warning",
+            ], env, log_path))
+            base_url = f"http://127.0.0.1:{args.api_port}"
+            wait_until_healthy(f"{mock_url}/health")
+            wait_until_healthy(f"{base_url}/")
+
+        results = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                "iterations": args.iterations,
+                "concurrency": args.concurrency,
+                "api_workers": args.api_workers,
+                "mock_ttft_ms": args.mock_ttft_ms,
+                "mock_tokens_per_second": args.mock_tokens_per_second,
+                "seed": args.seed,
+            },
+            "scenarios": {},
+        }
+        for scenario_name in args.scenarios:
+            for concurrency in args.concurrency:
+                level = asyncio.run(run_level(base_url, scenario_name, concurrency, args.iterations, args.seed))
+                results["scenarios"].setdefault(scenario_name, []).append(level)
+
+        print_results(results)
+        if not args.no_save:
+            print(f"\nResults written to {save_results('load_test', results)}")
+        if args.compare and compare_results(results, args.compare):
+            sys.exit(1)
+    finally:
+        stop_processes(processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Local stand-in for the Groq/OpenAI chat-completions API.
+
+Speaks the streaming (SSE) and non-streaming chat-completions protocol on both
+/openai/v1/chat/completions (Groq paths) and /v1/chat/completions (OpenAI paths),
+with configurable time-to-first-token, token rate and injected errors. Point the
+API at it with GROQ_BASE_URL=http://127.0.0.1:8090.
+
+    python -m benchmarks.mock_llm_server --port 8090 --ttft-ms 150 --tokens-per-second 250
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+class MockLLMConfig:
+    ttft_ms: float = 150.0
+    tokens_per_second: float = 250.0
+    jitter: float = 0.1               # +/- fraction applied to every delay
+    error_rate: float = 0.0           # fraction of calls answered with HTTP 500
+    rate_limit_rate: float = 0.0      # fraction of calls answered with HTTP 429
+    seed: int = 0
+
+config = MockLLMConfig()
+rng = random.Random(config.seed)
+app = FastAPI(title="Mock LLM", description="Chat-completions stand-in for benchmarks")
+
+CHECKLIST_RESPONSE = {
+    "steps": [
+        "Step 1: Book an appointment at the Foreigners Office (Ausländerbehörde).",
+        "Step 2: Fill in the application form for the residence permit.",
+        "Step 3: Bring your passport, a biometric photo and proof of health insurance.",
+        "Step 4: Provide proof of financial resources for the extended stay.",
+        "Step 5: Pay the fee and collect your electronic residence permit.",
+    ],
+    "pdf_links": [],
+    "source": "https://stadt.muenchen.de/en/info/entry-visa.html",
+    "closing": "Once the application is submitted you will receive a fictional certificate until your permit is ready.",
+}
+
+def build_reply(messages) -> str:
+    """Pick a plausible reply from the prompt so every code path gets parseable output."""
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    if "known flows" in prompt:
+        return "visa_extension"
+    if "strictly in JSON" in prompt or '"steps"' in prompt:
+        return json.dumps(CHECKLIST_RESPONSE)
+    if "answers to form questions" in prompt:
+        return "{}"
+    if "Document Type:" in prompt:
+        return "Document Type: residence_permit\nTags: residence, permit, munich, application"
+    if "reworded question" in prompt:
+        return "Thanks! Could you tell me a little more about that, please?"
+    if "summary" in prompt.lower():
+        return "Information about residence permits, visa extensions, appointments, fees and required documents."
+    return (
+        "I am a resident of Munich and I would like to extend my residence permit. "
+        "I have provided my personal details above. What do I need to do next?"
+    )
+
+def tokenize(text: str):
+    """Split into word-ish tokens, keeping whitespace attached like real BPE tokens."""
+    tokens, current = [], ""
+    for char in text:
+        current += char
+        if char in " \n":
+            tokens.append(current)
+            current = ""
+    if current:
+        tokens.append(current)
+    return tokens
+
+def jittered(seconds: float) -> float:
+    return max(0.0, seconds * (1.0 + rng.uniform(-config.jitter, config.jitter)))
+
+def chunk_payload(completion_id: str, model: str, created: int, delta: dict, finish_reason=None, usage=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if usage is not None:
+        payload["x_groq"] = {"id": completion_id, "usage": usage}
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock-model")
+    messages = body.get("messages", [])
+    max_tokens = int(body.get("max_tokens") or 512)
+
+    roll = rng.random()
+    if roll < config.rate_limit_rate:
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": "1"},
+            content={"error": {"message": "Rate limit reached (mock).", "type": "rate_limit_exceeded"}},
+        )
+    if roll < config.rate_limit_rate + config.error_rate:
+        return JSONResponse(status_code=500, content={"error": {"message": "Injected failure (mock).", "type": "server_error"}})
+
+    tokens = tokenize(build_reply(messages))[:max_tokens]
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(tokens),
+        "total_tokens": prompt_tokens + len(tokens),
+    }
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    per_token = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+    if not body.get("stream"):
+        await asyncio.sleep(jittered(config.ttft_ms / 1000.0 + per_token * len(tokens)))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    async def event_stream():
+        await asyncio.sleep(jittered(config.ttft_ms / 1000.0))
+        yield chunk_payload(completion_id, model, created, {"role": "assistant", "content": ""})
+        for token in tokens:
+            yield chunk_payload(completion_id, model, created, {"content": token})
+            if per_token:
+                await asyncio.sleep(jittered(per_token))
+        yield chunk_payload(completion_id, model, created, {}, finish_reason="stop", usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+app.add_api_route("/openai/v1/chat/completions", chat_completions, methods=["POST"])
+app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock chat-completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--ttft-ms", type=float, default=config.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second)
+    parser.add_argument("--jitter", type=float, default=config.jitter)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate)
+    parser.add_argument("--seed", type=int, default=config.seed)
+    args = parser.parse_args()
+
+    config.ttft_ms = args.ttft_ms
+    config.tokens_per_second = args.tokens_per_second
+    config.jitter = args.jitter
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    rng.seed(args.seed)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
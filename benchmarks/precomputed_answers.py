@@ -0,0 +1,159 @@
+"""
+Share of a skewed query mix answered from precomputed answers, and what that saves.
+
+    python -m benchmarks.precomputed_answers
+    python -m benchmarks.precomputed_answers --history 20000 --peak 5000 --tail-share 0.3 --save
+
+A query mix is simulated: BENCHMARK_QUERIES are the frequent tasks (Zipf-distributed,
+asked with varying casing, greetings and filler), and --tail-share of the queries are
+one-off questions made from words of the scraped pages. --history queries go through
+the real query log into a scratch database, the precompute job clusters them and
+"computes" answers with a stand-in that sleeps --llm-ms per answer (no LLM is called),
+then --peak fresh queries from the same mix are looked up. Queries are embedded with
+the configured embedding backend.
+"""
+import os
+import re
+import time
+import random
+import argparse
+
+from benchmarks.common import BENCHMARK_QUERIES, REPO_ROOT, SCRAPED_DATA_DIR, iter_scraped_pages, latency_summary, save_results
+
+WORKDIR = os.path.join(REPO_ROOT, "benchmarks", ".workdir", "precomputed_answers")
+os.makedirs(WORKDIR, exist_ok=True)
+# Scratch database and knowledge base version, set before the app modules read the settings
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+os.environ["KB_VERSION_FILE"] = os.path.join(WORKDIR, "kb_version.json")
+# Both are opt-in in the app
+os.environ["QUERY_LOG_ENABLED"] = "True"
+os.environ["PRECOMPUTE_ENABLED"] = "True"
+
+from app.config import settings  # noqa: E402
+from app.models.database import Base, engine  # noqa: E402
+from app.services.precomputed_answers_service import (  # noqa: E402
+    LLMBudget,
+    precomputed_answers,
+    query_logger,
+    refresh_precomputed_answers,
+)
+from app.utils.chromadb_client import embed_texts_array  # noqa: E402
+from app.utils.knowledge_base import mark_knowledge_base_changed  # noqa: E402
+
+PREFIXES = ["", "", "", "Hi, ", "Hello! ", "Quick question: ", "Please help: "]
+SUFFIXES = ["", "", "", " Thanks!", " Thank you.", " Please explain."]
+TAIL_TEMPLATES = [
+    "What does {0} mean for my {1}?",
+    "Do I need {0} when I apply for {1}?",
+    "How long does {0} take at the {1}?",
+]
+# Tokens a checklist answer is estimated to use (prompt + completion)
+ESTIMATED_CHECKLIST_TOKENS = 3600
+
+class QueryMix:
+    def __init__(self, tail_share: float, zipf_s: float, seed: int):
+        self.rng = random.Random(seed)
+        self.tail_share = tail_share
+        weights = [1.0 / (rank ** zipf_s) for rank in range(1, len(BENCHMARK_QUERIES) + 1)]
+        self.weights = [weight / sum(weights) for weight in weights]
+        words = set()
+        for page in iter_scraped_pages(SCRAPED_DATA_DIR):
+            words.update(word.lower() for word in re.findall(r"[A-Za-zÄÖÜäöüß]{6,}", page.get("text", "")))
+        self.words = sorted(words) or ["permit", "registration", "appointment"]
+
+    def sample(self) -> tuple:
+        """(query, head topic index or None for a one-off question)"""
+        if self.rng.random() < self.tail_share:
+            template = self.rng.choice(TAIL_TEMPLATES)
+            return template.format(self.rng.choice(self.words), self.rng.choice(self.words)), None
+        topic = self.rng.choices(range(len(BENCHMARK_QUERIES)), weights=self.weights)[0]
+        query = BENCHMARK_QUERIES[topic]
+        if self.rng.random() < 0.3:
+            query = query.lower()
+        return f"{self.rng.choice(PREFIXES)}{query}{self.rng.choice(SUFFIXES)}", topic
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark precomputed answers on a skewed query mix.")
+    parser.add_argument("--history", type=int, default=5000, help="Logged queries the job clusters")
+    parser.add_argument("--peak", type=int, default=2000, help="Queries looked up afterwards")
+    parser.add_argument("--tail-share", type=float, default=0.2)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="Simulated time to compute one answer")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    mark_knowledge_base_changed()
+    mix = QueryMix(args.tail_share, args.zipf, seed=0)
+
+    history = [mix.sample()[0] for _ in range(args.history)]
+    started = time.perf_counter()
+    history_vectors = embed_texts_array(history)
+    embed_s = time.perf_counter() - started
+    for query, vector in zip(history, history_vectors):
+        query_logger.record("checklist", query, vector)
+    query_logger.flush()
+
+    def stand_in(query: str, context, budget: LLMBudget):
+        budget.take(ESTIMATED_CHECKLIST_TOKENS)
+        time.sleep(args.llm_ms / 1000.0)
+        return {"steps": [f"Precomputed answer to: {query}"], "pdf_links": [], "source": "", "closing": ""}
+
+    started = time.perf_counter()
+    # No retrieval either: every cluster's context is the same, so its answer depends on the query only
+    job = refresh_precomputed_answers(
+        kinds=("checklist",), answer_functions={"checklist": stand_in}, context_functions={"checklist": lambda query: None},
+    )
+    job_s = time.perf_counter() - started
+    stats = job["checklist"]
+
+    peak = [mix.sample() for _ in range(args.peak)]
+    peak_vectors = embed_texts_array([query for query, _ in peak])
+    latencies, hits, head_hits, head_total, wrong = [], 0, 0, 0, 0
+    for (query, topic), vector in zip(peak, peak_vectors):
+        started = time.perf_counter()
+        # Same stand-in context as the job's, so similar queries match as they would with unchanged retrieval
+        answer = precomputed_answers.lookup("checklist", query, vector, context=lambda: None)
+        latencies.append(time.perf_counter() - started)
+        head_total += topic is not None
+        if answer is not None:
+            hits += 1
+            head_hits += topic is not None
+            # An answer computed for another task would be a wrong answer
+            answered_for = answer["steps"][0].split(": ", 1)[1].lower()
+            wrong += topic is None or BENCHMARK_QUERIES[topic].lower() not in answered_for
+
+    results = {
+        "history": args.history,
+        "peak": args.peak,
+        "tail_share": args.tail_share,
+        "clusters": stats["clusters"],
+        "answers": stats["answers"],
+        "over_budget": stats["over_budget"],
+        "llm_tokens": job["llm_tokens"],
+        "job_s": job_s,
+        "sequential_compute_s": stats["computed"] * args.llm_ms / 1000.0,
+        "history_embed_s": embed_s,
+        "hit_rate": hits / len(peak),
+        "head_hit_rate": head_hits / head_total if head_total else 0.0,
+        "wrong_answers": wrong,
+        "lookup_ms": latency_summary(latencies),
+    }
+
+    print(
+        f"{args.history} logged queries -> {stats['clusters']} clusters, {stats['answers']} precomputed answers "
+        f"in {job_s:.1f} s ({results['sequential_compute_s']:.1f} s sequentially, "
+        f"{settings.PRECOMPUTE_WORKERS} workers; {stats['over_budget']} over budget)"
+    )
+    print(
+        f"Peak of {args.peak} queries: {results['hit_rate']:.1%} answered from precomputed answers "
+        f"({results['head_hit_rate']:.1%} of frequent-task queries, {wrong} wrong), "
+        f"lookup p50 {results['lookup_ms']['p50_ms']:.3f} ms / p95 {results['lookup_ms']['p95_ms']:.3f} ms"
+    )
+    print(f"LLM calls avoided during the peak: {hits} of {args.peak}")
+    if args.save:
+        print(f"Results written to {save_results('precomputed_answers', results)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/scenarios.py
+
+import time
+import random
+from typing import Callable, Dict, List
+
+import httpx
+
+from benchmarks.common import BENCHMARK_QUERIES
+
+# Answers for the visa_extension flow, in question order
+VISA_EXTENSION_ANSWERS = [
+    "I have a residence permit for employment.",
+    "I am Italian.",
+    "Maria Rossi",
+    "02/03/1990",
+    "Leopoldstraße 5, 80802 München",
+    "I want to continue working for my employer.",
+    "Yes",
+    "Yes",
+    "I am employed at Example GmbH.",
+    "KVR Ruppertstraße",
+]
+
+# Opening message answering the first five questions of the visa_extension flow at once
+VISA_EXTENSION_RICH_MESSAGE = (
+    "Hi, I'd like to extend my residence permit for employment. I'm Maria Rossi, Italian, "
+    "born 02/03/1990, living at Leopoldstraße 5, 80802 München."
+)
+
+def minimal_pdf(text: str) -> bytes:
+    """Build a one-page PDF with a text layer, so labelling runs without OCR."""
+    content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    return pdf
+
+SAMPLE_PDF = minimal_pdf("Application for the extension of a residence permit - Landeshauptstadt Muenchen")
+
+class ScenarioResult:
+    """Latency of one scenario execution plus the latency of each HTTP request it made."""
+    def __init__(self):
+        self.request_latencies: Dict[str, List[float]] = {}
+        self.ok = True
+
+    def record(self, name: str, seconds: float):
+        self.request_latencies.setdefault(name, []).append(seconds)
+
+async def _timed_request(client: httpx.AsyncClient, result: ScenarioResult, name: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    result.record(name, time.perf_counter() - started)
+    if response.status_code >= 400:
+        result.ok = False
+    return response
+
+async def visa_extension_conversation(client: httpx.AsyncClient, rng: random.Random) -> ScenarioResult:
+    """A full visa-extension conversation through /assistant/message, answering every question."""
+    result = ScenarioResult()
+    response = await _timed_request(
+        client, result, "message", "POST", "/assistant/message",
+        json={"user_input": "Hi, I would like to extend my visa in Munich.", "conversation_id": None},
+    )
+    if response.status_code >= 400:
+        return result
+
+    payload = response.json()
+    conversation_id = payload.get("conversation_id")
+    for answer in VISA_EXTENSION_ANSWERS:
+        if payload.get("finished") or conversation_id is None:
+            break
+        response = await _timed_request(
+            client, result, "message", "POST", "/assistant/message",
+            json={"user_input": answer, "conversation_id": conversation_id},
+        )
+        if response.status_code >= 400:
+            break
+        payload = response.json()
+    return result
+
+async def visa_extension_rich_message(client: httpx.AsyncClient, rng: random.Random) -> ScenarioResult:
+    """A visa-extension conversation whose opening message already answers the first five questions."""
+    result = ScenarioResult()
+    response = await _timed_request(
+        client, result, "message", "POST", "/assistant/message",
+        json={"user_input": VISA_EXTENSION_RICH_MESSAGE, "conversation_id": None},
+    )
+    if response.status_code >= 400:
+        return result
+
+    payload = response.json()
+    conversation_id = payload.get("conversation_id")
+    for answer in VISA_EXTENSION_ANSWERS[5:]:
+        if payload.get("finished") or conversation_id is None:
+            break
+        response = await _timed_request(
+            client, result, "message", "POST", "/assistant/message",
+            json={"user_input": answer, "conversation_id": conversation_id},
+        )
+        if response.status_code >= 400:
+            break
+        payload = response.json()
+    return result
+
+async def checklist_generation(client: httpx.AsyncClient, rng: random.Random) -> ScenarioResult:
+    result = ScenarioResult()
+    await _timed_request(
+        client, result, "generate_checklist", "POST", "/assistant/generate-checklist",
+        json={"query": rng.choice(BENCHMARK_QUERIES)},
+    )
+    return result
+
+async def ask_human(client: httpx.AsyncClient, rng: random.Random) -> ScenarioResult:
+    result = ScenarioResult()
+    await _timed_request(
+        client, result, "ask_human", "POST", "/assistant/ask-human",
+        json={"query": rng.choice(BENCHMARK_QUERIES)},
+    )
+    return result
+
+async def pdf_labelling(client: httpx.AsyncClient, rng: random.Random) -> ScenarioResult:
+    result = ScenarioResult()
+    await _timed_request(
+        client, result, "process_pdf", "POST", "/documents/process-pdf",
+        files={"file": ("application.pdf", SAMPLE_PDF, "application/pdf")},
+    )
+    return result
+
+SCENARIOS: Dict[str, Callable] = {
+    "visa_extension_conversation": visa_extension_conversation,
+    "visa_extension_rich_message": visa_extension_rich_message,
+    "checklist_generation": checklist_generation,
+    "ask_human": ask_human,
+    "pdf_labelling": pdf_labelling,
+}
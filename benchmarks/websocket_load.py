@@ -0,0 +1,213 @@
+"""
+Assistant conversations over the WebSocket endpoint versus /assistant/message, and
+how many concurrent sockets one API worker holds.
+
+    python -m benchmarks.websocket_load                         # spawn mock LLM + API (1 worker)
+    python -m benchmarks.websocket_load --concurrency 1 16 64 --hold 500 1000 2000 5000
+    python -m benchmarks.websocket_load --base-url http://127.0.0.1:8000
+
+Part 1 runs the visa-extension conversation (VISA_EXTENSION_ANSWERS) with the given
+number of concurrent users, once per transport, and reports per-turn latency (for
+WebSocket: until the final "done" message, plus time to the first token).
+
+Part 2 opens idle sockets in steps and, with all of them open, runs one conversation
+turn on an extra socket. The server's memory (RSS, when the API was spawned here)
+is reported per step; the run stops at the first step that fails.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import httpx
+import websockets
+
+from benchmarks.common import latency_summary, save_results
+from benchmarks.fixtures import benchmark_environment, start_process, stop_processes, wait_until_healthy
+from benchmarks.scenarios import VISA_EXTENSION_ANSWERS
+
+OPENING_MESSAGE = "Hi, I would like to extend my visa in Munich."
+
+def rss_mb(pid: int | None) -> float | None:
+    """Resident memory of a process and its children (uvicorn workers), from /proc."""
+    if pid is None or not os.path.exists(f"/proc/{pid}"):
+        return None
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    total_kb = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            continue
+    return total_kb / 1024.0
+
+async def ws_turn(ws, user_input: str):
+    """Send one message; returns (seconds to first token, seconds to done, done message)."""
+    started = time.perf_counter()
+    first_token = None
+    await ws.send(json.dumps({"type": "message", "user_input": user_input}))
+    while True:
+        message = json.loads(await ws.recv())
+        if message["type"] == "token":
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            continue
+        return first_token, time.perf_counter() - started, message
+
+async def ws_conversation(ws_url: str, turns: list, ttft: list):
+    async with websockets.connect(f"{ws_url}/assistant/ws", max_size=None) as ws:
+        for user_input in [OPENING_MESSAGE] + VISA_EXTENSION_ANSWERS:
+            first_token, elapsed, message = await ws_turn(ws, user_input)
+            if message["type"] != "done":
+                raise RuntimeError(message.get("detail"))
+            turns.append(elapsed)
+            if first_token is not None:
+                ttft.append(first_token)
+            if message["finished"]:
+                return
+
+async def http_conversation(client: httpx.AsyncClient, turns: list):
+    conversation_id = None
+    for user_input in [OPENING_MESSAGE] + VISA_EXTENSION_ANSWERS:
+        started = time.perf_counter()
+        response = await client.post(
+            "/assistant/message", json={"user_input": user_input, "conversation_id": conversation_id},
+        )
+        response.raise_for_status()
+        turns.append(time.perf_counter() - started)
+        payload = response.json()
+        conversation_id = payload["conversation_id"]
+        if payload["finished"]:
+            return
+
+async def compare_transports(base_url: str, concurrency: int, conversations: int) -> dict:
+    ws_url = base_url.replace("http", "ws", 1)
+    results = {}
+    for transport in ("http", "websocket"):
+        turns, ttft, errors = [], [], 0
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+            async def one():
+                nonlocal errors
+                async with semaphore:
+                    try:
+                        if transport == "http":
+                            await http_conversation(client, turns)
+                        else:
+                            await ws_conversation(ws_url, turns, ttft)
+                    except Exception:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(conversations)))
+            wall_s = time.perf_counter() - started
+        results[transport] = {
+            "concurrency": concurrency,
+            "conversations": conversations,
+            "errors": errors,
+            "conversations_per_s": (conversations - errors) / wall_s if wall_s else 0.0,
+            "turn": latency_summary(turns),
+            "first_token": latency_summary(ttft) if ttft else None,
+        }
+    return results
+
+async def hold_sockets(base_url: str, steps: list, server_pid: int | None, connect_concurrency: int = 100) -> list:
+    ws_url = f"{base_url.replace('http', 'ws', 1)}/assistant/ws"
+    held, results = [], []
+    semaphore = asyncio.Semaphore(connect_concurrency)
+
+    async def connect():
+        async with semaphore:
+            return await websockets.connect(ws_url, open_timeout=30)
+
+    try:
+        for target in steps:
+            step = {"sockets": target, "ok": True}
+            try:
+                held += await asyncio.gather(*(connect() for _ in range(target - len(held))))
+                # One turn while every socket is held open
+                async with websockets.connect(ws_url, open_timeout=30) as probe:
+                    step["probe_first_token_s"], step["probe_turn_s"], message = await asyncio.wait_for(
+                        ws_turn(probe, OPENING_MESSAGE), timeout=120,
+                    )
+                    step["ok"] = message["type"] == "done"
+            except Exception as e:
+                step.update(ok=False, error=repr(e))
+            step["server_rss_mb"] = rss_mb(server_pid)
+            results.append(step)
+            print(f"{target:>7} sockets  ok={step['ok']}  probe turn {step.get('probe_turn_s') or 0:.3f}s  "
+                  f"server RSS {step['server_rss_mb'] or 0:.0f} MB")
+            if not step["ok"]:
+                break
+    finally:
+        await asyncio.gather(*(ws.close() for ws in held), return_exceptions=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the assistant WebSocket endpoint.")
+    parser.add_argument("--base-url", default=None, help="Use an already running API instead of spawning one")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16])
+    parser.add_argument("--conversations", type=int, default=32, help="Conversations per transport and level")
+    parser.add_argument("--hold", nargs="+", type=int, default=[100, 500, 1000, 2000])
+    parser.add_argument("--workdir", default=os.path.join("benchmarks", ".workdir"))
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--mock-port", type=int, default=8090)
+    parser.add_argument("--mock-ttft-ms", type=float, default=150.0)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=250.0)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    processes, server_pid = [], None
+    base_url = args.base_url
+    try:
+        if base_url is None:
+            os.makedirs(args.workdir, exist_ok=True)
+            mock_url = f"http://127.0.0.1:{args.mock_port}"
+            env = benchmark_environment(args.workdir, mock_url)
+            log_path = os.path.join(args.workdir, "processes.log")
+            processes.append(start_process([
+                sys.executable, "-m", "benchmarks.mock_llm_server", "--port", str(args.mock_port),
+                "--ttft-ms", str(args.mock_ttft_ms), "--tokens-per-second", str(args.mock_tokens_per_second),
+            ], env, log_path))
+            api = start_process([
+                sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                "--port", str(args.api_port), "--workers", "1", "--log-level", "warning",
+            ], env, log_path)
+            processes.append(api)
+            server_pid = api.pid
+            base_url = f"http://127.0.0.1:{args.api_port}"
+            wait_until_healthy(f"{mock_url}/health")
+            wait_until_healthy(f"{base_url}/")
+
+        results = {"transports": [], "hold": []}
+        print(f"{'transport':10} {'conc':>5} {'conv/s':>8} {'turn p50':>9} {'turn p95':>9} {'ttft p50':>9} {'errors':>7}")
+        for concurrency in args.concurrency:
+            level = asyncio.run(compare_transports(base_url, concurrency, args.conversations))
+            results["transports"].append(level)
+            for transport, run in level.items():
+                ttft = run["first_token"]["p50_ms"] if run["first_token"] else float("nan")
+                print(
+                    f"{transport:10} {concurrency:>5} {run['conversations_per_s']:>8.2f} {run['turn']['p50_ms']:>9.1f} "
+                    f"{run['turn']['p95_ms']:>9.1f} {ttft:>9.1f} {run['errors']:>7}"
+                )
+
+        print()
+        results["hold"] = asyncio.run(hold_sockets(base_url, sorted(args.hold), server_pid))
+        held = [step["sockets"] for step in results["hold"] if step["ok"]]
+        print(f"\nOne worker held {max(held) if held else 0} concurrent sockets")
+        if args.save:
+            print(f"Results written to {save_results('websocket_load', results)}")
+    finally:
+        stop_processes(processes)
+
+if __name__ == "__main__":
+    main()
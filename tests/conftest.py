@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+import pytest
+
+# Scratch locations for everything the app writes, set before the app modules read the settings
+_WORKDIR = tempfile.mkdtemp(prefix="bureasy-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}")
+os.environ.setdefault("CHROMA_PERSIST_DIRECTORY", os.path.join(_WORKDIR, "chroma_db"))
+os.environ.setdefault("VECTOR_STORE_DIR", os.path.join(_WORKDIR, "vector_store"))
+os.environ.setdefault("KB_VERSION_FILE", os.path.join(_WORKDIR, "kb_version.json"))
+os.environ.setdefault("LINK_GRAPH_DIR", os.path.join(_WORKDIR, "link_graph"))
+os.environ.setdefault("PDF_CACHE_DIR", os.path.join(_WORKDIR, "pdf_cache"))
+os.environ.setdefault("LLM_SHARED_STATE_FILE", "")
+
+@pytest.fixture
+def db():
+    """A session on freshly created tables."""
+    import app.models.conversation  # noqa: F401  (registers the tables)
+    import app.models.query_log  # noqa: F401
+    from app.models.database import Base, SessionLocal, engine
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with SessionLocal() as session:
+        yield session
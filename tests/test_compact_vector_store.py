@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from app.utils.compact_vector_store import CompactVectorStore
+
+DIM = 8
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+def nearest(store, vector, n=1, where=None):
+    return store.query(vector[None, :], n_results=n, where=where)["ids"][0]
+
+@pytest.fixture(params=["float16", "int8"])
+def store(request, tmp_path):
+    return CompactVectorStore(str(tmp_path / "store"), dtype=request.param, persist_every=0)
+
+def reopen(store):
+    return CompactVectorStore(store.directory, dtype=store.dtype, persist_every=0)
+
+def test_add_and_query(store):
+    vecs = vectors(20)
+    ids = [f"id{i}" for i in range(20)]
+    store.add(ids=ids, embeddings=vecs, documents=[f"doc {i}" for i in range(20)], metadatas=[{"i": i} for i in range(20)])
+
+    assert store.count() == 20
+    for i in (0, 7, 19):
+        assert nearest(store, vecs[i]) == [ids[i]]
+    result = store.query(vecs[3][None, :], n_results=3)
+    assert result["documents"][0][0] == "doc 3"
+    assert result["distances"][0] == sorted(result["distances"][0])
+
+def test_add_skips_existing_ids_and_upsert_replaces(store):
+    vecs = vectors(3)
+    store.add(ids=["a", "b"], embeddings=vecs[:2], documents=["a1", "b1"])
+    store.add(ids=["a"], embeddings=vecs[2:], documents=["a2"])
+    assert store.get(ids=["a"])["documents"] == ["a1"]
+
+    store.upsert(ids=["a"], embeddings=vecs[2:], documents=["a2"])
+    assert store.count() == 2
+    assert store.get(ids=["a"])["documents"] == ["a2"]
+    assert nearest(store, vecs[2]) == ["a"]
+
+def test_where_filters(store):
+    vecs = vectors(4)
+    metadatas = [
+        {"type": "content", "source_url": "u1"},
+        {"type": "pdf_content", "source_url": "u1"},
+        {"type": "content", "source_url": "u2"},
+        {"type": "phone_number", "source_url": "u1"},
+    ]
+    store.add(ids=["c1", "p1", "c2", "n1"], embeddings=vecs, metadatas=metadatas)
+
+    assert nearest(store, vecs[1], n=4, where={"type": "content"}) in (["c1", "c2"], ["c2", "c1"])
+    assert sorted(nearest(store, vecs[0], n=4, where={"type": {"$in": ["content", "phone_number"]}})) == ["c1", "c2", "n1"]
+    assert sorted(nearest(store, vecs[0], n=4, where={"$or": [{"type": "pdf_content"}, {"source_url": "u2"}]})) == ["c2", "p1"]
+    assert sorted(nearest(store, vecs[0], n=4, where={"type": {"$ne": "content"}})) == ["n1", "p1"]
+    with pytest.raises(ValueError):
+        store.query(vecs[:1], where={"type": {"$gt": 1}})
+
+def test_delete(store):
+    vecs = vectors(4)
+    store.add(ids=["a", "b", "c", "d"], embeddings=vecs, metadatas=[{"page": 1}, {"page": 1}, {"page": 2}, {"page": 2}])
+
+    store.delete(ids=["a"])
+    store.delete(where={"page": 2})
+
+    assert store.count() == 1
+    assert store.get()["ids"] == ["b"]
+    assert nearest(store, vecs[0], n=4) == ["b"]
+    with pytest.raises(ValueError):
+        store.delete()
+
+    # A deleted ID can be added again
+    store.add(ids=["a"], embeddings=vecs[:1])
+    assert nearest(store, vecs[0]) == ["a"]
+
+def test_reload_without_persist(store):
+    vecs = vectors(5)
+    store.add(ids=list("abcde"), embeddings=vecs, documents=list("ABCDE"))
+    store.upsert(ids=["b"], embeddings=vecs[4:], documents=["B2"])
+    store.delete(ids=["c"])
+
+    reloaded = reopen(store)
+
+    assert reloaded.count() == 4
+    assert reloaded.get(ids=["b"])["documents"] == ["B2"]
+    assert reloaded.get(ids=["c"])["ids"] == []
+    assert nearest(reloaded, vecs[0]) == ["a"]
+    assert sorted(nearest(reloaded, vecs[4], n=2)) == ["b", "e"]
+
+def test_reload_after_persist_and_later_writes(store):
+    vecs = vectors(6)
+    store.add(ids=list("abc"), embeddings=vecs[:3])
+    store.persist()
+    store.add(ids=list("def"), embeddings=vecs[3:])
+
+    reloaded = reopen(store)
+
+    assert reloaded.count() == 6
+    for i, id_ in enumerate("abcdef"):
+        assert nearest(reloaded, vecs[i]) == [id_]
+
+def test_torn_last_line_is_dropped(store):
+    vecs = vectors(2)
+    store.add(ids=["a", "b"], embeddings=vecs)
+    with open(store._path("records.jsonl"), "ab") as f:
+        f.write(b'{"id": "c", "docu')
+
+    reloaded = reopen(store)
+
+    assert reloaded.get()["ids"] == ["a", "b"]
+    reloaded.add(ids=["c"], embeddings=vecs[:1])
+    assert reopen(reloaded).get()["ids"] == ["a", "b", "c"]
+
+def test_persist_compacts_the_record_log(store):
+    vecs = vectors(3)
+    store.add(ids=list("abc"), embeddings=vecs)
+    for version in range(5):
+        store.upsert(ids=list("abc"), embeddings=vecs, documents=[f"v{version}"] * 3)
+    store.delete(ids=["b"])
+
+    store.persist()
+
+    with open(store._path("records.jsonl"), "rb") as f:
+        assert len(f.readlines()) == 3
+    reloaded = reopen(store)
+    assert reloaded.get()["ids"] == ["a", "c"]
+    assert reloaded.get()["documents"] == ["v4", "v4"]
+    # The deleted row keeps its place, so rows after it still line up with their vectors
+    assert nearest(reloaded, vecs[2]) == ["c"]
+
+def test_dimension_and_dtype_mismatch(store):
+    store.add(ids=["a"], embeddings=vectors(1))
+    with pytest.raises(ValueError):
+        store.add(ids=["b"], embeddings=np.ones((1, DIM + 1), dtype=np.float32))
+    store.persist()
+    other = "int8" if store.dtype == "float16" else "float16"
+    with pytest.raises(ValueError):
+        CompactVectorStore(store.directory, dtype=other)
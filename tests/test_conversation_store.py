@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from sqlalchemy import update
+
+from app.models.conversation import Conversation, Message, utcnow
+from app.models.database import SessionLocal, engine
+from app.services.archival_service import archive_finished_conversations
+from app.services.conversation_store import ConversationStore
+
+def make_store(write_behind=True) -> ConversationStore:
+    return ConversationStore(max_entries=10, recent_window=10, write_behind=write_behind, batch_ms=50)
+
+def transcript(conversation_id):
+    with SessionLocal() as session:
+        return [
+            (m.role, m.content)
+            for m in session.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.id)
+        ]
+
+def stored(conversation_id) -> Conversation:
+    with SessionLocal() as session:
+        return session.get(Conversation, conversation_id)
+
+def test_turns_are_written_behind_and_reloaded(db):
+    store = make_store()
+    state = store.create(db, "visa_extension", 0, [("user", "hi"), ("assistant", "Q1")], current_question="q1")
+    store.save_turn(db, state, [("user", "a1"), ("assistant", "Q2")], state_index=1, answers={"a": "1"}, current_question="q2")
+    assert store.flush(state.id, timeout=5)
+
+    conversation = stored(state.id)
+    assert (conversation.state_index, conversation.current_question, conversation.answers) == (1, "q2", {"a": "1"})
+    assert conversation.version == state.version
+    assert transcript(state.id)[-1] == ("assistant", "Q2")
+
+    fresh = make_store()
+    reloaded = fresh.get(db, state.id)
+    assert reloaded.current_question == "q2"
+    assert list(reloaded.recent)[-2:] == [("user", "a1"), ("assistant", "Q2")]
+
+def test_conflicting_turn_stores_neither_state_nor_messages(db):
+    store = make_store()
+    state = store.create(db, "visa_extension", 0, [("user", "hi"), ("assistant", "Q1")], current_question="q1")
+    # Another worker changes the conversation after this one cached it
+    with engine.begin() as conn:
+        conn.execute(update(Conversation.__table__).where(Conversation.id == state.id).values(
+            state_index=5, version=Conversation.version + 1,
+        ))
+
+    store.save_turn(db, state, [("user", "stale"), ("assistant", "stale reply")], state_index=1, current_question="q2")
+    assert store.flush(state.id, timeout=5)
+
+    assert store.conflicts == 1
+    assert stored(state.id).state_index == 5
+    assert transcript(state.id) == [("user", "hi"), ("assistant", "Q1")]
+    assert not store.is_current(state)
+
+def test_a_failing_write_does_not_lose_the_others(db):
+    store = make_store()
+    first = store.create(db, "visa_extension", 0, [("user", "hi")])
+    second = store.create(db, "visa_extension", 0, [("user", "hello")])
+
+    store.save_turn(db, first, [("user", object())], state_index=1)  # cannot be bound: this insert fails
+    store.save_turn(db, second, [("user", "fine")], state_index=1)
+    assert store.flush(timeout=5)
+
+    assert stored(first.id).state_index == 0
+    assert transcript(first.id) == [("user", "hi")]
+    assert stored(second.id).state_index == 1
+    assert transcript(second.id) == [("user", "hello"), ("user", "fine")]
+
+def test_turn_on_a_conversation_archived_meanwhile_restores_it(db):
+    store = make_store()
+    state = store.create(db, "visa_extension", 2, [("user", "hi"), ("assistant", "done")], finished=True)
+    with engine.begin() as conn:
+        conn.execute(update(Conversation.__table__).where(Conversation.id == state.id).values(
+            finished_at=utcnow() - timedelta(days=90),
+        ))
+    state.finished_at = stored(state.id).finished_at
+    assert archive_finished_conversations(db, older_than_days=30) == [state.id]
+
+    store.save_turn(db, state, [("user", "one more"), ("assistant", "sure")], state_index=3)
+    assert store.flush(state.id, timeout=5)
+
+    conversation = stored(state.id)
+    assert conversation.archived_at is None
+    assert conversation.state_index == 3
+    # The restore restarted the retention clock; the turn does not set it back
+    assert conversation.finished_at > utcnow() - timedelta(minutes=1)
+    assert transcript(state.id) == [("user", "hi"), ("assistant", "done"), ("user", "one more"), ("assistant", "sure")]
+
+def test_synchronous_writes_detect_conflicts_too(db):
+    store = make_store(write_behind=False)
+    state = store.create(db, "visa_extension", 0, [("user", "hi")])
+    with engine.begin() as conn:
+        conn.execute(update(Conversation.__table__).where(Conversation.id == state.id).values(version=Conversation.version + 1))
+
+    store.save_turn(db, state, [("user", "stale")], state_index=1)
+    assert store.conflicts == 1
+    assert transcript(state.id) == [("user", "hi")]
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.models.database import engine
+from app.utils.metrics import STAGE_SECONDS
+
+def test_failed_statements_do_not_disturb_statement_timing():
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        before = STAGE_SECONDS.snapshot(stage="db")
+        conn.execute(text("SELECT 1"))
+        after = STAGE_SECONDS.snapshot(stage="db")
+        assert "query_started" not in conn.info
+
+    assert after["count"] == before["count"] + 1
+    assert 0 <= after["sum"] - before["sum"] < 1
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.services import doc_ingestion_service as service
+from app.utils.compact_vector_store import CompactVectorStore
+
+URL = "https://example.org/visa"
+
+def _page(text, phone_numbers=(), pdf_links=()):
+    return {
+        "url": URL,
+        "text": text,
+        "summary": "",
+        "phone_numbers": [{"number": n, "left_context": "Call", "right_context": ""} for n in phone_numbers],
+        "pdf_links": list(pdf_links),
+    }
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    store = CompactVectorStore(str(tmp_path / "store"))
+    monkeypatch.setattr(service, "get_chroma_collection", lambda: store)
+    monkeypatch.setattr(service, "embed_texts_array", lambda texts: np.ones((len(texts), 4), dtype=np.float32))
+    monkeypatch.setattr(service, "record_links", lambda json_data: None)
+    monkeypatch.setattr(service.settings, "PDF_INGEST_ON_UPLOAD", False)
+    return store
+
+def _ids(store, type_):
+    return sorted(i for i, m in zip(*(store.get()[k] for k in ("ids", "metadatas"))) if m["type"] == type_)
+
+def test_reupload_removes_records_the_page_no_longer_has(collection):
+    service.ingest_json_to_chromadb(_page("word " * 1500, phone_numbers=["089 1", "089 2"], pdf_links=["https://example.org/a.pdf"]))
+    assert len(_ids(collection, "content")) > 1
+    assert len(_ids(collection, "phone_number")) == 2
+
+    service.ingest_json_to_chromadb(_page("short page", phone_numbers=["089 1"]))
+
+    assert _ids(collection, "content") == [service.record_id(URL, "content", 0)]
+    assert _ids(collection, "phone_number") == [service.record_id(URL, "phone_number", 0)]
+    assert _ids(collection, "pdf") == []
+
+def test_reupload_keeps_pdf_content_and_other_pages(collection):
+    collection.add(ids=["pdf_content_1"], embeddings=[[1, 0, 0, 0]], metadatas=[{"type": "pdf_content", "source_url": URL}])
+    other = dict(_page("other page"), url="https://example.org/other")
+    service.ingest_json_to_chromadb(other)
+
+    service.ingest_json_to_chromadb(_page("first version"))
+    service.ingest_json_to_chromadb(_page("second version"))
+
+    remaining = collection.get()
+    assert "pdf_content_1" in remaining["ids"]
+    assert service.record_id(other["url"], "content", 0) in remaining["ids"]
+    assert remaining["documents"][remaining["ids"].index(service.record_id(URL, "content", 0))] == "second version"
+
+def test_delete_legacy_records(collection):
+    legacy = ["content_summary", "phone_number_0", "url_12", "pdf_link_3"]
+    current = [service.record_id(URL, "content", 0), service.record_id(URL, "phone_number", 0)]
+    ids = legacy + current
+    collection.add(ids=ids, embeddings=np.ones((len(ids), 4), dtype=np.float32), metadatas=[{"type": "content"}] * len(ids))
+
+    assert service.delete_legacy_records(collection) == len(legacy)
+    assert sorted(collection.get()["ids"]) == sorted(current)
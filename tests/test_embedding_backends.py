@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.utils import chromadb_client
+from app.utils.embedding_backends import SENTENCE_TRANSFORMERS_CONFIG_FILE, load_sentence_transformers_config, pool_embeddings
+
+def write_model(directory, modules, files):
+    directory.mkdir(exist_ok=True)
+    (directory / "modules.json").write_text(json.dumps(modules))
+    for name, content in files.items():
+        (directory / name).parent.mkdir(parents=True, exist_ok=True)
+        (directory / name).write_text(json.dumps(content))
+    return str(directory)
+
+TRANSFORMER = {"idx": 0, "name": "0", "path": "", "type": "sentence_transformers.models.Transformer"}
+POOLING = {"idx": 1, "name": "1", "path": "1_Pooling", "type": "sentence_transformers.models.Pooling"}
+NORMALIZE = {"idx": 2, "name": "2", "path": "2_Normalize", "type": "sentence_transformers.models.Normalize"}
+
+def test_config_is_read_from_the_sentence_transformers_files(tmp_path):
+    model = write_model(tmp_path / "model", [TRANSFORMER, POOLING, NORMALIZE], {
+        "sentence_bert_config.json": {"max_seq_length": 128, "do_lower_case": False},
+        "1_Pooling/config.json": {"word_embedding_dimension": 4, "pooling_mode_cls_token": True, "pooling_mode_mean_tokens": False},
+    })
+    export_dir = tmp_path / "export"
+    export_dir.mkdir()
+
+    config = load_sentence_transformers_config(model, str(export_dir))
+
+    assert config == {"max_seq_length": 128, "pooling": "cls", "normalize": True}
+    assert json.loads((export_dir / SENTENCE_TRANSFORMERS_CONFIG_FILE).read_text()) == config
+
+def test_models_without_normalize_module_are_not_normalized(tmp_path):
+    model = write_model(tmp_path / "model", [TRANSFORMER, POOLING], {
+        "sentence_bert_config.json": {"max_seq_length": 512},
+        "1_Pooling/config.json": {"pooling_mode_mean_tokens": True},
+    })
+    assert load_sentence_transformers_config(model, str(tmp_path)) == {"max_seq_length": 512, "pooling": "mean", "normalize": False}
+
+def test_unsupported_modules_are_rejected(tmp_path):
+    dense = {"idx": 2, "name": "2", "path": "2_Dense", "type": "sentence_transformers.models.Dense"}
+    model = write_model(tmp_path / "model", [TRANSFORMER, POOLING, dense], {"1_Pooling/config.json": {"pooling_mode_mean_tokens": True}})
+    with pytest.raises(ValueError, match="Dense"):
+        load_sentence_transformers_config(model, str(tmp_path))
+
+    model = write_model(tmp_path / "weighted", [TRANSFORMER, POOLING], {"1_Pooling/config.json": {"pooling_mode_weightedmean_tokens": True}})
+    with pytest.raises(ValueError, match="weightedmean"):
+        load_sentence_transformers_config(model, str(tmp_path))
+
+def test_pooling():
+    tokens = np.array([[[3.0, 4.0], [1.0, 0.0], [100.0, 100.0]]])
+    mask = np.array([[1, 1, 0]])
+    assert np.allclose(pool_embeddings(tokens, mask, "mean", normalize=False), [[2.0, 2.0]])
+    assert np.allclose(pool_embeddings(tokens, mask, "cls", normalize=False), [[3.0, 4.0]])
+    assert np.allclose(pool_embeddings(tokens, mask, "max", normalize=False), [[3.0, 4.0]])
+    assert np.allclose(pool_embeddings(tokens, mask, "cls", normalize=True), [[0.6, 0.8]])
+
+@pytest.fixture
+def compact_collection(tmp_path, monkeypatch):
+    monkeypatch.setattr(chromadb_client.app_settings, "VECTOR_STORE_BACKEND", "compact")
+    monkeypatch.setattr(chromadb_client.app_settings, "VECTOR_STORE_DIR", str(tmp_path))
+    return chromadb_client.get_chroma_collection()
+
+def test_dimension_check(compact_collection):
+    chromadb_client.check_embedding_dimension(8)  # empty collections fit any model
+
+    compact_collection.add(ids=["a"], embeddings=[[1.0] * 4])
+    chromadb_client.check_embedding_dimension(4)
+    with pytest.raises(RuntimeError, match="8-dimensional vectors"):
+        chromadb_client.check_embedding_dimension(8)
+
+def test_chroma_collection_dimension():
+    collection = chromadb_client.client.get_or_create_collection("dimension_check")
+    assert chromadb_client.collection_dimension(collection) is None
+    collection.add(ids=["a"], embeddings=[[1.0, 0.0, 0.0]])
+    assert chromadb_client.collection_dimension(collection) == 3
@@ -0,0 +1,83 @@
+import os
+import shutil
+
+import pytest
+
+from app.services.flow_engine import DEFAULT_FLOWS_DIR, FlowDefinitionError, FlowRegistry, compile_flow, load_flow_file
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "flows")
+
+@pytest.fixture
+def flow():
+    return load_flow_file(os.path.join(FIXTURES, "branching.yaml"))
+
+def asked(flow, answers):
+    return [question.id for question, _ in flow.answered_path(answers)]
+
+def test_branching_skips_to_the_target(flow):
+    assert flow.next_question({}).id == "purpose"
+    assert flow.next_question({"purpose": "Working"}).id == "employer"
+    assert flow.next_question({"purpose": "Studying"}).id == "university"
+
+def test_when_and_unless_skip_questions(flow):
+    studying = {"purpose": "Studying", "university": "TUM"}
+    assert flow.next_question(studying).id == "financial_proof"
+    assert flow.next_question({**studying, "financial_proof": "Yes"}).id == "move_date"
+    assert flow.next_question({**studying, "financial_proof": "No"}).id == "financing_plan"
+
+def test_answered_path_follows_the_branch(flow):
+    answers = {"purpose": "Working", "employer": "BMW", "financial_proof": "Yes", "move_date": "01/01/2020"}
+    assert asked(flow, answers) == ["purpose", "employer", "financial_proof", "move_date"]
+    assert flow.next_question(answers) is None
+
+def test_open_questions_respect_conditions(flow):
+    open_ids = [q.id for q in flow.open_questions({"purpose": "Working"})]
+    assert "university" not in open_ids
+    assert "employer" in open_ids
+
+def test_answers_are_normalized_and_validated(flow):
+    purpose, proof, move_date = flow.by_id["purpose"], flow.by_id["financial_proof"], flow.by_id["move_date"]
+    assert purpose.check("working") == ("Working", None)
+    assert purpose.check("retired")[0] is None
+    assert proof.check("yes") == ("Yes", None)
+    assert move_date.check("01.02.2020") == ("01/02/2020", None)
+    assert move_date.check("01/01/2999")[0] is None
+
+@pytest.mark.parametrize("questions, message", [
+    ([{"text": "A", "next": {"x": "q1"}}], "forward"),
+    ([{"text": "A", "when": {"later": "x"}}, {"id": "later", "text": "B"}], "earlier question"),
+    ([{"text": "A", "type": "colour"}], "unknown type"),
+    ([{"id": "a", "text": "A"}, {"id": "a", "text": "B"}], "duplicate id"),
+])
+def test_invalid_flows_are_rejected(questions, message):
+    with pytest.raises(FlowDefinitionError, match=message):
+        compile_flow({"name": "broken", "questions": questions})
+
+def test_registry_hot_reloads_changed_files(tmp_path):
+    path = tmp_path / "branching.yaml"
+    shutil.copy(os.path.join(FIXTURES, "branching.yaml"), path)
+    registry = FlowRegistry(str(tmp_path), reload_interval_s=0)
+    assert len(registry.get("branching_example")) == 6
+
+    path.write_text("name: branching_example\nquestions:\n  - Only one question?\n", encoding="utf-8")
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2)
+    assert len(registry.get("branching_example")) == 1
+
+    # A broken edit keeps the last good version
+    path.write_text("name: branching_example\nquestions: []\n", encoding="utf-8")
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 2 * 10**9,) * 2)
+    assert len(registry.get("branching_example")) == 1
+
+    path.unlink()
+    assert registry.get("branching_example") is None
+
+def test_registry_detects_flows_by_keyword(tmp_path):
+    shutil.copy(os.path.join(FIXTURES, "branching.yaml"), tmp_path / "branching.yaml")
+    registry = FlowRegistry(str(tmp_path), reload_interval_s=0)
+    assert registry.candidates("I need a new work permit", limit=3) == ["branching_example"]
+    assert registry.candidates("hello", limit=3) == []
+
+def test_shipped_flows_compile():
+    registry = FlowRegistry(DEFAULT_FLOWS_DIR)
+    registry.reload(force=True)
+    assert "visa_extension" in registry.names()
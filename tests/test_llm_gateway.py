@@ -0,0 +1,135 @@
+import threading
+import time
+
+import groq
+import httpx
+import pytest
+
+from app.utils import llm_gateway
+from app.utils.llm_gateway import LLMDeadlineExceeded, LLMGateway, Priority, SharedLimiter, TokenBucket
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    return groq.RateLimitError("rate limited", response=httpx.Response(429, headers=headers, request=request), body=None)
+
+def test_token_bucket_refills_continuously():
+    bucket = TokenBucket(60)  # one per second
+    now = bucket.updated
+    bucket.consume(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, now + 1.0) == 0.0
+    # Refills up to the capacity only; requests above it wait for a full bucket
+    assert bucket.wait_time(1000, now + 3600) == 0.0
+    assert bucket.tokens == 60
+
+def test_token_bucket_disabled():
+    bucket = TokenBucket(0)
+    bucket.consume(100)
+    assert bucket.wait_time(100, time.monotonic()) == 0.0
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Replace the upstream call: each entry in the returned list is raised or streamed in turn."""
+    outcomes = []
+
+    def fake_open(self, request, deadline, attempt):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return [], iter(outcome)
+
+    monkeypatch.setattr(LLMGateway, "_open", fake_open)
+    return outcomes
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(llm_gateway.time, "sleep", slept.append)
+    return slept
+
+def test_retry_after_is_honoured(opened, sleeps):
+    gateway = LLMGateway(max_retries=2, retry_base_delay_s=0.01, retry_max_delay_s=0.01)
+    opened.extend([rate_limit_error("0.3"), ["chunk"]])
+
+    started = time.monotonic()
+    assert list(gateway.stream(MESSAGES, max_tokens=10, temperature=0)) == ["chunk"]
+    assert sleeps == [0.3]
+    # The 429 also paused the gateway: the retry waited for it in the scheduler
+    assert time.monotonic() - started >= 0.25
+
+def test_retries_are_bounded(opened, sleeps):
+    gateway = LLMGateway(max_retries=2, retry_base_delay_s=0.01)
+    opened.extend([groq.APIConnectionError(request=httpx.Request("POST", "https://api.groq.com"))] * 3)
+
+    with pytest.raises(groq.APIConnectionError):
+        list(gateway.stream(MESSAGES, max_tokens=10, temperature=0))
+    assert len(sleeps) == 2
+
+def test_non_retryable_errors_are_raised_at_once(opened, sleeps):
+    gateway = LLMGateway(max_retries=2)
+    opened.append(ValueError("bad request"))
+
+    with pytest.raises(ValueError):
+        list(gateway.stream(MESSAGES, max_tokens=10, temperature=0))
+    assert sleeps == []
+
+def test_retry_after_beyond_the_deadline_fails_fast(opened, sleeps):
+    gateway = LLMGateway(max_retries=2)
+    opened.append(rate_limit_error("30"))
+
+    with pytest.raises(LLMDeadlineExceeded):
+        list(gateway.stream(MESSAGES, max_tokens=10, temperature=0, deadline_s=5))
+    assert sleeps == []
+
+def test_waiting_calls_are_served_by_priority():
+    gateway = LLMGateway(requests_per_minute=300)  # one every 0.2s
+    gateway.requests.consume(300)
+    served = []
+
+    def call(priority):
+        gateway._acquire(priority, tokens=1, deadline=time.monotonic() + 10)
+        served.append(priority)
+
+    threads = []
+    for priority in (Priority.BACKGROUND, Priority.DEFAULT, Priority.INTERACTIVE):
+        threads.append(threading.Thread(target=call, args=(priority,)))
+        threads[-1].start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(10)
+
+    # The background call arrived first but was still waiting for capacity
+    assert served == [Priority.INTERACTIVE, Priority.DEFAULT, Priority.BACKGROUND]
+
+def test_queued_call_hits_its_deadline():
+    gateway = LLMGateway(requests_per_minute=1)
+    gateway.requests.consume(1)
+    with pytest.raises(LLMDeadlineExceeded):
+        gateway._acquire(Priority.INTERACTIVE, tokens=1, deadline=time.monotonic() + 0.1)
+
+def test_shared_limiter(tmp_path):
+    first = SharedLimiter(str(tmp_path / "limits.json"), requests_per_minute=2)
+    second = SharedLimiter(str(tmp_path / "limits.json"), requests_per_minute=2)
+
+    assert first.acquire(Priority.INTERACTIVE, tokens=10) == 0
+    assert second.acquire(Priority.INTERACTIVE, tokens=10) == 0
+    # Both processes drew on the same two requests per minute
+    assert 0 < first.acquire(Priority.BACKGROUND, tokens=10) <= 30
+
+def test_shared_limiter_holds_back_lower_priorities(tmp_path):
+    limiter = SharedLimiter(str(tmp_path / "limits.json"), requests_per_minute=1)
+    assert limiter.acquire(Priority.INTERACTIVE, tokens=1) == 0
+    assert limiter.acquire(Priority.INTERACTIVE, tokens=1) > 0  # announces that it is waiting
+
+    other = SharedLimiter(str(tmp_path / "limits.json"), requests_per_minute=0)
+    assert other.acquire(Priority.BACKGROUND, tokens=1) > 0
+    assert other.acquire(Priority.INTERACTIVE, tokens=1) == 0
+
+def test_shared_limiter_pause(tmp_path):
+    limiter = SharedLimiter(str(tmp_path / "limits.json"))
+    limiter.pause(5)
+    assert 4 < limiter.acquire(Priority.INTERACTIVE, tokens=1, announce=False) <= 5
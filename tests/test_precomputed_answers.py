@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+
+from app.models.query_log import PrecomputedAnswer
+from app.utils.knowledge_base import mark_knowledge_base_changed
+from app.services import precomputed_answers_service as service
+from app.services.precomputed_answers_service import (
+    PrecomputedAnswerStore,
+    cluster_queries,
+    context_fingerprint,
+    refresh_precomputed_answers,
+)
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+STUDENT = unit([1.0, 0.05, 0.0, 0.0])
+WORK = unit([1.0, 0.0, 0.05, 0.0])  # cosine ~0.999 with STUDENT
+PHONE = unit([0.0, 0.0, 0.0, 1.0])
+
+STUDENT_STEPS = {"query": "extend student visa", "steps": [{"step": "Enrolment certificate", "source": "a"}]}
+WORK_STEPS = {"query": "extend work visa", "steps": [{"step": "Employment contract", "source": "b"}]}
+
+def test_cluster_queries_groups_by_normalized_form_and_similarity():
+    rows = [
+        ("Extend student visa", "extend student visa", STUDENT),
+        ("extend  student visa", "extend student visa", STUDENT),
+        ("Extend my student visa", "extend my student visa", unit([1.0, 0.06, 0.0, 0.0])),
+        ("Phone number?", "phone number?", PHONE),
+    ]
+    clusters = cluster_queries(rows, similarity=0.95)
+    assert [cluster["count"] for cluster in clusters] == [3, 1]
+    assert clusters[0]["query"] == "extend  student visa"  # latest spelling of the most frequent query
+    assert clusters[0]["normalized_queries"] == ["extend student visa", "extend my student visa"]
+    assert clusters[1]["normalized_queries"] == ["phone number?"]
+
+def test_cluster_queries_does_not_chain_through_intermediate_queries():
+    a, b, c = unit([1.0, 0.0]), unit([1.0, 0.6]), unit([0.6, 1.0])
+    clusters = cluster_queries([("a", "a", a), ("a", "a", a), ("b", "b", b), ("c", "c", c)], similarity=0.85)
+    # b is close enough to a, c only to b: c is not pulled into a's cluster through b
+    assert [cluster["normalized_queries"] for cluster in clusters] == [["a", "b"], ["c"]]
+
+@pytest.fixture
+def store(db):
+    db.add(PrecomputedAnswer(
+        kind="checklist", kb_version="v1", query="extend student visa",
+        normalized_queries=["extend student visa", "extend my student visa"],
+        embedding=STUDENT.tobytes(), query_count=10, answer={"steps": ["student answer"]},
+        context_hash=context_fingerprint("checklist", STUDENT_STEPS),
+    ))
+    db.commit()
+    return PrecomputedAnswerStore(enabled=True, match_similarity=0.9, reload_interval_s=0)
+
+def test_exact_match_is_served_without_retrieval(store):
+    def context():
+        raise AssertionError("exact matches need no retrieval")
+    assert store.lookup("checklist", "Extend  Student Visa", STUDENT, context=context) == {"steps": ["student answer"]}
+
+def test_similar_query_with_the_same_context_is_served(store):
+    same_steps = {**STUDENT_STEPS, "query": "extend my student visa please"}
+    answer = store.lookup("checklist", "extend my student visa please", STUDENT, context=lambda: same_steps)
+    assert answer == {"steps": ["student answer"]}
+
+def test_contrasting_similar_query_is_not_served(store):
+    assert store.lookup("checklist", "extend work visa", WORK, context=lambda: WORK_STEPS) is None
+    # Without a way to check the context, similar matches are not served either
+    assert store.lookup("checklist", "extend work visa", WORK) is None
+    assert store.lookup("checklist", "extend my student visa", STUDENT) is None
+
+def test_unrelated_query_and_other_kinds_miss(store):
+    assert store.lookup("checklist", "phone number?", PHONE, context=lambda: STUDENT_STEPS) is None
+    assert store.lookup("ask_human", "extend student visa", STUDENT) is None
+
+def test_disabled_store_never_answers(store):
+    store.enabled = False
+    assert store.lookup("checklist", "extend student visa", STUDENT) is None
+
+def test_refresh_recomputes_only_clusters_whose_context_changed(db, monkeypatch):
+    monkeypatch.setattr(service.settings, "PRECOMPUTE_MIN_QUERIES", 2)
+    query_logger = service.QueryLogger(enabled=True)
+    for _ in range(3):
+        query_logger.record("checklist", "extend student visa", STUDENT)
+        query_logger.record("checklist", "phone number?", PHONE)
+    query_logger.flush(timeout=5)
+
+    contexts = {"extend student visa": STUDENT_STEPS, "phone number?": {"steps": ["call"]}}
+    computed = []
+
+    def answer(query, context, budget):
+        computed.append(query)
+        return {"steps": [f"{query}: {context['steps'][0]}"]}
+
+    def refresh():
+        return refresh_precomputed_answers(
+            kinds=("checklist",), workers=2, answer_functions={"checklist": answer},
+            context_functions={"checklist": lambda query: contexts[query]},
+        )["checklist"]
+
+    assert refresh()["computed"] == 2
+    computed.clear()
+    contexts["phone number?"] = {"steps": ["write"]}
+    stats = refresh()
+    assert (stats["computed"], stats["reused"], computed) == (1, 1, ["phone number?"])
+
+    store = PrecomputedAnswerStore(enabled=True, match_similarity=0.9, reload_interval_s=0)
+    assert store.lookup("checklist", "phone number?", PHONE) == {"steps": ["phone number?: write"]}
+
+def test_budget_stops_computing_when_spent():
+    budget = service.LLMBudget(100)
+    budget.take(60)
+    with pytest.raises(service.OverBudget):
+        budget.take(60)
+    assert budget.spent == 60
+
+def test_worker_processes_share_one_schedule(tmp_path, monkeypatch):
+    runs = []
+    monkeypatch.setattr(service, "refresh_precomputed_answers", lambda: runs.append(1) or {})
+    lock_path = str(tmp_path / "precompute.lock")
+    first = service.PrecomputeWorker(interval_s=3600, check_interval_s=60, settle_s=0, lock_path=lock_path)
+    second = service.PrecomputeWorker(interval_s=3600, check_interval_s=60, settle_s=0, lock_path=lock_path)
+
+    assert first.due() and second.due()
+    assert first.run_once() == {}
+    # The other process sees the run and skips its turn
+    assert not second.due()
+    assert second.run_once() is None
+    assert len(runs) == 1
+
+    mark_knowledge_base_changed()
+    assert second.due()
+    second.run_once()
+    assert not first.due()
+    assert len(runs) == 2
+
+def test_failed_run_is_recorded(tmp_path, monkeypatch):
+    def fail():
+        raise RuntimeError("LLM down")
+    monkeypatch.setattr(service, "refresh_precomputed_answers", fail)
+    worker = service.PrecomputeWorker(interval_s=3600, check_interval_s=60, settle_s=0, lock_path=str(tmp_path / "lock"))
+    with pytest.raises(RuntimeError):
+        worker.run_once()
+    assert worker.last_run()["last_run_at"] > 0
+    assert not worker.due()
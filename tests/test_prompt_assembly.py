@@ -0,0 +1,48 @@
+import pytest
+
+from app.config import settings
+from app.prompts import prompt_assembly
+from app.prompts.prompt_assembly import PromptPacker, count_tokens, truncate_to_tokens
+
+tokenizers = pytest.importorskip("tokenizers")
+
+WORDS = ["visa", "permit", "residence", "office", "appointment", "passport", "form", "fee"]
+
+@pytest.fixture
+def padded_tokenizer(tmp_path, monkeypatch):
+    """A tokenizer file that truncates and pads to 8 tokens, like an embedding model's."""
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    vocab = {"[UNK]": 0, "[PAD]": 1, **{word: idx + 2 for idx, word in enumerate(WORDS)}}
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.enable_truncation(max_length=8)
+    tokenizer.enable_padding(length=8, pad_id=1, pad_token="[PAD]")
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+
+    monkeypatch.setattr(settings, "PROMPT_TOKENIZER", str(path))
+    monkeypatch.setattr(prompt_assembly, "_tokenizer", None)
+    monkeypatch.setattr(prompt_assembly, "_tokenizer_loaded", False)
+    yield
+    prompt_assembly._tokenizer, prompt_assembly._tokenizer_loaded = None, False
+
+def test_counts_are_neither_truncated_nor_padded(padded_tokenizer):
+    long_text = " ".join(WORDS * 10)
+    assert count_tokens(long_text) == 80
+    assert count_tokens("visa") == 1
+
+def test_truncate_to_tokens_respects_the_budget(padded_tokenizer):
+    long_text = " ".join(WORDS * 10)
+    truncated = truncate_to_tokens(long_text, 20)
+    assert truncated.endswith(prompt_assembly.TRUNCATION_MARKER)
+    assert count_tokens(truncated) <= 20
+    assert truncate_to_tokens("visa permit", 20) == "visa permit"
+
+def test_packer_fits_long_text_into_the_remaining_budget(padded_tokenizer):
+    packer = PromptPacker("test", budget=30)
+    fitted = packer.fit(" ".join(WORDS * 10))
+    assert count_tokens(fitted) <= 30
+    assert packer.truncated == 1
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+def run_in_threads(n, target):
+    results = [None] * n
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_do_shares_one_call():
+    flight = SingleFlight("test")
+    calls, release = [], threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"answer": 42}
+
+    threads, results = run_in_threads(5, lambda: flight.do("key", compute))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert all(result == {"answer": 42} for result in results)
+    # Nothing is cached once the call is done
+    assert flight.do("key", lambda: "fresh") == "fresh"
+
+def test_do_shares_exceptions():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    threads, results = run_in_threads(3, lambda: flight.do("key", fail))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+def test_stream_followers_get_every_item():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    runs = []
+
+    def produce():
+        runs.append(1)
+        yield "a"
+        release.wait(5)
+        yield "b"
+        yield "c"
+
+    leader = flight.stream("key", produce)
+    assert next(leader) == "a"
+    # Joins the run in progress and still starts from the first item
+    follower = flight.stream("key", produce)
+    release.set()
+
+    assert list(follower) == ["a", "b", "c"]
+    assert list(leader) == ["b", "c"]
+    assert len(runs) == 1
+
+def test_stream_is_closed_once_every_caller_stopped():
+    flight = SingleFlight("test")
+    closed, produced = threading.Event(), []
+
+    def produce():
+        try:
+            for i in range(1000):
+                produced.append(i)
+                yield i
+                time.sleep(0.01)
+        finally:
+            closed.set()
+
+    first, second = flight.stream("key", produce), flight.stream("key", produce)
+    assert next(first) == 0
+    assert next(second) == 0
+    first.close()
+    assert not closed.wait(0.1)  # the second caller is still reading
+    second.close()
+
+    assert closed.wait(5)
+    assert len(produced) < 1000
+    # A new caller starts a fresh run instead of joining the cancelled one
+    assert next(flight.stream("key", lambda: iter(["fresh"]))) == "fresh"
+
+def test_stream_errors_reach_every_caller():
+    flight = SingleFlight("test")
+
+    def produce():
+        yield 1
+        raise ValueError("malformed")
+
+    first = flight.stream("key", produce)
+    assert next(first) == 1
+    second = flight.stream("key", produce)
+    with pytest.raises(ValueError):
+        list(first)
+    with pytest.raises(ValueError):
+        list(second)
+
+def test_disabled_runs_every_call():
+    flight = SingleFlight("test", enabled=False)
+    calls = []
+    flight.do("key", calls.append, 1)
+    flight.do("key", calls.append, 2)
+    assert calls == [1, 2]
+    assert list(flight.stream("key", lambda: iter([1, 2]))) == [1, 2]
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from app.services import slot_filling_service as service
+from app.services.flow_engine import DEFAULT_FLOWS_DIR, load_flow_file
+
+@pytest.fixture
+def flow(monkeypatch):
+    monkeypatch.setattr(service.settings, "SLOT_FILLING_LLM_ENABLED", False)
+    return load_flow_file(os.path.join(DEFAULT_FLOWS_DIR, "visa_extension.yaml"))
+
+def extract(flow, slot, message):
+    result = service.EXTRACTORS[flow.by_id[slot].type](message, flow.by_id[slot])
+    return result[0] if result else None
+
+@pytest.mark.parametrize("slot, message, expected", [
+    ("date_of_birth", "born on 3.7.1994 in Lagos", "03/07/1994"),
+    ("date_of_birth", "1994-07-03", "03/07/1994"),
+    ("date_of_birth", "31.02.1994", None),
+    ("nationality", "I'm from the Netherlands", "Dutch"),
+    ("nationality", "I am Sri Lankan", "Sri Lankan"),
+    ("nationality", "I live in Munich", None),
+    ("full_name", "My name is Ana Maria Lopez", "Ana Maria Lopez"),
+    ("full_name", "Ana Lopez", "Ana Lopez"),
+    ("full_name", "I'm Italian Student", None),
+    ("address", "I live at Leopoldstraße 12a, 80802 München", "Leopoldstraße 12a, 80802 München"),
+    ("permit_type", "I have an EU Blue Card", "EU Blue Card"),
+    ("permit_type", "my residence permit for studies expires", "residence permit for studies"),
+    ("extension_reason", "I need more time because my master's thesis is delayed.", "my master's thesis is delayed"),
+    ("foreigners_office", "I usually go to the KVR Ruppertstraße", "KVR Ruppertstraße"),
+])
+def test_extractors(flow, slot, message, expected):
+    assert extract(flow, slot, message) == expected
+
+@pytest.mark.parametrize("message, expected", [
+    ("I have a blocked account", "Yes"),
+    ("I don't have a blocked account yet", "No"),
+    ("My scholarship covers everything", "Yes"),
+    ("Yes", None),  # a bare yes only answers the question that was just asked
+])
+def test_yes_no_needs_the_topic(flow, message, expected):
+    assert extract(flow, "financial_proof", message) == expected
+
+@pytest.mark.parametrize("message, expected", [
+    ("I work at Siemens", "Employed at Siemens"),
+    ("I'm working for BMW Group.", "Employed at BMW Group"),
+    ("I work in the Klinikum Großhadern", "Employed at the Klinikum Großhadern"),
+    ("I work with Allianz SE", "Employed at Allianz SE"),
+    ("I'm a student at TUM", "Studying at TUM"),
+    ("I study in the LMU", "Studying at the LMU"),
+])
+def test_occupation(flow, message, expected):
+    assert extract(flow, "occupation", message) == expected
+
+@pytest.mark.parametrize("message", [
+    "I work in Munich",
+    "I have been working in Germany since 2019",
+    "I study in Munich",
+])
+def test_occupation_ignores_places(flow, message):
+    assert extract(flow, "occupation", message) is None
+
+def test_occupation_after_a_place(flow):
+    assert extract(flow, "occupation", "I live and work in Munich, I work at Siemens") == "Employed at Siemens"
+
+def test_one_message_fills_several_questions(flow):
+    message = "I'm Ana Lopez from Brazil, born 3.7.1994, on a student visa and I have health insurance"
+    filled, error = service.fill_slots(flow, message, {}, current=None)
+    assert filled == {
+        "permit_type": "student visa",
+        "nationality": "Brazilian",
+        "full_name": "Ana Lopez",
+        "date_of_birth": "03/07/1994",
+        "health_insurance": "Yes",
+    }
+    assert error is None
+
+def test_direct_answer_to_the_current_question(flow):
+    answers = {"permit_type": "student visa"}
+    filled, error = service.fill_slots(flow, "yes", answers, current=flow.by_id["financial_proof"])
+    assert filled == {"financial_proof": "Yes"}
+
+    filled, error = service.fill_slots(flow, "tomorrow", answers, current=flow.by_id["date_of_birth"])
+    assert "date_of_birth" not in filled
+    assert error == flow.by_id["date_of_birth"].error
+
+def test_answers_to_other_questions_are_not_taken_as_the_direct_answer(flow):
+    filled, error = service.fill_slots(flow, "I'm from Brazil", {}, current=flow.by_id["full_name"])
+    assert filled == {"nationality": "Brazilian"}
+    assert error is None
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import checklist_generation_service as service
+from app.utils.single_flight import SingleFlight
+from app.utils.streaming_json import MalformedJSONError, StreamingJSONObjectParser
+
+CHECKLIST = {"steps": [{"step": "Book an appointment at the KVR", "details": ["Online booking"], "source": "https://stadt.muenchen.de"}]}
+RESPONSE = {"steps": ["Book an appointment", 'Bring your "original" passport'], "pdf_links": [], "source": "KVR", "closing": "Good luck"}
+
+def chunks(text, size=3):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def parse(text, size=3):
+    parser = StreamingJSONObjectParser(array_fields=("steps",))
+    items = [item for chunk in chunks(text, size) for item in parser.feed(chunk)]
+    return items, parser.close()
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_steps_are_emitted_as_they_complete(size):
+    text = json.dumps({"steps": ["Book an appointment", 'Bring your "original" passport'], "source": "KVR", "other": ["not a step"]})
+    items, document = parse(text, size)
+    assert items == [("steps", "Book an appointment"), ("steps", 'Bring your "original" passport')]
+    assert document["source"] == "KVR"
+
+def test_step_is_emitted_before_the_object_is_complete():
+    parser = StreamingJSONObjectParser(array_fields=("steps",))
+    assert parser.feed('{"steps": ["First step", "Sec') == [("steps", "First step")]
+    with pytest.raises(MalformedJSONError):
+        parser.close()
+
+def test_markdown_fence_is_accepted():
+    items, document = parse('```json\n{"steps": ["One"]}\n```')
+    assert items == [("steps", "One")]
+    assert document == {"steps": ["One"]}
+
+def test_nested_arrays_are_not_steps():
+    items, _ = parse('{"steps": [["nested"], "top"], "meta": {"steps": ["inner"]}}')
+    assert items == [("steps", "top")]
+
+@pytest.mark.parametrize("text", [
+    "Sure! Here is your checklist:",
+    '{steps: ["One"]}',
+    '{"steps": ["One"}',
+    '{"steps": ["One"]} Let me know',
+])
+def test_malformed_output_fails_early(text):
+    parser = StreamingJSONObjectParser(array_fields=("steps",))
+    with pytest.raises(MalformedJSONError):
+        parser.feed(text)
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stub the LLM: each call streams the next response; records which streams were closed."""
+    responses, calls = [], []
+
+    def stream_chat_completion(**kwargs):
+        text = responses.pop(0)
+        call = {"closed": False, "sent": 0}
+        calls.append(call)
+        try:
+            for chunk in chunks(text):
+                call["sent"] += 1
+                yield chunk
+        finally:
+            call["closed"] = True
+
+    monkeypatch.setattr(service, "stream_chat_completion", stream_chat_completion)
+    monkeypatch.setattr(service, "llm_flight", SingleFlight("llm"))
+    return responses, calls
+
+def test_stream_checklist(model):
+    responses, calls = model
+    responses.append(json.dumps(RESPONSE))
+
+    events = list(service.stream_checklist_from_ai_model("visa extension", CHECKLIST))
+
+    assert [e["event"] for e in events] == ["step", "step", "checklist"]
+    assert [e["step"] for e in events[:2]] == RESPONSE["steps"]
+    assert events[-1]["ai_response"]["closing"] == "Good luck"
+
+def test_malformed_output_is_aborted_and_retried(model):
+    responses, calls = model
+    malformed = '{"steps": ["Book an appointment"], oops' + " padding" * 200
+    responses.extend([malformed, json.dumps(RESPONSE)])
+
+    events = list(service.stream_checklist_from_ai_model("visa extension", CHECKLIST))
+
+    assert [e["event"] for e in events] == ["step", "retry", "step", "step", "checklist"]
+    assert events[1]["reason"] == "malformed_output"
+    # The malformed generation was stopped as soon as it went wrong
+    assert calls[0]["closed"] and calls[0]["sent"] < len(chunks(malformed))
+
+def test_output_failing_the_schema_is_retried(model):
+    responses, calls = model
+    responses.extend([json.dumps({"steps": []}), json.dumps(RESPONSE)])
+
+    assert service.send_checklist_to_ai_model("visa extension", CHECKLIST)["steps"] == RESPONSE["steps"]
+    assert len(calls) == 2
+
+def test_gives_up_after_the_second_malformed_output(model):
+    responses, calls = model
+    responses.extend(["Here you go: 1. Book", "I cannot help"])
+
+    with pytest.raises(HTTPException) as error:
+        list(service.stream_checklist_from_ai_model("visa extension", CHECKLIST))
+    assert error.value.status_code == 502
+    assert len(calls) == 2
@@ -0,0 +1,304 @@
+# frontier.py
+"""
+Focused crawl: instead of following every link to a fixed depth, candidate URLs wait in
+a priority queue scored by anchor text, URL patterns and embedding similarity to topic
+seeds (by default the conversation flows), and the crawl stops at a page budget.
+Only pages relevant enough to the topics are summarized and saved, in the same
+level_<depth>/ layout as recursive_scraper.py or into a crawl archive (--archive), both
+of which app.bulk_load reads.
+
+    PYTHONPATH=. python web_scraper/frontier.py https://stadt.muenchen.de/en/info/entry-visa.html
+    PYTHONPATH=. python web_scraper/frontier.py <seed url> --max-pages 300 --max-depth 4 --domain muenchen.de
+    PYTHONPATH=. python web_scraper/frontier.py <seed url> --archive web_scraper/crawl.jsonl.zst
+"""
+import os
+import re
+import json
+import heapq
+import logging
+import argparse
+import itertools
+from typing import Callable, Dict, Iterable, List, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+
+from app.config import settings
+from scraper import archive_page_data, extract_links_with_anchors, fetch_page, parse_page, save_page_data
+from llm_helper import summarize_website
+from app.utils.crawl_archive import CrawlArchiveWriter
+from app.utils.link_graph import link_graph
+
+logger = logging.getLogger(__name__)
+
+# Score = weighted sum of these signals, minus a penalty per level of depth
+URL_WEIGHT = 1.0
+ANCHOR_WEIGHT = 1.0
+SIMILARITY_WEIGHT = 2.0
+PARENT_WEIGHT = 1.0
+DEPTH_PENALTY = 0.1
+
+# URL path patterns that usually lead towards (or away from) administrative content
+POSITIVE_URL_PATTERNS = [
+    r"/info/", r"/service", r"buergerservice", r"dienstleistung", r"formular", r"antrag",
+    r"visa", r"aufenthalt", r"einbuerger", r"auslaender", r"immigration", r"residence",
+    r"anmeld", r"ummeld", r"abmeld", r"kvr", r"behoerde", r"rathaus/",
+]
+NEGATIVE_URL_PATTERNS = [
+    r"veranstaltung", r"/events?/", r"tourismus", r"/tourism", r"hotel", r"restaurant", r"shopping",
+    r"sehenswuerdig", r"/sights", r"kultur", r"/culture", r"freizeit", r"/leisure", r"nightlife",
+    r"branchenbuch", r"newsletter", r"/presse", r"/press", r"/jobs?/", r"/login", r"/suche", r"/search",
+]
+# Social networks and file downloads are never fetched as pages (PDFs are indexed separately)
+SKIPPED_HOSTS = ("facebook.com", "instagram.com", "twitter.com", "x.com", "youtube.com", "linkedin.com", "tiktok.com")
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".zip", ".doc", ".docx",
+    ".xls", ".xlsx", ".ppt", ".pptx", ".mp3", ".mp4", ".ics", ".vcf",
+)
+
+def topic_seeds_from_flows() -> List[Tuple[str, List[str]]]:
+    """(seed text, keywords) for every conversation flow: its description, keywords and questions."""
+    from app.services.flow_engine import flow_registry
+
+    flow_registry.reload(force=True)
+    seeds = []
+    for name in flow_registry.names():
+        flow = flow_registry.get(name)
+        text = " ".join([flow.description, *flow.keywords, *(question.text for question in flow.questions)])
+        seeds.append((text, list(flow.keywords)))
+    return seeds
+
+def default_embedder() -> Callable[[List[str]], np.ndarray] | None:
+    """The app's embedding model, or None (no similarity signal) if it cannot be loaded."""
+    try:
+        from app.utils.chromadb_client import embed_texts_array
+    except Exception as e:
+        logger.warning(f"Embeddings unavailable, scoring by anchor text and URL only: {e}")
+        return None
+    return embed_texts_array
+
+def _domain_of(url: str) -> str:
+    host = urlparse(url).netloc.lower().split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+def _url_words(url: str) -> str:
+    return " ".join(re.split(r"[^a-zA-Z0-9äöüß]+", urlparse(url).path)).strip()
+
+class TopicScorer:
+    """Relevance of links (before fetching) and pages (after fetching) to a set of topic seeds."""
+    def __init__(self, seeds: Iterable[Tuple[str, List[str]]], embed: Callable[[List[str]], np.ndarray] | None = None):
+        seeds = list(seeds)
+        self.keywords = sorted({keyword.lower() for _, keywords in seeds for keyword in keywords})
+        self.positive = re.compile("|".join(POSITIVE_URL_PATTERNS), re.I)
+        self.negative = re.compile("|".join(NEGATIVE_URL_PATTERNS), re.I)
+        self.embed = embed
+        self._seed_vectors = self._normalized([text for text, _ in seeds]) if embed and seeds else None
+        self._cache: Dict[str, float] = {}
+
+    def _normalized(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed(texts), dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def similarities(self, texts: List[str]) -> List[float]:
+        """Highest cosine similarity of each text to any seed (0 without embeddings). Cached by text."""
+        if self._seed_vectors is None:
+            return [0.0] * len(texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in self._cache))
+        if missing:
+            scores = (self._normalized(missing) @ self._seed_vectors.T).max(axis=1)
+            self._cache.update(zip(missing, scores.tolist()))
+        return [self._cache[text] for text in texts]
+
+    def keyword_score(self, text: str) -> float:
+        text = text.lower()
+        return 1.0 if any(keyword in text for keyword in self.keywords) else 0.0
+
+    def url_score(self, url: str) -> float:
+        path = urlparse(url).path
+        return (1.0 if self.positive.search(path) else 0.0) - (1.0 if self.negative.search(path) else 0.0)
+
+    def link_scores(self, links: List[Tuple[str, str]], parent_relevance: float, depth: int) -> List[float]:
+        similarities = self.similarities([f"{anchor} {_url_words(url)}".strip() for url, anchor in links])
+        scores = []
+        for (url, anchor), similarity in zip(links, similarities):
+            anchor_score = self.keyword_score(anchor) - (1.0 if anchor and self.negative.search(anchor) else 0.0)
+            scores.append(
+                URL_WEIGHT * self.url_score(url)
+                + ANCHOR_WEIGHT * anchor_score
+                + SIMILARITY_WEIGHT * similarity
+                + PARENT_WEIGHT * parent_relevance
+                - DEPTH_PENALTY * depth
+            )
+        return scores
+
+    def page_relevance(self, text: str) -> float:
+        """Similarity of the page's opening text to the seeds, or keyword presence without embeddings."""
+        if self._seed_vectors is None:
+            return self.keyword_score(text)
+        return self.similarities([text[:2000]])[0]
+
+class Frontier:
+    """
+    Priority queue of URLs to fetch, best score first. A URL found again with a higher
+    score is moved up; URLs outside the allowed domains, deeper than max_depth or on a
+    host that used up its page budget are never queued.
+    """
+    def __init__(self, allowed_domains: Iterable[str], max_depth: int, max_pages_per_host: int = 0):
+        self.allowed_domains = [domain.lower().removeprefix("www.") for domain in allowed_domains]
+        self.max_depth = max_depth
+        self.max_pages_per_host = max_pages_per_host
+        self._heap = []
+        self._best: Dict[str, float] = {}
+        self._done = set()
+        self._pages_per_host: Dict[str, int] = {}
+        self._counter = itertools.count()
+
+    def in_scope(self, url: str) -> bool:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or parsed.path.lower().endswith(SKIPPED_EXTENSIONS):
+            return False
+        domain = _domain_of(url)
+        if any(domain == host or domain.endswith(f".{host}") for host in SKIPPED_HOSTS):
+            return False
+        return not self.allowed_domains or any(domain == d or domain.endswith(f".{d}") for d in self.allowed_domains)
+
+    def push(self, url: str, score: float, depth: int, anchor: str = ""):
+        if depth > self.max_depth or url in self._done or not self.in_scope(url):
+            return
+        if score <= self._best.get(url, float("-inf")):
+            return
+        self._best[url] = score
+        heapq.heappush(self._heap, (-score, next(self._counter), url, depth, anchor))
+
+    def pop(self) -> Tuple[str, float, int, str] | None:
+        """Best queued URL as (url, score, depth, anchor), or None when the frontier is empty."""
+        while self._heap:
+            neg_score, _, url, depth, anchor = heapq.heappop(self._heap)
+            if url in self._done or -neg_score < self._best.get(url, float("-inf")):
+                continue  # already fetched, or superseded by a higher-scored entry
+            host = urlparse(url).netloc.lower()
+            if self.max_pages_per_host and self._pages_per_host.get(host, 0) >= self.max_pages_per_host:
+                continue
+            self._done.add(url)
+            self._pages_per_host[host] = self._pages_per_host.get(host, 0) + 1
+            return url, -neg_score, depth, anchor
+        return None
+
+    def __len__(self) -> int:
+        return len(self._best) - len(self._done & self._best.keys())
+
+def _save_to_level_dir(data: dict, save_dir: str, depth: int, file_counter: dict, mappings: dict):
+    level_dir = os.path.join(save_dir, f"level_{depth}")
+    os.makedirs(level_dir, exist_ok=True)
+    file_counter[depth] = file_counter.get(depth, 0) + 1
+    file_name = f"level_{depth}_file{file_counter[depth]}.json"
+    save_page_data(data, os.path.join(level_dir, file_name))
+    mappings.setdefault(depth, {})[file_name] = data["url"]
+    with open(os.path.join(level_dir, "mapping.json"), "w", encoding="utf-8") as mapping_file:
+        json.dump(mappings[depth], mapping_file, ensure_ascii=False, indent=4)
+
+def focused_crawl(
+    seed_urls: List[str],
+    save_dir: str,
+    scorer: TopicScorer,
+    max_pages: int | None = None,
+    max_depth: int | None = None,
+    allowed_domains: List[str] | None = None,
+    max_pages_per_host: int | None = None,
+    min_relevance: float | None = None,
+    fetch: Callable[[str], str] = fetch_page,
+    summarize: Callable[[str], str] = summarize_website,
+    archive: CrawlArchiveWriter | None = None,
+) -> dict:
+    """
+    Crawl from the seeds, always fetching the best-scored URL next, until max_pages pages
+    were fetched or nothing in scope is left. Pages scoring below min_relevance are not
+    summarized or saved, and their links inherit their low relevance. Saved pages go to
+    save_dir, or to the crawl archive when one is given.
+    """
+    max_pages = settings.CRAWL_MAX_PAGES if max_pages is None else max_pages
+    max_depth = settings.CRAWL_MAX_DEPTH if max_depth is None else max_depth
+    min_relevance = settings.CRAWL_MIN_PAGE_RELEVANCE if min_relevance is None else min_relevance
+    max_pages_per_host = settings.CRAWL_MAX_PAGES_PER_HOST if max_pages_per_host is None else max_pages_per_host
+    allowed_domains = allowed_domains or settings.CRAWL_ALLOWED_DOMAINS or sorted({_domain_of(url) for url in seed_urls})
+
+    frontier = Frontier(allowed_domains, max_depth, max_pages_per_host)
+    for url in seed_urls:
+        frontier.push(url, float("inf"), 0)
+
+    stats = {"fetched": 0, "failed": 0, "saved": 0, "summaries": 0, "skipped_irrelevant": 0}
+    file_counter, mappings = {}, {}
+    while stats["fetched"] < max_pages:
+        item = frontier.pop()
+        if item is None:
+            break
+        url, score, depth, anchor = item
+        try:
+            html_content = fetch(url)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            stats["failed"] += 1
+            continue
+        stats["fetched"] += 1
+
+        data = parse_page(url, html_content)
+        relevance = scorer.page_relevance(data["text"])
+        if relevance >= min_relevance:
+            data["summary"] = summarize(data["text"])
+            stats["summaries"] += 1
+            stats["saved"] += 1
+            if archive is not None:
+                archive_page_data(data, archive, depth)
+            else:
+                _save_to_level_dir(data, save_dir, depth, file_counter, mappings)
+        else:
+            link_graph.add_page(url, data["all_links"], data["pdf_links"])
+            stats["skipped_irrelevant"] += 1
+        logger.info(f"[{stats['fetched']}/{max_pages}] depth {depth} score {score:.2f} relevance {relevance:.2f} {url}")
+
+        if depth < max_depth:
+            links = list(dict.fromkeys(
+                (link, anchor_text) for link, anchor_text in extract_links_with_anchors(url, html_content)
+                if frontier.in_scope(link)
+            ))
+            for (link, anchor_text), link_score in zip(links, scorer.link_scores(links, relevance, depth + 1)):
+                frontier.push(link, link_score, depth + 1, anchor_text)
+
+    link_graph.compact()
+    stats["queued"] = len(frontier)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Focused crawl of pages relevant to the conversation flows.")
+    parser.add_argument("seeds", nargs="+", help="Start URLs")
+    parser.add_argument("--output", default="web_scraper/recursive_scraped_data")
+    parser.add_argument("--archive", default=None, help="Write pages to this crawl archive instead of --output")
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--max-pages-per-host", type=int, default=None)
+    parser.add_argument("--domain", action="append", default=None, help="Allowed domain (repeatable; default: the seeds' domains)")
+    parser.add_argument("--min-relevance", type=float, default=None)
+    parser.add_argument("--no-embeddings", action="store_true", help="Score by anchor text and URL patterns only")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    scorer = TopicScorer(topic_seeds_from_flows(), embed=None if args.no_embeddings else default_embedder())
+    os.makedirs(args.output, exist_ok=True)
+    archive = CrawlArchiveWriter(args.archive) if args.archive else None
+    try:
+        stats = focused_crawl(
+            args.seeds, args.output, scorer,
+            max_pages=args.max_pages, max_depth=args.max_depth, allowed_domains=args.domain,
+            max_pages_per_host=args.max_pages_per_host, min_relevance=args.min_relevance, archive=archive,
+        )
+    finally:
+        if archive is not None:
+            archive.close()
+    print(
+        f"Fetched {stats['fetched']} pages ({stats['failed']} failed), saved and summarized {stats['saved']}, "
+        f"skipped {stats['skipped_irrelevant']} as irrelevant; {stats['queued']} URLs left in the frontier."
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,193 @@
-from http.client import HTTPException
+"""
+Page summaries for the scrapers, sent through the API's LLM gateway at background
+priority. Run the scrapers from the repository root with PYTHONPATH=. (see README.md);
+set LLM_SHARED_STATE_FILE so the priority also applies against the API's calls.
+"""
+import os
+import re
+import zlib
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
-from config import settings
-from models.conversation import Conversation
+from app.config import settings
+from app.utils.llm_client import complete_chat
+from app.utils.llm_gateway import Priority
+from app.prompts.prompt_assembly import PromptPacker, count_tokens, truncate_to_tokens
 
-from client_manager_scraper import client_manager
+logger = logging.getLogger(__name__)
 
+# Bump when the prompts change, so cached summaries are regenerated
+SUMMARY_PROMPT_VERSION = "1"
+CACHE_DIR = settings.SUMMARY_CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".summary_cache")
 
-def summarize_website(site_text: str) -> str:
-    """
-    Summarize the site_text, which is scraped from a website, and generate an overview of everything
-    that is available on the site. This function should return a string that summarizes the site_text.
-    """
+# A chunk may end at a sentence whose hash matches this mask once it is half full. Boundaries
+# then depend on the content around them, not on the offset from the start of the page, so an
+# edit in one section leaves the other chunks (and their cached summaries) unchanged.
+CHUNK_BOUNDARY_MASK = 0x7
 
+SUMMARY_STYLE = (
+    "Don't add any comments from you, just reply directly with and only with the summary. don't say things like 'Here is a summary of the available information on the site:'. Just start directly."
+    "Don't summarize detailed what is there, just list as many different things the user can find on the site."
+)
 
-    system_prompt = (
-        "Below is the raw text from the website:\n"
-        f"{site_text}\n\n"
-        "Please reply with a summary of every available information on the site."
-        "Don't leave out important information, but keep it concise. "
-        "Don't add any comments from you, just reply directly with and only with the summary. don't say things like 'Here is a summary of the available information on the site:'. Just start directly."
-        "Don't summarize detailed what is there, just list as many different things the user can find on the site."
+_executor = None
+_executor_lock = threading.Lock()
 
-    )
+def _get_executor() -> ThreadPoolExecutor:
+    """Shared pool, so the number of concurrent chunk summaries is bounded across all pages."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.SUMMARY_MAX_WORKERS, thread_name_prefix="summary")
+        return _executor
+
+def _cache_path(kind: str, text: str) -> str:
+    key = hashlib.sha256(
+        f"{kind}\0{SUMMARY_PROMPT_VERSION}\0{settings.MODEL_NAME_CONVERSATIONAL_GROQ}\0{text}".encode("utf-8")
+    ).hexdigest()
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.txt")
 
+def _cached_summary(kind: str, text: str, summarize) -> str:
+    """Return the cached summary for text, or compute and store it. Failures are not cached."""
+    path = _cache_path(kind, text)
     try:
-        client_manager.setup_clients()
-        groq_client = client_manager.get_groq_client()
-
-        response_stream = groq_client.chat.completions.create(
-            model=settings.MODEL_NAME_CONVERSATIONAL_GROQ,
-            messages=[{"role": "system", "content": system_prompt}],
-            stream=True,
-            max_tokens=400,
-            temperature=0.4,
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    summary = summarize(text)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(summary)
+    os.replace(tmp_path, path)
+    return summary
+
+def _split_sentences(text: str, max_tokens: int) -> List[str]:
+    """Split into sentences; anything still longer than max_tokens is cut into pieces."""
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        while count_tokens(sentence) > max_tokens:
+            head = truncate_to_tokens(sentence, max_tokens).removesuffix(" [...]")
+            pieces.append(head)
+            sentence = sentence[len(head):].lstrip()
+        if sentence.strip():
+            pieces.append(sentence)
+    return pieces
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """Split text into chunks of at most max_tokens with content-defined boundaries."""
+    chunks, current, current_tokens = [], [], 0
+    for sentence in _split_sentences(text, max_tokens):
+        tokens = count_tokens(sentence) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+        if current_tokens >= max_tokens // 2 and zlib.crc32(sentence.encode("utf-8")) & CHUNK_BOUNDARY_MASK == 0:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def _complete(system_prompt: str, max_tokens: int, call_type: str) -> str:
+    # Background priority: interactive chat calls are scheduled first, and there is no deadline
+    return complete_chat(
+        messages=[{"role": "system", "content": system_prompt}],
+        max_tokens=max_tokens,
+        temperature=0.4,
+        call_type=call_type,
+        priority=Priority.BACKGROUND,
+        deadline_s=0,
+    )
+
+def _summarize_page(site_text: str) -> str:
+    """Summarize a page that fits in one prompt."""
+    def build_prompt(text: str) -> str:
+        return (
+            "Below is the raw text from the website:\n"
+            f"{text}\n\n"
+            "Please reply with a summary of every available information on the site."
+            "Don't leave out important information, but keep it concise. "
+            f"{SUMMARY_STYLE}"
         )
 
-        request_text = ""
-        for chunk in response_stream:
-            if hasattr(chunk.choices[0].delta, "content"):
-                token = chunk.choices[0].delta.content
-                if token:
-                    request_text += token
+    packer = PromptPacker("website_summary", build_prompt(""))
+    system_prompt = build_prompt(packer.fit(site_text))
+    packer.log_usage([{"role": "system", "content": system_prompt}])
+    return _complete(system_prompt, 400, "website_summary")
 
-        return request_text.strip()
+def _summarize_chunk(chunk: str) -> str:
+    """Map step: summarize one section of a long page."""
+    system_prompt = (
+        "Below is one section of the raw text from a website:\n"
+        f"{chunk}\n\n"
+        "Please reply with a concise list of every distinct piece of information, service, form, "
+        "contact or requirement a user can find in this section. "
+        f"{SUMMARY_STYLE}"
+    )
+    return _complete(system_prompt, 300, "website_summary_chunk")
+
+def _merge_summaries(summaries: List[str]) -> str:
+    """Reduce step: merge section summaries into one page summary."""
+    sections = "\n\n".join(f"Section {idx}:\n{summary}" for idx, summary in enumerate(summaries, start=1))
+    system_prompt = (
+        "Below are summaries of consecutive sections of the same website:\n"
+        f"{sections}\n\n"
+        "Please merge them into one summary of every available information on the site, "
+        "removing repetitions. Don't leave out important information, but keep it concise. "
+        f"{SUMMARY_STYLE}"
+    )
+    return _complete(system_prompt, 400, "website_summary")
+
+def _map_reduce(site_text: str, depth: int = 0) -> str:
+    chunks = split_into_chunks(site_text, settings.SUMMARY_CHUNK_TOKENS)
+    futures = [_get_executor().submit(_cached_summary, "chunk", chunk, _summarize_chunk) for chunk in chunks]
+
+    summaries = []
+    for idx, future in enumerate(futures):
+        try:
+            summaries.append(future.result())
+        except Exception as e:
+            # One failed section should not lose the summary of the rest of the page
+            logger.error(f"Summarizing chunk {idx + 1}/{len(chunks)} failed: {e}")
+    if not summaries:
+        raise RuntimeError("Summarizing every chunk failed.")
+    logger.info(f"Summarized page of {count_tokens(site_text)} tokens in {len(chunks)} chunks")
+
+    merged_text = "\n\n".join(summaries)
+    if len(summaries) > 1 and count_tokens(merged_text) > settings.SUMMARY_CHUNK_TOKENS:
+        if depth < settings.SUMMARY_MAX_REDUCE_DEPTH:
+            # Too many section summaries for one merge prompt: summarize the summaries again
+            return _map_reduce(merged_text, depth + 1)
+        # Summaries that don't shrink any more: merge what fits, an equal share of each
+        logger.warning(f"Section summaries still exceed {settings.SUMMARY_CHUNK_TOKENS} tokens after {depth} reduce rounds; truncating them")
+        share = max(1, settings.SUMMARY_CHUNK_TOKENS // len(summaries))
+        summaries = [truncate_to_tokens(summary, share) for summary in summaries]
+        merged_text = "\n\n".join(summaries)
+    if len(summaries) == 1:
+        return summaries[0]
+    return _cached_summary("merge", merged_text, lambda _: _merge_summaries(summaries))
+
+def summarize_website(site_text: str) -> str:
+    """
+    Summarize the site_text, which is scraped from a website, and generate an overview of everything
+    that is available on the site. This function should return a string that summarizes the site_text.
+    Long pages are split into chunks that are summarized in parallel and then merged.
+    """
+    try:
+        if count_tokens(site_text) <= settings.SUMMARY_CHUNK_TOKENS:
+            return _cached_summary("page", site_text, _summarize_page)
+        return _map_reduce(site_text)
 
     except Exception as e:
+        logger.error(f"Summarizing website failed: {e}")
         fallback = "Failed to generate request. Please summarize the site text manually."
         return (
                 "LLM request generation failed. Fallback request based on partial conversation:\n"
@@ -2,8 +2,10 @@
 import os
 import json
 from scraper import scrape_and_process_data  # Assuming scraper.py contains scrape_and_process_data
+from app.utils.crawl_archive import CrawlArchiveWriter
+from app.utils.link_graph import link_graph
 
-def recursive_scrape(url, save_dir, level=0, current_level=0, file_counter=None, mappings=None):
+def recursive_scrape(url, save_dir, level=0, current_level=0, file_counter=None, mappings=None, archive=None):
     """
     Recursively scrape a URL and its links up to the specified depth level.
 
@@ -14,6 +16,8 @@ def recursive_scrape(url, save_dir, level=0, current_level=0, file_counter=None,
         current_level (int): Current depth level of the recursion (used internally).
         file_counter (dict): A dictionary to keep track of file numbering per level.
         mappings (dict): A dictionary to store mappings for the current level.
+        archive (CrawlArchiveWriter): If given, pages are appended to this crawl archive
+            instead of being written as level_X/level_X_fileY.json files.
     """
     if file_counter is None:
         file_counter = {}
@@ -24,6 +28,16 @@ def recursive_scrape(url, save_dir, level=0, current_level=0, file_counter=None,
     if current_level > level:
         return
 
+    if archive is not None:
+        data = scrape_and_process_data(url, None, archive=archive, depth=current_level)
+        if data and current_level < level:
+            for link in data.get("all_links", []):
+                recursive_scrape(link, save_dir, level, current_level + 1, archive=archive)
+        if current_level == 0:
+            archive.flush()
+            link_graph.compact()
+        return
+
     # Initialize the counter for the current level if not present
     if current_level not in file_counter:
         file_counter[current_level] = 1
@@ -57,9 +71,10 @@ def recursive_scrape(url, save_dir, level=0, current_level=0, file_counter=None,
             # Recursively scrape links
             recursive_scrape(link, save_dir, level, current_level + 1, file_counter, mappings)
 
-    # Clear mappings for next level
+    # Clear mappings for next level, and fold the crawl's links into the link graph
     if current_level == 0:
         mappings.clear()
+        link_graph.compact()
 
 # Example Usage
 if __name__ == "__main__":
@@ -68,3 +83,7 @@ if __name__ == "__main__":
     os.makedirs(output_directory, exist_ok=True)
 
     recursive_scrape(website_url, output_directory, level=1)
+
+    # Or, into a compressed crawl archive (load it with: python -m app.bulk_load web_scraper/crawl.jsonl.zst)
+    # with CrawlArchiveWriter("web_scraper/crawl.jsonl.zst") as archive:
+    #     recursive_scrape(website_url, output_directory, level=1, archive=archive)
@@ -9,6 +9,7 @@ import phonenumbers
 from phonenumbers import NumberParseException, PhoneNumberMatcher
 
 from llm_helper import summarize_website
+from app.utils.link_graph import link_graph
 
 
 # Function to fetch a web page
@@ -114,54 +115,77 @@ def extract_all_links(base_url, html_content):
         all_links.append(absolute_link)
     return all_links
 
-# Main function to scrape and process data
-def scrape_and_process_data(url, save_path):
-    print(f"Scraping {url}...")
-    try:
-        html_content = fetch_page(url)
-    except requests.RequestException as e:
-        print(f"Failed to fetch {url}: {e}")
-        return
-
-    # Extract PDFs
-    pdf_links = extract_pdf_links(url, html_content)
+# Function to extract links together with their anchor text (used to prioritize a focused crawl)
+def extract_links_with_anchors(base_url, html_content):
+    soup = BeautifulSoup(html_content, 'html.parser')
+    anchors = []
+    for a_tag in soup.find_all('a', href=True):
+        absolute_link = urljoin(base_url, a_tag['href']).split('#')[0].split('?')[0]
+        anchor_text = " ".join(filter(None, [a_tag.get_text(" ", strip=True), a_tag.get('title', '')]))
+        anchors.append((absolute_link, anchor_text))
+    return anchors
 
+# Function to build the page record (everything except the summary)
+def parse_page(url, html_content):
     # Extract text
     page_text = extract_text_content(html_content)
 
-    # Extract phone numbers with context
-    phone_numbers = extract_phone_numbers_with_context(page_text)
-
-    # Extract links
-    all_listed_links = extract_all_links(url, html_content)
-
-    summarized_website = summarize_website(page_text)
-
-    # Create JSON object
-    data = {
+    return {
         "url": url,
         "text": page_text,
-        "pdf_links": pdf_links,
-        "phone_numbers": phone_numbers,  # Now a list of dicts with number and context
-        "all_links": all_listed_links,
-        "summary": summarized_website
+        "pdf_links": extract_pdf_links(url, html_content),
+        "phone_numbers": extract_phone_numbers_with_context(page_text),  # Now a list of dicts with number and context
+        "all_links": extract_all_links(url, html_content),
     }
 
-    # Save JSON to file
+# Function to save a page record and record its links in the link graph
+def save_page_data(data, save_path):
     with open(save_path, 'w', encoding='utf-8') as json_file:
         json.dump(data, json_file, ensure_ascii=False, indent=4)
 
+    link_graph.add_page(data["url"], data["all_links"], data["pdf_links"])
+
+# Function to append a page record to a crawl archive and record its links in the link graph
+def archive_page_data(data, archive, depth):
+    archive.write({**data, "depth": depth})
+
+    link_graph.add_page(data["url"], data["all_links"], data["pdf_links"])
+
+# Main function to scrape and process data. With a crawl archive (app.utils.crawl_archive),
+# the page is appended to it instead of being written to save_path.
+def scrape_and_process_data(url, save_path, archive=None, depth=0):
+    print(f"Scraping {url}...")
+    try:
+        html_content = fetch_page(url)
+    except requests.RequestException as e:
+        print(f"Failed to fetch {url}: {e}")
+        return None
+
+    # Create JSON object
+    data = parse_page(url, html_content)
+    data["summary"] = summarize_website(data["text"])
+
+    if archive is not None:
+        archive_page_data(data, archive, depth)
+        print(f"Data added to {archive.path}")
+        return data
+
+    # Save JSON to file
+    save_page_data(data, save_path)
+
     print(f"Data saved to {save_path}")
+    return data
 
 
 
 
 # Example Usage
-# URL to scrape
-url_to_scrape = "https://stadt.muenchen.de/en/info/entry-visa.html"
+if __name__ == "__main__":
+    # URL to scrape
+    url_to_scrape = "https://stadt.muenchen.de/en/info/entry-visa.html"
 
-# Directory to save scraped data
-save_directory = "web_scraper/scraped_data"
+    # Directory to save scraped data
+    save_directory = "web_scraper/scraped_data"
 
-# Scrape and process data
-scrape_and_process_data(url_to_scrape, save_directory)
\ No newline at end of file
+    # Scrape and process data
+    scrape_and_process_data(url_to_scrape, save_directory)
\ No newline at end of file